@@ -7,31 +7,38 @@
 #
 # http://www.datastax.com/terms/datastax-dse-driver-license-terms
 
+# monkey patches the process for the gevent and eventlet reactors
+import green
+
 from cProfile import Profile
+import json
 import logging
 import os.path
+import resource
 import sys
 from threading import Thread
 import time
 from optparse import OptionParser
 import uuid
 
-from greplin import scales
-
 dirname = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(dirname)
 sys.path.append(os.path.join(dirname, '..'))
 
-import cassandra
-from cassandra.cluster import Cluster
-from cassandra.io.asyncorereactor import AsyncoreConnection
+import dse
+from dse import AlreadyExists
+from dse.cluster import Cluster
+from dse.io.asyncorereactor import AsyncoreConnection
+from dse.protocol import _ProtocolHandler, HAVE_CYTHON
+
+from fake_server import FakeServer, benchmark_table
 
 log = logging.getLogger()
 handler = logging.StreamHandler()
 handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s"))
 log.addHandler(handler)
 
-logging.getLogger('cassandra').setLevel(logging.WARN)
+logging.getLogger('dse').setLevel(logging.WARN)
 
 _log_levels = {
     'CRITICAL': logging.CRITICAL,
@@ -43,24 +50,37 @@ _log_levels = {
     'NOTSET': logging.NOTSET,
 }
 
-have_libev = False
-supported_reactors = [AsyncoreConnection]
+# reactor name -> connection class, for the reactors that can be imported.
+# gevent and eventlet are only available in a process monkey patched for
+# them, see green.py.
+reactors = {'asyncore': AsyncoreConnection}
+try:
+    from dse.io.libevreactor import LibevConnection
+    reactors['libev'] = LibevConnection
+except ImportError:
+    pass
+
 try:
-    from cassandra.io.libevreactor import LibevConnection
-    have_libev = True
-    supported_reactors.append(LibevConnection)
-except ImportError as exc:
+    from dse.io.asyncioreactor import AsyncioConnection
+    reactors['asyncio'] = AsyncioConnection
+except (ImportError, SyntaxError):
     pass
 
-have_twisted = False
 try:
-    from cassandra.io.twistedreactor import TwistedConnection
-    have_twisted = True
-    supported_reactors.append(TwistedConnection)
-except ImportError as exc:
-    log.exception("Error importing twisted")
+    from dse.io.twistedreactor import TwistedConnection
+    reactors['twisted'] = TwistedConnection
+except ImportError:
     pass
 
+if green.patched == 'gevent':
+    from dse.io.geventreactor import GeventConnection
+    reactors['gevent'] = GeventConnection
+elif green.patched == 'eventlet':
+    from dse.io.eventletreactor import EventletConnection
+    reactors['eventlet'] = EventletConnection
+
+REACTOR_ORDER = ('asyncore', 'libev', 'asyncio', 'twisted')
+
 KEYSPACE = "testkeyspace" + str(int(time.time()))
 TABLE = "testtable"
 
@@ -72,9 +92,18 @@ COLUMN_VALUES = {
     'timestamp': "'2016-02-03 04:05+0000'"
 }
 
+# bound values of prepared statements
+PREPARED_COLUMN_VALUES = {
+    'int': 42,
+    'text': '42',
+    'float': 42.0,
+    'uuid': uuid.uuid4(),
+    'timestamp': 1454472300000
+}
+
 
 def setup(options):
-    log.info("Using 'cassandra' package from %s", cassandra.__path__)
+    log.info("Using 'dse' package from %s", dse.__path__)
 
     cluster = Cluster(options.hosts, schema_metadata_enabled=False, token_metadata_enabled=False)
     try:
@@ -88,7 +117,7 @@ def setup(options):
                 """ % options.keyspace)
 
             log.debug("Setting keyspace...")
-        except cassandra.AlreadyExists:
+        except AlreadyExists:
             log.debug("Keyspace already exists")
 
         session.set_keyspace(options.keyspace)
@@ -104,7 +133,7 @@ def setup(options):
 
         try:
             session.execute(create_table_query.format(TABLE))
-        except cassandra.AlreadyExists:
+        except AlreadyExists:
             log.debug("Table already exists.")
 
     finally:
@@ -119,42 +148,105 @@ def teardown(options):
     cluster.shutdown()
 
 
+def build_query(options):
+    if options.prepared:
+        if options.read:
+            return "SELECT * FROM {0} WHERE thekey = ?".format(TABLE)
+        columns = ''.join(", col{0}".format(i) for i in range(options.num_columns))
+        markers = ", ?" * options.num_columns
+        return "INSERT INTO {0} (thekey{1}) VALUES (?{2})".format(TABLE, columns, markers)
+
+    if options.read:
+        return "SELECT * FROM {0}  WHERE thekey = '{{key}}'".format(TABLE)
+
+    query = "INSERT INTO {0} (thekey".format(TABLE)
+    for i in range(options.num_columns):
+        query += ", col{0}".format(i)
+
+    query += ") VALUES ('{key}'"
+    for i in range(options.num_columns):
+        query += ", {0}".format(COLUMN_VALUES[options.column_type])
+    query += ")"
+    return query
+
+
+class LatencyRecorder(object):
+    """
+    Records the latency of every request, from the moment it is created
+    until its callbacks run.
+    """
+
+    def __init__(self):
+        self.latencies = []
+
+    def __call__(self, response_future):
+        start = time.time()
+        record = self.latencies.append
+
+        def done(_):
+            record(time.time() - start)
+
+        response_future.add_callbacks(done, done)
+
+    def percentile(self, p):
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return float('nan')
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100.0))]
+
+
+def _cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
 def benchmark(thread_class):
     options, args = parse_options()
-    for conn_class in options.supported_reactors:
-        setup(options)
+    for name in options.reactors:
+        conn_class = reactors[name]
+        server = None
+        if options.fake_server:
+            table = benchmark_table(options.keyspace, TABLE, options.num_columns, options.column_type)
+            server = FakeServer(table).start()
+            hosts = ['127.0.0.1']
+            kwargs = {'port': server.port, 'schema_metadata_enabled': False, 'token_metadata_enabled': False}
+        else:
+            setup(options)
+            hosts = options.hosts
+            kwargs = {}
         log.info("==== %s ====" % (conn_class.__name__,))
 
-        kwargs = {'metrics_enabled': options.enable_metrics,
-                  'connection_class': conn_class}
+        kwargs.update({'metrics_enabled': options.enable_metrics,
+                       'connection_class': conn_class})
         if options.protocol_version:
             kwargs['protocol_version'] = options.protocol_version
-        cluster = Cluster(options.hosts, **kwargs)
+        cluster = Cluster(hosts, **kwargs)
         session = cluster.connect(options.keyspace)
+        if not options.cython:
+            session.client_protocol_handler = _ProtocolHandler
 
-        log.debug("Sleeping for two seconds...")
-        time.sleep(2.0)
-
+        if not options.fake_server:
+            log.debug("Sleeping for two seconds...")
+            time.sleep(2.0)
 
-        # Generate the query
-        if options.read:
-            query = "SELECT * FROM {0}  WHERE thekey = '{{key}}'".format(TABLE)
+        query = build_query(options)
+        if options.prepared:
+            query = session.prepare(query)
+            values = () if options.read else (PREPARED_COLUMN_VALUES[options.column_type],) * options.num_columns
         else:
-            query = "INSERT INTO {0} (thekey".format(TABLE)
-            for i in range(options.num_columns):
-                query += ", col{0}".format(i)
-
-            query += ") VALUES ('{key}'"
-            for i in range(options.num_columns):
-                query += ", {0}".format(COLUMN_VALUES[options.column_type])
-            query += ")"
-
-        values = None  # we don't use that anymore. Keeping it in case we go back to prepared statements.
+            values = None
         per_thread = options.num_ops // options.threads
         threads = []
 
+        recorder = LatencyRecorder()
+        session.add_request_init_listener(recorder)
+
         log.debug("Beginning {0}...".format('reads' if options.read else 'inserts'))
         start = time.time()
+        start_cpu = _cpu_time()
+        # green threads all run in one OS thread, whose CPU time includes
+        # the benchmark
+        start_server_cpu = server.cpu_time() if server and not green.patched else None
         try:
             for i in range(options.threads):
                 thread = thread_class(
@@ -171,15 +263,39 @@ def benchmark(thread_class):
                     thread.join(timeout=0.5)
 
             end = time.time()
+            cpu = _cpu_time() - start_cpu
+            if start_server_cpu is not None:
+                # leave out the work of the fake server
+                cpu -= server.cpu_time() - start_server_cpu
         finally:
             cluster.shutdown()
-            teardown(options)
+            if server:
+                server.stop()
+            else:
+                teardown(options)
 
         total = end - start
+        num_ops = per_thread * options.threads
+        result = {
+            'benchmark': os.path.splitext(os.path.basename(sys.argv[0]))[0],
+            'reactor': name,
+            'codec': 'cython' if options.cython else 'python',
+            'requests': num_ops,
+            'requests_per_sec': num_ops / total,
+            'p50_ms': recorder.percentile(50) * 1000,
+            'p99_ms': recorder.percentile(99) * 1000,
+            'cpu_us_per_request': cpu / num_ops * 1e6,
+            'cpu_includes_server': server is not None and start_server_cpu is None,
+        }
+        if options.json:
+            print(json.dumps(result))
         log.info("Total time: %0.2fs" % total)
-        log.info("Average throughput: %0.2f/sec" % (options.num_ops / total))
+        log.info("Average throughput: %0.2f/sec" % result['requests_per_sec'])
+        log.info("Latency: p50 %0.3fms, p99 %0.3fms", result['p50_ms'], result['p99_ms'])
+        log.info("CPU per request: %0.1fus%s", result['cpu_us_per_request'],
+                 " (including the fake server)" if result['cpu_includes_server'] else "")
         if options.enable_metrics:
-            stats = scales.getStats()['cassandra']
+            stats = cluster.metrics.get_stats()
             log.info("Connection errors: %d", stats['connection_errors'])
             log.info("Write timeouts: %d", stats['write_timeouts'])
             log.info("Read timeouts: %d", stats['read_timeouts'])
@@ -203,18 +319,24 @@ def benchmark(thread_class):
 
 def parse_options():
     parser = OptionParser()
-    parser.add_option('-H', '--hosts', default='127.0.0.1',
-                      help='cassandra hosts to connect to (comma-separated list) [default: %default]')
+    parser.add_option('-H', '--hosts',
+                      help='cassandra hosts to connect to (comma-separated list); '
+                           'an in-process fake server is used if not set')
     parser.add_option('-t', '--threads', type='int', default=1,
                       help='number of threads [default: %default]')
     parser.add_option('-n', '--num-ops', type='int', default=10000,
                       help='number of operations [default: %default]')
+    parser.add_option('-r', '--reactor', action='append', dest='reactor_names', default=[],
+                      help='only benchmark with this reactor (%s); may be repeated, except for gevent '
+                           'and eventlet' % ', '.join(REACTOR_ORDER + green.GREEN_REACTORS))
     parser.add_option('--asyncore-only', action='store_true', dest='asyncore_only',
                       help='only benchmark with asyncore connections')
     parser.add_option('--libev-only', action='store_true', dest='libev_only',
                       help='only benchmark with libev connections')
     parser.add_option('--twisted-only', action='store_true', dest='twisted_only',
                       help='only benchmark with Twisted connections')
+    parser.add_option('--no-cython', action='store_false', dest='cython', default=HAVE_CYTHON,
+                      help='decode responses with the pure Python protocol handler')
     parser.add_option('-m', '--metrics', action='store_true', dest='enable_metrics',
                       help='enable and print metrics for operations')
     parser.add_option('-l', '--log-level', default='info',
@@ -233,11 +355,16 @@ def parse_options():
                       help='Specify the column type for the schema (supported: int, text, float, uuid, timestamp)')
     parser.add_option('--read', action='store_true', dest='read', default=False,
                       help='Read mode')
-
+    parser.add_option('--prepared', action='store_true', dest='prepared', default=False,
+                      help='Use a prepared statement')
+    parser.add_option('--json', action='store_true', dest='json', default=False,
+                      help='Print the results of each reactor as a line of JSON')
 
     options, args = parser.parse_args()
 
-    options.hosts = options.hosts.split(',')
+    options.fake_server = not options.hosts
+    if options.hosts:
+        options.hosts = options.hosts.split(',')
 
     level = options.log_level.upper()
     try:
@@ -246,21 +373,26 @@ def parse_options():
         log.warn("Unknown log level specified: %s; specify one of %s", options.log_level, _log_levels.keys())
 
     if options.asyncore_only:
-        options.supported_reactors = [AsyncoreConnection]
-    elif options.libev_only:
-        if not have_libev:
-            log.error("libev is not available")
+        options.reactor_names.append('asyncore')
+    if options.libev_only:
+        options.reactor_names.append('libev')
+    if options.twisted_only:
+        options.reactor_names.append('twisted')
+
+    if options.reactor_names:
+        for name in options.reactor_names:
+            if name not in reactors:
+                log.error("%s is not available", name)
+                sys.exit(1)
+        if green.patched and len(set(options.reactor_names)) > 1:
+            log.error("%s must be benchmarked on its own, as it monkey patches the process", green.patched)
             sys.exit(1)
-        options.supported_reactors = [LibevConnection]
-    elif options.twisted_only:
-        if not have_twisted:
-            log.error("Twisted is not available")
-            sys.exit(1)
-        options.supported_reactors = [TwistedConnection]
+        options.reactors = options.reactor_names
     else:
-        options.supported_reactors = supported_reactors
-        if not have_libev:
-            log.warning("Not benchmarking libev reactor because libev is not available")
+        options.reactors = [name for name in REACTOR_ORDER if name in reactors]
+        for name in REACTOR_ORDER:
+            if name not in reactors:
+                log.warning("Not benchmarking %s reactor because it is not available", name)
 
     return options, args
 
@@ -281,8 +413,14 @@ class BenchmarkThread(Thread):
         if self.profiler:
             self.profiler.enable()
 
+    def query_args(self, key):
+        if self.values is not None:
+            return self.query, (key,) + self.values
+        return self.query.format(key=key), None
+
     def run_query(self, key, **kwargs):
-        return self.session.execute_async(self.query.format(key=key), **kwargs)
+        query, parameters = self.query_args(key)
+        return self.session.execute_async(query, parameters, **kwargs)
 
     def finish_profile(self):
         if self.profiler:
@@ -7,12 +7,14 @@
 #
 # http://www.datastax.com/terms/datastax-dse-driver-license-terms
 
+# imported first, as it monkey patches the process for gevent and eventlet
+from base import benchmark, BenchmarkThread
+
 import logging
 
 from itertools import count
 from threading import Event
 
-from base import benchmark, BenchmarkThread
 from six.moves import range
 
 log = logging.getLogger(__name__)
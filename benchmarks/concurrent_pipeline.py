@@ -0,0 +1,31 @@
+# Copyright 2013-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+
+# imported first, as it monkey patches the process for gevent and eventlet
+from base import benchmark, BenchmarkThread
+from six.moves import range
+
+from dse.concurrent import execute_concurrent
+
+
+class Runner(BenchmarkThread):
+
+    def run(self):
+        statements = (self.query_args("{0}-{1}".format(self.thread_num, i))
+                      for i in range(self.num_queries))
+
+        self.start_profile()
+
+        execute_concurrent(self.session, statements, concurrency=120)
+
+        self.finish_profile()
+
+
+if __name__ == "__main__":
+    benchmark(Runner)
@@ -0,0 +1,407 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+
+"""
+A native protocol server that runs in the benchmark process and answers
+every request with a canned frame, so that benchmarks measure the driver
+rather than a cluster.
+
+It speaks protocol versions 3 and 4, without compression, and answers:
+
+    - OPTIONS with SUPPORTED, STARTUP and REGISTER with READY
+    - ``USE`` queries with SET_KEYSPACE
+    - queries of ``system.local`` and ``system.peers`` with a single node
+    - other SELECT queries with `num_rows` rows of the benchmark table
+    - any other query, and BATCH, with VOID
+    - PREPARE with a prepared id, and EXECUTE like the prepared query
+
+Bind markers of prepared queries are typed like the columns of the
+benchmark table, in order.
+"""
+
+from hashlib import md5
+import logging
+import resource
+import socket
+import struct
+from threading import Thread, Lock
+import time
+import uuid
+
+from six import BytesIO
+
+from dse.marshal import int32_pack, float_pack, int64_pack
+from dse.protocol import (write_int, write_short, write_string, write_stringmultimap, write_value, read_short,
+                          read_longstring, read_binary_string)
+
+log = logging.getLogger(__name__)
+
+HEADER = struct.Struct('>BBhBi')
+
+OPCODE_ERROR = 0x00
+OPCODE_STARTUP = 0x01
+OPCODE_READY = 0x02
+OPCODE_OPTIONS = 0x05
+OPCODE_SUPPORTED = 0x06
+OPCODE_QUERY = 0x07
+OPCODE_RESULT = 0x08
+OPCODE_PREPARE = 0x09
+OPCODE_EXECUTE = 0x0A
+OPCODE_REGISTER = 0x0B
+OPCODE_BATCH = 0x0D
+
+SUPPORTED_VERSIONS = (3, 4)
+
+TYPE_INT = 0x0009
+TYPE_BIGINT = 0x0002
+TYPE_FLOAT = 0x0008
+TYPE_TIMESTAMP = 0x000B
+TYPE_UUID = 0x000C
+TYPE_VARCHAR = 0x000D
+TYPE_INET = 0x0010
+TYPE_SET = 0x0022
+
+# benchmark column type -> (type id, serialized value)
+COLUMN_TYPES = {
+    'int': (TYPE_INT, int32_pack(42)),
+    'text': (TYPE_VARCHAR, b'42'),
+    'float': (TYPE_FLOAT, float_pack(42.0)),
+    'uuid': (TYPE_UUID, uuid.UUID('3f1c2c9a-3b6e-4d1a-9c4e-0e1f2a3b4c5d').bytes),
+    'timestamp': (TYPE_TIMESTAMP, int64_pack(1454472300000)),
+}
+
+_SKIP_METADATA_FLAG = 0x02
+_GLOBAL_TABLES_SPEC = 0x0001
+_NO_METADATA = 0x0004
+
+RESULT_KIND_VOID = 0x0001
+RESULT_KIND_ROWS = 0x0002
+RESULT_KIND_SET_KEYSPACE = 0x0003
+RESULT_KIND_PREPARED = 0x0004
+
+PROTOCOL_ERROR = 0x000A
+INVALID = 0x2200
+
+if hasattr(resource, 'RUSAGE_THREAD'):
+    def _thread_cpu_time():
+        usage = resource.getrusage(resource.RUSAGE_THREAD)
+        return usage.ru_utime + usage.ru_stime
+else:
+    _thread_cpu_time = None
+
+
+class Table(object):
+    """
+    The columns of the benchmark table, as ``(name, type id, value)``
+    tuples, where `value` is the serialized value of every row.
+    """
+
+    def __init__(self, keyspace, name, columns):
+        self.keyspace = keyspace
+        self.name = name
+        self.columns = columns
+
+
+def benchmark_table(keyspace, name, num_columns, column_type):
+    type_id, value = COLUMN_TYPES[column_type]
+    columns = [('thekey', TYPE_VARCHAR, b'key')]
+    columns.extend(('col%d' % i, type_id, value) for i in range(num_columns))
+    return Table(keyspace, name, columns)
+
+
+def _write_column_specs(f, keyspace, table, columns):
+    write_string(f, keyspace)
+    write_string(f, table)
+    for column in columns:
+        write_string(f, column[0])
+        type_id = column[1]
+        if isinstance(type_id, tuple):
+            write_short(f, type_id[0])
+            write_short(f, type_id[1])
+        else:
+            write_short(f, type_id)
+
+
+def rows_body(keyspace, table, columns, rows, with_metadata=True):
+    """
+    Returns the body of a ROWS result. `columns` are ``(name, type id)``
+    pairs, where the type id of a collection is a ``(collection, element)``
+    tuple, and `rows` are sequences of serialized values.
+    """
+    f = BytesIO()
+    write_int(f, RESULT_KIND_ROWS)
+    if with_metadata:
+        write_int(f, _GLOBAL_TABLES_SPEC)
+        write_int(f, len(columns))
+        _write_column_specs(f, keyspace, table, columns)
+    else:
+        write_int(f, _NO_METADATA)
+        write_int(f, len(columns))
+    write_int(f, len(rows))
+    for row in rows:
+        for value in row:
+            write_value(f, value)
+    return f.getvalue()
+
+
+def _set_value(values):
+    f = BytesIO()
+    write_int(f, len(values))
+    for value in values:
+        write_int(f, len(value))
+        f.write(value)
+    return f.getvalue()
+
+
+_LOCAL_COLUMNS = [('key', TYPE_VARCHAR), ('cluster_name', TYPE_VARCHAR), ('data_center', TYPE_VARCHAR),
+                  ('rack', TYPE_VARCHAR), ('partitioner', TYPE_VARCHAR), ('release_version', TYPE_VARCHAR),
+                  ('schema_version', TYPE_UUID), ('host_id', TYPE_UUID), ('tokens', (TYPE_SET, TYPE_VARCHAR))]
+
+_PEERS_COLUMNS = [('peer', TYPE_INET), ('data_center', TYPE_VARCHAR), ('rack', TYPE_VARCHAR),
+                  ('rpc_address', TYPE_INET), ('release_version', TYPE_VARCHAR), ('schema_version', TYPE_UUID),
+                  ('host_id', TYPE_UUID), ('tokens', (TYPE_SET, TYPE_VARCHAR))]
+
+_SCHEMA_VERSION = uuid.UUID('9ba6ee2e-8b6e-4f8b-a1b4-7d0a3c9e2f10').bytes
+
+
+class FakeServer(object):
+    """
+    Listens on `address` (by default, a free port of the loopback address)
+    and answers requests with canned frames. Call :meth:`start` before
+    connecting and :meth:`stop` when done.
+    """
+
+    def __init__(self, table, num_rows=1, address=('127.0.0.1', 0)):
+        self.table = table
+        self.num_rows = num_rows
+        self._address = address
+        self._socket = None
+        self._handlers = []
+        self._lock = Lock()
+        self._stopped = False
+        self._prepared = {}
+
+        columns = [column[:2] for column in table.columns]
+        row = [column[2] for column in table.columns]
+        self._rows = rows_body(table.keyspace, table.name, columns, [row] * num_rows)
+        self._rows_no_metadata = rows_body(table.keyspace, table.name, columns, [row] * num_rows,
+                                           with_metadata=False)
+        self._void = int32_pack(RESULT_KIND_VOID)
+
+        local_row = [b'local', b'Fake Cluster', b'dc1', b'rack1', b'org.apache.cassandra.dht.Murmur3Partitioner',
+                     b'3.11.0', _SCHEMA_VERSION, uuid.uuid4().bytes, _set_value([b'0'])]
+        self._local = rows_body('system', 'local', _LOCAL_COLUMNS, [local_row])
+        self._peers = rows_body('system', 'peers', _PEERS_COLUMNS, [])
+
+        f = BytesIO()
+        write_stringmultimap(f, {'CQL_VERSION': ['3.4.4'], 'COMPRESSION': []})
+        self._supported = f.getvalue()
+
+    @property
+    def port(self):
+        return self._socket.getsockname()[1]
+
+    def start(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(self._address)
+        self._socket.listen(64)
+        thread = Thread(target=self._accept, name='fake-server')
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        try:
+            # unblocks accept()
+            socket.create_connection(self._socket.getsockname(), 1).close()
+        except socket.error:
+            pass
+        self._socket.close()
+        with self._lock:
+            handlers = list(self._handlers)
+        for handler in handlers:
+            handler.close()
+
+    def cpu_time(self):
+        """
+        Returns the CPU time, in seconds, used by the threads answering
+        requests, or None if the platform cannot measure it.
+        """
+        if _thread_cpu_time is None:
+            return None
+        with self._lock:
+            return sum(handler.cpu_time for handler in self._handlers)
+
+    def _accept(self):
+        while not self._stopped:
+            try:
+                sock, _ = self._socket.accept()
+            except socket.error:
+                break
+            if self._stopped:
+                sock.close()
+                break
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            handler = _ConnectionHandler(self, sock)
+            with self._lock:
+                self._handlers.append(handler)
+            handler.start()
+
+    def respond(self, version, opcode, body):
+        """
+        Returns the ``(opcode, body)`` of the response to a request.
+        """
+        if version not in SUPPORTED_VERSIONS:
+            return OPCODE_ERROR, self._error(PROTOCOL_ERROR, "Invalid or unsupported protocol version (%d); "
+                                                             "supported versions are (3/v3, 4/v4)" % version)
+
+        if opcode == OPCODE_OPTIONS:
+            return OPCODE_SUPPORTED, self._supported
+        if opcode in (OPCODE_STARTUP, OPCODE_REGISTER):
+            return OPCODE_READY, b''
+
+        f = BytesIO(body)
+        if opcode == OPCODE_QUERY:
+            query = read_longstring(f)
+            read_short(f)  # consistency
+            flags = ord(f.read(1))
+            return OPCODE_RESULT, self._query_result(query, flags & _SKIP_METADATA_FLAG)
+        if opcode == OPCODE_EXECUTE:
+            query_id = read_binary_string(f)
+            read_short(f)
+            flags = ord(f.read(1))
+            query = self._prepared.get(query_id)
+            if query is None:
+                return OPCODE_ERROR, self._error(INVALID, "Unknown prepared id")
+            return OPCODE_RESULT, self._query_result(query, flags & _SKIP_METADATA_FLAG)
+        if opcode == OPCODE_PREPARE:
+            return OPCODE_RESULT, self._prepare(read_longstring(f), version)
+        if opcode == OPCODE_BATCH:
+            return OPCODE_RESULT, self._void
+        return OPCODE_ERROR, self._error(PROTOCOL_ERROR, "Unsupported opcode %d" % opcode)
+
+    def _query_result(self, query, skip_metadata):
+        words = query.split(None, 1)
+        verb = words[0].upper() if words else ''
+        if verb == 'USE':
+            f = BytesIO()
+            write_int(f, RESULT_KIND_SET_KEYSPACE)
+            write_string(f, words[1].strip('"; '))
+            return f.getvalue()
+        if verb == 'SELECT':
+            if 'system.local' in query:
+                return self._local
+            if 'system.peers' in query:
+                return self._peers
+            return self._rows_no_metadata if skip_metadata else self._rows
+        return self._void
+
+    def _prepare(self, query, version):
+        query_id = md5(query.encode('utf8')).digest()
+        self._prepared[query_id] = query
+        table = self.table
+
+        f = BytesIO()
+        write_int(f, RESULT_KIND_PREPARED)
+        write_string(f, query_id)
+
+        # bind metadata
+        bind_columns = [column[:2] for column in table.columns[:query.count('?')]]
+        write_int(f, _GLOBAL_TABLES_SPEC)
+        write_int(f, len(bind_columns))
+        if version >= 4:
+            write_int(f, 1 if bind_columns else 0)
+            if bind_columns:
+                write_short(f, 0)
+        _write_column_specs(f, table.keyspace, table.name, bind_columns)
+
+        # result metadata
+        if query.split(None, 1)[0].upper() == 'SELECT':
+            columns = [column[:2] for column in table.columns]
+            write_int(f, _GLOBAL_TABLES_SPEC)
+            write_int(f, len(columns))
+            _write_column_specs(f, table.keyspace, table.name, columns)
+        else:
+            write_int(f, _NO_METADATA)
+            write_int(f, 0)
+        return f.getvalue()
+
+    @staticmethod
+    def _error(code, message):
+        f = BytesIO()
+        write_int(f, code)
+        write_string(f, message)
+        return f.getvalue()
+
+
+class _ConnectionHandler(Thread):
+
+    cpu_time = 0.0
+
+    def __init__(self, server, sock):
+        Thread.__init__(self, name='fake-server-connection')
+        self.daemon = True
+        self.server = server
+        self.sock = sock
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self.sock.close()
+
+    def run(self):
+        buf = b''
+        respond = self.server.respond
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except socket.error:
+                break
+            if not data:
+                break
+            buf += data
+
+            # answer every complete frame at once, as pipelined requests arrive together
+            responses = []
+            pos = 0
+            while len(buf) - pos >= HEADER.size:
+                version, flags, stream, opcode, length = HEADER.unpack_from(buf, pos)
+                end = pos + HEADER.size + length
+                if len(buf) < end:
+                    break
+                version &= 0x7F
+                response_opcode, body = respond(version, opcode, buf[pos + HEADER.size:end])
+                responses.append(HEADER.pack(0x80 | version, 0, stream, response_opcode, len(body)))
+                responses.append(body)
+                pos = end
+            buf = buf[pos:]
+
+            if responses:
+                try:
+                    self.sock.sendall(b''.join(responses))
+                except socket.error:
+                    break
+            if _thread_cpu_time is not None:
+                self.cpu_time = _thread_cpu_time()
+        self.sock.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    server = FakeServer(benchmark_table('ks', 'tbl', 2, 'text')).start()
+    log.info("Listening on port %d", server.port)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
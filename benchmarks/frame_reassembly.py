@@ -0,0 +1,78 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+
+"""
+Feeds pipelined response frames through Connection.process_io_buffer in
+socket-read sized chunks and reports how many frames per second are
+reassembled. No server is needed; process_msg is replaced with a no-op.
+"""
+
+from optparse import OptionParser
+import os.path
+import sys
+import time
+
+dirname = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(dirname, '..'))
+
+from dse.connection import Connection, HEADER_DIRECTION_TO_CLIENT
+from dse.marshal import uint8_pack, uint16_pack, int32_pack
+from dse.protocol import ResultMessage
+
+
+def make_frames(num_frames, body_size, protocol_version):
+    body = b'x' * body_size
+    frames = []
+    for i in range(num_frames):
+        header = (uint8_pack(HEADER_DIRECTION_TO_CLIENT | protocol_version) + uint8_pack(0) +
+                  uint16_pack(i % 32768) + uint8_pack(ResultMessage.opcode) + int32_pack(len(body)))
+        frames.append(header + body)
+    return b''.join(frames)
+
+
+def run(data, chunk_size, protocol_version):
+    conn = Connection('127.0.0.1', protocol_version=protocol_version)
+    received = [0]
+
+    def process_msg(header, body):
+        received[0] += 1
+
+    conn.process_msg = process_msg
+
+    start = time.time()
+    for i in range(0, len(data), chunk_size):
+        conn._iobuf.write(data[i:i + chunk_size])
+        conn.process_io_buffer()
+    return received[0], time.time() - start
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('-n', '--num-frames', type='int', default=100000,
+                      help='number of pipelined frames to feed [default: %default]')
+    parser.add_option('-b', '--body-size', type='int', default=256,
+                      help='size of each frame body in bytes [default: %default]')
+    parser.add_option('-c', '--chunk-size', type='int', default=65536,
+                      help='bytes handed to the connection per simulated read [default: %default]')
+    parser.add_option('-r', '--repeat', type='int', default=3,
+                      help='number of runs [default: %default]')
+    parser.add_option('-p', '--protocol-version', type='int', default=4,
+                      help='native protocol version of the generated frames [default: %default]')
+    options, args = parser.parse_args()
+
+    data = make_frames(options.num_frames, options.body_size, options.protocol_version)
+    print("Feeding %d frames (%d bytes) in %d byte chunks" % (options.num_frames, len(data), options.chunk_size))
+    for _ in range(options.repeat):
+        count, elapsed = run(data, options.chunk_size, options.protocol_version)
+        assert count == options.num_frames, (count, options.num_frames)
+        print("%.3fs, %.0f frames/s, %.1f MB/s" % (elapsed, count / elapsed, len(data) / elapsed / 1e6))
+
+
+if __name__ == "__main__":
+    main()
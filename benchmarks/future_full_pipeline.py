@@ -7,8 +7,10 @@
 #
 # http://www.datastax.com/terms/datastax-dse-driver-license-terms
 
-import logging
+# imported first, as it monkey patches the process for gevent and eventlet
 from base import benchmark, BenchmarkThread
+
+import logging
 from six.moves import queue
 
 log = logging.getLogger(__name__)
@@ -7,9 +7,11 @@
 #
 # http://www.datastax.com/terms/datastax-dse-driver-license-terms
 
+# imported first, as it monkey patches the process for gevent and eventlet
+from base import benchmark, BenchmarkThread
+
 import logging
 
-from base import benchmark, BenchmarkThread
 
 log = logging.getLogger(__name__)
 
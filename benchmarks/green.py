@@ -0,0 +1,53 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+
+"""
+Monkey patches the process for the gevent or eventlet reactor when it is
+selected with ``-r``/``--reactor``. Benchmarks import this module before
+anything else, as modules imported earlier keep the unpatched threading and
+socket functions.
+"""
+
+import sys
+
+GREEN_REACTORS = ('gevent', 'eventlet')
+
+
+def selected_reactors(argv):
+    """Returns the reactor names given with -r or --reactor in `argv`"""
+    names = []
+    args = iter(argv)
+    for arg in args:
+        if arg in ('-r', '--reactor'):
+            names.append(next(args, None))
+        elif arg.startswith('--reactor='):
+            names.append(arg[len('--reactor='):])
+        elif arg.startswith('-r') and not arg.startswith('--'):
+            names.append(arg[2:])
+    return names
+
+
+# the green reactor the process is patched for, if any
+patched = None
+
+for _name in selected_reactors(sys.argv[1:]):
+    if _name not in GREEN_REACTORS:
+        continue
+    try:
+        if _name == 'gevent':
+            from gevent import monkey
+            monkey.patch_all()
+        else:
+            import eventlet
+            eventlet.monkey_patch()
+    except ImportError:
+        # reported as not available by base.parse_options
+        break
+    patched = _name
+    break
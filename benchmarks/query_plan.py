@@ -0,0 +1,106 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+
+"""
+Measures how many token aware query plans per second TokenAwarePolicy can
+generate for rings of different sizes. No server is needed; the ring is built
+from random vnode tokens.
+
+Two cases are reported: a new statement for every plan, which hashes the
+routing key, and the same statements planned again, as happens on retries
+and speculative executions, which reuses the cached token.
+"""
+
+from optparse import OptionParser
+import os
+import os.path
+import random
+import sys
+import time
+
+dirname = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(dirname, '..'))
+
+from dse.hosts import Host
+from dse.metadata import Metadata, KeyspaceMetadata, MIN_LONG, MAX_LONG
+from dse.policies import TokenAwarePolicy, DCAwareRoundRobinPolicy, SimpleConvictionPolicy
+from dse.query import SimpleStatement
+
+
+class FakeCluster(object):
+
+    def __init__(self, metadata):
+        self.metadata = metadata
+
+
+def make_cluster(num_nodes, vnodes, replication_factor, seed):
+    rand = random.Random(seed)
+    hosts = []
+    token_map = {}
+    for i in range(num_nodes):
+        host = Host('10.%d.%d.%d' % (i >> 16 & 255, i >> 8 & 255, i & 255), SimpleConvictionPolicy)
+        host.set_location_info('dc1', 'rack%d' % (i % 3))
+        host.set_up()
+        hosts.append(host)
+        token_map[host] = [str(rand.randint(MIN_LONG, MAX_LONG)) for _ in range(vnodes)]
+
+    metadata = Metadata()
+    metadata.keyspaces['ks'] = KeyspaceMetadata('ks', True, 'NetworkTopologyStrategy',
+                                                {'dc1': str(replication_factor)})
+    metadata.rebuild_token_map('Murmur3Partitioner', token_map)
+    return FakeCluster(metadata), hosts
+
+
+def run(policy, statements, hosts_per_plan):
+    start = time.time()
+    for statement in statements:
+        plan = policy.make_query_plan('ks', statement)
+        for _ in range(hosts_per_plan):
+            next(plan)
+    return time.time() - start
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('-n', '--nodes', default='3,30,300',
+                      help='comma separated ring sizes to measure [default: %default]')
+    parser.add_option('-v', '--vnodes', type='int', default=256,
+                      help='tokens per node [default: %default]')
+    parser.add_option('-f', '--replication-factor', type='int', default=3,
+                      help='replication factor of the keyspace [default: %default]')
+    parser.add_option('-p', '--plans', type='int', default=100000,
+                      help='number of query plans per run [default: %default]')
+    parser.add_option('-H', '--hosts-per-plan', type='int', default=1,
+                      help='hosts consumed from each plan [default: %default]')
+    parser.add_option('-s', '--seed', type='int', default=0,
+                      help='random seed for tokens and keys [default: %default]')
+    options, args = parser.parse_args()
+
+    rand = random.Random(options.seed)
+    keys = [os.urandom(16) for _ in range(1024)]
+    for num_nodes in [int(n) for n in options.nodes.split(',')]:
+        start = time.time()
+        cluster, hosts = make_cluster(num_nodes, options.vnodes, options.replication_factor, options.seed)
+        policy = TokenAwarePolicy(DCAwareRoundRobinPolicy('dc1'))
+        policy.populate(cluster, hosts)
+        # builds the replica map for the keyspace
+        next(policy.make_query_plan('ks', SimpleStatement('', routing_key=keys[0])))
+        print("%d nodes, %d tokens: ring built in %.2fs" %
+              (num_nodes, len(cluster.metadata.token_map.ring), time.time() - start))
+
+        fresh = [SimpleStatement('', routing_key=rand.choice(keys)) for _ in range(options.plans)]
+        elapsed = run(policy, fresh, options.hosts_per_plan)
+        print("    new statements:    %.0f plans/s" % (options.plans / elapsed))
+
+        elapsed = run(policy, fresh, options.hosts_per_plan)
+        print("    reused statements: %.0f plans/s" % (options.plans / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+
+"""
+Measures the cost, in nanoseconds, of recording a request with
+:class:`dse.request_metrics.RequestMetrics`.
+
+Requests are recorded across `--hosts` hosts and `--statements` prepared
+statements, with latencies spread over several orders of magnitude. The
+cost of calling an empty function with the same arguments is subtracted.
+The cost of a ``dict.get`` is reported as well, to compare results across
+machines.
+
+The cost of reading the metrics with ``to_prometheus()`` is also reported.
+"""
+
+import logging
+import os.path
+import random
+import sys
+import timeit
+from optparse import OptionParser
+
+dirname = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(dirname, '..'))
+
+from dse.hosts import Host
+from dse.policies import SimpleConvictionPolicy
+from dse.request_metrics import RequestMetrics
+
+log = logging.getLogger(__name__)
+
+
+class _PreparedStatement(object):
+
+    def __init__(self, query_id):
+        self.query_id = query_id
+
+
+def _empty(host, profile, prepared_statement, latency, error=None):
+    pass
+
+
+def best_time(fn, args, repeat):
+    def run():
+        for a in args:
+            fn(*a)
+    return min(timeit.repeat(run, number=1, repeat=repeat)) / len(args)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('-n', '--requests', type='int', default=100000,
+                      help='number of requests recorded by each run [default: %default]')
+    parser.add_option('-r', '--repeat', type='int', default=5,
+                      help='number of runs [default: %default]')
+    parser.add_option('--hosts', type='int', default=6,
+                      help='number of hosts [default: %default]')
+    parser.add_option('--statements', type='int', default=20,
+                      help='number of prepared statements [default: %default]')
+    options, args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    hosts = [Host('127.0.0.%d' % (i + 1), SimpleConvictionPolicy) for i in range(options.hosts)]
+    statements = [_PreparedStatement(os.urandom(16)) for _ in range(options.statements)] + [None]
+    requests = [(random.choice(hosts), 'default', random.choice(statements),
+                 random.lognormvariate(-7, 1.5)) for _ in range(options.requests)]
+
+    metrics = RequestMetrics()
+    overhead = best_time(_empty, requests, options.repeat)
+    record = best_time(metrics.record, requests, options.repeat) - overhead
+    d = {}
+    dict_get = min(timeit.repeat(lambda: d.get(1), number=options.requests, repeat=options.repeat))
+    dict_get -= min(timeit.repeat(lambda: None, number=options.requests, repeat=options.repeat))
+
+    log.info("record: %0.0fns per request", record * 1e9)
+    log.info("dict.get: %0.0fns, for reference", dict_get / options.requests * 1e9)
+
+    prometheus = min(timeit.repeat(metrics.to_prometheus, number=1, repeat=options.repeat))
+    log.info("to_prometheus: %0.1fms for %d series", prometheus * 1000, len(metrics.histograms()))
+
+
+if __name__ == '__main__':
+    main()
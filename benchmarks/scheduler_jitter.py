@@ -0,0 +1,122 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+
+"""
+Measures how late the cluster's task scheduler runs tasks.
+
+`--tasks` tasks are scheduled with random delays of up to `--duration`
+seconds, and the difference between when each one runs and its deadline is
+reported as percentiles. Tasks run inline instead of on a thread pool, so
+only the scheduler's own lateness is measured.
+
+The CPU used by the process while the tasks are pending, but none is due,
+is reported as well.
+"""
+
+import logging
+import os.path
+import random
+import resource
+import sys
+import time
+from optparse import OptionParser
+from threading import Event
+
+dirname = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(dirname, '..'))
+
+from dse.cluster import _Scheduler
+
+log = logging.getLogger(__name__)
+
+
+class _DoneFuture(object):
+
+    def add_done_callback(self, fn):
+        pass
+
+    def exception(self):
+        return None
+
+
+class InlineExecutor(object):
+
+    def submit(self, fn, *args, **kwargs):
+        fn(*args, **kwargs)
+        return _DoneFuture()
+
+
+def _cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def measure_lateness(num_tasks, duration):
+    scheduler = _Scheduler(InlineExecutor())
+    lateness = []
+    done = Event()
+
+    def task(deadline):
+        lateness.append(time.time() - deadline)
+        if len(lateness) == num_tasks:
+            done.set()
+
+    try:
+        for _ in range(num_tasks):
+            delay = random.uniform(0, duration)
+            # each task is distinct, as the scheduler keeps a set of them
+            scheduler.schedule(delay, task, time.time() + delay)
+        done.wait(duration * 2 + 10)
+    finally:
+        scheduler.shutdown()
+    return sorted(lateness)
+
+
+def measure_idle_cpu(num_tasks, idle_time):
+    scheduler = _Scheduler(InlineExecutor())
+    try:
+        for i in range(num_tasks):
+            scheduler.schedule(3600 + i, lambda: None)
+        start = _cpu_time()
+        time.sleep(idle_time)
+        return _cpu_time() - start
+    finally:
+        scheduler.shutdown()
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('-n', '--tasks', type='int', default=10000,
+                      help='number of pending tasks [default: %default]')
+    parser.add_option('-d', '--duration', type='float', default=5.0,
+                      help='tasks are due within this many seconds [default: %default]')
+    parser.add_option('-i', '--idle-time', type='float', default=2.0,
+                      help='seconds during which idle CPU is measured [default: %default]')
+    options, args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    lateness = measure_lateness(options.tasks, options.duration)
+    if len(lateness) < options.tasks:
+        log.warning("Only %d of %d tasks ran", len(lateness), options.tasks)
+    log.info("Lateness of %d tasks:", len(lateness))
+    for p in (50, 90, 99, 99.9):
+        log.info("  %sth: %0.3fms", p, percentile(lateness, p) * 1000)
+    log.info("  max: %0.3fms", lateness[-1] * 1000)
+
+    cpu = measure_idle_cpu(options.tasks, options.idle_time)
+    log.info("CPU while idle with %d pending tasks: %0.3fms/s", options.tasks, cpu / options.idle_time * 1000)
+
+
+if __name__ == '__main__':
+    main()
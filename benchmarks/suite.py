@@ -0,0 +1,88 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+
+"""
+Runs every benchmark with every available reactor and codec against the
+in-process fake server, and prints a table of requests per second, p50 and
+p99 latencies and CPU time per request.
+
+Each run happens in its own process, which monkey patches itself before
+importing anything else when the reactor is gevent or eventlet. Arguments
+after ``--`` (e.g. ``-- --read --prepared``) are passed through to the
+benchmarks.
+
+CPU times marked with ``*`` include the work of the fake server, which can
+only be told apart when it runs in OS threads.
+"""
+
+import json
+import os.path
+import subprocess
+import sys
+from optparse import OptionParser
+
+dirname = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(dirname)
+
+from base import reactors, REACTOR_ORDER, HAVE_CYTHON
+from green import GREEN_REACTORS
+
+from dse.cython_deps import _module_available
+
+BENCHMARKS = ('sync', 'future_full_pipeline', 'future_batches', 'future_full_throttle',
+              'callback_full_pipeline', 'concurrent_pipeline')
+
+
+def run(benchmark, reactor, cython, num_ops, extra_args):
+    args = [sys.executable, os.path.join(dirname, benchmark + '.py'), '--json', '-l', 'warning',
+            '-r', reactor, '-n', str(num_ops)] + extra_args
+    if not cython:
+        args.append('--no-cython')
+    output = subprocess.check_output(args)
+    if not isinstance(output, str):
+        output = output.decode('utf8')
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = OptionParser(usage="%prog [options] [-- benchmark options]")
+    parser.add_option('-b', '--benchmark', action='append', dest='benchmarks', default=[],
+                      help='only run this benchmark (%s); may be repeated' % ', '.join(BENCHMARKS))
+    parser.add_option('-r', '--reactor', action='append', dest='reactors', default=[],
+                      help='only run with this reactor; may be repeated')
+    parser.add_option('-n', '--num-ops', type='int', default=10000,
+                      help='number of operations of each run [default: %default]')
+    options, extra_args = parser.parse_args()
+
+    benchmarks = options.benchmarks or BENCHMARKS
+    reactor_names = options.reactors or ([name for name in REACTOR_ORDER if name in reactors] +
+                                         [name for name in GREEN_REACTORS if _module_available(name)])
+    codecs = (True, False) if HAVE_CYTHON else (False,)
+
+    header = "%-24s %-9s %-7s %12s %10s %10s %12s" % (
+        'benchmark', 'reactor', 'codec', 'requests/s', 'p50 (ms)', 'p99 (ms)', 'CPU/req (us)')
+    print(header)
+    print('-' * len(header))
+    for benchmark in benchmarks:
+        for reactor in reactor_names:
+            for cython in codecs:
+                try:
+                    result = run(benchmark, reactor, cython, options.num_ops, extra_args)
+                except (subprocess.CalledProcessError, ValueError) as exc:
+                    print("%-24s %-9s %-7s failed: %s" % (benchmark, reactor, 'cython' if cython else 'python', exc))
+                    continue
+                print("%-24s %-9s %-7s %12.0f %10.3f %10.3f %12.1f%s" % (
+                    benchmark, reactor, result['codec'], result['requests_per_sec'],
+                    result['p50_ms'], result['p99_ms'], result['cpu_us_per_request'],
+                    '*' if result.get('cpu_includes_server') else ''))
+                sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,7 @@
 #
 # http://www.datastax.com/terms/datastax-dse-driver-license-terms
 
+# imported first, as it monkey patches the process for gevent and eventlet
 from base import benchmark, BenchmarkThread
 from six.moves import range
 
@@ -16,8 +17,9 @@ class Runner(BenchmarkThread):
     def run(self):
         self.start_profile()
 
-        for _ in range(self.num_queries):
-            self.session.execute(self.query, self.values)
+        for i in range(self.num_queries):
+            key = "{0}-{1}".format(self.thread_num, i)
+            self.session.execute(*self.query_args(key))
 
         self.finish_profile()
 
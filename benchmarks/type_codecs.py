@@ -0,0 +1,207 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+
+"""
+Measures the cost, in nanoseconds per cell, of encoding and decoding each
+CQL type.
+
+Values are encoded with the type's ``to_binary``, as done when binding
+statements, and decoded from a ROWS result of `--rows` rows of `--width`
+columns of the type, with the pure Python protocol handler and, when the
+extensions are built, with the Cython one. There are no Cython serializers,
+so encoding is only measured on the Python path.
+
+Each measurement is the best of `--repeat` runs. With --output, results are
+written as JSON; with --baseline, they are compared with a previous output.
+"""
+
+import datetime
+from decimal import Decimal
+import io
+import json
+import logging
+import os.path
+import platform
+import sys
+import timeit
+import uuid
+from optparse import OptionParser
+
+dirname = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(dirname, '..'))
+
+from dse.cqltypes import (AsciiType, BooleanType, BytesType, ByteType, DateRangeType, DecimalType, DoubleType,
+                          DurationType, FloatType, InetAddressType, Int32Type, IntegerType, LineStringType,
+                          ListType, LongType, MapType, PointType, PolygonType, SetType, ShortType,
+                          SimpleDateType, TimeType, TimestampType, TimeUUIDType, TupleType, UserType, UTF8Type,
+                          UUIDType)
+from dse.protocol import (_ProtocolHandler, ProtocolHandler, ResultMessage, RESULT_KIND_ROWS,
+                          HAVE_CYTHON, write_int, write_value)
+from dse.util import DateRange, DateRangeBound, Duration, LineString, Point, Polygon
+
+log = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = 4
+
+_address = UserType.make_udt_class('ks', 'address', ('street', 'zip', 'tags'),
+                                   (UTF8Type, Int32Type, ListType.apply_parameters([UTF8Type])))
+_timestamp = datetime.datetime(2017, 3, 4, 5, 6, 7, 8000)
+
+# (name, cqltype, value)
+CASES = [
+    ('ascii', AsciiType, 'abcdefghij'),
+    ('bigint', LongType, 1234567890123),
+    ('blob', BytesType, b'\x00\x01\x02\x03' * 4),
+    ('boolean', BooleanType, True),
+    ('date', SimpleDateType, datetime.date(2017, 3, 4)),
+    ('decimal', DecimalType, Decimal('1234.5678')),
+    ('double', DoubleType, 1.5),
+    ('duration', DurationType, Duration(1, 2, 3000000000)),
+    ('float', FloatType, 1.5),
+    ('inet', InetAddressType, '192.168.1.1'),
+    ('int', Int32Type, 123456),
+    ('smallint', ShortType, 1234),
+    ('text', UTF8Type, u'café latté'),
+    ('time', TimeType, 3723000000004),
+    ('timestamp', TimestampType, _timestamp),
+    ('timeuuid', TimeUUIDType, uuid.uuid1()),
+    ('tinyint', ByteType, 12),
+    ('uuid', UUIDType, uuid.uuid4()),
+    ('varint', IntegerType, 2 ** 70),
+    ('list<int>', ListType.apply_parameters([Int32Type]), list(range(10))),
+    ('set<text>', SetType.apply_parameters([UTF8Type]), set('abcdefghij')),
+    ('map<text,int>', MapType.apply_parameters([UTF8Type, Int32Type]), dict(zip('abcdefghij', range(10)))),
+    ('map<text,list<int>>', MapType.apply_parameters([UTF8Type, ListType.apply_parameters([Int32Type])]),
+     dict((k, [1, 2, 3]) for k in 'abcde')),
+    ('list<map<int,text>>', ListType.apply_parameters([MapType.apply_parameters([Int32Type, UTF8Type])]),
+     [{1: 'a', 2: 'b'}] * 5),
+    ('tuple<int,text,double>', TupleType.apply_parameters([Int32Type, UTF8Type, DoubleType]), (1, 'a', 1.5)),
+    ('udt', _address, _address.tuple_type('Main St', 12345, ['a', 'b'])),
+    ('daterange', DateRangeType, DateRange(lower_bound=DateRangeBound(_timestamp, 'DAY'),
+                                           upper_bound=DateRangeBound(_timestamp, 'YEAR'))),
+    ('point', PointType, Point(1.5, 2.5)),
+    ('linestring', LineStringType, LineString([(0, 0), (1, 1), (2, 0)])),
+    ('polygon', PolygonType, Polygon([(0, 0), (1, 0), (1, 1), (0, 1), (0, 0)])),
+]
+
+
+def rows_body(values, num_rows):
+    f = io.BytesIO()
+    write_int(f, RESULT_KIND_ROWS)
+    write_int(f, ResultMessage._NO_METADATA_FLAG)
+    write_int(f, len(values))
+    write_int(f, num_rows)
+    for _ in range(num_rows):
+        for value in values:
+            write_value(f, value)
+    return f.getvalue()
+
+
+def best_time(fn, repeat):
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+
+def measure_encode(cqltype, value, width, num_rows, repeat):
+    to_binary = cqltype.to_binary
+    values = [value] * width
+
+    def encode():
+        for _ in range(num_rows):
+            for v in values:
+                to_binary(v, PROTOCOL_VERSION)
+
+    return best_time(encode, repeat)
+
+
+def measure_decode(handler, cqltype, encoded, width, num_rows, repeat):
+    message_type = handler.message_types_by_opcode[ResultMessage.opcode]
+    metadata = [('ks', 'tbl', 'col%d' % i, cqltype) for i in range(width)]
+    body = rows_body([encoded] * width, num_rows)
+
+    def decode():
+        message_type.recv_body(io.BytesIO(body), PROTOCOL_VERSION, {}, metadata)
+
+    return best_time(decode, repeat)
+
+
+def run(options):
+    paths = [('python', _ProtocolHandler)]
+    if HAVE_CYTHON:
+        paths.append(('cython', ProtocolHandler))
+    else:
+        log.warning("Not measuring the Cython path because the extensions are not built")
+
+    cells = options.width * options.rows
+    results = []
+    for name, cqltype, value in CASES:
+        if options.types and name not in options.types:
+            continue
+        encoded = cqltype.to_binary(value, PROTOCOL_VERSION)
+        elapsed = measure_encode(cqltype, value, options.width, options.rows, options.repeat)
+        results.append({'type': name, 'op': 'encode', 'path': 'python', 'ns_per_cell': elapsed / cells * 1e9})
+        for path, handler in paths:
+            elapsed = measure_decode(handler, cqltype, encoded, options.width, options.rows, options.repeat)
+            results.append({'type': name, 'op': 'decode', 'path': path, 'ns_per_cell': elapsed / cells * 1e9})
+    return results
+
+
+def _key(result):
+    return result['type'], result['op'], result['path']
+
+
+def print_results(results, baseline=None):
+    baseline = dict((_key(r), r['ns_per_cell']) for r in baseline['results']) if baseline else {}
+    print("%-24s %-7s %-7s %12s %10s" % ('type', 'op', 'path', 'ns/cell', 'change'))
+    for result in results:
+        previous = baseline.get(_key(result))
+        change = "%+9.1f%%" % ((result['ns_per_cell'] / previous - 1) * 100) if previous else ''
+        print("%-24s %-7s %-7s %12.1f %10s" % (result['type'], result['op'], result['path'],
+                                               result['ns_per_cell'], change))
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('-w', '--width', type='int', default=10,
+                      help='number of columns of each row [default: %default]')
+    parser.add_option('-n', '--rows', type='int', default=1000,
+                      help='number of rows [default: %default]')
+    parser.add_option('-r', '--repeat', type='int', default=5,
+                      help='number of runs of each measurement [default: %default]')
+    parser.add_option('-t', '--type', action='append', dest='types', default=[],
+                      help='only measure this type (e.g. "map<text,int>"); may be repeated')
+    parser.add_option('-o', '--output',
+                      help='write the results to this JSON file')
+    parser.add_option('-b', '--baseline',
+                      help='compare with the results of a previous --output')
+    options, args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    results = run(options)
+
+    baseline = None
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'cython': HAVE_CYTHON,
+                'protocol_version': PROTOCOL_VERSION,
+                'width': options.width,
+                'rows': options.rows,
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
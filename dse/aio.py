@@ -0,0 +1,139 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+"""
+:mod:`asyncio` support for query results. Requires Python 3.5+.
+
+This module backs ``await session.execute_async(...)``, ``async for`` over a
+:class:`~.ResultSet` and over a :class:`~.connection.ContinuousPagingSession`.
+It works with any connection class: results are handed from the driver's event
+loop to the awaiting asyncio loop with ``call_soon_threadsafe``, so no thread
+is blocked while waiting.
+"""
+import asyncio
+from functools import partial
+
+
+def _set_result(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future, exc):
+    if not future.done():
+        future.set_exception(exc)
+
+
+def wrap_response_future(response_future, loop=None):
+    """
+    Returns an :class:`asyncio.Future` on `loop` (the current event loop by
+    default) that resolves to the :class:`~.ResultSet` of `response_future`,
+    or to its exception.
+
+    Only the page currently being fetched is awaited; after
+    :meth:`.ResponseFuture.start_fetching_next_page` the response future can
+    be wrapped again.
+    """
+    from dse.cluster import ResultSet
+
+    loop = loop or asyncio.get_event_loop()
+    future = loop.create_future()
+    fired = []
+
+    def callback(response):
+        fired.append(True)
+        response_future._remove_callbacks(callback, errback)
+        loop.call_soon_threadsafe(_set_result, future, ResultSet(response_future, response))
+
+    def errback(exc):
+        fired.append(True)
+        response_future._remove_callbacks(callback, errback)
+        loop.call_soon_threadsafe(_set_exception, future, exc)
+
+    response_future.add_callbacks(callback, errback)
+    if fired:
+        # a result that was already set ran the callback before the errback
+        # was registered
+        response_future._remove_callbacks(callback, errback)
+    return future
+
+
+class ResultSetAsyncIterator(object):
+    """
+    Asynchronous iterator over the rows of a :class:`~.ResultSet`, returned by
+    ``ResultSet.__aiter__``. Further pages are fetched without blocking the
+    event loop.
+    """
+
+    def __init__(self, result_set, loop=None):
+        self._result_set = result_set
+        self._loop = loop
+        if result_set._list_mode:
+            self._page_iter = iter(result_set._current_rows)
+        else:
+            self._page_iter = iter(result_set.current_rows)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        result_set = self._result_set
+        while True:
+            try:
+                return next(self._page_iter)
+            except StopIteration:
+                pass
+
+            response_future = result_set.response_future
+            if result_set._list_mode:
+                raise StopAsyncIteration
+            if not response_future.has_more_pages:
+                result_set._current_rows = []
+                raise StopAsyncIteration
+
+            response_future.start_fetching_next_page()
+            page = await wrap_response_future(response_future, self._loop)
+            result_set._current_rows = page._current_rows
+            self._page_iter = iter(result_set._current_rows)
+
+
+class ContinuousPagingAsyncIterator(object):
+    """
+    Asynchronous iterator over the rows streamed by a
+    :class:`~.connection.ContinuousPagingSession`. Waiting for a page does not
+    block the event loop.
+    """
+
+    def __init__(self, paging_session, loop=None):
+        self._paging_session = paging_session
+        self._loop = loop or asyncio.get_event_loop()
+        self._rows = iter(())
+
+    def __aiter__(self):
+        return self
+
+    def _on_page(self, future, page):
+        self._loop.call_soon_threadsafe(_set_result, future, page)
+
+    async def __anext__(self):
+        while True:
+            try:
+                return next(self._rows)
+            except StopIteration:
+                pass
+
+            future = self._loop.create_future()
+            self._paging_session.next_page(partial(self._on_page, future))
+            page = await future
+            if page is None:
+                raise StopAsyncIteration
+
+            names, rows, err = page
+            if err:
+                raise err
+            self._rows = iter(self._paging_session.row_factory(names, rows))
@@ -0,0 +1,346 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+
+"""
+This module provides an optional protocol parser that returns
+Apache Arrow record batches.
+
+Values are written straight into Arrow buffers, with NULL values marked
+in the validity bitmap:
+
+    - numeric and boolean columns map to the Arrow types of the same width
+    - timestamp columns are ``timestamp[ms]``, date columns are ``date32``
+      and time columns are ``time64[ns]``
+    - uuid, timeuuid and inet columns are ``fixed_size_binary[16]``, with
+      IPv4 addresses stored as IPv4-mapped IPv6 addresses
+    - text, varchar and ascii columns are ``string`` and blob columns are
+      ``binary``
+
+Collections, tuples, user types, decimals and varints are deserialized into
+Python values, then converted to an Arrow type derived from the column type:
+
+    - list and set columns are ``list``, with sets in their sorted order
+    - map columns are ``map``, with entries in the order of the map
+    - tuple columns are ``struct`` with fields ``f0``, ``f1``, ..., and user
+      type columns are ``struct`` with the fields of the type
+    - decimal columns are ``decimal128``, with the precision and scale
+      needed by the values of the batch
+    - varint columns are ``string``, holding the decimal representation of
+      the values
+
+Other types, such as durations, geometries and date ranges, are ``binary``
+columns holding the serialized values.
+
+=============================================================================
+This module should not be imported by any of the main python-driver modules,
+as pyarrow is an optional dependency.
+=============================================================================
+"""
+
+include "ioutils.pyx"
+
+cimport cython
+from libc.stdint cimport int8_t, int16_t, int32_t, int64_t, uint8_t, uint32_t
+
+from dse.bytesio cimport BytesIOReader
+from dse.deserializers cimport Deserializer, from_binary
+from dse.parsing cimport ParseDesc, ColumnParser
+from dse import cqltypes
+
+import pyarrow as pa
+
+
+# How the values of a column are stored
+cdef enum:
+    COL_INT8
+    COL_INT16
+    COL_INT32
+    COL_INT64
+    COL_FLOAT
+    COL_DOUBLE
+    COL_BOOL    # bit packed
+    COL_DATE    # days since the epoch
+    COL_FIXED16
+    COL_INET    # 16 byte IPv6 addresses
+    COL_BINARY  # offsets and data buffers
+    COL_OBJECT  # Python objects, converted to the Arrow type of the column
+
+# cqltype -> (column kind, value width, Arrow type)
+_cqltype_to_arrow = {
+    cqltypes.ByteType:          (COL_INT8, 1, pa.int8()),
+    cqltypes.ShortType:         (COL_INT16, 2, pa.int16()),
+    cqltypes.Int32Type:         (COL_INT32, 4, pa.int32()),
+    cqltypes.LongType:          (COL_INT64, 8, pa.int64()),
+    cqltypes.CounterColumnType: (COL_INT64, 8, pa.int64()),
+    cqltypes.FloatType:         (COL_FLOAT, 4, pa.float32()),
+    cqltypes.DoubleType:        (COL_DOUBLE, 8, pa.float64()),
+    cqltypes.BooleanType:       (COL_BOOL, 1, pa.bool_()),
+    cqltypes.DateType:          (COL_INT64, 8, pa.timestamp('ms')),
+    cqltypes.TimestampType:     (COL_INT64, 8, pa.timestamp('ms')),
+    cqltypes.SimpleDateType:    (COL_DATE, 4, pa.date32()),
+    cqltypes.TimeType:          (COL_INT64, 8, pa.time64('ns')),
+    cqltypes.UUIDType:          (COL_FIXED16, 16, pa.binary(16)),
+    cqltypes.TimeUUIDType:      (COL_FIXED16, 16, pa.binary(16)),
+    cqltypes.InetAddressType:   (COL_INET, 16, pa.binary(16)),
+    cqltypes.UTF8Type:          (COL_BINARY, 0, pa.string()),
+    cqltypes.VarcharType:       (COL_BINARY, 0, pa.string()),
+    cqltypes.AsciiType:         (COL_BINARY, 0, pa.string()),
+    cqltypes.BytesType:         (COL_BINARY, 0, pa.binary()),
+}
+
+# cqltypes deserialized into Python values
+_object_cqltypes = (cqltypes.ListType, cqltypes.SetType, cqltypes.MapType, cqltypes.TupleType,
+                    cqltypes.DecimalType, cqltypes.IntegerType)
+
+# decimal128 holds up to 38 digits
+cdef int max_decimal_precision = 38
+
+cdef char *ipv4_mapped_prefix = b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\xff\xff"
+
+
+cdef class ArrowParser(ColumnParser):
+    """Decode a ResultMessage into an Arrow RecordBatch"""
+
+    cpdef parse_rows(self, BytesIOReader reader, ParseDesc desc):
+        cdef Py_ssize_t i, j, rowcount
+        cdef Buffer buf
+        cdef _Column col
+
+        rowcount = read_int(reader)
+        data_sizes = _data_sizes(reader, desc, rowcount)
+        columns = [_Column(coltype, rowcount, data_size, desc.protocol_version)
+                   for coltype, data_size in zip(desc.coltypes, data_sizes)]
+
+        for i in range(rowcount):
+            for j in range(desc.rowsize):
+                get_buf(reader, &buf)
+                col = columns[j]
+                if col.kind == COL_OBJECT:
+                    col.values.append(from_binary(desc.deserializers[j], &buf, desc.protocol_version))
+                else:
+                    col.append(&buf)
+
+        return pa.RecordBatch.from_arrays([col.to_arrow() for col in columns], list(desc.colnames))
+
+
+cdef _data_sizes(BytesIOReader reader, ParseDesc desc, Py_ssize_t rowcount):
+    """
+    Returns the total size of the values of each column, leaving the
+    reader where it was.
+    """
+    cdef Py_ssize_t i, j, start = reader.pos
+    cdef Buffer buf
+    sizes = [0] * desc.rowsize
+
+    for i in range(rowcount):
+        for j in range(desc.rowsize):
+            get_buf(reader, &buf)
+            if buf.size > 0:
+                sizes[j] += buf.size
+
+    reader.pos = start
+    return sizes
+
+
+@cython.final
+cdef class _Column:
+    """Buffers of a column being decoded"""
+
+    cdef int kind
+    cdef Py_ssize_t width
+    cdef object arrow_type
+    cdef object coltype
+    cdef int protocol_version
+    cdef Py_ssize_t length
+    cdef Py_ssize_t null_count
+    cdef bytearray validity
+    cdef bytearray data
+    cdef bytearray offsets
+    cdef uint8_t *validity_ptr
+    cdef char *data_ptr
+    cdef int32_t *offsets_ptr
+    cdef list values
+
+    def __init__(self, coltype, Py_ssize_t rowcount, Py_ssize_t data_size, int protocol_version):
+        try:
+            self.kind, self.width, self.arrow_type = _cqltype_to_arrow[coltype]
+        except KeyError:
+            if issubclass(coltype, _object_cqltypes):
+                self.kind = COL_OBJECT
+                self.coltype = coltype
+                self.protocol_version = protocol_version
+                self.values = []
+                return
+            # serialized values
+            self.kind, self.width, self.arrow_type = COL_BINARY, 0, pa.binary()
+
+        self.validity = bytearray((rowcount + 7) // 8)
+        self.validity_ptr = <uint8_t *> (<char *> self.validity)
+        if self.kind == COL_BINARY:
+            if data_size > 0x7FFFFFFF:
+                raise ValueError("Column data too large for 32 bit Arrow offsets")
+            self.data = bytearray(data_size)
+            self.offsets = bytearray((rowcount + 1) * 4)
+            self.offsets_ptr = <int32_t *> (<char *> self.offsets)
+        elif self.kind == COL_BOOL:
+            self.data = bytearray((rowcount + 7) // 8)
+        else:
+            self.data = bytearray(rowcount * self.width)
+        self.data_ptr = <char *> self.data
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef inline int append(self, Buffer *buf) except -1:
+        cdef Py_ssize_t i = self.length
+        cdef bint valid
+
+        self.length += 1
+        if self.kind == COL_BINARY:
+            valid = buf.size >= 0
+            self.offsets_ptr[i + 1] = self.offsets_ptr[i]
+            if buf.size > 0:
+                memcpy(self.data_ptr + self.offsets_ptr[i], buf.ptr, buf.size)
+                self.offsets_ptr[i + 1] += <int32_t> buf.size
+        elif self.kind == COL_INET and buf.size == 4:
+            valid = True
+            memcpy(self.data_ptr + 16 * i, ipv4_mapped_prefix, 12)
+            memcpy(self.data_ptr + 16 * i + 12, buf.ptr, 4)
+        else:
+            # NULL and empty values are null
+            valid = buf.size == self.width
+            if valid:
+                self._write(i, buf)
+
+        if valid:
+            self.validity_ptr[i >> 3] |= 1 << (i & 7)
+        else:
+            self.null_count += 1
+        return 0
+
+    cdef inline void _write(self, Py_ssize_t i, Buffer *buf):
+        cdef int kind = self.kind
+        if kind == COL_INT8:
+            (<int8_t *> self.data_ptr)[i] = unpack_num[int8_t](buf)
+        elif kind == COL_INT16:
+            (<int16_t *> self.data_ptr)[i] = unpack_num[int16_t](buf)
+        elif kind == COL_INT32:
+            (<int32_t *> self.data_ptr)[i] = unpack_num[int32_t](buf)
+        elif kind == COL_INT64:
+            (<int64_t *> self.data_ptr)[i] = unpack_num[int64_t](buf)
+        elif kind == COL_FLOAT:
+            (<float *> self.data_ptr)[i] = unpack_num[float](buf)
+        elif kind == COL_DOUBLE:
+            (<double *> self.data_ptr)[i] = unpack_num[double](buf)
+        elif kind == COL_BOOL:
+            if buf.ptr[0]:
+                (<uint8_t *> self.data_ptr)[i >> 3] |= 1 << (i & 7)
+        elif kind == COL_DATE:
+            # days since the epoch, centered on 2**31
+            (<int32_t *> self.data_ptr)[i] = <int32_t> (<int64_t> unpack_num[uint32_t](buf) - 2147483648)
+        else:
+            memcpy(self.data_ptr + 16 * i, buf.ptr, 16)
+
+    def to_arrow(self):
+        if self.kind == COL_OBJECT:
+            values = [_to_arrow_value(self.coltype, value, self.protocol_version) for value in self.values]
+            return pa.array(values, type=_arrow_type(self.coltype, values))
+
+        validity = pa.py_buffer(self.validity) if self.null_count else None
+        if self.kind == COL_BINARY:
+            buffers = [validity, pa.py_buffer(self.offsets), pa.py_buffer(self.data)]
+        else:
+            buffers = [validity, pa.py_buffer(self.data)]
+        return pa.Array.from_buffers(self.arrow_type, self.length, buffers, self.null_count)
+
+
+def _to_arrow_value(coltype, value, protocol_version):
+    """
+    Converts a deserialized value to a Python value that pyarrow converts
+    to the Arrow type of `coltype`.
+    """
+    if value is None:
+        return None
+    if issubclass(coltype, (cqltypes.ListType, cqltypes.SetType)):
+        subtype = coltype.subtypes[0]
+        return [_to_arrow_value(subtype, v, protocol_version) for v in value]
+    if issubclass(coltype, cqltypes.MapType):
+        key_type, value_type = coltype.subtypes
+        return [(_to_arrow_value(key_type, k, protocol_version), _to_arrow_value(value_type, v, protocol_version))
+                for k, v in value.items()]
+    if issubclass(coltype, cqltypes.UserType) and coltype.mapped_class:
+        return dict((name, _to_arrow_value(subtype, getattr(value, name, None), protocol_version))
+                    for name, subtype in zip(coltype.fieldnames, coltype.subtypes))
+    if issubclass(coltype, cqltypes.TupleType):
+        return dict((name, _to_arrow_value(subtype, v, protocol_version))
+                    for name, subtype, v in zip(_struct_field_names(coltype), coltype.subtypes, value))
+    if issubclass(coltype, cqltypes.IntegerType):
+        return str(value)
+    if issubclass(coltype, cqltypes.DecimalType):
+        return value
+    if issubclass(coltype, (cqltypes.UUIDType, cqltypes.TimeUUIDType)):
+        return value.bytes
+    if issubclass(coltype, cqltypes.InetAddressType):
+        address = coltype.serialize(value, protocol_version)
+        return ipv4_mapped_prefix[:12] + address if len(address) == 4 else address
+    if issubclass(coltype, cqltypes.SimpleDateType):
+        return value.days_from_epoch
+    if issubclass(coltype, cqltypes.TimeType):
+        return value.nanosecond_time
+    if coltype in _cqltype_to_arrow:
+        return value
+    return coltype.serialize(value, protocol_version)
+
+
+def _arrow_type(coltype, values):
+    """
+    Returns the Arrow type of a column of `coltype`, given its values as
+    converted by :func:`_to_arrow_value`.
+    """
+    if coltype in _cqltype_to_arrow:
+        return _cqltype_to_arrow[coltype][2]
+    if issubclass(coltype, (cqltypes.ListType, cqltypes.SetType)):
+        return pa.list_(_arrow_type(coltype.subtypes[0], [v for value in values if value is not None for v in value]))
+    if issubclass(coltype, cqltypes.MapType):
+        entries = [entry for value in values if value is not None for entry in value]
+        key_type, value_type = coltype.subtypes
+        return pa.map_(_arrow_type(key_type, [k for k, _ in entries]),
+                       _arrow_type(value_type, [v for _, v in entries]))
+    if issubclass(coltype, cqltypes.TupleType):
+        return pa.struct([pa.field(name, _arrow_type(subtype, [value[name] for value in values if value is not None]))
+                          for name, subtype in zip(_struct_field_names(coltype), coltype.subtypes)])
+    if issubclass(coltype, cqltypes.IntegerType):
+        return pa.string()
+    if issubclass(coltype, cqltypes.DecimalType):
+        return _decimal_type(values)
+    return pa.binary()
+
+
+def _struct_field_names(coltype):
+    if issubclass(coltype, cqltypes.UserType):
+        return coltype.fieldnames
+    return ['f%d' % i for i in range(len(coltype.subtypes))]
+
+
+def _decimal_type(values):
+    """Returns the smallest decimal128 type holding all of `values`"""
+    integer_digits, scale = 1, 0
+    for value in values:
+        if value is None:
+            continue
+        sign, digits, exponent = value.as_tuple()
+        if not isinstance(exponent, int):
+            raise ValueError("Cannot convert %s to an Arrow decimal" % (value,))
+        integer_digits = max(integer_digits, len(digits) + exponent)
+        scale = max(scale, -exponent)
+
+    precision = integer_digits + scale
+    if precision > max_decimal_precision:
+        raise ValueError("Decimal values need a precision of %d, more than the %d digits of decimal128"
+                         % (precision, max_decimal_precision))
+    return pa.decimal128(precision, scale)
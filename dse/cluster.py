@@ -13,20 +13,21 @@ This module houses the main classes you will interact with,
 from __future__ import absolute_import
 
 import atexit
-from collections import defaultdict, Mapping
+from collections import defaultdict, deque, Mapping
 from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait as wait_futures
 from copy import copy
 from functools import partial, wraps
+from heapq import heappush, heappop
 from itertools import groupby, count
 import json
 import logging
 from random import random
 import six
-from six.moves import filter, range, queue as Queue
+from six.moves import filter, range
 import socket
 import sys
 import time
-from threading import Lock, RLock, Thread, Event
+from threading import Lock, RLock, Thread, Event, Condition
 
 import weakref
 from weakref import WeakValueDictionary
@@ -70,6 +71,7 @@ from dse.hosts import (Host, _ReconnectionHandler, _HostReconnectionHandler,
 from dse.query import (SimpleStatement, PreparedStatement, BoundStatement,
                        BatchStatement, bind_params, QueryTrace, TraceUnavailable, HostTargetingStatement,
                        named_tuple_factory, dict_factory, tuple_factory, FETCH_SIZE_UNSET)
+from dse.row_decoder import RowDecoder
 from dse.timestamps import MonotonicTimestampGenerator
 
 
@@ -113,6 +115,15 @@ log = logging.getLogger(__name__)
 
 _NOT_SET = object()
 
+DEFAULT_MIN_REQUESTS = 32
+DEFAULT_MAX_REQUESTS = 1024
+
+DEFAULT_MIN_CONNECTIONS_PER_LOCAL_HOST = 1
+DEFAULT_MAX_CONNECTIONS_PER_LOCAL_HOST = 1
+
+DEFAULT_MIN_CONNECTIONS_PER_REMOTE_HOST = 1
+DEFAULT_MAX_CONNECTIONS_PER_REMOTE_HOST = 1
+
 
 class NoHostAvailable(Exception):
     """
@@ -183,6 +194,14 @@ def default_lbp_factory():
     return DCAwareRoundRobinPolicy()
 
 
+def _targeted_query_plan(host, query_plan):
+    if host.is_up:
+        yield host
+    for h in query_plan:
+        if h != host:
+            yield h
+
+
 class ContinuousPagingOptions(object):
 
     class PagingUnit(object):
@@ -206,10 +225,34 @@ class ContinuousPagingOptions(object):
     Max rate at which to send pages
     """
 
-    def __init__(self, page_unit=PagingUnit.ROWS, max_pages=0, max_pages_per_second=0):
+    max_queue_size = None
+    """
+    Max number of pages received but not yet consumed by the application,
+    or 0 for no limit. Default is 0.
+
+    Once the limit is reached, the driver stops reading from the connection
+    until a page is consumed, so the server waits instead of the driver
+    buffering an unbounded number of pages. Every other request on the same
+    connection is held up meanwhile, for as long as the application does not
+    consume a page, or close the session. Heartbeats are not sent on a paused
+    connection. Pausing is supported by the asyncore, libev and asyncio
+    reactors; with other reactors pages are not limited.
+    """
+
+    page_timeout = None
+    """
+    Seconds to wait for each page after the first, before the session is
+    cancelled and :exc:`.OperationTimedOut` is raised. Default is None,
+    which uses the timeout of the request.
+    """
+
+    def __init__(self, page_unit=PagingUnit.ROWS, max_pages=0, max_pages_per_second=0, max_queue_size=0,
+                 page_timeout=None):
         self.page_unit = page_unit
         self.max_pages = max_pages
         self.max_pages_per_second = max_pages_per_second
+        self.max_queue_size = max_queue_size
+        self.page_timeout = page_timeout
 
     def page_unit_bytes(self):
         return self.page_unit == ContinuousPagingOptions.PagingUnit.BYTES
@@ -392,6 +435,21 @@ class ProfileManager(object):
         """
         return self.profiles[EXEC_PROFILE_DEFAULT]
 
+    def name(self, profile):
+        """
+        Returns the name of `profile`, an execution profile key or instance.
+        Instances that are not registered, such as clones, are all named
+        'custom'.
+        """
+        if isinstance(profile, ExecutionProfile):
+            profile = next((key for key, p in six.iteritems(self.profiles) if p is profile), None)
+            if profile is None:
+                return 'custom'
+        name = _profile_names.get(profile)
+        if name is None:
+            name = profile if isinstance(profile, six.string_types) else str(profile)
+        return name
+
 
 EXEC_PROFILE_DEFAULT = object()
 """
@@ -426,6 +484,13 @@ use Spark/analytics as the traversal source.
 Selected using ``Session.execute_graph(execution_profile=EXEC_PROFILE_GRAPH_ANALYTICS_DEFAULT)``.
 """
 
+_profile_names = {
+    EXEC_PROFILE_DEFAULT: 'default',
+    EXEC_PROFILE_GRAPH_DEFAULT: 'graph',
+    EXEC_PROFILE_GRAPH_SYSTEM_DEFAULT: 'graph_system',
+    EXEC_PROFILE_GRAPH_ANALYTICS_DEFAULT: 'graph_analytics'
+}
+
 
 class _ConfigMode(object):
     UNCOMMITTED = 0
@@ -587,6 +652,14 @@ class Cluster(object):
     :const:`True`, else :const:`None`.
     """
 
+    request_metrics = None
+    """
+    An optional instance of :class:`dse.request_metrics.RequestMetrics`,
+    recording the latency and outcome of every request by host, execution
+    profile and prepared statement. Unlike :attr:`.metrics`, it does not
+    require ``greplin.scales``.
+    """
+
     ssl_options = None
     """
     A optional dict which will be used as kwargs for ``ssl.wrap_socket()``
@@ -741,6 +814,32 @@ class Cluster(object):
     establishment, options passing, and authentication.
     """
 
+    max_pending_requests_per_host = 1024
+    """
+    The maximum number of requests that may wait for a free request ID when
+    every connection to a host is at capacity. Waiting requests do not block
+    the thread that sent them; they are sent as soon as a request ID is
+    returned to the pool. Requests beyond this bound fail fast and move on to
+    the next host of the query plan. Setting to zero disables waiting.
+    """
+
+    pending_request_timeout = 2.0
+    """
+    The maximum time, in seconds, a request waits for a free request ID on a
+    host before moving on to the next host of the query plan. If set to
+    :const:`None`, requests wait until a request ID is free or the request
+    times out.
+    """
+
+    concurrency_limiter = None
+    """
+    An instance of :class:`.policies.ConcurrencyLimiter`, such as
+    :class:`.policies.AIMDConcurrencyLimiter`, bounding the number of
+    requests in flight to each host. Hosts at their limit are skipped by
+    query plans until requests complete. Defaults to :const:`None`: requests
+    are only bounded by :attr:`~.Cluster.max_pending_requests_per_host`.
+    """
+
     timestamp_generator = None
     """
     An object, shared between all sessions created by this cluster instance,
@@ -802,8 +901,29 @@ class Cluster(object):
     A map of {keyspace: {type_name: UserType}}
     """
 
+    _core_connections_per_host = {
+        HostDistance.LOCAL: DEFAULT_MIN_CONNECTIONS_PER_LOCAL_HOST,
+        HostDistance.REMOTE: DEFAULT_MIN_CONNECTIONS_PER_REMOTE_HOST
+    }
+
+    _max_connections_per_host = {
+        HostDistance.LOCAL: DEFAULT_MAX_CONNECTIONS_PER_LOCAL_HOST,
+        HostDistance.REMOTE: DEFAULT_MAX_CONNECTIONS_PER_REMOTE_HOST
+    }
+
+    _min_requests_per_connection = {
+        HostDistance.LOCAL: DEFAULT_MIN_REQUESTS,
+        HostDistance.REMOTE: DEFAULT_MIN_REQUESTS
+    }
+
+    _max_requests_per_connection = {
+        HostDistance.LOCAL: DEFAULT_MAX_REQUESTS,
+        HostDistance.REMOTE: DEFAULT_MAX_REQUESTS
+    }
+
     _listeners = None
     _listener_lock = None
+    _latency_trackers = ()
 
     def __init__(self,
                  contact_points=["127.0.0.1"],
@@ -914,6 +1034,12 @@ class Cluster(object):
         self.prepare_on_all_hosts = prepare_on_all_hosts
         self.reprepare_on_up = reprepare_on_up
 
+        # copy the class-level defaults so that pool settings are per-instance
+        self._core_connections_per_host = self._core_connections_per_host.copy()
+        self._max_connections_per_host = self._max_connections_per_host.copy()
+        self._min_requests_per_connection = self._min_requests_per_connection.copy()
+        self._max_requests_per_connection = self._max_requests_per_connection.copy()
+
         self._listeners = set()
         self._listener_lock = Lock()
 
@@ -1026,6 +1152,90 @@ class Cluster(object):
         if not_done:
             raise OperationTimedOut("Failed to create all new connection pools in the %ss timeout.")
 
+    def get_min_requests_per_connection(self, host_distance):
+        return self._min_requests_per_connection[host_distance]
+
+    def set_min_requests_per_connection(self, host_distance, min_requests):
+        """
+        Sets a threshold for concurrent requests per connection, below which
+        connections above the core count will be considered for closing
+        (see :meth:`~.Cluster.set_core_connections_per_host`).
+        """
+        if min_requests < 0 or min_requests > 2 ** 15 - 1 or \
+                min_requests >= self._max_requests_per_connection[host_distance]:
+            raise ValueError("min_requests must be 0-32766 and less than the max_requests for this host_distance (%d)" %
+                             (self._max_requests_per_connection[host_distance],))
+        self._min_requests_per_connection[host_distance] = min_requests
+
+    def get_max_requests_per_connection(self, host_distance):
+        return self._max_requests_per_connection[host_distance]
+
+    def set_max_requests_per_connection(self, host_distance, max_requests):
+        """
+        Sets a threshold for concurrent requests per connection, above which new
+        connections will be opened, up to :meth:`~.Cluster.get_max_connections_per_host`.
+        This does not limit the number of requests that may be placed on a connection.
+        """
+        if max_requests < 1 or max_requests > 2 ** 15 or \
+                max_requests <= self._min_requests_per_connection[host_distance]:
+            raise ValueError("max_requests must be 1-32768 and greater than the min_requests for this host_distance (%d)" %
+                             (self._min_requests_per_connection[host_distance],))
+        self._max_requests_per_connection[host_distance] = max_requests
+
+    def get_core_connections_per_host(self, host_distance):
+        """
+        Gets the minimum number of connections per Session that will be opened
+        for each host with :class:`~.HostDistance` equal to `host_distance`.
+        The default is 1 for :attr:`~HostDistance.LOCAL` and
+        :attr:`~HostDistance.REMOTE`.
+        """
+        return self._core_connections_per_host[host_distance]
+
+    def set_core_connections_per_host(self, host_distance, core_connections):
+        """
+        Sets the minimum number of connections per Session that will be opened
+        for each host with :class:`~.HostDistance` equal to `host_distance`.
+        The default is 1 for :attr:`~HostDistance.LOCAL` and
+        :attr:`~HostDistance.REMOTE`.
+
+        A single connection multiplexes up to 32768 concurrent requests, but all
+        of them share one socket and one event loop registration. Opening more
+        connections per host can raise throughput for request-heavy workloads.
+
+        If this is raised on a running Cluster, the missing connections are
+        opened in the background.
+        """
+        if core_connections < 1 or core_connections > self._max_connections_per_host[host_distance]:
+            raise ValueError("core_connections must be at least one and no more than max_connections for this "
+                             "host_distance (%d)" % (self._max_connections_per_host[host_distance],))
+        old = self._core_connections_per_host[host_distance]
+        self._core_connections_per_host[host_distance] = core_connections
+        if old < core_connections:
+            self._ensure_core_connections()
+
+    def get_max_connections_per_host(self, host_distance):
+        """
+        Gets the maximum number of connections per Session that will be opened
+        for each host with :class:`~.HostDistance` equal to `host_distance`.
+        The default is 1 for :attr:`~HostDistance.LOCAL` and
+        :attr:`~HostDistance.REMOTE`.
+        """
+        return self._max_connections_per_host[host_distance]
+
+    def set_max_connections_per_host(self, host_distance, max_connections):
+        """
+        Sets the maximum number of connections per Session that will be opened
+        for each host with :class:`~.HostDistance` equal to `host_distance`.
+
+        A pool grows toward this limit when even its least busy connection
+        has more than :meth:`~.Cluster.get_max_requests_per_connection`
+        requests in flight.
+        """
+        if max_connections < self._core_connections_per_host[host_distance]:
+            raise ValueError("max_connections must be no less than core_connections for this host_distance (%d)" %
+                             (self._core_connections_per_host[host_distance],))
+        self._max_connections_per_host[host_distance] = max_connections
+
     def connection_factory(self, address, *args, **kwargs):
         """
         Called to create a new connection with proper configuration.
@@ -1486,6 +1696,22 @@ class Cluster(object):
         with self._listener_lock:
             return self._listeners.copy()
 
+    def register_latency_tracker(self, tracker):
+        """
+        Adds an object whose ``update(host, latency)`` method is called with
+        the time, in seconds, each successful request took on the host that
+        answered it. :class:`~.LatencyAwarePolicy` registers itself when it
+        is populated.
+        """
+        with self._listener_lock:
+            if tracker not in self._latency_trackers:
+                self._latency_trackers += (tracker,)
+
+    def unregister_latency_tracker(self, tracker):
+        """ Removes a registered latency tracker. """
+        with self._listener_lock:
+            self._latency_trackers = tuple(t for t in self._latency_trackers if t is not tracker)
+
     def _ensure_core_connections(self):
         """
         If any host has fewer than the configured number of core connections
@@ -1910,6 +2136,19 @@ class Session(object):
         future.send_request()
         return future
 
+    def _execute_on_host(self, query, host, execution_profile=EXEC_PROFILE_DEFAULT):
+        """
+        Like :meth:`execute_async`, but `host` is tried first, while it is up,
+        whatever the load balancing policy of the profile.
+        """
+        query = HostTargetingStatement(query, host.address)
+        future = self._create_response_future(query, None, False, None, _NOT_SET, execution_profile)
+        future.query_plan = _targeted_query_plan(host, future.query_plan)
+        future._protocol_handler = self.client_protocol_handler
+        self._on_request(future)
+        future.send_request()
+        return future
+
     def execute_graph(self, query, parameters=None, trace=False, execution_profile=EXEC_PROFILE_GRAPH_DEFAULT, execute_as=None):
         """
         Executes a Gremlin query string or SimpleGraphStatement synchronously,
@@ -2009,6 +2248,10 @@ class Session(object):
         elif isinstance(query, PreparedStatement):
             query = query.bind(parameters)
 
+        request_metrics = self.cluster.request_metrics
+        profile_name = None
+        if request_metrics is not None:
+            profile_name = self.cluster.profile_manager.name(execution_profile)
         execution_profile = self._get_execution_profile(execution_profile)
 
         if timeout is _NOT_SET:
@@ -2056,7 +2299,9 @@ class Session(object):
         return ResponseFuture(
             self, message, query, timeout, metrics=self._metrics,
             prepared_statement=prepared_statement, retry_policy=retry_policy, row_factory=execution_profile.row_factory,
-            load_balancer=execution_profile.load_balancing_policy, start_time=start_time, speculative_execution_plan=spec_exec_plan)
+            load_balancer=execution_profile.load_balancing_policy, start_time=start_time, speculative_execution_plan=spec_exec_plan,
+            latency_trackers=self.cluster._latency_trackers, concurrency_limiter=self.cluster.concurrency_limiter,
+            request_metrics=request_metrics, profile_name=profile_name)
 
     def _get_execution_profile(self, ep):
         profiles = self.cluster.profile_manager.profiles
@@ -2321,6 +2566,7 @@ class Session(object):
                     future = self.remove_pool(host)
                 else:
                     pool.host_distance = distance
+                    pool.ensure_core_connections()
             if future:
                 futures.add(future)
         return futures
@@ -2410,6 +2656,13 @@ class Session(object):
             return self.cluster.executor.submit(fn, *args, **kwargs)
 
     def get_pool_state(self):
+        """
+        Returns a dict of ``{host: state}`` describing the connection pool to each host.
+        Each state is a dict with the keys ``shutdown``, ``open_count``, ``in_flights``
+        (requests in flight on each pooled connection), ``trashed`` (connections
+        waiting for in-flight requests to complete before being closed) and
+        ``pending`` (requests waiting for a free request ID).
+        """
         return dict((host, pool.get_state()) for host, pool in tuple(self._pools.items()))
 
     def get_pools(self):
@@ -3060,6 +3313,11 @@ def _stop_scheduler(scheduler, thread):
 
 
 class _Scheduler(Thread):
+    """
+    Runs tasks on the executor once their delay has elapsed. The thread
+    sleeps until the earliest deadline, and is woken up early when a task
+    is scheduled before it.
+    """
 
     _queue = None
     _scheduled_tasks = None
@@ -3067,10 +3325,11 @@ class _Scheduler(Thread):
     is_shutdown = False
 
     def __init__(self, executor):
-        self._queue = Queue.PriorityQueue()
+        self._queue = []
         self._scheduled_tasks = set()
         self._count = count()
         self._executor = executor
+        self._condition = Condition()
 
         Thread.__init__(self, name="Task Scheduler")
         self.daemon = True
@@ -3082,8 +3341,9 @@ class _Scheduler(Thread):
         except AttributeError:
             # this can happen on interpreter shutdown
             pass
-        self.is_shutdown = True
-        self._queue.put_nowait((0, 0, None))
+        with self._condition:
+            self.is_shutdown = True
+            self._condition.notify()
         self.join()
 
     def schedule(self, delay, fn, *args, **kwargs):
@@ -3091,44 +3351,49 @@ class _Scheduler(Thread):
 
     def schedule_unique(self, delay, fn, *args, **kwargs):
         task = (fn, args, tuple(kwargs.items()))
-        if task not in self._scheduled_tasks:
-            self._insert_task(delay, task)
-        else:
-            log.debug("Ignoring schedule_unique for already-scheduled task: %r", task)
+        with self._condition:
+            if task not in self._scheduled_tasks:
+                self._insert_task(delay, task)
+            else:
+                log.debug("Ignoring schedule_unique for already-scheduled task: %r", task)
 
     def _insert_task(self, delay, task):
-        if not self.is_shutdown:
-            run_at = time.time() + delay
-            self._scheduled_tasks.add(task)
-            self._queue.put_nowait((run_at, next(self._count), task))
-        else:
-            log.debug("Ignoring scheduled task after shutdown: %r", task)
+        with self._condition:
+            if not self.is_shutdown:
+                run_at = time.time() + delay
+                i = next(self._count)
+                self._scheduled_tasks.add(task)
+                heappush(self._queue, (run_at, i, task))
+                if self._queue[0][1] == i:
+                    # the thread may be sleeping until a later deadline
+                    self._condition.notify()
+            else:
+                log.debug("Ignoring scheduled task after shutdown: %r", task)
 
     def run(self):
         while True:
-            if self.is_shutdown:
-                return
-
-            try:
-                while True:
-                    run_at, i, task = self._queue.get(block=True, timeout=None)
-                    if self.is_shutdown:
-                        if task:
-                            log.debug("Not executing scheduled task due to Scheduler shutdown")
-                        return
-                    if run_at <= time.time():
-                        self._scheduled_tasks.discard(task)
-                        fn, args, kwargs = task
-                        kwargs = dict(kwargs)
-                        future = self._executor.submit(fn, *args, **kwargs)
-                        future.add_done_callback(self._log_if_failed)
+            with self._condition:
+                while not self.is_shutdown:
+                    if self._queue:
+                        delay = self._queue[0][0] - time.time()
+                        if delay <= 0:
+                            break
                     else:
-                        self._queue.put_nowait((run_at, i, task))
-                        break
-            except Queue.Empty:
-                pass
+                        delay = None
+                    self._condition.wait(delay)
 
-            time.sleep(0.1)
+                if self.is_shutdown:
+                    if self._queue:
+                        log.debug("Not executing scheduled task due to Scheduler shutdown")
+                    return
+
+                _, _, task = heappop(self._queue)
+                self._scheduled_tasks.discard(task)
+
+            fn, args, kwargs = task
+            kwargs = dict(kwargs)
+            future = self._executor.submit(fn, *args, **kwargs)
+            future.add_done_callback(self._log_if_failed)
 
     def _log_if_failed(self, future):
         exc = future.exception()
@@ -3138,6 +3403,10 @@ class _Scheduler(Thread):
                 exc_info=exc)
 
 
+# returned by ResponseFuture._query for requests waiting for a free request ID
+_PENDING_REQUEST_ID = -1
+
+
 def refresh_schema_and_set_result(control_conn, response_future, connection, **kwargs):
     try:
         log.debug("Refreshing schema in response to schema change. "
@@ -3211,6 +3480,7 @@ class ResponseFuture(object):
     _start_time = None
     _metrics = None
     _paging_state = None
+    _page_size_bytes = None
     _custom_payload = None
     _warnings = None
     _timer = None
@@ -3218,11 +3488,17 @@ class ResponseFuture(object):
     _spec_execution_plan = NoSpeculativeExecutionPlan()
     _continuous_paging_options = None
     _continuous_paging_session = None
+    _latency_trackers = ()
+    _sent_times = None
+    _concurrency_limiter = None
+    _request_metrics = None
+    _profile_name = None
 
     _warned_timeout = False
 
     def __init__(self, session, message, query, timeout, metrics=None, prepared_statement=None,
-                 retry_policy=RetryPolicy(), row_factory=None, load_balancer=None, start_time=None, speculative_execution_plan=None):
+                 retry_policy=RetryPolicy(), row_factory=None, load_balancer=None, start_time=None, speculative_execution_plan=None,
+                 latency_trackers=None, concurrency_limiter=None, request_metrics=None, profile_name=None):
         self.session = session
         # TODO: normalize handling of retry policy and row factory
         self.row_factory = row_factory or session.cluster._default_row_factory
@@ -3241,6 +3517,12 @@ class ResponseFuture(object):
         self._callbacks = []
         self._errbacks = []
         self._spec_execution_plan = speculative_execution_plan or self._spec_execution_plan
+        if latency_trackers:
+            self._latency_trackers = latency_trackers
+        self._concurrency_limiter = concurrency_limiter
+        if request_metrics is not None:
+            self._request_metrics = request_metrics
+            self._profile_name = profile_name
         self.attempted_hosts = []
         self._start_timer()
 
@@ -3275,6 +3557,11 @@ class ResponseFuture(object):
                 host = connection.host if connection else 'unknown'
                 errors = {host: "Request timed out while waiting for schema agreement. See Session.execute[_async](timeout) and Cluster.max_schema_agreement_wait."}
 
+        if self._concurrency_limiter is not None and self._current_host is not None:
+            self._concurrency_limiter.on_timeout(self._current_host)
+        if self._sent_times:
+            self._report_timeouts()
+
         self._set_final_exception(OperationTimedOut(errors, self._current_host))
 
     def _on_speculative_execute(self):
@@ -3323,17 +3610,50 @@ class ResponseFuture(object):
             self._errors[host] = ConnectionException("Pool is shutdown")
             return None
 
+        limiter = self._concurrency_limiter
+        if limiter is not None and not limiter.try_acquire(host):
+            log.debug("Host %s is at its concurrency limit, moving to the next host", host)
+            self._errors[host] = NoConnectionsAvailable("Host is at its concurrency limit")
+            return None
+
         self._current_host = host
 
-        connection = None
         try:
-            # TODO get connectTimeout from cluster settings
-            connection, request_id = pool.borrow_connection(timeout=2.0)
+            borrowed = pool.borrow_connection_or_park(
+                partial(self._on_connection_available, host, pool, message, cb))
+            if borrowed is None:
+                # sent once a request ID is returned to the pool
+                return _PENDING_REQUEST_ID
+            connection, request_id = borrowed
+        except NoConnectionsAvailable as exc:
+            log.debug("All connections for host %s are at capacity, moving to the next host", host)
+            self._errors[host] = exc
+            self._release_limit(host)
+            return None
+        except Exception as exc:
+            log.debug("Error querying host %s", host, exc_info=True)
+            self._errors[host] = exc
+            if self._metrics is not None:
+                self._metrics.on_connection_error()
+            self._release_limit(host)
+            return None
+
+        return self._send_on_connection(host, pool, connection, request_id, message, cb)
+
+    def _send_on_connection(self, host, pool, connection, request_id, message, cb):
+        try:
             self._connection = connection
             result_meta = self.prepared_statement.result_metadata if self.prepared_statement else []
 
             if cb is None:
                 cb = partial(self._set_result, host, connection, pool)
+            if self._concurrency_limiter is not None:
+                cb = partial(self._on_limited_response, host, time.time(), cb)
+
+            if self._latency_trackers:
+                if self._sent_times is None:
+                    self._sent_times = {}
+                self._sent_times[host] = time.time()
 
             self.request_encoded_size = connection.send_msg(message, request_id, cb=cb,
                                                             encoder=self._protocol_handler.encode_message,
@@ -3341,19 +3661,50 @@ class ResponseFuture(object):
                                                             result_metadata=result_meta)
             self.attempted_hosts.append(host)
             return request_id
-        except NoConnectionsAvailable as exc:
-            log.debug("All connections for host %s are at capacity, moving to the next host", host)
-            self._errors[host] = exc
-            return None
         except Exception as exc:
             log.debug("Error querying host %s", host, exc_info=True)
             self._errors[host] = exc
             if self._metrics is not None:
                 self._metrics.on_connection_error()
-            if connection:
-                pool.return_connection(connection)
+            pool.return_connection(connection)
+            self._release_limit(host)
             return None
 
+    def _release_limit(self, host):
+        if self._concurrency_limiter is not None:
+            self._concurrency_limiter.release(host, None, False)
+
+    def _on_limited_response(self, host, sent_time, cb, response):
+        if isinstance(response, Exception) and not isinstance(response, ErrorMessage):
+            # the connection failed: no signal about the host's load
+            self._concurrency_limiter.release(host, None, False)
+        else:
+            overloaded = isinstance(response, (OverloadedErrorMessage, ReadTimeoutErrorMessage,
+                                               WriteTimeoutErrorMessage))
+            self._concurrency_limiter.release(host, time.time() - sent_time, overloaded)
+        cb(response)
+
+    def _on_connection_available(self, host, pool, message, cb, connection, request_id, exc):
+        """
+        Called by the pool of `host` once a request parked by :meth:`_query`
+        can be sent, or has to give up on that host.
+        """
+        if exc is not None:
+            self._errors[host] = exc
+            self._release_limit(host)
+            if not self._event.is_set():
+                self.send_request()
+            return False
+
+        if self._event.is_set():
+            # e.g. timed out while waiting
+            self._release_limit(host)
+            return False
+
+        if self._send_on_connection(host, pool, connection, request_id, message, cb) is None:
+            self.send_request()
+        return True
+
     @property
     def has_more_pages(self):
         """
@@ -3435,6 +3786,9 @@ class ResponseFuture(object):
             if pool:
                 pool.return_connection(connection)
 
+            if self._sent_times:
+                self._report_latency(host, response)
+
             trace_id = getattr(response, 'trace_id', None)
             if trace_id:
                 if not self._query_traces:
@@ -3467,10 +3821,13 @@ class ResponseFuture(object):
                         self, connection, **response.schema_change_event)
                 elif response.kind == RESULT_KIND_ROWS:
                     self._paging_state = response.paging_state
+                    self._page_size_bytes = response.body_size
                     self._col_names = response.column_names
                     self._col_types = response.column_types
                     if getattr(self.message, 'continuous_paging_options', None):
                         self._handle_continuous_paging_first_response(connection, response)
+                    elif isinstance(response.row_decoder, RowDecoder):
+                        self._set_final_result(response.row_decoder.make_rows(self.row_factory, response.parsed_rows))
                     else:
                         self._set_final_result(self.row_factory(response.column_names, response.parsed_rows))
                 elif response.kind == RESULT_KIND_VOID:
@@ -3590,9 +3947,14 @@ class ResponseFuture(object):
             self._set_final_exception(exc)
 
     def _handle_continuous_paging_first_response(self, connection, response):
+        options = self.message.continuous_paging_options
+        page_timeout = options.page_timeout if options.page_timeout is not None else self.timeout
         self._continuous_paging_session = connection.new_continuous_paging_session(response.stream_id,
                                                                                    self._protocol_handler.decode_message,
-                                                                                   self.row_factory)
+                                                                                   self.row_factory,
+                                                                                   options.max_queue_size,
+                                                                                   page_timeout,
+                                                                                   self._metrics)
         self._set_final_result(self._continuous_paging_session.results())
         self._continuous_paging_session.on_message(response)
 
@@ -3645,10 +4007,45 @@ class ResponseFuture(object):
                 "Got unexpected response type when preparing "
                 "statement on host %s: %s" % (host, response)))
 
+    def _report_latency(self, host, response):
+        # the request may time out meanwhile
+        sent_times = self._sent_times
+        sent_time = sent_times.pop(host, None) if sent_times else None
+        if sent_time is None:
+            return
+        if isinstance(response, (ResultMessage, ReadTimeoutErrorMessage, WriteTimeoutErrorMessage)):
+            latency = time.time() - sent_time
+        elif isinstance(response, OverloadedErrorMessage):
+            # as slow as a request that timed out, however fast the error came
+            latency = max(time.time() - sent_time, self.timeout or 0)
+        else:
+            return
+        for tracker in self._latency_trackers:
+            tracker.update(host, latency)
+
+    def _report_timeouts(self):
+        """
+        Reports the time waited by requests still in flight, so hosts that
+        only time out are measured too.
+        """
+        sent_times, self._sent_times = self._sent_times, None
+        now = time.time()
+        for host, sent_time in list(sent_times.items()):
+            for tracker in self._latency_trackers:
+                tracker.update(host, now - sent_time)
+
+    def _record_request(self, error=None):
+        if self._metrics is not None or self._request_metrics is not None:
+            latency = time.time() - self._start_time
+            if self._metrics is not None:
+                self._metrics.request_timer.addValue(latency)
+            if self._request_metrics is not None:
+                self._request_metrics.record(self._current_host, self._profile_name, self.prepared_statement,
+                                             latency, error)
+
     def _set_final_result(self, response):
         self._cancel_timer()
-        if self._metrics is not None:
-            self._metrics.request_timer.addValue(time.time() - self._start_time)
+        self._record_request()
 
         with self._callback_lock:
             self._final_result = response
@@ -3669,8 +4066,7 @@ class ResponseFuture(object):
 
     def _set_final_exception(self, response):
         self._cancel_timer()
-        if self._metrics is not None:
-            self._metrics.request_timer.addValue(time.time() - self._start_time)
+        self._record_request(response)
 
         with self._callback_lock:
             self._final_exception = response
@@ -3888,6 +4284,25 @@ class ResponseFuture(object):
             self._callbacks = []
             self._errbacks = []
 
+    def _remove_callbacks(self, callback, errback):
+        with self._callback_lock:
+            self._callbacks = [c for c in self._callbacks if c[0] is not callback]
+            self._errbacks = [e for e in self._errbacks if e[0] is not errback]
+
+    def __await__(self):
+        """
+        Makes the future awaitable from a coroutine (Python 3.5+). Awaiting
+        yields the same :class:`.ResultSet` as :meth:`result`, or raises its
+        exception, without blocking the event loop::
+
+            >>> rows = await session.execute_async("SELECT * FROM users")
+            >>> async for row in rows:
+            ...     process(row)
+
+        """
+        from dse.aio import wrap_response_future
+        return wrap_response_future(self).__await__()
+
     def __str__(self):
         result = "(no result yet)" if self._final_result is _NOT_SET else self._final_result
         return "<ResponseFuture: query='%s' request_id=%s result=%s exception=%s coordinator_host=%s>" \
@@ -3906,6 +4321,99 @@ class QueryExhausted(Exception):
     pass
 
 
+def _is_arrow_batch(result):
+    # pyarrow is imported once such a result exists
+    pyarrow = sys.modules.get('pyarrow')
+    return pyarrow is not None and isinstance(result, pyarrow.RecordBatch)
+
+
+class _PagePrefetcher(object):
+    """
+    Fetches the pages of a :class:`.ResponseFuture` ahead of a
+    :class:`.ResultSet` consuming them. Each page is requested as soon as
+    the previous one arrives, while fewer than `depth` pages, `max_rows`
+    rows and `max_bytes` bytes of frames are waiting to be consumed.
+    """
+
+    def __init__(self, response_future, depth, max_rows, max_bytes):
+        self._future = response_future
+        self._depth = depth
+        self._max_rows = max_rows
+        self._max_bytes = max_bytes
+        self._condition = Condition()
+        self._pages = deque()  # (rows, paging state, row count, size in bytes)
+        self._rows = 0
+        self._bytes = 0
+        self._fetching = False
+        self._exception = None
+        self._callbacks_added = False
+        # paging state after the last consumed page
+        self.paging_state = response_future._paging_state
+
+    @property
+    def has_more_pages(self):
+        with self._condition:
+            return bool(self._pages or self._fetching or self._exception is not None or
+                        self._future.has_more_pages)
+
+    def next_page(self):
+        """
+        Returns the rows of the next page, waiting for it if it is not
+        fetched yet.
+        """
+        self.maybe_fetch()
+        with self._condition:
+            while not self._pages and self._fetching:
+                self._condition.wait()
+            if self._pages:
+                rows, self.paging_state, row_count, size = self._pages.popleft()
+                self._rows -= row_count
+                self._bytes -= size
+            elif self._exception is not None:
+                exc, self._exception = self._exception, None
+                raise exc
+            else:
+                raise QueryExhausted()
+        self.maybe_fetch()
+        return rows
+
+    def maybe_fetch(self):
+        with self._condition:
+            if (self._fetching or self._exception is not None or not self._future.has_more_pages or
+                    len(self._pages) >= self._depth or
+                    (self._max_rows is not None and self._rows >= self._max_rows) or
+                    (self._max_bytes is not None and self._bytes >= self._max_bytes)):
+                return
+            self._fetching = True
+
+        # outside the lock, as callbacks may run on the spot
+        try:
+            self._future.start_fetching_next_page()
+            if not self._callbacks_added:
+                # callbacks stay registered for the following pages
+                self._callbacks_added = True
+                self._future.add_callbacks(self._on_page, self._on_error)
+        except Exception as exc:
+            self._on_error(exc)
+
+    def _on_page(self, rows):
+        row_count = len(rows) if isinstance(rows, list) else 0
+        size = self._future._page_size_bytes or 0
+        with self._condition:
+            self._pages.append((rows, self._future._paging_state, row_count, size))
+            self._rows += row_count
+            self._bytes += size
+            self._fetching = False
+            self._condition.notify_all()
+        self.maybe_fetch()
+
+    def _on_error(self, exc):
+        with self._condition:
+            self._exception = exc
+            self._fetching = False
+            self._condition.notify_all()
+
+
 class ResultSet(object):
     """
     An iterator over the rows from a query result. Also supplies basic equality
@@ -3934,12 +4442,15 @@ class ResultSet(object):
         self._set_current_rows(initial_response)
         self._page_iter = None
         self._list_mode = False
+        self._prefetcher = None
 
     @property
     def has_more_pages(self):
         """
         True if the last response indicated more pages; False otherwise
         """
+        if self._prefetcher is not None:
+            return self._prefetcher.has_more_pages
         return self.response_future.has_more_pages
 
     @property
@@ -3960,7 +4471,7 @@ class ResultSet(object):
         try:
             return next(self._page_iter)
         except StopIteration:
-            if not self.response_future.has_more_pages:
+            if not self.has_more_pages:
                 if not self._list_mode:
                     self._current_rows = []
                 raise
@@ -3973,23 +4484,79 @@ class ResultSet(object):
 
     __next__ = next
 
+    def __aiter__(self):
+        """
+        Asynchronous iteration over all rows (Python 3.5+). Further pages, including
+        those streamed by continuous paging, are awaited without blocking the
+        event loop.
+        """
+        paging_session = self.response_future._continuous_paging_session
+        if paging_session:
+            return paging_session.__aiter__()
+        if self._prefetcher is not None:
+            raise DriverException("Asynchronous iteration is not supported after prefetch()")
+        from dse.aio import ResultSetAsyncIterator
+        return ResultSetAsyncIterator(self)
+
     def fetch_next_page(self):
         """
         Manually, synchronously fetch the next page. Supplied for manually retrieving pages
         and inspecting :meth:`~.current_page`. It is not necessary to call this when iterating
         through results; paging happens implicitly in iteration.
         """
-        if self.response_future.has_more_pages:
+        if self._prefetcher is not None:
+            if self._prefetcher.has_more_pages:
+                self._set_current_rows(self._prefetcher.next_page())
+            else:
+                self._current_rows = []
+        elif self.response_future.has_more_pages:
             self.response_future.start_fetching_next_page()
             result = self.response_future.result()
             self._current_rows = result._current_rows  # ResultSet has already _set_current_rows to the appropriate form
         else:
             self._current_rows = []
 
+    def prefetch(self, pages=1, max_rows=None, max_bytes=None):
+        """
+        Starts fetching the following pages in the background, so that the
+        next page is ready, or on its way, when the current one is consumed,
+        instead of being requested only then. Returns this :class:`.ResultSet`::
+
+            >>> for row in session.execute(statement).prefetch(pages=2, max_bytes=16 * 1024 * 1024):
+            ...     process(row)
+
+        Pages are still fetched one after the other, as each request needs
+        the paging state of the previous page. Each page is requested as soon
+        as the previous one arrives, while fewer than `pages` pages are
+        waiting to be consumed. `max_rows` and `max_bytes` also stop
+        fetching ahead once the waiting pages hold that many rows, or that
+        many bytes of response frames. They bound the memory used, at the
+        cost of a round trip when reached.
+
+        Pages are then only fetched through this :class:`.ResultSet`, which
+        must not be used with :meth:`.ResponseFuture.start_fetching_next_page`
+        or asynchronous iteration. :attr:`~.paging_state` is that of the last
+        page consumed. This has no effect with continuous paging, which
+        already streams pages.
+        """
+        if pages < 1:
+            raise ValueError("pages must be greater than 0")
+        if self._prefetcher is not None:
+            raise DriverException("prefetch() was already called for this ResultSet")
+        if self.response_future._continuous_paging_session:
+            return self
+        self._prefetcher = _PagePrefetcher(self.response_future, pages, max_rows, max_bytes)
+        self._prefetcher.maybe_fetch()
+        return self
+
     def _set_current_rows(self, result):
         if isinstance(result, Mapping):
             self._current_rows = [result] if result else []
             return
+        if _is_arrow_batch(result):
+            # empty batches still carry the schema
+            self._current_rows = [result]
+            return
         try:
             iter(result)  # can't check directly for generator types because cython generators are different
             self._current_rows = result
@@ -4000,12 +4567,48 @@ class ResultSet(object):
         self._current_rows = list(self)
         self._page_iter = None
 
+    def to_arrow(self):
+        """
+        Returns all rows as a :class:`pyarrow.Table`, fetching any remaining
+        pages. The pages are concatenated without copying their data.
+
+        This requires results to be decoded with
+        :attr:`~dse.protocol.ArrowProtocolHandler`, which decodes each page into
+        a :class:`pyarrow.RecordBatch`::
+
+            >>> from dse.protocol import ArrowProtocolHandler
+            >>> session.client_protocol_handler = ArrowProtocolHandler
+            >>> session.row_factory = tuple_factory
+            >>> table = session.execute("SELECT * FROM users").to_arrow()
+            >>> df = table.to_pandas()
+        """
+        if not self._list_mode:
+            self._fetch_all()
+            self._list_mode = True
+        batches = self._current_rows
+        if not all(_is_arrow_batch(batch) for batch in batches):
+            raise DriverException("to_arrow() requires results decoded with ArrowProtocolHandler, "
+                                  "and tuple_factory as row factory")
+
+        import pyarrow
+        if not batches:
+            return pyarrow.Table.from_batches([], pyarrow.schema([]))
+        try:
+            return pyarrow.Table.from_batches(batches)
+        except pyarrow.ArrowInvalid:
+            # columns converted from Python values may be typed differently
+            # from page to page, e.g. as nulls in a page with no values
+            tables = [pyarrow.Table.from_batches([batch]) for batch in batches]
+            if int(pyarrow.__version__.split('.')[0]) >= 14:
+                return pyarrow.concat_tables(tables, promote_options='default')
+            return pyarrow.concat_tables(tables, promote=True)
+
     def _enter_list_mode(self, operator):
         if self._list_mode:
             return
         if self._page_iter:
             raise RuntimeError("Cannot use %s when results have been iterated." % operator)
-        if self.response_future.has_more_pages:
+        if self.has_more_pages:
             log.warning("Using %s on paged results causes entire result set to be materialized.", operator)
         self._fetch_all()  # done regardless of paging status in case the row factory produces a generator
         self._list_mode = True
@@ -4071,4 +4674,6 @@ class ResultSet(object):
         The driver treats paging state as opaque, but it may contain primary key data, so applications may want to
         avoid sending this to untrusted parties.
         """
+        if self._prefetcher is not None:
+            return self._prefetcher.paging_state
         return self.response_future._paging_state
@@ -8,15 +8,22 @@
 # http://www.datastax.com/terms/datastax-dse-driver-license-terms
 
 
-from collections import namedtuple
+from collections import defaultdict, namedtuple, deque
+from functools import partial
 from heapq import heappush, heappop
 from itertools import cycle
+import re
 import six
 from six.moves import xrange, zip
 from threading import Condition
 import sys
 
-from dse.cluster import ResultSet
+from dse import ProtocolVersion
+from dse.cluster import ResultSet, ContinuousPagingOptions, EXEC_PROFILE_DEFAULT
+from dse.metadata import protect_name, Murmur3Token, MD5Token, MIN_LONG, MAX_LONG
+from dse.policies import HostDistance
+from dse.query import BatchStatement, BatchType, BoundStatement, PreparedStatement
+from dse.util import OrderedDict
 
 import logging
 log = logging.getLogger(__name__)
@@ -24,7 +31,8 @@ log = logging.getLogger(__name__)
 
 ExecutionResult = namedtuple('ExecutionResult', ['success', 'result_or_exc'])
 
-def execute_concurrent(session, statements_and_parameters, concurrency=100, raise_on_first_error=True, results_generator=False):
+def execute_concurrent(session, statements_and_parameters, concurrency=100, raise_on_first_error=True, results_generator=False,
+                       ordered=True, buffer_size=None, fetch_all_pages=False):
     """
     Executes a sequence of (statement, parameters) tuples concurrently.  Each
     ``parameters`` item must be a sequence or :const:`None`.
@@ -52,6 +60,20 @@ def execute_concurrent(session, statements_and_parameters, concurrency=100, rais
     an :class:`Exception`.  If ``success`` is :const:`True`, ``result_or_exc``
     will be the query result.
 
+    If `ordered` is :const:`False`, a generator is returned regardless of `results_generator`,
+    and it yields ``(index, ExecutionResult)`` tuples as soon as each statement completes, where
+    ``index`` is the position of the statement in `statements_and_parameters`. A slow statement
+    then does not hold back the results of those after it. No new statement is started while
+    `buffer_size` results (by default, `concurrency`) are waiting to be consumed, so memory stays
+    bounded when the consumer is slower than the cluster. `statements_and_parameters` is read
+    lazily and may be an unbounded iterator.
+
+    If `fetch_all_pages` is :const:`True`, the remaining pages of each statement are fetched
+    asynchronously before its result is returned, and the result holds every row. A statement keeps
+    its slot in `concurrency` until its last page arrives, so fan-out reads run entirely in parallel
+    without iterating the results fetching pages one at a time on the calling thread. Pages are
+    only gathered for row factories that return lists, which includes the built-in ones.
+
     Example usage::
 
         select_statement = session.prepare("SELECT * FROM users WHERE id=?")
@@ -74,10 +96,19 @@ def execute_concurrent(session, statements_and_parameters, concurrency=100, rais
     if concurrency <= 0:
         raise ValueError("concurrency must be greater than 0")
 
+    if buffer_size is not None and buffer_size <= 0:
+        raise ValueError("buffer_size must be greater than 0")
+
+    if not ordered:
+        executor = ConcurrentExecutorUnorderedResults(session, statements_and_parameters, buffer_size or concurrency,
+                                                      fetch_all_pages=fetch_all_pages)
+        return executor.execute(concurrency, raise_on_first_error)
+
     if not statements_and_parameters:
         return []
 
-    executor = ConcurrentExecutorGenResults(session, statements_and_parameters) if results_generator else ConcurrentExecutorListResults(session, statements_and_parameters)
+    executor_class = ConcurrentExecutorGenResults if results_generator else ConcurrentExecutorListResults
+    executor = executor_class(session, statements_and_parameters, fetch_all_pages=fetch_all_pages)
     return executor.execute(concurrency, raise_on_first_error)
 
 
@@ -85,9 +116,11 @@ class _ConcurrentExecutor(object):
 
     max_error_recursion = 100
 
-    def __init__(self, session, statements_and_params):
+    def __init__(self, session, statements_and_params, fetch_all_pages=False):
         self.session = session
         self._enum_statements = enumerate(iter(statements_and_params))
+        self._fetch_all_pages = fetch_all_pages
+        self._pages = {}
         self._condition = Condition()
         self._fail_fast = False
         self._results_queue = []
@@ -139,10 +172,22 @@ class _ConcurrentExecutor(object):
         self._exec_depth -= 1
 
     def _on_success(self, result, future, idx):
+        if self._fetch_all_pages and isinstance(result, list):
+            if future.has_more_pages:
+                # the callbacks are called again with the next page
+                self._pages.setdefault(idx, []).extend(result)
+                future.start_fetching_next_page()
+                return
+            rows = self._pages.pop(idx, None)
+            if rows is not None:
+                rows.extend(result)
+                result = rows
+
         future.clear_callbacks()
         self._put_result(ResultSet(future, result), idx, True)
 
     def _on_error(self, result, future, idx):
+        self._pages.pop(idx, None)
         self._put_result(result, idx, False)
 
     @staticmethod
@@ -179,6 +224,65 @@ class ConcurrentExecutorGenResults(_ConcurrentExecutor):
                     self._current += 1
 
 
+class ConcurrentExecutorUnorderedResults(_ConcurrentExecutor):
+
+    def __init__(self, session, statements_and_params, buffer_size, fetch_all_pages=False):
+        super(ConcurrentExecutorUnorderedResults, self).__init__(session, statements_and_params, fetch_all_pages)
+        self._buffer_size = buffer_size
+        self._concurrency = 0
+        self._in_flight = 0
+        self._exhausted = False
+        self._stopped = False
+
+    def execute(self, concurrency, fail_fast):
+        self._fail_fast = fail_fast
+        self._concurrency = concurrency
+        self._results_queue = deque()
+        self._in_flight = 0
+        self._exhausted = False
+        self._stopped = False
+        with self._condition:
+            self._fill()
+        return self._results()
+
+    def _fill(self):
+        # lock must be held
+        while (self._in_flight < self._concurrency and len(self._results_queue) < self._buffer_size and
+               not self._exhausted and not self._stopped):
+            # counted first: the result may be put before _execute_next returns
+            self._in_flight += 1
+            if not self._execute_next():
+                self._in_flight -= 1
+                self._exhausted = True
+
+    def _put_result(self, result, idx, success):
+        with self._condition:
+            self._in_flight -= 1
+            self._results_queue.append((idx, ExecutionResult(success, result)))
+            if not success and self._fail_fast:
+                self._stopped = True
+            else:
+                self._fill()
+            self._condition.notify()
+
+    def _results(self):
+        with self._condition:
+            while True:
+                while not self._results_queue:
+                    if self._in_flight == 0 and (self._exhausted or self._stopped):
+                        return
+                    self._condition.wait()
+                idx, res = self._results_queue.popleft()
+                self._fill()
+                try:
+                    self._condition.release()
+                    if self._fail_fast and not res[0]:
+                        self._raise(res[1])
+                    yield idx, res
+                finally:
+                    self._condition.acquire()
+
+
 class ConcurrentExecutorListResults(_ConcurrentExecutor):
 
     _exception = None
@@ -223,3 +327,465 @@ def execute_concurrent_with_args(session, statement, parameters, *args, **kwargs
         execute_concurrent_with_args(session, statement, parameters, concurrency=50)
     """
     return execute_concurrent(session, zip(cycle((statement,)), parameters), *args, **kwargs)
+
+
+def execute_bulk_writes(session, statements_and_parameters, group_by='partition', max_batch_size=50,
+                        max_batch_bytes=50 * 1024, max_open_batches=1000, concurrency=100,
+                        max_in_flight_per_host=10, raise_on_first_error=True):
+    """
+    Writes a sequence of (statement, parameters) tuples in ``UNLOGGED``
+    batches of statements that go to the same replicas, rather than sending
+    one request per statement.
+
+    `group_by` sets which statements share a batch. With ``'partition'``,
+    a batch only holds statements for one partition, which the server
+    applies as a single mutation. With ``'replicas'``, it holds statements
+    for any partitions with the same replicas, which cuts the request count
+    further at the cost of the coordinator applying several partitions.
+    Grouping uses the :attr:`~.Statement.routing_key` and
+    :attr:`~.Statement.keyspace` of each statement, which prepared
+    statements set once bound. Statements without them are sent on their
+    own.
+
+    A batch is sent once it holds `max_batch_size` statements or adding a
+    statement would take its estimated size over `max_batch_bytes` (by
+    default, the server's default ``batch_size_fail_threshold_in_kb``). When
+    more than `max_open_batches` batches are being filled, the oldest one is
+    sent, which bounds memory when statements arrive in no particular order.
+    Remaining batches are sent at the end.
+
+    At most `concurrency` requests are in flight at once, and at most
+    `max_in_flight_per_host` to the first replica of a batch, the host a
+    :class:`~.TokenAwarePolicy` routes it to. Reading
+    `statements_and_parameters` blocks while those limits are reached, so it
+    may be a lazy, unbounded iterator.
+
+    If `raise_on_first_error` is left as :const:`True`, writing stops after
+    the first failed request and its exception is raised. Otherwise, a list
+    of ``(statement, exception)`` tuples, one per failed batch or statement,
+    is returned. It is empty when all writes succeeded.
+
+    Example usage::
+
+        insert = session.prepare("INSERT INTO users (id, name) VALUES (?, ?)")
+        execute_bulk_writes_with_args(session, insert, ((user.id, user.name) for user in users))
+    """
+    if group_by not in ('partition', 'replicas'):
+        raise ValueError("group_by must be 'partition' or 'replicas'")
+    if max_batch_size <= 0 or max_batch_bytes <= 0 or max_open_batches <= 0:
+        raise ValueError("max_batch_size, max_batch_bytes and max_open_batches must be greater than 0")
+    if concurrency <= 0 or max_in_flight_per_host <= 0:
+        raise ValueError("concurrency and max_in_flight_per_host must be greater than 0")
+
+    metadata = session.cluster.metadata
+    by_replicas = group_by == 'replicas'
+    writer = _BulkWriter(session, concurrency, max_in_flight_per_host, raise_on_first_error)
+
+    # group key -> [batch, estimated size, first replica]
+    open_batches = OrderedDict()
+
+    for statement, parameters in statements_and_parameters:
+        if isinstance(statement, PreparedStatement):
+            statement = statement.bind(() if parameters is None else parameters)
+            parameters = None
+
+        keyspace = getattr(statement, 'keyspace', None)
+        routing_key = getattr(statement, 'routing_key', None)
+        if not keyspace or not routing_key:
+            writer.submit(statement, parameters, None)
+            continue
+
+        if by_replicas:
+            replicas = metadata.get_replicas(keyspace, routing_key, statement=statement)
+            if replicas:
+                key = frozenset(replicas)
+                host = replicas[0]
+            else:
+                # e.g. token metadata disabled: only group statements that
+                # are known to share a partition
+                key = (keyspace, routing_key)
+                host = None
+        else:
+            key = (keyspace, routing_key)
+            host = None
+
+        size = _estimated_size(statement, parameters)
+        pending = open_batches.get(key)
+        if pending is not None and (len(pending[0]) >= max_batch_size or pending[1] + size > max_batch_bytes):
+            del open_batches[key]
+            writer.submit(pending[0], None, pending[2])
+            pending = None
+
+        if pending is None:
+            if len(open_batches) >= max_open_batches:
+                _, oldest = open_batches.popitem(last=False)
+                writer.submit(oldest[0], None, oldest[2])
+            if not by_replicas:
+                replicas = metadata.get_replicas(keyspace, routing_key, statement=statement)
+                host = replicas[0] if replicas else None
+            batch = BatchStatement(BatchType.UNLOGGED, consistency_level=statement.consistency_level)
+            pending = open_batches[key] = [batch, 0, host]
+
+        pending[0].add(statement, parameters)
+        pending[1] += size
+
+    for batch, _, host in open_batches.values():
+        writer.submit(batch, None, host)
+    return writer.join()
+
+
+def execute_bulk_writes_with_args(session, statement, parameters, *args, **kwargs):
+    """
+    Like :meth:`~dse.concurrent.execute_bulk_writes()`, but takes a single
+    statement and a sequence of parameters.
+    """
+    return execute_bulk_writes(session, zip(cycle((statement,)), parameters), *args, **kwargs)
+
+
+def _estimated_size(statement, parameters):
+    # roughly what the statement adds to a BATCH frame
+    if isinstance(statement, BoundStatement):
+        return 16 + sum(4 + len(v) for v in statement.values if isinstance(v, six.binary_type))
+    query_string = getattr(statement, 'query_string', statement)
+    return 8 + len(query_string) + 8 * len(parameters or ())
+
+
+class _BulkWriter(object):
+
+    def __init__(self, session, concurrency, max_in_flight_per_host, fail_fast):
+        self.session = session
+        self._concurrency = concurrency
+        self._max_in_flight_per_host = max_in_flight_per_host
+        self._fail_fast = fail_fast
+        self._condition = Condition()
+        self._in_flight = 0
+        self._in_flight_by_host = defaultdict(int)
+        self._errors = []
+
+    def submit(self, statement, parameters, host):
+        with self._condition:
+            while (not (self._fail_fast and self._errors) and
+                   (self._in_flight >= self._concurrency or
+                    (host is not None and self._in_flight_by_host[host] >= self._max_in_flight_per_host))):
+                self._condition.wait()
+            if self._fail_fast and self._errors:
+                raise self._errors[0][1]
+            self._in_flight += 1
+            if host is not None:
+                self._in_flight_by_host[host] += 1
+
+        try:
+            future = self.session.execute_async(statement, parameters, timeout=None)
+        except Exception as exc:
+            self._on_error(exc, statement, host)
+            return
+        future.add_callbacks(callback=self._on_success, callback_args=(host,),
+                             errback=self._on_error, errback_args=(statement, host))
+
+    def join(self):
+        with self._condition:
+            while self._in_flight:
+                self._condition.wait()
+        if self._fail_fast and self._errors:
+            raise self._errors[0][1]
+        return self._errors
+
+    def _on_success(self, result, host):
+        self._release(host)
+
+    def _on_error(self, exc, statement, host):
+        with self._condition:
+            self._errors.append((statement, exc))
+        self._release(host)
+
+    def _release(self, host):
+        with self._condition:
+            self._in_flight -= 1
+            if host is not None:
+                self._in_flight_by_host[host] -= 1
+            self._condition.notify_all()
+
+
+# pages of a range received but not yet consumed, when scanning with the
+# default continuous paging options
+_scan_max_queue_size = 4
+
+# the lowest and highest tokens of the partitioners that can be scanned
+_token_bounds = {
+    Murmur3Token: (MIN_LONG, MAX_LONG),
+    MD5Token: (-1, 2 ** 127)
+}
+
+
+def scan_table(session, keyspace, table, columns=None, concurrency=8, split=1, per_range=False,
+               continuous_paging=True, execution_profile=EXEC_PROFILE_DEFAULT):
+    """
+    Reads every row of a table by splitting the token ring into ranges and
+    reading the ranges in parallel, each from one of its replicas.
+
+    Each range between two tokens of the ring is split into `split`
+    sub-ranges, which are read with
+    ``SELECT ... WHERE token(pk) > ? AND token(pk) <= ?``. The request for a
+    range goes to a replica the load balancing policy of
+    `execution_profile` considers local, or to any replica if none is,
+    spreading ranges evenly among the replicas. `columns` is a sequence of
+    the column names to select, by default all of them.
+
+    Ranges read from hosts running DSE 5.1 or later use continuous paging
+    when the protocol version of the cluster supports it, with the
+    :attr:`~.ExecutionProfile.continuous_paging_options` of the profile. If
+    it has none, :class:`~.ContinuousPagingOptions` with a
+    :attr:`~.ContinuousPagingOptions.max_queue_size` of 4 pages are used. If
+    `continuous_paging` is :const:`False`, ranges are always paged normally.
+
+    By default, a generator is returned that yields the rows of every range,
+    page by page in the order the pages arrive. At most `concurrency` ranges
+    are read at once, and no more than one page of each is waiting to be
+    consumed (or :attr:`~.ContinuousPagingOptions.max_queue_size` pages with
+    continuous paging), so memory stays bounded however large the table is.
+    Continuous paging options with a `max_queue_size` of 0, or a reactor that
+    cannot pause reading, leave the pages of continuously paged ranges
+    unbounded.
+    The first error raised while reading a range is raised by the generator.
+    Closing the generator cancels the ranges being read.
+
+    If `per_range` is :const:`True`, a list of ``(start, end, rows)`` tuples
+    is returned instead, one per sub-range in token order, where `rows` is a
+    generator of the rows with tokens in ``(start, end]``. A range is only
+    read once its generator is iterated, which may be from another thread;
+    while `concurrency` of these generators are being iterated, starting
+    another one blocks until one of them is exhausted or closed.
+
+    Scans need token metadata (see :attr:`.Cluster.token_metadata_enabled`)
+    and the ``Murmur3Partitioner`` or ``RandomPartitioner``.
+
+    Example usage::
+
+        for row in scan_table(session, 'analytics', 'events', ['id', 'payload'], concurrency=16):
+            export(row)
+    """
+    if concurrency <= 0 or split <= 0:
+        raise ValueError("concurrency and split must be greater than 0")
+
+    metadata = session.cluster.metadata
+    try:
+        table_meta = metadata.keyspaces[keyspace].tables[table]
+    except KeyError:
+        raise ValueError("Unknown table %s.%s" % (keyspace, table))
+
+    token_map = metadata.token_map
+    if token_map is None:
+        raise ValueError("Token range scans need token metadata; see Cluster.token_metadata_enabled")
+    bounds = _token_bounds.get(token_map.token_class)
+    if bounds is None:
+        raise ValueError("Token range scans are not supported with %s" % (token_map.token_class.__name__,))
+
+    partition_key = ', '.join(protect_name(c.name) for c in table_meta.partition_key)
+    query = "SELECT %s FROM %s.%s WHERE token(%s) > ? AND token(%s) <= ?" % (
+        ', '.join(protect_name(c) for c in columns) if columns else '*',
+        protect_name(keyspace), protect_name(table), partition_key, partition_key)
+
+    profile = session.execution_profile_clone_update(execution_profile)
+    continuous_profile = None
+    if continuous_paging and ProtocolVersion.has_continuous_paging_support(session.cluster.protocol_version):
+        options = profile.continuous_paging_options or ContinuousPagingOptions(max_queue_size=_scan_max_queue_size)
+        continuous_profile = session.execution_profile_clone_update(profile, continuous_paging_options=options)
+    profile.continuous_paging_options = None
+
+    load = defaultdict(int)
+    ranges = [(start, end, _pick_replica(replicas, profile.load_balancing_policy, load))
+              for start, end, replicas in _scan_ranges(token_map, keyspace, bounds, split)]
+
+    scan = _TableScan(session, session.prepare(query), profile, continuous_profile, concurrency)
+    if per_range:
+        return [(start, end, scan.range_rows(start, end, host)) for start, end, host in ranges]
+    return scan.results(ranges)
+
+
+def _scan_ranges(token_map, keyspace, bounds, split):
+    """
+    Returns ``(start, end, replicas)`` tuples covering the whole ring in
+    token order.
+    """
+    token_map.rebuild_keyspace(keyspace, build_if_absent=True)
+    replica_map = token_map.tokens_to_hosts_by_ks.get(keyspace) or {}
+    ring = token_map.ring
+
+    ranges = []
+    start = bounds[0]
+    for token in ring:
+        ranges.extend(_split_range(start, token.value, split, replica_map.get(token, ())))
+        start = token.value
+    # the range wrapping around the ring is owned by the first token
+    wrap_replicas = replica_map.get(ring[0], ()) if ring else ()
+    ranges.extend(_split_range(start, bounds[1], split, wrap_replicas))
+    return ranges
+
+
+def _split_range(start, end, split, replicas):
+    if end <= start:
+        return []
+    bounds = sorted(set(start + (end - start) * i // split for i in xrange(split + 1)))
+    return [(lower, upper, replicas) for lower, upper in zip(bounds, bounds[1:])]
+
+
+def _pick_replica(replicas, load_balancing_policy, load):
+    """
+    Returns the up replica with the fewest ranges so far, preferring local
+    ones, or None if no replica is up.
+    """
+    candidates = [h for h in replicas if h.is_up and load_balancing_policy.distance(h) == HostDistance.LOCAL]
+    if not candidates:
+        candidates = [h for h in replicas if h.is_up]
+    if not candidates:
+        return None
+    host = min(candidates, key=lambda h: load[h])
+    load[host] += 1
+    return host
+
+
+def _supports_continuous_paging(host):
+    # continuous paging was added in DSE 5.1
+    match = re.match(r'(\d+)\.(\d+)', host.dse_version or '')
+    return bool(match) and (int(match.group(1)), int(match.group(2))) >= (5, 1)
+
+
+class _TableScan(object):
+
+    def __init__(self, session, prepared, profile, continuous_profile, concurrency):
+        self.session = session
+        self._prepared = prepared
+        self._profile = profile
+        self._continuous_profile = continuous_profile
+        self._concurrency = concurrency
+        self._condition = Condition()
+        self._active = 0
+        self._closed = False
+        self._ranges = deque()
+        # (advance, rows, exc); advance asks for the next page of the range
+        self._pages = deque()
+        self._paging_sessions = set()
+
+    def _execute(self, start, end, host):
+        statement = self._prepared.bind((start, end))
+        if host is None:
+            return self.session.execute_async(statement, execution_profile=self._profile)
+        profile = self._profile
+        if self._continuous_profile is not None and _supports_continuous_paging(host):
+            profile = self._continuous_profile
+        return self.session._execute_on_host(statement, host, profile)
+
+    def range_rows(self, start, end, host):
+        with self._condition:
+            while self._active >= self._concurrency:
+                self._condition.wait()
+            self._active += 1
+
+        result = None
+        try:
+            result = self._execute(start, end, host).result()
+            for row in result:
+                yield row
+        except GeneratorExit:
+            # closing the rows of a continuous paging session cancels it
+            close = getattr(result.current_rows, 'close', None) if result is not None else None
+            if close is not None:
+                close()
+            raise
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify()
+
+    def results(self, ranges):
+        self._ranges.extend(ranges)
+        self._fill()
+        try:
+            while True:
+                with self._condition:
+                    while not self._pages and (self._active or self._ranges):
+                        self._condition.wait()
+                    if not self._pages:
+                        return
+                    advance, rows, exc = self._pages.popleft()
+                if exc is not None:
+                    raise exc
+                # the next page arrives while this one is consumed
+                advance()
+                for row in rows:
+                    yield row
+        finally:
+            self._close()
+
+    def _fill(self):
+        while True:
+            with self._condition:
+                if self._closed or not self._ranges or self._active >= self._concurrency:
+                    return
+                start, end, host = self._ranges.popleft()
+                self._active += 1
+            try:
+                future = self._execute(start, end, host)
+            except Exception as exc:
+                self._put(None, None, exc)
+                continue
+            future.add_callbacks(callback=self._on_result, callback_args=(future,),
+                                 errback=self._on_error)
+
+    def _on_result(self, result, future):
+        paging_session = future._continuous_paging_session
+        if paging_session is not None:
+            with self._condition:
+                closed = self._closed
+                if not closed:
+                    self._paging_sessions.add(paging_session)
+            if closed:
+                paging_session.cancel()
+            else:
+                paging_session.next_page(partial(self._on_continuous_page, paging_session))
+            return
+
+        if future.has_more_pages:
+            advance = future.start_fetching_next_page
+        else:
+            future.clear_callbacks()
+            advance = self._range_done
+        self._put(advance, ResultSet(future, result).current_rows, None)
+
+    def _on_continuous_page(self, paging_session, page):
+        if page is None:
+            with self._condition:
+                self._paging_sessions.discard(paging_session)
+            self._range_done()
+            return
+
+        names, rows, err = page
+        if err:
+            self._put(None, None, err)
+        else:
+            advance = partial(paging_session.next_page, partial(self._on_continuous_page, paging_session))
+            self._put(advance, paging_session.row_factory(names, rows), None)
+
+    def _on_error(self, exc):
+        self._put(None, None, exc)
+
+    def _put(self, advance, rows, exc):
+        with self._condition:
+            self._pages.append((advance, rows, exc))
+            self._condition.notify()
+
+    def _range_done(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify()
+        self._fill()
+
+    def _close(self):
+        with self._condition:
+            self._closed = True
+            self._ranges.clear()
+            self._pages.clear()
+            paging_sessions = list(self._paging_sessions)
+            self._paging_sessions.clear()
+        for paging_session in paging_sessions:
+            paging_session.cancel()
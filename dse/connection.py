@@ -11,15 +11,13 @@ from __future__ import absolute_import  # to enable import io from stdlib
 from collections import defaultdict, deque
 import errno
 from functools import wraps, partial
-from heapq import heappush, heappop
-import io
 import logging
 import six
 from six.moves import range
 import socket
 import struct
 import sys
-from threading import Thread, Event, RLock, Condition
+from threading import Thread, Event, Lock, RLock, Condition
 import time
 
 try:
@@ -122,6 +120,51 @@ class _Frame(object):
         return "ver({0}); flags({1:04b}); stream({2}); op({3}); offset({4}); len({5})".format(self.version, self.flags, self.stream, self.opcode, self.body_offset, self.end_pos - self.body_offset)
 
 
+class _FrameBuffer(object):
+    """
+    Accumulates bytes read from a socket and hands out frame bodies as
+    ``memoryview`` slices, so bodies are not copied on their way to the decoder.
+
+    Offsets passed to :meth:`view` and :meth:`unpack_from` are relative to the
+    first unconsumed byte. Consumed bytes are only dropped by :meth:`compact`,
+    which moves the unread tail into a new ``bytearray``. The previous array is
+    never written again, so views handed out before compacting remain valid.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._start = 0
+
+    def write(self, data):
+        self._buf += data
+
+    def __len__(self):
+        return len(self._buf) - self._start
+
+    # number of unconsumed bytes; kept for callers written against io.BytesIO
+    tell = __len__
+
+    def getvalue(self):
+        return bytes(self._buf[self._start:])
+
+    def peek_byte(self):
+        return self._buf[self._start]
+
+    def unpack_from(self, st, offset=0):
+        return st.unpack_from(self._buf, self._start + offset)
+
+    def view(self, begin, end):
+        start = self._start
+        return memoryview(self._buf)[start + begin:start + end]
+
+    def consume(self, n):
+        self._start += n
+
+    def compact(self):
+        if self._start:
+            self._buf = self._buf[self._start:]
+            self._start = 0
+
 
 NONBLOCKING = (errno.EAGAIN, errno.EWOULDBLOCK)
 
@@ -170,14 +213,57 @@ class ProtocolError(Exception):
 
 
 class ContinuousPagingSession(object):
-    def __init__(self, stream_id, decoder, row_factory, connection):
+    """
+    Receives the pages of a continuous paging request.
+
+    At most `max_queue_size` pages are queued (0 for no limit). Once that
+    many pages are waiting to be consumed, the connection stops reading
+    from its socket until the application takes a page, which holds up
+    the server. Note that responses to other requests on the connection
+    are held up as well while reading is paused.
+
+    If no page arrives within `page_timeout` seconds of the application
+    asking for one, the session is cancelled and :exc:`.OperationTimedOut`
+    is raised.
+    """
+
+    max_queue_depth = 0
+    """
+    The largest number of pages that were queued at once
+    """
+
+    stalls = 0
+    """
+    The number of times reading was paused because the queue was full
+    """
+
+    stall_time = 0.0
+    """
+    The total time, in seconds, reading was paused
+    """
+
+    def __init__(self, stream_id, decoder, row_factory, connection, max_queue_size=0, page_timeout=None,
+                 metrics=None):
         self.stream_id = stream_id
         self.decoder = decoder
         self.row_factory = row_factory
         self.connection = connection
+        self._max_queue_size = max_queue_size
+        self._page_timeout = page_timeout
+        self._metrics = metrics
         self._condition = Condition()
         self._stop = False
         self._page_queue = deque()
+        self._page_callback = None
+        self._page_timer = None
+        self._paused_at = None
+
+    @property
+    def queue_depth(self):
+        """
+        The number of pages received but not yet consumed
+        """
+        return len(self._page_queue)
 
     def on_message(self, result):
         if isinstance(result, ResultMessage):
@@ -189,8 +275,11 @@ class ContinuousPagingSession(object):
         with self._condition:
             self._page_queue.appendleft((result.column_names, result.parsed_rows, None))
             self._stop |= result.continuous_paging_last
+            self.max_queue_depth = max(self.max_queue_depth, len(self._page_queue))
+            self._update_reading()
             self._condition.notify()
 
+        self._notify_page_callback()
         if result.continuous_paging_last:
             self.connection.remove_continuous_paging_session(self.stream_id)
 
@@ -198,36 +287,150 @@ class ContinuousPagingSession(object):
         with self._condition:
             self._page_queue.appendleft((None, None, error.to_exception()))
             self._stop = True
+            self._update_reading()
             self._condition.notify()
 
+        self._notify_page_callback()
         self.connection.remove_continuous_paging_session(self.stream_id)
 
     def results(self):
-        with self._condition:
+        try:
             while True:
-                while not self._page_queue and not self._stop:
-                    # TODO: need to timeout here somehow
-                    self._condition.wait()
-                while self._page_queue:
-                    names, rows, err = self._page_queue.pop()
-                    if err:
-                        raise err
-                    self._condition.release()
-                    for row in self.row_factory(names, rows):
-                        yield row
-                    self._condition.acquire()
-                if self._stop:
-                    break
+                page = self._wait_for_page()
+                if page is None:
+                    return
+                names, rows, err = page
+                if err:
+                    raise err
+                for row in self.row_factory(names, rows):
+                    yield row
+        except GeneratorExit:
+            # abandoned by the application; don't leave the server streaming
+            if not self._stop:
+                self._abort()
+            raise
+
+    def _wait_for_page(self):
+        with self._condition:
+            if self._page_timeout is not None:
+                deadline = time.time() + self._page_timeout
+            while not self._page_queue and not self._stop:
+                remaining = None
+                if self._page_timeout is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                self._condition.wait(remaining)
+            if self._page_queue:
+                return self._pop_page()
+            if self._stop:
+                return None
+
+        self._abort()
+        raise self._timeout_error()
+
+    def next_page(self, callback):
+        """
+        Non-blocking alternative to :meth:`results`. `callback` is called with
+        the next page as a ``(column_names, rows, exception)`` tuple, or with
+        None once the session is finished. If no page is queued yet, it is
+        called from the event loop thread when one arrives.
+        """
+        with self._condition:
+            if not self._page_queue and not self._stop:
+                self._page_callback = callback
+                if self._page_timeout is not None:
+                    self._page_timer = self.connection.create_timer(self._page_timeout, self._on_page_timeout)
+                return
+            page = self._pop_page()
+        callback(page)
+
+    def _notify_page_callback(self):
+        with self._condition:
+            callback = self._page_callback
+            if callback is None:
+                return
+            self._page_callback = None
+            self._cancel_page_timer()
+            page = self._pop_page()
+        callback(page)
+
+    def _on_page_timeout(self):
+        with self._condition:
+            callback = self._page_callback
+            if callback is None:
+                return
+            self._page_callback = None
+            self._page_timer = None
+        self._abort()
+        callback((None, None, self._timeout_error()))
+
+    def _cancel_page_timer(self):
+        if self._page_timer is not None:
+            self._page_timer.cancel()
+            self._page_timer = None
+
+    def _timeout_error(self):
+        return OperationTimedOut("No page received from %s in %s seconds" % (self.connection.host, self._page_timeout),
+                                 self.connection.host)
+
+    def _pop_page(self):
+        # called with the condition held
+        if not self._page_queue:
+            return None
+        page = self._page_queue.pop()
+        self._update_reading()
+        return page
+
+    def _update_reading(self):
+        # called with the condition held; pauses reading while the queue is
+        # full, and resumes it once a page is consumed or the session stops
+        full = bool(self._max_queue_size and not self._stop and len(self._page_queue) >= self._max_queue_size)
+        paused = self._paused_at is not None
+        if full and not paused:
+            if self.connection.pause_reading():
+                self._paused_at = time.time()
+                self.stalls += 1
+            else:
+                log.debug("Connection to %s cannot pause reading; not limiting queued pages of paging session %s",
+                          self.connection.host, self.stream_id)
+                self._max_queue_size = 0
+        elif paused and not full:
+            self.connection.resume_reading()
+            stalled = time.time() - self._paused_at
+            self._paused_at = None
+            self.stall_time += stalled
+            if self._metrics is not None:
+                self._metrics.on_continuous_paging_stall(stalled)
+
+    def __aiter__(self):
+        from dse.aio import ContinuousPagingAsyncIterator
+        return ContinuousPagingAsyncIterator(self)
 
     def cancel(self):
-        log.debug("Canceling paging session %s from %s", self.stream_id, self.connection.host)
-        self.connection.send_msg(CancelMessage(CONTINUOUS_PAGING_OP_TYPE, self.stream_id),
-                                 self.connection.get_request_id(),
-                                 self._on_cancel_response)
         with self._condition:
+            # nothing to cancel once the last page or an error arrived
+            if self._stop:
+                return
             self._stop = True
+            self._update_reading()
             self._condition.notify()
 
+        log.debug("Canceling paging session %s from %s", self.stream_id, self.connection.host)
+        try:
+            self.connection.send_msg(CancelMessage(CONTINUOUS_PAGING_OP_TYPE, self.stream_id),
+                                     self.connection.get_request_id(),
+                                     self._on_cancel_response)
+        finally:
+            self._notify_page_callback()
+
+    def _abort(self):
+        try:
+            self.cancel()
+        except Exception:
+            log.debug("Failed canceling paging session %s from %s", self.stream_id, self.connection.host,
+                      exc_info=True)
+
     def _on_cancel_response(self, response):
         if isinstance(response, ResultMessage):
             log.debug("Paging session %s canceled.", self.stream_id)
@@ -250,12 +453,6 @@ def defunct_on_error(f):
 
 DEFAULT_CQL_VERSION = '3.0.0'
 
-if six.PY3:
-    def int_from_buf_item(i):
-        return i
-else:
-    int_from_buf_item = ord
-
 
 class Connection(object):
 
@@ -264,6 +461,10 @@ class Connection(object):
     in_buffer_size = 4096
     out_buffer_size = 4096
 
+    # Upper bound on the number of queued bytes that reactors which coalesce
+    # writes (asyncore, libev) hand to the socket in a single send call.
+    out_batch_size = 65536
+
     cql_version = None
     protocol_version = ProtocolVersion.MAX_SUPPORTED
 
@@ -308,6 +509,13 @@ class Connection(object):
 
     allow_beta_protocol_version = False
 
+    # True if the reactor can stop reading from the socket (see pause_reading)
+    supports_read_pause = False
+
+    # Outstanding pause_reading() calls
+    _read_pauses = 0
+    _reading_paused = False
+
     _iobuf = None
     _current_frame = None
 
@@ -336,7 +544,7 @@ class Connection(object):
         self.allow_beta_protocol_version = allow_beta_protocol_version
         self._push_watchers = defaultdict(set)
         self._requests = {}
-        self._iobuf = io.BytesIO()
+        self._iobuf = _FrameBuffer()
         self._continuous_paging_sessions = {}
 
         if ssl_options:
@@ -376,6 +584,43 @@ class Connection(object):
     def create_timer(cls, timeout, callback):
         raise NotImplementedError()
 
+    def pause_reading(self):
+        """
+        Stops reading from the socket until :meth:`resume_reading` is called,
+        so that the server stops sending once the socket buffers are full.
+        Pauses nest; reading resumes once each of them has been released.
+
+        Returns :const:`False`, without pausing, if the reactor does not
+        support it.
+        """
+        if not self.supports_read_pause:
+            return False
+        with self.lock:
+            self._read_pauses += 1
+            if self._read_pauses == 1:
+                self._reading_paused = True
+                self._reading_pause_changed()
+        return True
+
+    def resume_reading(self):
+        """
+        Releases a pause taken with :meth:`pause_reading`.
+        """
+        with self.lock:
+            if not self._read_pauses:
+                return
+            self._read_pauses -= 1
+            if not self._read_pauses:
+                self._reading_paused = False
+                self._reading_pause_changed()
+
+    def _reading_pause_changed(self):
+        """
+        Called with :attr:`lock` held when :attr:`_reading_paused` changes.
+        Reactors that set :attr:`supports_read_pause` apply it to the socket.
+        """
+        raise NotImplementedError()
+
     @classmethod
     def factory(cls, host, timeout, *args, **kwargs):
         """
@@ -514,6 +759,51 @@ class Connection(object):
             except Exception:
                 log.exception("Pushed event handler errored, ignoring:")
 
+    def _send_coalesced(self, queue, lock, send, sendmsg=None):
+        """
+        Pops chunks from the front of `queue` until :attr:`out_batch_size`
+        bytes are collected and writes them with a single socket call: `sendmsg`
+        when vectored sends are available, otherwise `send` on the joined chunks.
+        Whatever the socket did not accept is put back at the front of the queue.
+
+        Returns the number of bytes sent, or None if the queue was empty.
+        Socket errors are re-raised once the batch has been requeued.
+        """
+        batch = []
+        size = 0
+        budget = self.out_batch_size
+        with lock:
+            while queue and size < budget:
+                chunk = queue.popleft()
+                batch.append(chunk)
+                size += len(chunk)
+
+        if not batch:
+            return None
+
+        try:
+            if len(batch) == 1:
+                sent = send(batch[0])
+            elif sendmsg is not None:
+                sent = sendmsg(batch)
+            else:
+                sent = send(b''.join(batch))
+        except socket.error:
+            with lock:
+                queue.extendleft(reversed(batch))
+            raise
+
+        if sent < size:
+            remaining = sent
+            for i, chunk in enumerate(batch):
+                if remaining < len(chunk):
+                    unsent = [chunk[remaining:]] + batch[i + 1:]
+                    break
+                remaining -= len(chunk)
+            with lock:
+                queue.extendleft(reversed(unsent))
+        return sent
+
     def send_msg(self, msg, request_id, cb, encoder=ProtocolHandler.encode_message, decoder=ProtocolHandler.decode_message, result_metadata=None):
         if self.is_defunct:
             raise ConnectionShutdown("Connection to %s is defunct" % self.host)
@@ -602,45 +892,46 @@ class Connection(object):
 
     @defunct_on_error
     def _read_frame_header(self):
-        buf = self._iobuf.getvalue()
-        pos = len(buf)
+        iobuf = self._iobuf
+        pos = len(iobuf)
         if pos:
-            version = int_from_buf_item(buf[0]) & PROTOCOL_VERSION_MASK
+            version = iobuf.peek_byte() & PROTOCOL_VERSION_MASK
             if version not in ProtocolVersion.SUPPORTED_VERSIONS:
                 raise ProtocolError("This version of the driver does not support protocol version %d" % version)
             frame_header = frame_header_v3
             # this frame header struct is everything after the version byte
             header_size = frame_header.size + 1
             if pos >= header_size:
-                flags, stream, op, body_len = frame_header.unpack_from(buf, 1)
+                flags, stream, op, body_len = iobuf.unpack_from(frame_header, 1)
                 if body_len < 0:
                     raise ProtocolError("Received negative body length: %r" % body_len)
                 self._current_frame = _Frame(version, flags, stream, op, header_size, body_len + header_size)
         return pos
 
-    def _reset_frame(self):
-        self._iobuf = io.BytesIO(self._iobuf.read())
-        self._iobuf.seek(0, 2)  # io.SEEK_END == 2 (constant not present in 2.6)
-        self._current_frame = None
-
     def process_io_buffer(self):
-        while True:
-            if not self._current_frame:
-                pos = self._read_frame_header()
-            else:
-                pos = self._iobuf.tell()
+        iobuf = self._iobuf
+        try:
+            while True:
+                if not self._current_frame:
+                    pos = self._read_frame_header()
+                else:
+                    pos = len(iobuf)
 
-            if not self._current_frame or pos < self._current_frame.end_pos:
-                # we don't have a complete header yet or we
-                # already saw a header, but we don't have a
-                # complete message yet
-                return
-            else:
-                frame = self._current_frame
-                self._iobuf.seek(frame.body_offset)
-                msg = self._iobuf.read(frame.end_pos - frame.body_offset)
-                self.process_msg(frame, msg)
-                self._reset_frame()
+                if not self._current_frame or pos < self._current_frame.end_pos:
+                    # we don't have a complete header yet or we
+                    # already saw a header, but we don't have a
+                    # complete message yet
+                    return
+                else:
+                    frame = self._current_frame
+                    msg = iobuf.view(frame.body_offset, frame.end_pos)
+                    iobuf.consume(frame.end_pos)
+                    self._current_frame = None
+                    self.process_msg(frame, msg)
+        finally:
+            # drop everything consumed in this pass at once, rather than
+            # shifting the unread tail after every frame
+            iobuf.compact()
 
     @defunct_on_error
     def process_msg(self, header, body):
@@ -691,8 +982,10 @@ class Connection(object):
             with self.lock:
                 self.request_ids.append(stream_id)
 
-    def new_continuous_paging_session(self, stream_id, decoder, row_factory):
-        session = ContinuousPagingSession(stream_id, decoder, row_factory, self)
+    def new_continuous_paging_session(self, stream_id, decoder, row_factory, max_queue_size=0,
+                                      page_timeout=None, metrics=None):
+        session = ContinuousPagingSession(stream_id, decoder, row_factory, self, max_queue_size,
+                                          page_timeout, metrics)
         self._continuous_paging_sessions[stream_id] = session
         return session
 
@@ -939,7 +1232,9 @@ class Connection(object):
 
     @property
     def is_idle(self):
-        return not self.msg_received
+        # while reading is paused nothing can be received, including a
+        # heartbeat reply, so the connection is not treated as idle
+        return not self.msg_received and not self._reading_paused
 
     def reset_idle(self):
         self.msg_received = False
@@ -1130,6 +1425,8 @@ class ConnectionHeartbeat(Thread):
 class Timer(object):
 
     canceled = False
+    _manager = None
+    _slot = None
 
     def __init__(self, timeout, callback):
         self.end = time.time() + timeout
@@ -1140,6 +1437,9 @@ class Timer(object):
 
     def cancel(self):
         self.canceled = True
+        manager = self._manager
+        if manager is not None:
+            manager.remove_timer(self)
 
     def finish(self, time_now):
         if self.canceled:
@@ -1153,16 +1453,60 @@ class Timer(object):
 
 
 class TimerManager(object):
+    """
+    A hashed timer wheel: timers are kept in `slots` buckets, each covering
+    `resolution` seconds of deadlines, so that adding and cancelling a timer
+    are O(1). Cancelled timers are removed right away instead of staying
+    around until they expire.
+
+    Timers may be added and cancelled from any thread, while timeouts are
+    serviced from the event thread. Callbacks still run at the deadline of
+    their timer, not at the end of its bucket.
+    """
 
-    def __init__(self):
-        self._queue = []
-        self._new_timers = []
+    def __init__(self, resolution=0.01, slots=1024, clock=time.time):
+        self.resolution = resolution
+        self._clock = clock
+        self._buckets = [set() for _ in range(slots)]
+        self._tick = int(clock() / resolution)
+        self._count = 0
+        self._next_end = None
+        self._lock = Lock()
+
+    def __len__(self):
+        return self._count
+
+    def __bool__(self):
+        # a manager with no timers is still a manager
+        return True
+
+    __nonzero__ = __bool__
 
     def add_timer(self, timer):
         """
         called from client thread with a Timer object
         """
-        self._new_timers.append((timer.end, timer))
+        with self._lock:
+            if timer.canceled:
+                return
+            # timers already due go in the bucket serviced next
+            tick = max(int(timer.end / self.resolution), self._tick)
+            timer._slot = tick % len(self._buckets)
+            timer._manager = self
+            self._buckets[timer._slot].add(timer)
+            self._count += 1
+            if self._next_end is None or timer.end < self._next_end:
+                self._next_end = timer.end
+
+    def remove_timer(self, timer):
+        """
+        called from any thread when a Timer is cancelled
+        """
+        with self._lock:
+            if timer._manager is self:
+                self._buckets[timer._slot].discard(timer)
+                timer._manager = None
+                self._count -= 1
 
     def service_timeouts(self):
         """
@@ -1170,27 +1514,56 @@ class TimerManager(object):
         Called from the event thread
         :return: next end time, or None
         """
-        queue = self._queue
-        if self._new_timers:
-            new_timers = self._new_timers
-            while new_timers:
-                heappush(queue, new_timers.pop())
-
-        if queue:
-            now = time.time()
-            while queue:
-                try:
-                    timer = queue[0][1]
-                    if timer.finish(now):
-                        heappop(queue)
-                    else:
-                        return timer.end
-                except Exception:
-                    log.exception("Exception while servicing timeout callback: ")
+        now = self._clock()
+        next_end = self._next_end
+        if next_end is None or now < next_end:
+            # nothing can be due before the earliest deadline
+            return next_end
+
+        expired = []
+        with self._lock:
+            buckets = self._buckets
+            current = int(now / self.resolution)
+            if current - self._tick < len(buckets):
+                ticks = range(self._tick, current + 1)
+            else:
+                ticks = range(len(buckets))
+            for tick in ticks:
+                bucket = buckets[tick % len(buckets)]
+                due = [timer for timer in bucket if timer.end <= now]
+                for timer in due:
+                    bucket.remove(timer)
+                    timer._manager = None
+                expired.extend(due)
+            self._count -= len(expired)
+            self._tick = current
+            self._next_end = self._find_next_end()
+
+        expired.sort()
+        for timer in expired:
+            try:
+                timer.finish(now)
+            except Exception:
+                log.exception("Exception while servicing timeout callback: ")
+        return self._next_end
+
+    def _find_next_end(self):
+        """
+        Returns the earliest deadline, or the end of the current revolution
+        of the wheel if every timer expires after it.
+        """
+        if not self._count:
+            return None
+
+        buckets = self._buckets
+        horizon = (self._tick + len(buckets)) * self.resolution
+        # the buckets of the current revolution are ordered by deadline
+        for tick in range(self._tick, self._tick + len(buckets)):
+            ends = [timer.end for timer in buckets[tick % len(buckets)] if timer.end < horizon]
+            if ends:
+                return min(ends)
+        return horizon
 
     @property
     def next_timeout(self):
-        try:
-            return self._queue[0][0]
-        except IndexError:
-            pass
+        return self._next_end
@@ -18,3 +18,23 @@ try:
     HAVE_NUMPY = True
 except ImportError:
     HAVE_NUMPY = False
+
+
+def _module_available(name):
+    """
+    Returns whether module `name` can be imported, without importing it.
+    """
+    try:
+        from importlib.util import find_spec
+    except ImportError:  # Python 2
+        import imp
+        try:
+            imp.find_module(name)
+            return True
+        except ImportError:
+            return False
+    return find_spec(name) is not None
+
+# pyarrow takes long to import, so it is only imported once Arrow results
+# are decoded
+HAVE_ARROW = _module_available('pyarrow')
@@ -11,7 +11,8 @@
 Connection pooling and host management.
 """
 
-from functools import total_ordering
+from collections import deque
+from functools import partial, total_ordering
 import logging
 import time
 from threading import Lock, RLock, Condition
@@ -298,7 +299,38 @@ class _HostReconnectionHandler(_ReconnectionHandler):
             return True
 
 
+class _PendingRequest(object):
+    """
+    A request waiting in a :class:`HostConnection` for a free request ID.
+    """
+
+    __slots__ = ('callback', 'enqueued_at', 'timer', 'done')
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.enqueued_at = time.time()
+        self.timer = None
+        self.done = False
+
+
 class HostConnection(object):
+    """
+    A pool of connections to a single host.
+
+    The pool opens :meth:`.Cluster.get_core_connections_per_host` connections
+    when it is created. Requests are always placed on the least busy
+    connection. When even the least busy connection has more than
+    :meth:`.Cluster.get_max_requests_per_connection` requests in flight, an
+    additional connection is opened in the background, up to
+    :meth:`.Cluster.get_max_connections_per_host`. Connections above the core
+    count whose load drops below :meth:`.Cluster.get_min_requests_per_connection`
+    are trashed, and closed once their outstanding requests complete.
+
+    When every request ID of every connection is in use,
+    :meth:`borrow_connection_or_park` parks requests in a queue of up to
+    :attr:`.Cluster.max_pending_requests_per_host` entries, and hands them a
+    connection as soon as a request ID is returned.
+    """
 
     host = None
     host_distance = None
@@ -306,9 +338,19 @@ class HostConnection(object):
     shutdown_on_error = False
 
     _session = None
-    _connection = None
+    _connections = None
+    _trash = None
     _lock = None
     _keyspace = None
+    _pending = None
+    _pending_count = 0
+
+    trash_delay = 10
+    """
+    Minimum time, in seconds, between two connections being trashed by the
+    same pool. This keeps a pool from churning sockets when the load
+    oscillates around the thresholds.
+    """
 
     def __init__(self, host, host_distance, session):
         self.host = host
@@ -317,7 +359,11 @@ class HostConnection(object):
         self._lock = Lock()
         # this is used in conjunction with the connection streams. Not using the connection lock because the connection can be replaced in the lifetime of the pool.
         self._stream_available_condition = Condition(self._lock)
-        self._is_replacing = False
+        self._connections = []
+        self._trash = set()
+        self._pending = deque()
+        self._scheduled_for_creation = 0
+        self._next_trash_allowed_at = time.time()
 
         if host_distance == HostDistance.IGNORED:
             log.debug("Not opening connection to ignored host %s", self.host)
@@ -326,29 +372,43 @@ class HostConnection(object):
             log.debug("Not opening connection to remote host %s", self.host)
             return
 
-        log.debug("Initializing connection for host %s", self.host)
-        self._connection = session.cluster.connection_factory(host.address)
-        self._keyspace = session.keyspace
-        if self._keyspace:
-            self._connection.set_keyspace_blocking(self._keyspace)
-        log.debug("Finished initializing connection for host %s", self.host)
+        core_conns = session.cluster.get_core_connections_per_host(host_distance)
+        log.debug("Initializing %d connection(s) for host %s", core_conns, self.host)
+        connections = []
+        try:
+            for _ in range(core_conns):
+                connections.append(session.cluster.connection_factory(host.address))
+
+            self._keyspace = session.keyspace
+            if self._keyspace:
+                for conn in connections:
+                    conn.set_keyspace_blocking(self._keyspace)
+        except Exception:
+            for conn in connections:
+                conn.close()
+            raise
+
+        self._connections = connections
+        log.debug("Finished initializing connections for host %s", self.host)
+
+    @property
+    def _connection(self):
+        # first connection of the pool; kept for callers that predate multiple connections per host
+        conns = self._connections
+        return conns[0] if conns else None
 
     def borrow_connection(self, timeout):
         if self.is_shutdown:
             raise ConnectionException(
                 "Pool for %s is shutdown" % (self.host,), self.host)
 
-        conn = self._connection
-        if not conn:
-            raise NoConnectionsAvailable()
-
         start = time.time()
         remaining = timeout
         while True:
-            with conn.lock:
-                if conn.in_flight <= conn.max_request_id:
-                    conn.in_flight += 1
-                    return conn, conn.get_request_id()
+            borrowed = self._try_borrow()
+            if borrowed is not None:
+                return borrowed
+
             if timeout is not None:
                 remaining = timeout - time.time() + start
                 if remaining < 0:
@@ -356,13 +416,157 @@ class HostConnection(object):
             with self._stream_available_condition:
                 self._stream_available_condition.wait(remaining)
 
+            if self.is_shutdown:
+                raise ConnectionException(
+                    "Pool for %s is shutdown" % (self.host,), self.host)
+
         raise NoConnectionsAvailable("All request IDs are currently in use")
 
+    def borrow_connection_or_park(self, callback):
+        """
+        Like :meth:`borrow_connection`, but never blocks.
+
+        If every request ID is in use, `callback` is parked and :const:`None`
+        is returned. Once a request ID is free, `callback` is called with
+        ``(connection, request_id, None)``, and must return :const:`False` if
+        it does not use the connection. If none frees up within
+        :attr:`.Cluster.pending_request_timeout` seconds, or the pool is shut
+        down, it is called with ``(None, None, exception)`` instead.
+
+        Raises :exc:`.NoConnectionsAvailable` right away if
+        :attr:`.Cluster.max_pending_requests_per_host` requests are already
+        parked.
+        """
+        if self.is_shutdown:
+            raise ConnectionException(
+                "Pool for %s is shutdown" % (self.host,), self.host)
+
+        # requests already parked go first
+        if not self._pending_count:
+            borrowed = self._try_borrow()
+            if borrowed is not None:
+                return borrowed
+
+        cluster = self._session.cluster
+        with self._lock:
+            if self.is_shutdown:
+                raise ConnectionException(
+                    "Pool for %s is shutdown" % (self.host,), self.host)
+            if self._pending_count >= cluster.max_pending_requests_per_host:
+                raise NoConnectionsAvailable("All request IDs are currently in use and %d requests are "
+                                             "already waiting" % (self._pending_count,))
+            request = _PendingRequest(callback)
+            self._pending.append(request)
+            self._pending_count += 1
+
+        if cluster.pending_request_timeout is not None:
+            request.timer = cluster.connection_class.create_timer(cluster.pending_request_timeout,
+                                                                  partial(self._expire_pending, request))
+            if request.done:
+                request.timer.cancel()
+
+        # a request ID may have been returned before the request was parked
+        self._dispatch_pending()
+        return None
+
+    def _try_borrow(self):
+        conns = self._connections
+        if not conns:
+            raise NoConnectionsAvailable()
+
+        least_busy = min(conns, key=lambda c: c.in_flight)
+        with least_busy.lock:
+            if least_busy.in_flight > least_busy.max_request_id:
+                return None
+            least_busy.in_flight += 1
+            in_flight = least_busy.in_flight
+            request_id = least_busy.get_request_id()
+
+        if in_flight >= self._session.cluster.get_max_requests_per_connection(self.host_distance):
+            self._maybe_spawn_new_connection()
+        return least_busy, request_id
+
+    def _dispatch_pending(self):
+        while self._pending_count:
+            try:
+                borrowed = self._try_borrow()
+            except NoConnectionsAvailable:
+                return
+            if borrowed is None:
+                return
+
+            connection, request_id = borrowed
+            request = None
+            with self._lock:
+                while self._pending:
+                    request = self._pending.popleft()
+                    if not request.done:
+                        request.done = True
+                        self._pending_count -= 1
+                        break
+                    request = None
+
+            if request is None:
+                self._release(connection, request_id)
+                return
+
+            if request.timer:
+                request.timer.cancel()
+            metrics = self._session.cluster.metrics
+            if metrics is not None:
+                metrics.on_pending_request(time.time() - request.enqueued_at)
+
+            try:
+                used = request.callback(connection, request_id, None)
+            except Exception:
+                log.exception("Unexpected error handing a connection to %s to a pending request", self.host)
+                self._release(connection, request_id)
+                continue
+            if used is False:
+                self._release(connection, request_id)
+
+    def _release(self, connection, request_id):
+        """
+        Gives back a request ID that was borrowed but not used.
+        """
+        with connection.lock:
+            connection.request_ids.append(request_id)
+            connection.in_flight -= 1
+
+    def _expire_pending(self, request):
+        with self._lock:
+            if request.done:
+                return
+            request.done = True
+            self._pending_count -= 1
+
+        request.callback(None, None, NoConnectionsAvailable(
+            "No request ID was returned within %s seconds" % (self._session.cluster.pending_request_timeout,)))
+
+    def _fail_pending(self, exc):
+        with self._lock:
+            pending = [request for request in self._pending if not request.done]
+            for request in pending:
+                request.done = True
+            self._pending.clear()
+            self._pending_count = 0
+
+        for request in pending:
+            if request.timer:
+                request.timer.cancel()
+            try:
+                request.callback(None, None, exc)
+            except Exception:
+                log.exception("Unexpected error failing a pending request to %s", self.host)
+
     def return_connection(self, connection):
         with connection.lock:
             connection.in_flight -= 1
+            in_flight = connection.in_flight
         with self._stream_available_condition:
             self._stream_available_condition.notify()
+        if self._pending_count:
+            self._dispatch_pending()
 
         if connection.is_defunct or connection.is_closed:
             if connection.signaled_error and not self.shutdown_on_error:
@@ -383,12 +587,23 @@ class HostConnection(object):
             if is_down:
                 self.shutdown()
             else:
-                self._connection = None
                 with self._lock:
-                    if self._is_replacing:
+                    self._trash.discard(connection)
+                    if connection not in self._connections:
+                        return
+                    self._connections = [c for c in self._connections if c is not connection]
+                self._session.submit(self._replace, connection)
+        elif connection in self._trash:
+            if not in_flight:
+                with self._lock:
+                    if connection not in self._trash:
                         return
-                    self._is_replacing = True
-                    self._session.submit(self._replace, connection)
+                    self._trash.discard(connection)
+                log.debug("Closing trashed connection (%s) to %s", id(connection), self.host)
+                connection.close()
+        elif len(self._connections) > 1 and \
+                in_flight <= self._session.cluster.get_min_requests_per_connection(self.host_distance):
+            self._maybe_trash_connection(connection)
 
     def _replace(self, connection):
         with self._lock:
@@ -400,14 +615,114 @@ class HostConnection(object):
             conn = self._session.cluster.connection_factory(self.host.address)
             if self._keyspace:
                 conn.set_keyspace_blocking(self._keyspace)
-            self._connection = conn
         except Exception:
             log.warning("Failed reconnecting %s. Retrying." % (self.host.address,))
             self._session.submit(self._replace, connection)
         else:
             with self._lock:
-                self._is_replacing = False
+                if self.is_shutdown:
+                    conn.close()
+                    return
+                self._connections = self._connections + [conn]
                 self._stream_available_condition.notify()
+        self._dispatch_pending()
+
+    def _maybe_spawn_new_connection(self):
+        with self._lock:
+            if self.is_shutdown:
+                return
+            max_conns = self._session.cluster.get_max_connections_per_host(self.host_distance)
+            if len(self._connections) + self._scheduled_for_creation >= max_conns:
+                return
+            self._scheduled_for_creation += 1
+
+        log.debug("Submitting task for creation of new connection to %s", self.host)
+        if not self._session.submit(self._create_new_connection):
+            with self._lock:
+                self._scheduled_for_creation -= 1
+
+    def _create_new_connection(self):
+        try:
+            self._add_conn_if_under_max()
+        except Exception:
+            log.exception("Unexpectedly failed to create new connection to %s", self.host)
+        finally:
+            with self._lock:
+                self._scheduled_for_creation -= 1
+
+    def _add_conn_if_under_max(self):
+        max_conns = self._session.cluster.get_max_connections_per_host(self.host_distance)
+        if self.is_shutdown or len(self._connections) >= max_conns:
+            return False
+
+        log.debug("Going to open new connection to host %s", self.host)
+        try:
+            conn = self._session.cluster.connection_factory(self.host.address)
+            if self._keyspace:
+                conn.set_keyspace_blocking(self._keyspace)
+        except Exception as exc:
+            log.warning("Failed to open additional connection to %s: %s", self.host, exc)
+            return False
+
+        with self._lock:
+            if self.is_shutdown or len(self._connections) >= max_conns:
+                close = True
+            else:
+                close = False
+                self._next_trash_allowed_at = time.time() + self.trash_delay
+                self._connections = self._connections + [conn]
+                self._stream_available_condition.notify()
+
+        if close:
+            conn.close()
+            return False
+
+        log.debug("Added new connection (%s) to pool for host %s", id(conn), self.host)
+        self._dispatch_pending()
+        return True
+
+    def _maybe_trash_connection(self, connection):
+        core_conns = self._session.cluster.get_core_connections_per_host(self.host_distance)
+        with self._lock:
+            if self.is_shutdown or len(self._connections) <= core_conns:
+                return
+            if time.time() < self._next_trash_allowed_at:
+                return
+            if connection not in self._connections:
+                return
+            self._next_trash_allowed_at = time.time() + self.trash_delay
+            self._connections = [c for c in self._connections if c is not connection]
+            self._trash.add(connection)
+
+        with connection.lock:
+            in_flight = connection.in_flight
+        if not in_flight:
+            with self._lock:
+                if connection not in self._trash:
+                    return
+                self._trash.discard(connection)
+            log.debug("Closing idle connection (%s) to %s", id(connection), self.host)
+            connection.close()
+        else:
+            log.debug("Trashed connection (%s) to %s; it will be closed once its %d in-flight requests complete",
+                      id(connection), self.host, in_flight)
+
+    def ensure_core_connections(self):
+        """
+        Opens connections until the pool holds at least
+        :meth:`.Cluster.get_core_connections_per_host` connections.
+        Intended for internal use only.
+        """
+        if self.is_shutdown or self.host_distance == HostDistance.IGNORED:
+            return
+
+        core_conns = self._session.cluster.get_core_connections_per_host(self.host_distance)
+        for _ in range(core_conns - len(self._connections) - self._scheduled_for_creation):
+            with self._lock:
+                self._scheduled_for_creation += 1
+            if not self._session.submit(self._create_new_connection):
+                with self._lock:
+                    self._scheduled_for_creation -= 1
 
     def shutdown(self):
         with self._lock:
@@ -416,34 +731,45 @@ class HostConnection(object):
             else:
                 self.is_shutdown = True
             self._stream_available_condition.notify_all()
+            connections = self._connections + list(self._trash)
+            self._connections = []
+            self._trash = set()
 
-        if self._connection:
-            self._connection.close()
-            self._connection = None
+        self._fail_pending(ConnectionException("Pool for %s is shutdown" % (self.host,), self.host))
+        for conn in connections:
+            conn.close()
 
     def _set_keyspace_for_all_conns(self, keyspace, callback):
-        if self.is_shutdown or not self._connection:
+        connections = self._connections
+        if self.is_shutdown or not connections:
             return
 
+        remaining_callbacks = set(connections)
+        errors = []
+
         def connection_finished_setting_keyspace(conn, error):
             self.return_connection(conn)
-            errors = [] if not error else [error]
-            callback(self, errors)
+            with self._lock:
+                remaining_callbacks.discard(conn)
+                if error:
+                    errors.append(error)
+                done = not remaining_callbacks
+            if done:
+                callback(self, errors)
 
         self._keyspace = keyspace
-        self._connection.set_keyspace_async(keyspace, connection_finished_setting_keyspace)
+        for conn in connections:
+            conn.set_keyspace_async(keyspace, connection_finished_setting_keyspace)
 
     def get_connections(self):
-        c = self._connection
-        return [c] if c else []
+        return list(self._connections) + list(self._trash)
 
     def get_state(self):
-        connection = self._connection
-        open_count = 1 if connection and not (connection.is_closed or connection.is_defunct) else 0
-        in_flights = [connection.in_flight] if connection else []
-        return {'shutdown': self.is_shutdown, 'open_count': open_count, 'in_flights': in_flights}
+        connections = self._connections
+        in_flights = [c.in_flight for c in connections]
+        return {'shutdown': self.is_shutdown, 'open_count': self.open_count,
+                'in_flights': in_flights, 'trashed': len(self._trash), 'pending': self._pending_count}
 
     @property
     def open_count(self):
-        connection = self._connection
-        return 1 if connection and not (connection.is_closed or connection.is_defunct) else 0
+        return sum(1 for c in self._connections if not (c.is_closed or c.is_defunct))
@@ -0,0 +1,285 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+"""
+Module that implements an event loop based on :mod:`asyncio`.
+
+Requires Python 3.5+ and an event loop that supports ``add_reader`` and
+``add_writer`` (any selector based loop; not the Windows proactor loop).
+"""
+import asyncio
+import atexit
+from collections import deque
+from functools import partial
+import logging
+import os
+import socket
+import ssl
+from threading import Lock, Thread
+import time
+import weakref
+
+from dse.connection import (Connection, ConnectionShutdown,
+                            NONBLOCKING, Timer, TimerManager)
+
+
+log = logging.getLogger(__name__)
+
+
+def _cleanup(loop_weakref):
+    loop = loop_weakref()
+    if loop:
+        loop._cleanup()
+
+
+class AsyncioLoop(object):
+    """
+    Drives connection IO and timers on an asyncio event loop. The loop is
+    either supplied by the application, which remains responsible for running
+    it, or created here and run in a daemon thread.
+    """
+
+    def __init__(self, loop=None):
+        self._pid = os.getpid()
+        self._lock = Lock()
+        self._thread = None
+        self._owns_loop = loop is None
+        self._loop = loop or asyncio.new_event_loop()
+
+        self._timers = TimerManager()
+        self._timer_handle = None
+        self._timer_deadline = None
+
+    def maybe_start(self):
+        if not self._owns_loop:
+            return
+
+        with self._lock:
+            if not self._thread:
+                self._thread = Thread(target=self._run_loop, name="dse_driver_event_loop")
+                self._thread.daemon = True
+                self._thread.start()
+                atexit.register(partial(_cleanup, weakref.ref(self)))
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _cleanup(self):
+        if self._thread:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=1.0)
+            if self._thread.is_alive():
+                log.warning("Event loop thread could not be joined, so "
+                            "shutdown may not be clean. Please call "
+                            "Cluster.shutdown() to avoid this.")
+            log.debug("Event loop thread was joined")
+
+    def call_soon(self, fn, *args):
+        """
+        Schedules `fn` to run on the event loop; safe to call from any thread.
+        """
+        self._loop.call_soon_threadsafe(fn, *args)
+
+    def add_timer(self, timer):
+        self._timers.add_timer(timer)
+        # TimerManager and the loop timer handle are only touched from the loop
+        self.call_soon(self._schedule_timeout, timer.end)
+
+    def _schedule_timeout(self, next_timeout):
+        if next_timeout is None:
+            return
+
+        if self._timer_handle:
+            if next_timeout >= self._timer_deadline:
+                return
+            self._timer_handle.cancel()
+
+        self._timer_deadline = next_timeout
+        self._timer_handle = self._loop.call_later(max(next_timeout - time.time(), 0), self._on_loop_timer)
+
+    def _on_loop_timer(self):
+        self._timer_handle = None
+        self._timers.service_timeouts()
+        self._schedule_timeout(self._timers.next_timeout)
+
+
+class AsyncioConnection(Connection):
+    """
+    An implementation of :class:`.Connection` that uses an :mod:`asyncio`
+    event loop.
+
+    By default the driver creates its own loop and runs it in a daemon thread.
+    To share the application's loop instead, pass it to
+    :meth:`initialize_reactor` before the cluster connects::
+
+        AsyncioConnection.initialize_reactor(loop)
+        cluster = Cluster(connection_class=AsyncioConnection)
+        session = await loop.run_in_executor(None, cluster.connect)
+        rows = await session.execute_async("SELECT * FROM users")
+
+    The blocking :meth:`.Cluster.connect` and :meth:`.Session.execute` wait for
+    IO that is serviced by this loop, so with a shared loop they must be called
+    from another thread, as above. Await :meth:`.Session.execute_async` instead.
+    """
+
+    _asyncioloop = None
+    _writer_active = False
+    _socket = None
+
+    supports_read_pause = True
+
+    @classmethod
+    def initialize_reactor(cls, loop=None):
+        """
+        Sets up the event loop used by all connections of this class. When
+        `loop` is given, connections are serviced by it and the caller is
+        responsible for running it. Otherwise a private loop is started in a
+        background thread on first use.
+        """
+        if loop is not None:
+            if not cls._asyncioloop or cls._asyncioloop._loop is not loop:
+                cls._asyncioloop = AsyncioLoop(loop)
+        elif not cls._asyncioloop:
+            cls._asyncioloop = AsyncioLoop()
+        elif cls._asyncioloop._pid != os.getpid():
+            log.debug("Detected fork, clearing and reinitializing reactor state")
+            cls.handle_fork()
+            cls._asyncioloop = AsyncioLoop()
+
+    @classmethod
+    def handle_fork(cls):
+        cls._asyncioloop = None
+
+    @classmethod
+    def create_timer(cls, timeout, callback):
+        timer = Timer(timeout, callback)
+        cls._asyncioloop.add_timer(timer)
+        return timer
+
+    def __init__(self, *args, **kwargs):
+        Connection.__init__(self, *args, **kwargs)
+
+        self.deque = deque()
+        self._deque_lock = Lock()
+        self._connect_socket()
+        self._socket.setblocking(0)
+        self._fileno = self._socket.fileno()
+
+        self._asyncioloop.call_soon(self._start_reading)
+        self._send_options_message()
+
+        # start the event loop if needed
+        self._asyncioloop.maybe_start()
+
+    def _start_reading(self):
+        if not self.is_closed and not self._reading_paused:
+            self._asyncioloop._loop.add_reader(self._fileno, self.handle_read)
+
+    def _reading_pause_changed(self):
+        self._asyncioloop.call_soon(self._apply_reading_pause)
+
+    def _apply_reading_pause(self):
+        if self.is_closed:
+            return
+        if self._reading_paused:
+            self._asyncioloop._loop.remove_reader(self._fileno)
+        else:
+            self._asyncioloop._loop.add_reader(self._fileno, self.handle_read)
+
+    def _start_writing(self):
+        if not self.is_closed:
+            self._asyncioloop._loop.add_writer(self._fileno, self.handle_write)
+
+    def _close_socket(self):
+        loop = self._asyncioloop._loop
+        loop.remove_reader(self._fileno)
+        loop.remove_writer(self._fileno)
+        self._socket.close()
+        log.debug("Closed socket to %s", self.host)
+
+    def close(self):
+        with self.lock:
+            if self.is_closed:
+                return
+            self.is_closed = True
+
+        log.debug("Closing connection (%s) to %s", id(self), self.host)
+        # the socket must be unregistered from the loop before it is closed
+        self._asyncioloop.call_soon(self._close_socket)
+
+        if not self.is_defunct:
+            self.error_all_requests(
+                ConnectionShutdown("Connection to %s was closed" % self.host))
+
+            # This happens when the connection is shutdown while waiting for the ReadyMessage
+            if not self.connected_event.is_set():
+                self.last_error = ConnectionShutdown("Connection to %s was closed" % self.host)
+
+            # don't leave in-progress operations hanging
+            self.connected_event.set()
+
+    def handle_write(self):
+        sendmsg = None if self.ssl_options else getattr(self._socket, 'sendmsg', None)
+        try:
+            self._send_coalesced(self.deque, self._deque_lock, self._socket.send, sendmsg)
+        except socket.error as err:
+            if err.args[0] not in NONBLOCKING:
+                self.defunct(err)
+                return
+
+        with self._deque_lock:
+            if self.deque:
+                return
+            self._writer_active = False
+        # a push racing with this re-registers the writer through call_soon,
+        # which runs after we return
+        self._asyncioloop._loop.remove_writer(self._fileno)
+
+    def handle_read(self):
+        closed_by_server = False
+        try:
+            while True:
+                buf = self._socket.recv(self.in_buffer_size)
+                if not buf:
+                    closed_by_server = True
+                    break
+                self._iobuf.write(buf)
+                if len(buf) < self.in_buffer_size:
+                    break
+        except socket.error as err:
+            if isinstance(err, ssl.SSLError):
+                if err.args[0] not in (ssl.SSL_ERROR_WANT_READ, ssl.SSL_ERROR_WANT_WRITE):
+                    self.defunct(err)
+                    return
+            elif err.args[0] not in NONBLOCKING:
+                self.defunct(err)
+                return
+
+        if self._iobuf.tell():
+            self.process_io_buffer()
+
+        if closed_by_server:
+            log.debug("Connection %s closed by server", self)
+            self.close()
+
+    def push(self, data):
+        sabs = self.out_buffer_size
+        if len(data) > sabs:
+            chunks = []
+            for i in range(0, len(data), sabs):
+                chunks.append(data[i:i + sabs])
+        else:
+            chunks = [data]
+
+        with self._deque_lock:
+            self.deque.extend(chunks)
+            if self._writer_active:
+                return
+            self._writer_active = True
+        self._asyncioloop.call_soon(self._start_writing)
@@ -268,6 +268,8 @@ class AsyncoreConnection(Connection, asyncore.dispatcher):
     _writable = False
     _readable = False
 
+    supports_read_pause = True
+
     @classmethod
     def initialize_reactor(cls):
         if not cls._loop:
@@ -341,30 +343,21 @@ class AsyncoreConnection(Connection, asyncore.dispatcher):
         self.close()
 
     def handle_write(self):
-        while True:
-            with self.deque_lock:
-                try:
-                    next_msg = self.deque.popleft()
-                except IndexError:
-                    self._writable = False
-                    return
+        # flush at most one coalesced batch per loop iteration; the loop calls
+        # back while we remain writable
+        sendmsg = None if self.ssl_options else getattr(self.socket, 'sendmsg', None)
+        try:
+            sent = self._send_coalesced(self.deque, self.deque_lock, self.send, sendmsg)
+        except socket.error as err:
+            if err.args[0] not in NONBLOCKING:
+                self.defunct(err)
+            return
 
-            try:
-                sent = self.send(next_msg)
-                self._readable = True
-            except socket.error as err:
-                if (err.args[0] in NONBLOCKING):
-                    with self.deque_lock:
-                        self.deque.appendleft(next_msg)
-                else:
-                    self.defunct(err)
-                return
-            else:
-                if sent < len(next_msg):
-                    with self.deque_lock:
-                        self.deque.appendleft(next_msg[sent:])
-                    if sent == 0:
-                        return
+        if sent is not None:
+            self._readable = True
+        with self.deque_lock:
+            if not self.deque:
+                self._writable = False
 
     def handle_read(self):
         try:
@@ -404,5 +397,10 @@ class AsyncoreConnection(Connection, asyncore.dispatcher):
     def writable(self):
         return self._writable
 
+    def _reading_pause_changed(self):
+        self._loop.wake_loop()
+
     def readable(self):
+        if self._reading_paused:
+            return False
         return self._readable or ((self.is_control_connection or self._continuous_paging_sessions) and not (self.is_defunct or self.is_closed))
@@ -47,7 +47,7 @@ class EventletConnection(Connection):
     @classmethod
     def initialize_reactor(cls):
         eventlet.monkey_patch()
-        if not cls._timers:
+        if cls._timers is None:
             cls._timers = TimerManager()
             cls._timeout_watcher = eventlet.spawn(cls.service_timeouts)
             cls._new_timer = Event()
@@ -42,7 +42,7 @@ class GeventConnection(Connection):
 
     @classmethod
     def initialize_reactor(cls):
-        if not cls._timers:
+        if cls._timers is None:
             cls._timers = TimerManager()
             cls._timeout_watcher = gevent.spawn(cls.service_timeouts)
             cls._new_timer = gevent.event.Event()
@@ -183,6 +183,14 @@ class LibevLoop(object):
                 conn._write_watcher_is_active = True
                 changed = True
 
+            if conn._read_watcher_is_active == conn._reading_paused and conn._read_watcher:
+                if conn._reading_paused:
+                    conn._read_watcher.stop()
+                else:
+                    conn._read_watcher.start()
+                conn._read_watcher_is_active = not conn._reading_paused
+                changed = True
+
         if self._new_conns:
             with self._conn_set_lock:
                 to_start = self._new_conns
@@ -190,6 +198,7 @@ class LibevLoop(object):
 
             for conn in to_start:
                 conn._read_watcher.start()
+                conn._read_watcher_is_active = True
 
             changed = True
 
@@ -223,10 +232,13 @@ class LibevConnection(Connection):
     """
     _libevloop = None
     _write_watcher_is_active = False
+    _read_watcher_is_active = False
     _read_watcher = None
     _write_watcher = None
     _socket = None
 
+    supports_read_pause = True
+
     @classmethod
     def initialize_reactor(cls):
         if not cls._libevloop:
@@ -294,26 +306,14 @@ class LibevConnection(Connection):
             self.defunct(exc)
             return
 
-        while True:
-            try:
-                with self._deque_lock:
-                    next_msg = self.deque.popleft()
-            except IndexError:
-                return
-
-            try:
-                sent = self._socket.send(next_msg)
-            except socket.error as err:
-                if (err.args[0] in NONBLOCKING):
-                    with self._deque_lock:
-                        self.deque.appendleft(next_msg)
-                else:
-                    self.defunct(err)
-                return
-            else:
-                if sent < len(next_msg):
-                    with self._deque_lock:
-                        self.deque.appendleft(next_msg[sent:])
+        # flush at most one coalesced batch per wakeup; the write watcher stays
+        # active while the deque is non-empty
+        sendmsg = None if self.ssl_options else getattr(self._socket, 'sendmsg', None)
+        try:
+            self._send_coalesced(self.deque, self._deque_lock, self._socket.send, sendmsg)
+        except socket.error as err:
+            if err.args[0] not in NONBLOCKING:
+                self.defunct(err)
 
     def handle_read(self, watcher, revents, errno=None):
         if revents & libev.EV_ERROR:
@@ -345,6 +345,10 @@ class LibevConnection(Connection):
             log.debug("Connection %s closed by server", self)
             self.close()
 
+    def _reading_pause_changed(self):
+        # the read watcher is started or stopped from the loop thread
+        self._libevloop.notify()
+
     def push(self, data):
         sabs = self.out_buffer_size
         if len(data) > sabs:
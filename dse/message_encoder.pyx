@@ -0,0 +1,261 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+
+"""
+Encodes QUERY, EXECUTE and BATCH request frames into a single growable
+buffer. This replaces the two BytesIO objects and per-field write_* calls of
+_ProtocolHandler.encode_message for the requests sent most often.
+
+Bound values are expected to be serialized already (BoundStatement.bind does
+that); they are copied once, straight into the frame.
+"""
+
+from cpython.bytes cimport PyBytes_AS_STRING, PyBytes_GET_SIZE, PyBytes_FromStringAndSize
+from cpython.mem cimport PyMem_Malloc, PyMem_Realloc, PyMem_Free
+from libc.stdint cimport int16_t, int32_t, int64_t, uint8_t, uint16_t, uint32_t, uint64_t
+from libc.string cimport memcpy
+
+import six
+
+# must match the values used in dse.protocol
+DEF QUERY_OPCODE = 0x07
+DEF EXECUTE_OPCODE = 0x0A
+DEF BATCH_OPCODE = 0x0D
+
+DEF VALUES_FLAG = 0x01
+DEF SKIP_METADATA_FLAG = 0x02
+DEF PAGE_SIZE_FLAG = 0x04
+DEF WITH_PAGING_STATE_FLAG = 0x08
+DEF WITH_SERIAL_CONSISTENCY_FLAG = 0x10
+DEF PROTOCOL_TIMESTAMP_FLAG = 0x20
+DEF PAGE_SIZE_BYTES_FLAG = 0x40000000
+DEF PAGING_OPTIONS_FLAG = 0x80000000
+
+DEF HEADER_SIZE = 9
+
+
+cdef class FrameWriter:
+    """
+    Append-only buffer of big-endian protocol primitives. Space for the frame
+    header is reserved up front and filled in by finish().
+    """
+
+    cdef char *buf
+    cdef Py_ssize_t size
+    cdef Py_ssize_t capacity
+
+    def __cinit__(self, Py_ssize_t capacity=256):
+        if capacity < HEADER_SIZE:
+            capacity = HEADER_SIZE
+        self.buf = <char *> PyMem_Malloc(capacity)
+        if self.buf == NULL:
+            raise MemoryError()
+        self.capacity = capacity
+        self.size = HEADER_SIZE
+
+    def __dealloc__(self):
+        PyMem_Free(self.buf)
+
+    cdef int reserve(self, Py_ssize_t n) except -1:
+        cdef Py_ssize_t needed = self.size + n
+        cdef Py_ssize_t new_capacity = self.capacity
+        cdef char *new_buf
+        if needed <= self.capacity:
+            return 0
+        while new_capacity < needed:
+            new_capacity *= 2
+        new_buf = <char *> PyMem_Realloc(self.buf, new_capacity)
+        if new_buf == NULL:
+            raise MemoryError()
+        self.buf = new_buf
+        self.capacity = new_capacity
+        return 0
+
+    cdef inline int write_raw(self, const char *data, Py_ssize_t n) except -1:
+        self.reserve(n)
+        memcpy(self.buf + self.size, data, n)
+        self.size += n
+        return 0
+
+    cdef inline int write_uint_be(self, uint64_t value, int width) except -1:
+        cdef int i
+        self.reserve(width)
+        for i in range(width):
+            self.buf[self.size + width - 1 - i] = <char> (value & 0xff)
+            value >>= 8
+        self.size += width
+        return 0
+
+    cdef inline int write_byte(self, uint8_t value) except -1:
+        return self.write_uint_be(value, 1)
+
+    cdef inline int write_short(self, uint16_t value) except -1:
+        return self.write_uint_be(value, 2)
+
+    cdef inline int write_int(self, int32_t value) except -1:
+        return self.write_uint_be(<uint32_t> value, 4)
+
+    cdef inline int write_uint(self, uint32_t value) except -1:
+        return self.write_uint_be(value, 4)
+
+    cdef inline int write_long(self, int64_t value) except -1:
+        return self.write_uint_be(<uint64_t> value, 8)
+
+    cdef int write_bytes(self, bytes data) except -1:
+        return self.write_raw(PyBytes_AS_STRING(data), PyBytes_GET_SIZE(data))
+
+    cdef int write_string(self, s) except -1:
+        cdef bytes b
+        if isinstance(s, six.text_type):
+            s = s.encode('utf8')
+        b = s
+        self.write_short(PyBytes_GET_SIZE(b))
+        return self.write_bytes(b)
+
+    cdef int write_longstring(self, s) except -1:
+        cdef bytes b
+        if isinstance(s, six.text_type):
+            s = s.encode('utf8')
+        b = s
+        self.write_int(PyBytes_GET_SIZE(b))
+        return self.write_bytes(b)
+
+    cdef int write_value(self, v, unset_value) except -1:
+        cdef bytes b
+        if v is None:
+            return self.write_int(-1)
+        if v is unset_value:
+            return self.write_int(-2)
+        b = v if type(v) is bytes else bytes(v)
+        self.write_int(PyBytes_GET_SIZE(b))
+        return self.write_bytes(b)
+
+    cdef bytes finish(self, int protocol_version, int flags, int stream_id, int opcode):
+        cdef Py_ssize_t body_size = self.size - HEADER_SIZE
+        cdef Py_ssize_t end = self.size
+        # the header goes in the space reserved at the front
+        self.size = 0
+        self.write_byte(protocol_version)
+        self.write_byte(flags)
+        self.write_uint_be(<uint16_t> (<int16_t> stream_id), 2)
+        self.write_byte(opcode)
+        self.write_int(body_size)
+        self.size = end
+        return PyBytes_FromStringAndSize(self.buf, self.size)
+
+
+cdef int _write_query_params(FrameWriter w, msg, bint int_query_flags, unset_value) except -1:
+    cdef uint32_t flags = 0
+    query_params = msg.query_params
+    serial_consistency_level = msg.serial_consistency_level
+    fetch_size = msg.fetch_size
+    paging_state = msg.paging_state
+    timestamp = msg.timestamp
+    paging_options = msg.continuous_paging_options
+
+    w.write_short(msg.consistency_level)
+
+    if query_params is not None:
+        flags |= VALUES_FLAG
+    if serial_consistency_level:
+        flags |= WITH_SERIAL_CONSISTENCY_FLAG
+    if fetch_size:
+        flags |= PAGE_SIZE_FLAG
+        if paging_options and paging_options.page_unit_bytes():
+            flags |= PAGE_SIZE_BYTES_FLAG
+    if paging_state:
+        flags |= WITH_PAGING_STATE_FLAG
+    if timestamp is not None:
+        flags |= PROTOCOL_TIMESTAMP_FLAG
+    if paging_options:
+        flags |= PAGING_OPTIONS_FLAG
+
+    if int_query_flags:
+        w.write_uint(flags)
+    else:
+        w.write_byte(flags)
+
+    if query_params is not None:
+        w.write_short(len(query_params))
+        for param in query_params:
+            w.write_value(param, unset_value)
+    if fetch_size:
+        w.write_int(fetch_size)
+    if paging_state:
+        w.write_longstring(paging_state)
+    if serial_consistency_level:
+        w.write_short(serial_consistency_level)
+    if timestamp is not None:
+        w.write_long(timestamp)
+    if paging_options:
+        w.write_int(paging_options.max_pages)
+        w.write_int(paging_options.max_pages_per_second)
+    return 0
+
+
+cdef int _write_batch(FrameWriter w, msg, bint int_query_flags, unset_value) except -1:
+    cdef uint32_t flags = 0
+    cdef bytes query_id
+
+    w.write_byte(msg.batch_type.value)
+    w.write_short(len(msg.queries))
+    for prepared, string_or_query_id, params in msg.queries:
+        if not prepared:
+            w.write_byte(0)
+            w.write_longstring(string_or_query_id)
+        else:
+            w.write_byte(1)
+            query_id = string_or_query_id
+            w.write_short(PyBytes_GET_SIZE(query_id))
+            w.write_bytes(query_id)
+        w.write_short(len(params))
+        for param in params:
+            w.write_value(param, unset_value)
+
+    w.write_short(msg.consistency_level)
+
+    if msg.serial_consistency_level:
+        flags |= WITH_SERIAL_CONSISTENCY_FLAG
+    if msg.timestamp is not None:
+        flags |= PROTOCOL_TIMESTAMP_FLAG
+
+    if int_query_flags:
+        w.write_uint(flags)
+    else:
+        w.write_byte(flags)
+
+    if msg.serial_consistency_level:
+        w.write_short(msg.serial_consistency_level)
+    if msg.timestamp is not None:
+        w.write_long(msg.timestamp)
+    return 0
+
+
+def encode_message(msg, int stream_id, int protocol_version, int frame_flags,
+                   bint int_query_flags, unset_value):
+    """
+    Returns the complete frame for a QueryMessage, ExecuteMessage or
+    BatchMessage. The caller is responsible for rejecting messages this does
+    not handle (compression, custom payloads, unsupported paging options).
+    """
+    cdef int opcode = msg.opcode
+    cdef FrameWriter w = FrameWriter()
+
+    if opcode == QUERY_OPCODE:
+        w.write_longstring(msg.query)
+        _write_query_params(w, msg, int_query_flags, unset_value)
+    elif opcode == EXECUTE_OPCODE:
+        w.write_string(msg.query_id)
+        _write_query_params(w, msg, int_query_flags, unset_value)
+    elif opcode == BATCH_OPCODE:
+        _write_batch(w, msg, int_query_flags, unset_value)
+    else:
+        raise ValueError("Cannot encode message with opcode 0x%02x" % (opcode,))
+
+    return w.finish(protocol_version, frame_flags, stream_id, opcode)
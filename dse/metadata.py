@@ -7,14 +7,15 @@
 #
 # http://www.datastax.com/terms/datastax-dse-driver-license-terms
 
+from array import array
 from binascii import unhexlify
-from bisect import bisect_right
+from bisect import bisect_left, bisect_right
 from collections import defaultdict, Mapping
 from functools import total_ordering
 from hashlib import md5
-from itertools import islice, cycle
 import json
 import logging
+from operator import attrgetter
 import re
 import six
 from six.moves import zip
@@ -272,20 +273,31 @@ class Metadata(object):
                 ring.append(token)
                 token_to_host_owner[token] = host
 
-        all_tokens = sorted(ring)
-        self.token_map = TokenMap(
-            token_class, token_to_host_owner, all_tokens, self)
+        all_tokens = sorted(ring, key=attrgetter('value'))
+        token_map = TokenMap(token_class, token_to_host_owner, all_tokens, self)
+        if self.token_map:
+            token_map._rebuild_from(self.token_map)
+        self.token_map = token_map
 
-    def get_replicas(self, keyspace, key):
+    def get_replicas(self, keyspace, key, statement=None):
         """
         Returns a list of :class:`.Host` instances that are replicas for a given
         partition key.
+
+        When the :class:`.Statement` the key was taken from is passed as
+        `statement`, the token computed for `key` is cached on it, so retries
+        and speculative executions of that statement do not hash the key
+        again.
         """
         t = self.token_map
         if not t:
             return []
         try:
-            return t.get_replicas(keyspace, t.token_class.from_key(key))
+            if statement is None:
+                token = t.token_class.from_key(key)
+            else:
+                token = statement._get_routing_token(t.token_class, key)
+            return t.get_replicas(keyspace, token)
         except NoMurmur3:
             return []
 
@@ -374,6 +386,11 @@ class _ReplicationStrategy(object):
     def export_for_schema(self):
         raise NotImplementedError()
 
+    def _replica_map_key(self):
+        # strategies with equal keys place replicas identically, so keyspaces
+        # using them share one replica map
+        return self.__class__, self.export_for_schema()
+
 
 ReplicationStrategy = _ReplicationStrategy
 
@@ -410,6 +427,9 @@ class _UnknownStrategy(ReplicationStrategy):
     def make_token_replica_map(self, token_to_host_owner, ring):
         return {}
 
+    def _replica_map_key(self):
+        return _UnknownStrategy, self.name, tuple(sorted((str(k), str(v)) for k, v in self.options_map.items()))
+
 
 class SimpleStrategy(ReplicationStrategy):
 
@@ -425,18 +445,33 @@ class SimpleStrategy(ReplicationStrategy):
             raise ValueError("SimpleStrategy requires an integer 'replication_factor' option")
 
     def make_token_replica_map(self, token_to_host_owner, ring):
-        replica_map = {}
-        for i in range(len(ring)):
+        walk, _ = self._replica_walker([token_to_host_owner[token] for token in ring])
+        return dict((token, walk(i)[0]) for i, token in enumerate(ring))
+
+    def _replica_walker(self, owners):
+        """
+        Returns ``(walk, params)``. ``walk(i)`` returns the replicas for ring
+        position `i`, given the owner of each ring position in `owners`, and
+        how many positions ahead it looked to place them (the ring size if it
+        went all the way around). The replicas depend on nothing but that
+        stretch of the ring and `params`.
+        """
+        num_tokens = len(owners)
+        replication_factor = self.replication_factor
+
+        def walk(i):
             j, hosts = 0, list()
-            while len(hosts) < self.replication_factor and j < len(ring):
-                token = ring[(i + j) % len(ring)]
-                host = token_to_host_owner[token]
+            while len(hosts) < replication_factor and j < num_tokens:
+                host = owners[(i + j) % num_tokens]
                 if host not in hosts:
                     hosts.append(host)
                 j += 1
+            return hosts, (j - 1 if len(hosts) == replication_factor else num_tokens)
 
-            replica_map[ring[i]] = hosts
-        return replica_map
+        return walk, None
+
+    def _replica_map_key(self):
+        return SimpleStrategy, self.replication_factor
 
     def export_for_schema(self):
         """
@@ -465,58 +500,67 @@ class NetworkTopologyStrategy(ReplicationStrategy):
             (str(k), int(v)) for k, v in dc_replication_factors.items())
 
     def make_token_replica_map(self, token_to_host_owner, ring):
+        walk, _ = self._replica_walker([token_to_host_owner[token] for token in ring])
+        return dict((token, walk(i)[0]) for i, token in enumerate(ring))
+
+    def _replica_walker(self, owners):
+        # see SimpleStrategy._replica_walker
         dc_rf_map = dict((dc, int(rf))
                          for dc, rf in self.dc_replication_factors.items() if rf > 0)
 
         # build a map of DCs to lists of indexes into `ring` for tokens that
         # belong to that DC
         dc_to_token_offset = defaultdict(list)
+        host_dcs = {}
+        for i, host in enumerate(owners):
+            try:
+                dc = host_dcs[host]
+            except KeyError:
+                dc = host_dcs[host] = host.datacenter
+            dc_to_token_offset[dc].append(i)
+
         dc_racks = defaultdict(set)
         hosts_per_dc = defaultdict(set)
-        for i, token in enumerate(ring):
-            host = token_to_host_owner[token]
-            dc_to_token_offset[host.datacenter].append(i)
+        for host in host_dcs:
             if host.datacenter and host.rack:
                 dc_racks[host.datacenter].add(host.rack)
                 hosts_per_dc[host.datacenter].add(host)
 
-        # A map of DCs to an index into the dc_to_token_offset value for that dc.
-        # This is how we keep track of advancing around the ring for each DC.
-        dc_to_current_index = defaultdict(int)
+        dcs = [(token_offsets, dc_rf_map[dc], len(dc_racks[dc]), len(hosts_per_dc[dc]))
+               for dc, token_offsets in dc_to_token_offset.items() if dc in dc_rf_map]
+        # besides the ring order, replicas depend on the order DCs are visited
+        # in, their rack counts and, when it does not exceed the replication
+        # factor, their host counts
+        params = tuple((dc, len(dc_racks[dc]), min(len(hosts_per_dc[dc]), dc_rf_map[dc] + 1))
+                       for dc in dc_to_token_offset if dc in dc_rf_map)
+        num_ring_tokens = len(owners)
 
-        replica_map = defaultdict(list)
-        for i in range(len(ring)):
-            replicas = replica_map[ring[i]]
+        def walk(i):
+            replicas = []
+            span = -1
 
             # go through each DC and find the replicas in that DC
-            for dc in dc_to_token_offset.keys():
-                if dc not in dc_rf_map:
-                    continue
-
-                # advance our per-DC index until we're up to at least the
-                # current token in the ring
-                token_offsets = dc_to_token_offset[dc]
-                index = dc_to_current_index[dc]
+            for token_offsets, replication_factor, num_racks, hosts_this_dc in dcs:
+                # start from the first token of this DC at or after the current token
                 num_tokens = len(token_offsets)
-                while index < num_tokens and token_offsets[index] < i:
-                    index += 1
-                dc_to_current_index[dc] = index
+                index = bisect_left(token_offsets, i)
 
-                replicas_remaining = dc_rf_map[dc]
+                replicas_remaining = replication_factor
                 replicas_this_dc = 0
                 skipped_hosts = []
                 racks_placed = set()
-                racks_this_dc = dc_racks[dc]
-                hosts_this_dc = len(hosts_per_dc[dc])
-                for token_offset in islice(cycle(token_offsets), index, index + num_tokens):
-                    host = token_to_host_owner[ring[token_offset]]
+                last_offset = None
+                for k in range(index, index + num_tokens):
+                    token_offset = token_offsets[k % num_tokens]
+                    host = owners[token_offset]
                     if replicas_remaining == 0 or replicas_this_dc == hosts_this_dc:
                         break
+                    last_offset = token_offset
 
                     if host in replicas:
                         continue
 
-                    if host.rack in racks_placed and len(racks_placed) < len(racks_this_dc):
+                    if host.rack in racks_placed and len(racks_placed) < num_racks:
                         skipped_hosts.append(host)
                         continue
 
@@ -525,15 +569,29 @@ class NetworkTopologyStrategy(ReplicationStrategy):
                     replicas_remaining -= 1
                     racks_placed.add(host.rack)
 
-                    if len(racks_placed) == len(racks_this_dc):
+                    if len(racks_placed) == num_racks:
                         for host in skipped_hosts:
                             if replicas_remaining == 0:
                                 break
                             replicas.append(host)
                             replicas_remaining -= 1
                         del skipped_hosts[:]
+                else:
+                    # went all the way around this DC
+                    span = num_ring_tokens
+                    continue
 
-        return replica_map
+                if last_offset is not None:
+                    span = max(span, (last_offset - i) % num_ring_tokens)
+
+            return replicas, span
+
+        return walk, params
+
+    def _replica_map_key(self):
+        # data centers without replicas make no difference
+        return NetworkTopologyStrategy, tuple(sorted((dc, rf) for dc, rf in self.dc_replication_factors.items()
+                                                     if rf > 0))
 
     def export_for_schema(self):
         """
@@ -1416,8 +1474,9 @@ class TokenMap(object):
 
     tokens_to_hosts_by_ks = None
     """
-    A map of keyspace names to a nested map of :class:`.Token` objects to
-    sets of :class:`.Host` objects.
+    A map of keyspace names to a nested, read-only map of :class:`.Token`
+    objects to lists of :class:`.Host` objects. Keyspaces with the same
+    replication settings share one nested map.
     """
 
     ring = None
@@ -1436,6 +1495,17 @@ class TokenMap(object):
         self._metadata = metadata
         self._rebuild_lock = RLock()
 
+        # raw token values bisect without calling Token.__lt__
+        self._ring_values = [token.value for token in all_tokens]
+
+        # _ReplicaMaps by ReplicationStrategy._replica_map_key()
+        self._replica_maps = {}
+        self._owners = [token_to_host_owner[token] for token in all_tokens]
+        self._host_locations = dict((host, (host.datacenter, host.rack))
+                                    for host in set(self._owners))
+        self._ring_diff = None
+        self._previous_replica_maps = {}
+
     def rebuild_keyspace(self, keyspace, build_if_absent=False):
         with self._rebuild_lock:
             try:
@@ -1443,14 +1513,111 @@ class TokenMap(object):
                 if (build_if_absent and current is None) or (not build_if_absent and current is not None):
                     ks_meta = self._metadata.keyspaces.get(keyspace)
                     if ks_meta:
-                        replica_map = self.replica_map_for_keyspace(self._metadata.keyspaces[keyspace])
-                        self.tokens_to_hosts_by_ks[keyspace] = replica_map
+                        strategy = ks_meta.replication_strategy
+                        if strategy:
+                            self.tokens_to_hosts_by_ks[keyspace] = self._replica_map_for_strategy(strategy)
+                        else:
+                            self.tokens_to_hosts_by_ks[keyspace] = None
             except Exception:
                 # should not happen normally, but we don't want to blow up queries because of unexpected meta state
                 # bypass until new map is generated
                 self.tokens_to_hosts_by_ks[keyspace] = {}
                 log.exception("Failed creating a token map for keyspace '%s' with %s. PLEASE REPORT THIS: https://datastax-oss.atlassian.net/projects/PYTHON", keyspace, self.token_to_host_owner)
 
+    def _rebuild_from(self, previous):
+        """
+        Builds the replica maps of the keyspaces known to `previous`, the
+        token map this one replaces. Replicas of ring ranges that the
+        topology change did not affect are reused instead of recomputed.
+        """
+        if previous.token_class is not self.token_class or not previous.ring:
+            return
+
+        with self._rebuild_lock:
+            self._ring_diff = self._diff_ring(previous)
+            self._previous_replica_maps = dict(previous._replica_maps)
+            try:
+                for keyspace in list(previous.tokens_to_hosts_by_ks):
+                    self.rebuild_keyspace(keyspace, build_if_absent=True)
+            finally:
+                self._ring_diff = None
+                self._previous_replica_maps = {}
+
+    def _diff_ring(self, previous):
+        new_positions = dict((value, i) for i, value in enumerate(self._ring_values))
+        owners = self._owners
+        locations = self._host_locations
+        old_locations = previous._host_locations
+
+        # old ring positions mapped to their new ones; tokens that are gone,
+        # changed owner or whose owner changed location map to None and are
+        # listed in `changed`
+        old_to_new = []
+        changed = []
+        for i, (value, host) in enumerate(zip(previous._ring_values, previous._owners)):
+            j = new_positions.get(value)
+            if j is None or owners[j] is not host or locations[host] != old_locations[host]:
+                old_to_new.append(None)
+                changed.append(i)
+            else:
+                old_to_new.append(j)
+
+        # old ring positions followed by a new token
+        old_values = previous._ring_values
+        old_value_set = set(old_values)
+        inserted_after = sorted(set((bisect_left(old_values, value) - 1) % len(old_values)
+                                    for value in self._ring_values if value not in old_value_set))
+
+        return old_to_new, changed, inserted_after
+
+    def _replica_map_for_strategy(self, strategy):
+        key = strategy._replica_map_key()
+        replica_map = self._replica_maps.get(key)
+        if replica_map is None:
+            replica_map = self._build_replica_map(strategy, self._previous_replica_maps.get(key))
+            self._replica_maps[key] = replica_map
+        return replica_map
+
+    def _build_replica_map(self, strategy, previous):
+        walker = getattr(strategy, '_replica_walker', None)
+        if walker is None:
+            token_replicas = strategy.make_token_replica_map(self.token_to_host_owner, self.ring)
+            if not token_replicas:
+                return _ReplicaMap([], [], [])
+            no_replicas = []
+            return _ReplicaMap(self.ring, self._ring_values,
+                               [token_replicas.get(token, no_replicas) for token in self.ring],
+                               self._host_locations)
+
+        walk, params = walker(self._owners)
+        replicas = [None] * len(self.ring)
+        spans = [None] * len(self.ring)
+        if previous is not None and previous.spans is not None and previous.params == params and self._ring_diff:
+            self._reuse_replicas(previous, replicas, spans)
+
+        for i, span in enumerate(spans):
+            if span is None:
+                replicas[i], spans[i] = walk(i)
+
+        return _ReplicaMap(self.ring, self._ring_values, replicas, self._host_locations, spans, params)
+
+    def _reuse_replicas(self, previous, replicas, spans):
+        # The replicas of a position depend only on the ring positions its
+        # walk covers, up to `span` positions ahead. They are still valid if
+        # no token in that stretch changed and no token was inserted into it.
+        old_to_new, changed, inserted_after = self._ring_diff
+        num_tokens = len(old_to_new)
+        replicas_at = previous.replicas_at
+        for i, span in enumerate(previous.spans):
+            j = old_to_new[i]
+            if j is None:
+                continue
+            if span >= 0 and (_cyclic_distance(changed, i, num_tokens) <= span or
+                              _cyclic_distance(inserted_after, i, num_tokens) < span):
+                continue
+            replicas[j] = replicas_at(i)
+            spans[j] = span
+
     def replica_map_for_keyspace(self, ks_metadata):
         strategy = ks_metadata.replication_strategy
         if strategy:
@@ -1459,30 +1626,123 @@ class TokenMap(object):
             return None
 
     def remove_keyspace(self, keyspace):
-        self.tokens_to_hosts_by_ks.pop(keyspace, None)
+        with self._rebuild_lock:
+            removed = self.tokens_to_hosts_by_ks.pop(keyspace, None)
+            if removed and not any(m is removed for m in self.tokens_to_hosts_by_ks.values()):
+                for key, replica_map in list(self._replica_maps.items()):
+                    if replica_map is removed:
+                        del self._replica_maps[key]
 
     def get_replicas(self, keyspace, token):
         """
         Get  a set of :class:`.Host` instances representing all of the
         replica nodes for a given :class:`.Token`.
+
+        A new list is returned on every call.
         """
-        tokens_to_hosts = self.tokens_to_hosts_by_ks.get(keyspace, None)
-        if tokens_to_hosts is None:
+        replica_map = self.tokens_to_hosts_by_ks.get(keyspace, None)
+        if replica_map is None:
             self.rebuild_keyspace(keyspace, build_if_absent=True)
-            tokens_to_hosts = self.tokens_to_hosts_by_ks.get(keyspace, None)
+            replica_map = self.tokens_to_hosts_by_ks.get(keyspace, None)
 
-        if tokens_to_hosts:
+        if replica_map:
             # token range ownership is exclusive on the LHS (the start token), so
             # we use bisect_right, which, in the case of a tie/exact match,
             # picks an insertion point to the right of the existing match
-            point = bisect_right(self.ring, token)
-            if point == len(self.ring):
-                return tokens_to_hosts[self.ring[0]]
-            else:
-                return tokens_to_hosts[self.ring[point]]
+            return replica_map.replicas_at(bisect_right(self._ring_values, token.value))
         return []
 
 
+def _cyclic_distance(positions, i, num_positions):
+    """
+    Returns how many positions ahead of `i` the nearest of the sorted
+    `positions` is, wrapping around `num_positions`, or `num_positions` if
+    there are none.
+    """
+    if not positions:
+        return num_positions
+    k = bisect_left(positions, i)
+    position = positions[k] if k < len(positions) else positions[0]
+    return (position - i) % num_positions
+
+
+class _ReplicaMap(Mapping):
+    """
+    A read-only map of the :class:`.Token` objects of a ring to the replicas
+    of the range ending at each one, under one replication strategy.
+
+    Replicas are stored as indexes into a table of the distinct hosts rather
+    than as one list per token; lists are built when looked up.
+    """
+
+    spans = None
+    """
+    For each ring position, how many positions ahead the strategy looked to
+    place its replicas, or the ring size if it went all the way around. None
+    if the strategy does not support incremental rebuilds.
+    """
+
+    params = None
+    """
+    Anything besides the ring order that the replicas depend on.
+    """
+
+    def __init__(self, ring, ring_values, replicas, hosts=(), spans=None, params=None):
+        self._ring = ring
+        self._ring_values = ring_values
+
+        # `hosts` are the ring owners; keying by id avoids Host.__hash__, and
+        # they are all referenced for as long as this runs
+        hosts = list(hosts)
+        host_indexes = dict((id(host), i) for i, host in enumerate(hosts))
+        indexes = []
+        offsets = [0]
+        for replica_hosts in replicas:
+            try:
+                indexes.extend([host_indexes[id(host)] for host in replica_hosts])
+            except KeyError:
+                for host in replica_hosts:
+                    if id(host) not in host_indexes:
+                        host_indexes[id(host)] = len(hosts)
+                        hosts.append(host)
+                indexes.extend([host_indexes[id(host)] for host in replica_hosts])
+            offsets.append(len(indexes))
+
+        # the replicas of position i are _indexes[_offsets[i]:_offsets[i + 1]]
+        self._hosts = tuple(hosts)
+        self._indexes = array('H' if len(hosts) <= 0xFFFF else 'i', indexes)
+        self._offsets = array('i', offsets)
+
+        if spans is not None:
+            spans = array('i', spans)
+        self.spans = spans
+        self.params = params
+
+    def replicas_at(self, position):
+        """
+        Returns the replicas of ring position `position`. The position one
+        past the end is the wrap-around range, replicated like the first.
+        """
+        offsets = self._offsets
+        if position == len(offsets) - 1:
+            position = 0
+        hosts = self._hosts
+        return [hosts[i] for i in self._indexes[offsets[position]:offsets[position + 1]]]
+
+    def __getitem__(self, token):
+        values = self._ring_values
+        i = bisect_left(values, token.value)
+        if i == len(values) or values[i] != token.value:
+            raise KeyError(token)
+        return self.replicas_at(i)
+
+    def __iter__(self):
+        return iter(self._ring)
+
+    def __len__(self):
+        return len(self._ring)
+
+
 @total_ordering
 class Token(object):
     """
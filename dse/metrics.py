@@ -106,6 +106,21 @@ class Metrics(object):
     the driver currently has open.
     """
 
+    continuous_paging_stall_timer = None
+    """
+    A :class:`greplin.scales.PmfStat` timer of the time continuous paging
+    sessions spent with reading paused, because the application was not
+    consuming pages as fast as the server sent them. Has the same keys as
+    :attr:`request_timer`.
+    """
+
+    pending_request_timer = None
+    """
+    A :class:`greplin.scales.PmfStat` timer of the time requests waited for a
+    free request ID, when every connection to their host was at capacity.
+    Has the same keys as :attr:`request_timer`.
+    """
+
     _stats_counter = 0
 
     def __init__(self, cluster_proxy):
@@ -122,6 +137,8 @@ class Metrics(object):
             scales.IntStat('other_errors'),
             scales.IntStat('retries'),
             scales.IntStat('ignores'),
+            scales.PmfStat('continuous_paging_stall_timer'),
+            scales.PmfStat('pending_request_timer'),
 
             # gauges
             scales.Stat('known_hosts',
@@ -144,6 +161,8 @@ class Metrics(object):
         self.other_errors = self.stats.other_errors
         self.retries = self.stats.retries
         self.ignores = self.stats.ignores
+        self.continuous_paging_stall_timer = self.stats.continuous_paging_stall_timer
+        self.pending_request_timer = self.stats.pending_request_timer
         self.known_hosts = self.stats.known_hosts
         self.connected_to = self.stats.connected_to
         self.open_connections = self.stats.open_connections
@@ -169,6 +188,12 @@ class Metrics(object):
     def on_retry(self):
         self.stats.retries += 1
 
+    def on_continuous_paging_stall(self, duration):
+        self.continuous_paging_stall_timer.addValue(duration)
+
+    def on_pending_request(self, duration):
+        self.pending_request_timer.addValue(duration)
+
     def get_stats(self):
         """
         Returns the metrics for the registered cluster instance.
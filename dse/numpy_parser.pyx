@@ -11,6 +11,20 @@
 This module provides an optional protocol parser that returns
 NumPy arrays.
 
+Numeric, boolean, timestamp, date, time, uuid and inet columns are
+decoded into typed masked arrays, with NULL values masked:
+
+    - timestamp columns are ``datetime64[ms]``, date columns are
+      ``datetime64[D]`` and time columns are ``timedelta64[ns]``
+    - uuid and timeuuid columns are ``V16``, holding the 16 bytes of
+      each UUID
+    - inet columns are ``V16``, holding IPv6 addresses, with IPv4
+      addresses stored as IPv4-mapped IPv6 addresses (``::ffff:a.b.c.d``)
+
+Other types are decoded into object arrays of Python values, text,
+varchar and ascii columns included. A parser made with a `text_width`
+decodes text columns into ``U<text_width>`` masked arrays instead.
+
 =============================================================================
 This module should not be imported by any of the main python-driver modules,
 as numpy is an optional dependency.
@@ -41,17 +55,24 @@ cdef extern from "Python.h":
     ctypedef uint64_t Py_uintptr_t
 
 
+# How unpack_row stores the values of a column
+cdef enum:
+    ARR_FIXED = 0   # fixed width values, other sizes are masked
+    ARR_OBJECT = 1  # Python objects
+    ARR_INET = 2    # 16 byte IPv6 addresses
+    ARR_UNICODE = 3 # NUL padded UCS4 strings, at most 'stride' bytes long
+
 # Simple array descriptor, useful to parse rows into a NumPy array
 ctypedef struct ArrDesc:
     Py_uintptr_t buf_ptr
     int stride # should be large enough as we allocate contiguous arrays
-    int is_object
+    int kind
     Py_uintptr_t mask_ptr
 
 arrDescDtype = np.dtype(
     [ ('buf_ptr', np.uintp)
     , ('stride', np.dtype('i'))
-    , ('is_object', np.dtype('i'))
+    , ('kind', np.dtype('i'))
     , ('mask_ptr', np.uintp)
     ], align=True)
 
@@ -62,14 +83,48 @@ _cqltype_to_numpy = {
     cqltypes.ShortType:         np.dtype('>i2'),
     cqltypes.FloatType:         np.dtype('>f4'),
     cqltypes.DoubleType:        np.dtype('>f8'),
+    cqltypes.ByteType:          np.dtype('i1'),
+    cqltypes.BooleanType:       np.dtype('?'),
+    cqltypes.DateType:          np.dtype('>i8'),
+    cqltypes.TimestampType:     np.dtype('>i8'),
+    cqltypes.SimpleDateType:    np.dtype('>u4'),
+    cqltypes.TimeType:          np.dtype('>i8'),
+    cqltypes.UUIDType:          np.dtype('V16'),
+    cqltypes.TimeUUIDType:      np.dtype('V16'),
+    cqltypes.InetAddressType:   np.dtype('V16'),
+}
+
+# types whose arrays are viewed as NumPy temporal types once decoded
+_cqltype_to_temporal = {
+    cqltypes.DateType:          np.dtype('datetime64[ms]'),
+    cqltypes.TimestampType:     np.dtype('datetime64[ms]'),
+    cqltypes.TimeType:          np.dtype('timedelta64[ns]'),
 }
 
+_text_types = frozenset((cqltypes.UTF8Type, cqltypes.VarcharType, cqltypes.AsciiType))
+
 obj_dtype = np.dtype('O')
 
+# the encoding of the characters of 'U' arrays
+_ucs4_encoding = 'utf-32-le' if is_little_endian else 'utf-32-be'
+
 cdef uint8_t mask_true = 0x01
+cdef char *ipv4_mapped_prefix = b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\xff\xff"
 
 cdef class NumpyParser(ColumnParser):
-    """Decode a ResultMessage into a bunch of NumPy arrays"""
+    """
+    Decode a ResultMessage into a bunch of NumPy arrays
+
+    Text columns are decoded into object arrays of strings, or into
+    ``U<text_width>`` arrays if `text_width` is not :const:`None`. Values
+    longer than `text_width` characters then fail to decode, and trailing
+    NUL characters are dropped, as in any NumPy string array.
+    """
+
+    cdef public object text_width
+
+    def __init__(self, text_width=None):
+        self.text_width = text_width
 
     cpdef parse_rows(self, BytesIOReader reader, ParseDesc desc):
         cdef Py_ssize_t rowcount
@@ -77,12 +132,12 @@ cdef class NumpyParser(ColumnParser):
         cdef ArrDesc *arrs
 
         rowcount = read_int(reader)
-        array_descs, arrays = make_arrays(desc, rowcount)
+        array_descs, arrays = make_arrays(desc, rowcount, self.text_width)
         arrs = &array_descs[0]
 
         _parse_rows(reader, desc, arrs, rowcount)
 
-        arrays = [make_native_byteorder(arr) for arr in arrays]
+        arrays = [finish_array(coltype, arr) for coltype, arr in zip(desc.coltypes, arrays)]
         result = dict(zip(desc.colnames, arrays))
         return result
 
@@ -97,9 +152,10 @@ cdef _parse_rows(BytesIOReader reader, ParseDesc desc,
 
 ### Helper functions to create NumPy arrays and array descriptors
 
-def make_arrays(ParseDesc desc, array_size):
+def make_arrays(ParseDesc desc, array_size, text_width=None):
     """
-    Allocate arrays for each result column.
+    Allocate arrays for each result column, with ``U<text_width>`` arrays
+    for text columns if `text_width` is not :const:`None`.
 
     returns a tuple of (array_descs, arrays), where
         'array_descs' describe the arrays for NativeRowParser and
@@ -110,10 +166,17 @@ def make_arrays(ParseDesc desc, array_size):
     arrays = []
 
     for i, coltype in enumerate(desc.coltypes):
-        arr = make_array(coltype, array_size)
+        arr = make_array(coltype, array_size, text_width)
         array_descs[i]['buf_ptr'] = arr.ctypes.data
         array_descs[i]['stride'] = arr.strides[0]
-        array_descs[i]['is_object'] = arr.dtype is obj_dtype
+        if arr.dtype is obj_dtype:
+            array_descs[i]['kind'] = ARR_OBJECT
+        elif coltype is cqltypes.InetAddressType:
+            array_descs[i]['kind'] = ARR_INET
+        elif arr.dtype.kind == 'U':
+            array_descs[i]['kind'] = ARR_UNICODE
+        else:
+            array_descs[i]['kind'] = ARR_FIXED
         try:
             array_descs[i]['mask_ptr'] = arr.mask.ctypes.data
         except AttributeError:
@@ -123,13 +186,20 @@ def make_arrays(ParseDesc desc, array_size):
     return array_descs, arrays
 
 
-def make_array(coltype, array_size):
+def make_array(coltype, array_size, text_width=None):
     """
-    Allocate a new NumPy array of the given column type and size.
+    Allocate a new NumPy array of the given column type and size. Text
+    columns get a ``U<text_width>`` array, or an object array if
+    `text_width` is :const:`None`.
     """
+    if text_width is not None and coltype in _text_types:
+        # values shorter than the width are NUL padded
+        a = np.ma.zeros((array_size,), dtype=np.dtype('U%d' % (text_width,)))
+        a.mask = np.zeros((array_size,), dtype=np.bool_)
+        return a
     try:
         a = np.ma.empty((array_size,), dtype=_cqltype_to_numpy[coltype])
-        a.mask = np.zeros((array_size,), dtype=np.bool)
+        a.mask = np.zeros((array_size,), dtype=np.bool_)
     except KeyError:
         a = np.empty((array_size,), dtype=obj_dtype)
     return a
@@ -149,14 +219,20 @@ cdef inline int unpack_row(
         get_buf(reader, &buf)
         arr = arrays[i]
 
-        if arr.is_object:
+        if arr.kind == ARR_OBJECT:
             deserializer = desc.deserializers[i]
             val = from_binary(deserializer, &buf, desc.protocol_version)
             Py_INCREF(val)
             (<PyObject **> arr.buf_ptr)[0] = <PyObject *> val
-        elif buf.size >= 0:
+        elif arr.kind == ARR_UNICODE and buf.size >= 0:
+            unpack_unicode(&arr, &buf)
+        elif buf.size == arr.stride:
             memcpy(<char *> arr.buf_ptr, buf.ptr, buf.size)
+        elif arr.kind == ARR_INET and buf.size == 4:
+            memcpy(<char *> arr.buf_ptr, ipv4_mapped_prefix, 12)
+            memcpy(<char *> arr.buf_ptr + 12, buf.ptr, 4)
         else:
+            # NULL and empty values
             memcpy(<char *>arr.mask_ptr, &mask_true, 1)
 
         # Update the pointer into the array for the next time
@@ -166,11 +242,38 @@ cdef inline int unpack_row(
     return 0
 
 
+cdef inline int unpack_unicode(ArrDesc *arr, Buffer *buf) except -1:
+    cdef bytes ucs4
+    if buf.size == 0:
+        return 0
+    ucs4 = buf.ptr[:buf.size].decode('utf8').encode(_ucs4_encoding)
+    if len(ucs4) > arr.stride:
+        raise ValueError("Text value of %d characters is longer than the text width of %d"
+                         % (len(ucs4) // 4, arr.stride // 4))
+    memcpy(<char *> arr.buf_ptr, <char *> ucs4, len(ucs4))
+    return 0
+
+
+def finish_array(coltype, arr):
+    """
+    Convert a decoded array to native byte order, and temporal columns to
+    NumPy temporal types.
+    """
+    arr = make_native_byteorder(arr)
+    if coltype is cqltypes.SimpleDateType:
+        # days since the epoch, centered on 2**31
+        return (arr.astype(np.int64) - 2 ** 31).astype('datetime64[D]')
+    try:
+        return arr.view(_cqltype_to_temporal[coltype])
+    except KeyError:
+        return arr
+
+
 def make_native_byteorder(arr):
     """
     Make sure all values have a native endian in the NumPy arrays.
     """
-    if is_little_endian and not arr.dtype.kind == 'O':
+    if is_little_endian and arr.dtype.kind not in 'OUVb' and arr.dtype.itemsize > 1:
         # We have arrays in big-endian order. First swap the bytes
         # into little endian order, and then update the numpy dtype
         # accordingly (e.g. from '>i8' to '<i8')
@@ -9,9 +9,11 @@
 
 from itertools import islice, cycle, groupby, repeat
 import logging
+from math import log as _log
 from random import randint, shuffle
 from threading import Lock
 import socket
+import time
 from warnings import warn
 
 from dse import ConsistencyLevel, OperationTimedOut
@@ -363,7 +365,7 @@ class TokenAwarePolicy(LoadBalancingPolicy):
                 for host in child.make_query_plan(keyspace, query):
                     yield host
             else:
-                replicas = self._cluster_metadata.get_replicas(keyspace, routing_key)
+                replicas = self._cluster_metadata.get_replicas(keyspace, routing_key, statement=query)
                 if self.shuffle_replicas:
                     shuffle(replicas)
                 for replica in replicas:
@@ -566,6 +568,161 @@ class HostFilterPolicy(LoadBalancingPolicy):
         return self._child_policy.check_supported()
 
 
+class LatencyAwarePolicy(LoadBalancingPolicy):
+    """
+    A :class:`.LoadBalancingPolicy` wrapper that moves hosts that respond
+    much slower than the fastest host to the end of its child policy's query
+    plans.
+
+    The policy keeps an average latency per host, in which older
+    measurements lose weight as time passes. It is updated by every request
+    the host answers with results or a server timeout, and by every request
+    still waiting for the host when the request times out on the client.
+    An overloaded error counts as a request that took the whole request
+    timeout. A host is considered slow when its average exceeds
+    :attr:`.exclusion_threshold` times the lowest average of all hosts. Slow
+    hosts are still tried, after all the others, so queries do not fail for
+    lack of fast hosts. A slow host that has not answered a request for
+    :attr:`.retry_period` seconds is no longer penalized, which gives it a
+    chance to show it has recovered.
+
+    To try replicas first, ordered by latency, wrap a
+    :class:`.TokenAwarePolicy`:
+
+    .. code-block:: python
+
+        policy = LatencyAwarePolicy(TokenAwarePolicy(DCAwareRoundRobinPolicy('dc1')))
+    """
+
+    exclusion_threshold = 2.0
+    """
+    How many times slower than the fastest host a host must be to be moved to
+    the end of query plans.
+    """
+
+    scale = 0.1
+    """
+    How quickly, in seconds, older measurements lose weight. A measurement
+    taken `scale` seconds after the previous one makes up about 30% of the
+    new average; the longer the gap, the larger its share.
+    """
+
+    retry_period = 10.0
+    """
+    After how many seconds without a measurement a slow host is tried again
+    in its normal place.
+    """
+
+    update_rate = 0.1
+    """
+    How often, in seconds, the lowest average is recomputed.
+    """
+
+    min_measure = 50
+    """
+    How many measurements a host needs before its average is used.
+    """
+
+    _child_policy = None
+
+    def __init__(self, child_policy, exclusion_threshold=2.0, scale=0.1, retry_period=10.0,
+                 update_rate=0.1, min_measure=50):
+        if exclusion_threshold < 1:
+            raise ValueError("exclusion_threshold must be at least 1")
+        if scale <= 0:
+            raise ValueError("scale must be positive")
+        if retry_period < 0 or update_rate < 0 or min_measure < 0:
+            raise ValueError("retry_period, update_rate and min_measure must not be negative")
+
+        self._child_policy = child_policy
+        self.exclusion_threshold = exclusion_threshold
+        self.scale = scale
+        self.retry_period = retry_period
+        self.update_rate = update_rate
+        self.min_measure = min_measure
+
+        # host -> (time of the last measurement, average, number of measurements)
+        self._latencies = {}
+        self._lock = Lock()
+        self._fastest = None
+        self._next_update = 0
+
+    def populate(self, cluster, hosts):
+        self._child_policy.populate(cluster, hosts)
+        cluster.register_latency_tracker(self)
+
+    def check_supported(self):
+        return self._child_policy.check_supported()
+
+    def distance(self, *args, **kwargs):
+        return self._child_policy.distance(*args, **kwargs)
+
+    def update(self, host, latency):
+        """
+        Records that a request to `host` took `latency` seconds. Called by the
+        :class:`~.Cluster` this policy is registered with.
+        """
+        now = time.time()
+        with self._lock:
+            previous = self._latencies.get(host)
+            if previous is None:
+                self._latencies[host] = (now, latency, 1)
+                return
+
+            timestamp, average, count = previous
+            delay = now - timestamp
+            if delay > 0:
+                scaled_delay = delay / self.scale
+                previous_weight = _log(scaled_delay + 1) / scaled_delay
+                average = (1 - previous_weight) * latency + previous_weight * average
+            self._latencies[host] = (max(now, timestamp), average, count + 1)
+
+    def _fastest_average(self, now):
+        if now >= self._next_update:
+            self._next_update = now + self.update_rate
+            averages = [average for timestamp, average, count in list(self._latencies.values())
+                        if count >= self.min_measure and now - timestamp <= self.retry_period]
+            self._fastest = min(averages) if averages else None
+        return self._fastest
+
+    def make_query_plan(self, working_keyspace=None, query=None):
+        child_plan = self._child_policy.make_query_plan(working_keyspace, query)
+        now = time.time()
+        fastest = self._fastest_average(now) if self._latencies else None
+        if fastest is None:
+            for host in child_plan:
+                yield host
+            return
+
+        limit = fastest * self.exclusion_threshold
+        latencies = self._latencies
+        slow_hosts = []
+        for host in child_plan:
+            stats = latencies.get(host)
+            if stats is not None and stats[1] > limit and stats[2] >= self.min_measure and \
+                    now - stats[0] <= self.retry_period:
+                slow_hosts.append(host)
+            else:
+                yield host
+
+        for host in slow_hosts:
+            yield host
+
+    def on_up(self, *args, **kwargs):
+        return self._child_policy.on_up(*args, **kwargs)
+
+    def on_down(self, *args, **kwargs):
+        return self._child_policy.on_down(*args, **kwargs)
+
+    def on_add(self, *args, **kwargs):
+        return self._child_policy.on_add(*args, **kwargs)
+
+    def on_remove(self, host, *args, **kwargs):
+        with self._lock:
+            self._latencies.pop(host, None)
+        return self._child_policy.on_remove(host, *args, **kwargs)
+
+
 class ConvictionPolicy(object):
     """
     A policy which decides when hosts should be considered down
@@ -1106,6 +1263,115 @@ class ConstantSpeculativeExecutionPolicy(SpeculativeExecutionPolicy):
         return self.ConstantSpeculativeExecutionPlan(self.delay, self.max_attempts)
 
 
+class ConcurrencyLimiter(object):
+    """
+    Interface for limiting the number of requests in flight to each host.
+
+    Every attempt to send a request to a host first calls :meth:`try_acquire`.
+    Hosts for which it returns :const:`False` are skipped, and the request
+    moves on to the next host of its query plan. Every acquired slot is given
+    back with exactly one call to :meth:`release`.
+
+    Set a limiter on :attr:`.Cluster.concurrency_limiter` to use it.
+    """
+
+    def try_acquire(self, host):
+        """
+        Returns :const:`True` if a request may be sent to `host`, taking
+        one of its slots.
+        """
+        raise NotImplementedError()
+
+    def release(self, host, latency, overloaded):
+        """
+        Gives back a slot of `host` once its request completed. `latency` is
+        the time, in seconds, the host took to respond, or :const:`None` if
+        the request was not sent. `overloaded` is :const:`True` if the host
+        signaled it could not keep up: an overloaded error, or a server
+        timeout.
+        """
+        raise NotImplementedError()
+
+    def on_timeout(self, host):
+        """
+        Called when a request sent to `host` times out on the client side.
+        Its slot is released later, when the host responds or the
+        connection is closed.
+        """
+        pass
+
+
+class AIMDConcurrencyLimiter(ConcurrencyLimiter):
+    """
+    Adapts the limit of each host with additive increase, multiplicative
+    decrease, like TCP congestion control.
+
+    The limit of a host starts at `initial_limit`. It grows by one for
+    every limit's worth of successful requests, while the host uses at
+    least half of it. It is multiplied by `backoff_ratio` whenever the host
+    is overloaded, times out, or responds slower than `max_latency`
+    seconds (if set), and always stays between `min_limit` and `max_limit`.
+
+    This sheds load from struggling hosts, so that retries go to healthier
+    replicas instead of piling up on them.
+    """
+
+    def __init__(self, initial_limit=128, min_limit=8, max_limit=4096, backoff_ratio=0.9, max_latency=None):
+        if not 0 < backoff_ratio < 1:
+            raise ValueError("backoff_ratio must be between 0 and 1")
+        if not 0 < min_limit <= initial_limit <= max_limit:
+            raise ValueError("Limits must satisfy 0 < min_limit <= initial_limit <= max_limit")
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.max_latency = max_latency
+        self._limits = {}
+        self._in_flight = {}
+        self._lock = Lock()
+
+    def get_limit(self, host):
+        """
+        Returns the current limit of `host`.
+        """
+        return int(self._limits.get(host, self.initial_limit))
+
+    def get_in_flight(self, host):
+        """
+        Returns the number of slots of `host` in use.
+        """
+        return self._in_flight.get(host, 0)
+
+    def try_acquire(self, host):
+        with self._lock:
+            in_flight = self._in_flight.get(host, 0)
+            if in_flight >= int(self._limits.get(host, self.initial_limit)):
+                return False
+            self._in_flight[host] = in_flight + 1
+            return True
+
+    def release(self, host, latency, overloaded):
+        with self._lock:
+            in_flight = self._in_flight.get(host, 0)
+            if in_flight <= 1:
+                self._in_flight.pop(host, None)
+            else:
+                self._in_flight[host] = in_flight - 1
+
+            if latency is None:
+                return
+            limit = self._limits.get(host, self.initial_limit)
+            if overloaded or (self.max_latency is not None and latency > self.max_latency):
+                self._limits[host] = max(self.min_limit, limit * self.backoff_ratio)
+            elif in_flight * 2 >= limit:
+                self._limits[host] = min(self.max_limit, limit + 1.0 / limit)
+
+    def on_timeout(self, host):
+        with self._lock:
+            limit = self._limits.get(host, self.initial_limit)
+            self._limits[host] = max(self.min_limit, limit * self.backoff_ratio)
+
+
 class WrapperPolicy(LoadBalancingPolicy):
 
     def __init__(self, child_policy):
@@ -35,7 +35,8 @@ from dse.cqltypes import (AsciiType, BytesType, BooleanType,
                           TupleType, lookup_casstype, SimpleDateType,
                           TimeType, ByteType, ShortType, DurationType)
 from dse.policies import WriteType
-from dse.cython_deps import HAVE_CYTHON, HAVE_NUMPY
+from dse.row_decoder import get_row_decoder
+from dse.cython_deps import HAVE_CYTHON, HAVE_NUMPY, HAVE_ARROW
 from dse import util
 
 log = logging.getLogger(__name__)
@@ -85,6 +86,7 @@ class _MessageType(object):
     tracing = False
     custom_payload = None
     warnings = None
+    body_size = None
 
     def update_custom_payload(self, other):
         if other:
@@ -625,6 +627,7 @@ class ResultMessage(_MessageType):
     column_names = None
     column_types = None
     parsed_rows = None
+    row_decoder = None
     paging_state = None
     continuous_paging_seq = None
     continuous_paging_last = None
@@ -663,15 +666,16 @@ class ResultMessage(_MessageType):
         self.recv_results_metadata(f, user_type_map)
         column_metadata = self.column_metadata or result_metadata
         rowcount = read_int(f)
-        rows = [self.recv_row(f, len(column_metadata)) for _ in range(rowcount)]
         self.column_names = [c[2] for c in column_metadata]
         self.column_types = [c[3] for c in column_metadata]
+        self.row_decoder = get_row_decoder(column_metadata, protocol_version)
+        rows_start = f.tell()
         try:
-            self.parsed_rows = [
-                tuple(ctype.from_binary(val, protocol_version)
-                      for ctype, val in zip(self.column_types, row))
-                for row in rows]
+            self.parsed_rows = self.row_decoder.decode_rows(f, rowcount)
         except Exception:
+            # decode again cell by cell to report the failing column
+            f.seek(rows_start)
+            rows = [self.recv_row(f, len(column_metadata)) for _ in range(rowcount)]
             for row in rows:
                 for i in range(len(row)):
                     try:
@@ -680,6 +684,7 @@ class ResultMessage(_MessageType):
                         raise DriverException('Failed decoding result column "%s" of type %s: %s' % (self.column_names[i],
                                                                                                      self.column_types[i].cql_parameterized_type(),
                                                                                                      str(e)))
+            raise
 
     def recv_results_prepared(self, f, protocol_version, user_type_map):
         self.query_id = read_binary_string(f)
@@ -1006,16 +1011,19 @@ class _ProtocolHandler(object):
         :param stream_id: native protocol stream id from the frame header
         :param flags: native protocol flags bitmap from the header
         :param opcode: native protocol opcode from the header
-        :param body: frame body
+        :param body: frame body, as bytes or a memoryview over the connection read buffer
         :param decompressor: optional decompression function to inflate the body
         :return: a message decoded from the body and frame attributes
         """
         if flags & COMPRESSED_FLAG:
             if decompressor is None:
                 raise RuntimeError("No de-compressor available for compressed frame!")
+            if isinstance(body, memoryview):
+                body = body.tobytes()
             body = decompressor(body)
             flags ^= COMPRESSED_FLAG
 
+        body_size = len(body)
         body = io.BytesIO(body)
         if flags & TRACING_FLAG:
             trace_id = UUID(bytes=body.read(16))
@@ -1046,6 +1054,7 @@ class _ProtocolHandler(object):
         msg.trace_id = trace_id
         msg.custom_payload = custom_payload
         msg.warnings = warnings
+        msg.body_size = body_size
 
         if msg.warnings:
             for w in msg.warnings:
@@ -1053,10 +1062,12 @@ class _ProtocolHandler(object):
 
         return msg
 
-def cython_protocol_handler(colparser):
+def cython_protocol_handler(colparser=None, load_colparser=None):
     """
     Given a column parser to deserialize ResultMessages, return a suitable
-    Cython-based protocol handler.
+    Cython-based protocol handler. Instead of `colparser`, a function
+    returning it may be given as `load_colparser`, to import the parser
+    when the first rows result is decoded.
 
     There are three Cython-based protocol handlers:
 
@@ -1069,10 +1080,22 @@ def cython_protocol_handler(colparser):
         - numpy_parser.NumPyParser
             decodes result messages into NumPy arrays
 
+        - arrow_parser.ArrowParser
+            decodes result messages into Arrow record batches
+
     The default is to use obj_parser.ListParser
     """
     from dse.row_parser import make_recv_results_rows
 
+    if load_colparser is None:
+        recv_results_rows = make_recv_results_rows(colparser)
+    else:
+        def recv_results_rows(self, f, protocol_version, user_type_map, result_metadata):
+            parser = load_colparser()
+            FastResultMessage.recv_results_rows = make_recv_results_rows(parser)
+            CythonProtocolHandler.col_parser = parser
+            return self.recv_results_rows(f, protocol_version, user_type_map, result_metadata)
+
     class FastResultMessage(ResultMessage):
         """
         Cython version of Result Message that has a faster implementation of
@@ -1080,7 +1103,8 @@ def cython_protocol_handler(colparser):
         """
         # type_codes = ResultMessage.type_codes.copy()
         code_to_type = dict((v, k) for k, v in ResultMessage.type_codes.items())
-        recv_results_rows = make_recv_results_rows(colparser)
+
+    FastResultMessage.recv_results_rows = recv_results_rows
 
     class CythonProtocolHandler(_ProtocolHandler):
         """
@@ -1093,9 +1117,38 @@ def cython_protocol_handler(colparser):
 
         col_parser = colparser
 
+        @classmethod
+        def encode_message(cls, msg, stream_id, protocol_version, compressor, allow_beta_protocol_version):
+            """
+            Encodes QUERY, EXECUTE and BATCH requests in a single buffer using
+            :mod:`dse.message_encoder`, falling back to
+            :meth:`_ProtocolHandler.encode_message` for everything else.
+            """
+            if (fast_encode_message is None or compressor or msg.custom_payload or
+                    msg.opcode not in _FAST_ENCODE_OPCODES or
+                    (getattr(msg, 'continuous_paging_options', None) and
+                     not ProtocolVersion.has_continuous_paging_support(protocol_version))):
+                return super(CythonProtocolHandler, cls).encode_message(msg, stream_id, protocol_version,
+                                                                        compressor, allow_beta_protocol_version)
+
+            flags = 0
+            if msg.tracing:
+                flags |= TRACING_FLAG
+            if allow_beta_protocol_version:
+                flags |= USE_BETA_FLAG
+            return fast_encode_message(msg, stream_id, protocol_version, flags,
+                                       ProtocolVersion.uses_int_query_flags(protocol_version), _UNSET_VALUE)
+
     return CythonProtocolHandler
 
 
+_FAST_ENCODE_OPCODES = frozenset((QueryMessage.opcode, ExecuteMessage.opcode, BatchMessage.opcode))
+
+try:
+    from dse.message_encoder import encode_message as fast_encode_message
+except ImportError:
+    fast_encode_message = None
+
 if HAVE_CYTHON:
     from dse.obj_parser import ListParser, LazyParser
     ProtocolHandler = cython_protocol_handler(ListParser())
@@ -1113,6 +1166,18 @@ else:
     NumpyProtocolHandler = None
 
 
+def _load_arrow_parser():
+    from dse.arrow_parser import ArrowParser
+    return ArrowParser()
+
+
+if HAVE_CYTHON and HAVE_ARROW:
+    # imports pyarrow only once Arrow results are decoded
+    ArrowProtocolHandler = cython_protocol_handler(load_colparser=_load_arrow_parser)
+else:
+    ArrowProtocolHandler = None
+
+
 def read_byte(f):
     return int8_unpack(f.read(1))
 
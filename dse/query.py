@@ -104,9 +104,14 @@ def named_tuple_factory(colnames, rows):
         name: Bob, age: 42
 
     """
+    Row = _named_tuple_class(colnames)
+    return [Row(*row) for row in rows]
+
+
+def _named_tuple_class(colnames):
     clean_column_names = map(_clean_column_name, colnames)
     try:
-        Row = namedtuple('Row', clean_column_names)
+        return namedtuple('Row', clean_column_names)
     except Exception:
         clean_column_names = list(map(_clean_column_name, colnames))  # create list because py3 map object will be consumed by first attempt
         log.warning("Failed creating named tuple for results with column names %s (cleaned: %s) "
@@ -115,9 +120,7 @@ def named_tuple_factory(colnames, rows):
                     "Avoid this by choosing different names, using SELECT \"<col name>\" AS aliases, "
                     "or specifying a different row_factory on your Session" %
                     (colnames, clean_column_names))
-        Row = namedtuple('Row', _sanitize_identifiers(clean_column_names))
-
-    return [Row(*row) for row in rows]
+        return namedtuple('Row', _sanitize_identifiers(clean_column_names))
 
 
 def dict_factory(colnames, rows):
@@ -206,6 +209,7 @@ class Statement(object):
 
     _serial_consistency_level = None
     _routing_key = None
+    _routing_token = None
 
     def __init__(self, retry_policy=None, consistency_level=None, routing_key=None,
                  serial_consistency_level=None, fetch_size=FETCH_SIZE_UNSET, keyspace=None, custom_payload=None,
@@ -231,6 +235,16 @@ class Statement(object):
             l = len(p)
             yield struct.pack(">H%dsB" % l, l, p, 0)
 
+    def _get_routing_token(self, token_class, key):
+        # the token is reused for as long as the routing key object is the
+        # same, e.g. across retries and speculative executions
+        cached = self._routing_token
+        if cached is not None and cached[0] is key and cached[1].__class__ is token_class:
+            return cached[1]
+        token = token_class.from_key(key)
+        self._routing_token = (key, token)
+        return token
+
     def _get_routing_key(self):
         return self._routing_key
 
@@ -0,0 +1,207 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+
+"""
+Pure Python decoding of ROWS results, used when the Cython extensions are not
+built (PyPy, slim installs).
+
+A :class:`RowDecoder` is built once per result metadata signature. It holds
+one reader per column and walks the frame body through a ``memoryview``
+instead of slicing a cell at a time out of the stream. Fixed width types are
+unpacked in place with precompiled :class:`struct.Struct` objects. Other types
+go through the usual ``from_binary``.
+"""
+
+import struct
+from uuid import UUID
+
+import six
+from six.moves import range
+
+from dse.cqltypes import (AsciiType, BooleanType, ByteType, BytesType, CounterColumnType,
+                          DoubleType, FloatType, Int32Type, LongType, ShortType,
+                          TimeUUIDType, UTF8Type, UUIDType, VarcharType)
+
+_int32_unpack_from = struct.Struct('>i').unpack_from
+
+
+def _struct_reader(fmt):
+    def build(ctype, protocol_version):
+        packer = struct.Struct(fmt)
+        unpack_from = packer.unpack_from
+        width = packer.size
+        from_binary = ctype.from_binary
+
+        def read(buf, pos, size):
+            if size == width:
+                return unpack_from(buf, pos)[0]
+            # empty values and malformed cells keep the from_binary semantics
+            return from_binary(buf[pos:pos + size].tobytes(), protocol_version)
+        return read
+    return build
+
+
+def _text_reader(encoding):
+    def build(ctype, protocol_version):
+        def read(buf, pos, size):
+            return buf[pos:pos + size].tobytes().decode(encoding)
+        return read
+    return build
+
+
+def _bytes_reader(ctype, protocol_version):
+    def read(buf, pos, size):
+        return buf[pos:pos + size].tobytes()
+    return read
+
+
+def _uuid_reader(ctype, protocol_version):
+    from_binary = ctype.from_binary
+
+    def read(buf, pos, size):
+        if size == 16:
+            return UUID(bytes=buf[pos:pos + 16].tobytes())
+        return from_binary(buf[pos:pos + size].tobytes(), protocol_version)
+    return read
+
+
+def _generic_reader(ctype, protocol_version):
+    from_binary = ctype.from_binary
+
+    def read(buf, pos, size):
+        return from_binary(buf[pos:pos + size].tobytes(), protocol_version)
+    return read
+
+
+# ctype -> (deserialize the reader was written against, reader builder)
+_fast_readers = dict((ctype, (ctype.deserialize, build)) for ctype, build in (
+    (Int32Type, _struct_reader('>i')),
+    (LongType, _struct_reader('>q')),
+    (CounterColumnType, _struct_reader('>q')),
+    (ShortType, _struct_reader('>h')),
+    (ByteType, _struct_reader('>b')),
+    (FloatType, _struct_reader('>f')),
+    (DoubleType, _struct_reader('>d')),
+    (BooleanType, _struct_reader('>?')),
+    (UTF8Type, _text_reader('utf8')),
+    (VarcharType, _text_reader('utf8')),
+    (AsciiType, _bytes_reader if six.PY2 else _text_reader('ascii')),
+    (BytesType, _bytes_reader),
+    (UUIDType, _uuid_reader),
+    (TimeUUIDType, _uuid_reader)))
+
+
+def _make_reader(ctype, protocol_version):
+    try:
+        deserialize, build = _fast_readers[ctype]
+    except KeyError:
+        return _generic_reader(ctype, protocol_version)
+    if ctype.deserialize is not deserialize:
+        # the application replaced the deserializer; honor it
+        return _generic_reader(ctype, protocol_version)
+    return build(ctype, protocol_version)
+
+
+def _buffer_view(f):
+    try:
+        return f.getbuffer()
+    except AttributeError:  # Python 2 BytesIO
+        return memoryview(f.getvalue())
+
+
+class RowDecoder(object):
+    """
+    Decodes the rows of results sharing one column signature.
+    """
+
+    column_names = None
+    column_types = None
+    protocol_version = None
+
+    def __init__(self, column_names, column_types, protocol_version):
+        self.column_names = column_names
+        self.column_types = column_types
+        self.protocol_version = protocol_version
+        self._readers = tuple(_make_reader(ctype, protocol_version) for ctype in column_types)
+        self._row_makers = {}
+
+    def decode_rows(self, f, rowcount):
+        """
+        Reads `rowcount` rows from the current position of the BytesIO `f`
+        and returns them as a list of tuples. `f` is left after the last row.
+        """
+        buf = _buffer_view(f)
+        pos = f.tell()
+        readers = self._readers
+        unpack_size = _int32_unpack_from
+        rows = []
+        append = rows.append
+        try:
+            for _ in range(rowcount):
+                row = []
+                for read in readers:
+                    size = unpack_size(buf, pos)[0]
+                    pos += 4
+                    if size < 0:
+                        row.append(None)
+                    else:
+                        row.append(read(buf, pos, size))
+                        pos += size
+                append(tuple(row))
+        finally:
+            del buf
+        f.seek(pos)
+        return rows
+
+    def make_rows(self, row_factory, rows):
+        """
+        Applies `row_factory` to rows returned by :meth:`decode_rows`. The row
+        type built by :func:`~.named_tuple_factory` is created once per
+        decoder rather than once per page.
+        """
+        try:
+            maker = self._row_makers[row_factory]
+        except KeyError:
+            maker = self._row_makers[row_factory] = self._fuse_row_factory(row_factory)
+        return maker(rows)
+
+    def _fuse_row_factory(self, row_factory):
+        from dse.query import tuple_factory, named_tuple_factory, _named_tuple_class
+
+        if row_factory is tuple_factory:
+            return lambda rows: rows
+        if row_factory is named_tuple_factory:
+            Row = _named_tuple_class(self.column_names)
+            new = tuple.__new__
+            return lambda rows: [new(Row, row) for row in rows]
+        column_names = self.column_names
+        return lambda rows: row_factory(column_names, rows)
+
+
+_row_decoders = {}
+_MAX_CACHED_DECODERS = 1024
+
+
+def get_row_decoder(column_metadata, protocol_version):
+    """
+    Returns the :class:`RowDecoder` for `column_metadata`, which is a list of
+    ``(keyspace, table, name, type)`` tuples. Decoders are cached by
+    signature, so the result metadata of a prepared statement, and results
+    of the same shape, share one decoder.
+    """
+    key = (protocol_version, tuple((c[2], c[3]) for c in column_metadata))
+    try:
+        return _row_decoders[key]
+    except KeyError:
+        pass
+    if len(_row_decoders) >= _MAX_CACHED_DECODERS:
+        _row_decoders.clear()
+    decoder = RowDecoder([c[2] for c in column_metadata], [c[3] for c in column_metadata], protocol_version)
+    _row_decoders[key] = decoder
+    return decoder
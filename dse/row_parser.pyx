@@ -39,5 +39,7 @@ def make_recv_results_rows(ColumnParser colparser):
             rowcount = read_int(reader)
             for i in range(rowcount):
                 rowparser.unpack_row(reader, desc)
+            # the values decode, so the column parser failed
+            raise
 
     return recv_results_rows
@@ -8,12 +8,15 @@ except ImportError:
     import unittest
 
 from itertools import count
+import socket
+import uuid
 
 from dse.query import tuple_factory
 from dse.cluster import Cluster, ExecutionProfile, EXEC_PROFILE_DEFAULT
 from dse.concurrent import execute_concurrent_with_args
 from dse.protocol import ProtocolHandler, LazyProtocolHandler, NumpyProtocolHandler
 from dse.cython_deps import HAVE_CYTHON, HAVE_NUMPY
+from dse.util import Date, Time
 from tests import VERIFY_CYTHON
 from tests.integration import use_singledc, PROTOCOL_VERSION, drop_keyspace_shutdown_cluster\
     , BasicSharedKeyspaceUnitTestCase, execute_with_retry_tolerant, greaterthancass21
@@ -146,6 +149,8 @@ class CythonProtocolHandlerTest(unittest.TestCase):
             arr = page[colname]
             self.match_dtype(datatype, arr.dtype)
 
+        page = dict((colname, [numpy_value_to_python(datatype, v) for v in page[colname]])
+                    for colname, datatype in zip(colnames, datatypes))
         return verify_iterator_data(self.assertEqual, arrays_to_list_of_tuples(page, colnames))
 
     def match_dtype(self, datatype, dtype):
@@ -160,6 +165,18 @@ class CythonProtocolHandlerTest(unittest.TestCase):
             self.match_dtype_props(dtype, 'f', 4)
         elif datatype == 'double':
             self.match_dtype_props(dtype, 'f', 8)
+        elif datatype == 'tinyint':
+            self.match_dtype_props(dtype, 'i', 1)
+        elif datatype == 'boolean':
+            self.match_dtype_props(dtype, 'b', 1)
+        elif datatype == 'timestamp':
+            self.assertEqual(dtype, 'datetime64[ms]')
+        elif datatype == 'date':
+            self.assertEqual(dtype, 'datetime64[D]')
+        elif datatype == 'time':
+            self.assertEqual(dtype, 'timedelta64[ns]')
+        elif datatype in ('uuid', 'timeuuid', 'inet'):
+            self.match_dtype_props(dtype, 'V', 16)
         else:
             self.assertEqual(dtype.kind, 'O', msg=(dtype, datatype))
 
@@ -168,6 +185,24 @@ class CythonProtocolHandlerTest(unittest.TestCase):
         self.assertEqual(dtype.itemsize, size, msg=dtype)
 
 
+def numpy_value_to_python(datatype, value):
+    """Convert a value of a typed NumPy array to the value the driver would return"""
+    if datatype == 'timestamp':
+        return value.astype(object)
+    elif datatype == 'date':
+        return Date(value.astype(object))
+    elif datatype == 'time':
+        return Time(int(value.astype('i8')))
+    elif datatype in ('uuid', 'timeuuid'):
+        return uuid.UUID(bytes=value.tobytes())
+    elif datatype == 'inet':
+        address = value.tobytes()
+        if address.startswith(b'\x00' * 10 + b'\xff\xff'):
+            return socket.inet_ntop(socket.AF_INET, address[12:])
+        return socket.inet_ntop(socket.AF_INET6, address)
+    return value
+
+
 def arrays_to_list_of_tuples(arrays, colnames):
     """Convert a dict of arrays (as given by the numpy protocol handler) to a list of tuples"""
     first_array = arrays[colnames[0]]
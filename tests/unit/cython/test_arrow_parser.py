@@ -0,0 +1,169 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+
+from tests.unit.cython.utils import arrowtest
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+import datetime
+from decimal import Decimal
+import io
+import uuid
+
+from dse.cqltypes import (BooleanType, ByteType, BytesType, DateType, DecimalType, DoubleType, DurationType,
+                          InetAddressType, Int32Type, IntegerType, ListType, LongType, MapType, SetType,
+                          SimpleDateType, TimeType, TupleType, UserType, UTF8Type, UUIDType)
+from dse.protocol import ArrowProtocolHandler, ResultMessage, RESULT_KIND_ROWS, write_int, write_value
+from dse.util import Duration, OrderedMap, SortedSet
+
+
+def parse(types, rows):
+    f = io.BytesIO()
+    write_int(f, RESULT_KIND_ROWS)
+    write_int(f, ResultMessage._NO_METADATA_FLAG)
+    write_int(f, len(types))
+    write_int(f, len(rows))
+    for row in rows:
+        for value in row:
+            write_value(f, value)
+    f.seek(0)
+
+    message_type = ArrowProtocolHandler.message_types_by_opcode[ResultMessage.opcode]
+    column_metadata = [('ks', 'tbl', 'col%d' % i, t) for i, t in enumerate(types)]
+    return message_type.recv_body(f, 4, {}, column_metadata).parsed_rows
+
+
+class ArrowParserTest(unittest.TestCase):
+
+    @arrowtest
+    def test_types(self):
+        import pyarrow as pa
+
+        u = uuid.uuid4()
+        types = [Int32Type, LongType, ByteType, DoubleType, BooleanType, DateType, SimpleDateType, TimeType,
+                 UUIDType, InetAddressType, UTF8Type, BytesType, DecimalType]
+        values = [-42, 2 ** 40, -3, 2.5, True, datetime.datetime(2017, 3, 4, 5, 6, 7, 8000),
+                  datetime.date(1969, 7, 20), 3723000004000, u, '127.0.0.1', u'\u00e9t\u00e9', b'\x00\x01',
+                  Decimal('1.5')]
+        batch = parse(types, [[t.serialize(v, 4) for t, v in zip(types, values)],
+                              [None] * len(types), [b''] * len(types)])
+
+        self.assertEqual([pa.int32(), pa.int64(), pa.int8(), pa.float64(), pa.bool_(), pa.timestamp('ms'),
+                          pa.date32(), pa.time64('ns'), pa.binary(16), pa.binary(16), pa.string(), pa.binary(),
+                          pa.decimal128(2, 1)],
+                         [field.type for field in batch.schema])
+        self.assertEqual(['col%d' % i for i in range(len(types))], batch.schema.names)
+        batch.validate(full=True)
+
+        columns = [column.to_pylist() for column in batch.columns]
+        self.assertEqual(values[:7], [c[0] for c in columns[:7]])
+        self.assertEqual(values[7], batch.column(7).cast(pa.int64())[0].as_py())
+        self.assertEqual(u, uuid.UUID(bytes=columns[8][0]))
+        self.assertEqual(b'\x00' * 10 + b'\xff\xff\x7f\x00\x00\x01', columns[9][0])
+        self.assertEqual(values[10:], [c[0] for c in columns[10:]])
+
+        self.assertEqual([None] * len(types), [c[1] for c in columns])
+        # empty values are null, except for strings and blobs
+        self.assertEqual([None] * 10 + [u'', b'', None], [c[2] for c in columns])
+
+    @arrowtest
+    def test_many_rows(self):
+        rows = [[Int32Type.serialize(i, 4) if i % 3 else None, BooleanType.serialize(i % 2 == 0, 4),
+                 UTF8Type.serialize(u'v' * (i % 5), 4)] for i in range(100)]
+        batch = parse([Int32Type, BooleanType, UTF8Type], rows)
+        batch.validate(full=True)
+        self.assertEqual(100, batch.num_rows)
+        self.assertEqual([i if i % 3 else None for i in range(100)], batch.column(0).to_pylist())
+        self.assertEqual([i % 2 == 0 for i in range(100)], batch.column(1).to_pylist())
+        self.assertEqual([u'v' * (i % 5) for i in range(100)], batch.column(2).to_pylist())
+
+    @arrowtest
+    def test_no_rows(self):
+        import pyarrow as pa
+
+        batch = parse([Int32Type, UTF8Type], [])
+        self.assertEqual(0, batch.num_rows)
+        self.assertEqual([pa.int32(), pa.string()], [field.type for field in batch.schema])
+
+    @arrowtest
+    def test_collections(self):
+        import pyarrow as pa
+
+        u = uuid.uuid4()
+        types = [SetType.apply_parameters([UTF8Type]), MapType.apply_parameters([UTF8Type, Int32Type]),
+                 ListType.apply_parameters([ListType.apply_parameters([UUIDType])]),
+                 MapType.apply_parameters([Int32Type, SetType.apply_parameters([InetAddressType])])]
+        values = [SortedSet([u'b', u'a']), OrderedMap([(u'x', 1), (u'y', None)]), [[u], []],
+                  OrderedMap([(1, SortedSet(['127.0.0.1']))])]
+        batch = parse(types, [[t.serialize(v, 4) for t, v in zip(types, values)], [None] * len(types)])
+        batch.validate(full=True)
+
+        self.assertEqual([pa.list_(pa.string()), pa.map_(pa.string(), pa.int32()),
+                          pa.list_(pa.list_(pa.binary(16))), pa.map_(pa.int32(), pa.list_(pa.binary(16)))],
+                         [field.type for field in batch.schema])
+        self.assertEqual([u'a', u'b'], batch.column(0)[0].as_py())
+        self.assertEqual([(u'x', 1), (u'y', None)], batch.column(1).to_pylist()[0])
+        self.assertEqual([[u.bytes], []], batch.column(2)[0].as_py())
+        self.assertEqual([(1, [b'\x00' * 10 + b'\xff\xff\x7f\x00\x00\x01'])], batch.column(3).to_pylist()[0])
+        self.assertEqual([None] * len(types), [column[1].as_py() for column in batch.columns])
+
+    @arrowtest
+    def test_tuples_and_user_types(self):
+        import pyarrow as pa
+
+        tuple_type = TupleType.apply_parameters([Int32Type, UTF8Type])
+        udt = UserType.make_udt_class('ks', 'address', ('street', 'zip'), (UTF8Type, Int32Type))
+        types = [tuple_type, udt, ListType.apply_parameters([udt])]
+        values = [(1, u'a'), (u'Main', 12345), [(u'Elm', None)]]
+        batch = parse(types, [[t.serialize(v, 4) for t, v in zip(types, values)], [None] * len(types)])
+        batch.validate(full=True)
+
+        address = pa.struct([('street', pa.string()), ('zip', pa.int32())])
+        self.assertEqual([pa.struct([('f0', pa.int32()), ('f1', pa.string())]), address, pa.list_(address)],
+                         [field.type for field in batch.schema])
+        self.assertEqual({'f0': 1, 'f1': u'a'}, batch.column(0)[0].as_py())
+        self.assertEqual({'street': u'Main', 'zip': 12345}, batch.column(1)[0].as_py())
+        self.assertEqual([{'street': u'Elm', 'zip': None}], batch.column(2)[0].as_py())
+        self.assertEqual([None] * len(types), [column[1].as_py() for column in batch.columns])
+
+    @arrowtest
+    def test_numbers(self):
+        import pyarrow as pa
+
+        types = [IntegerType, DecimalType, ListType.apply_parameters([DecimalType])]
+        rows = [[2 ** 70, Decimal('-123.45'), [Decimal('1E+3'), Decimal('0.001')]],
+                [-1, Decimal('7'), []]]
+        batch = parse(types, [[t.serialize(v, 4) for t, v in zip(types, row)] for row in rows])
+        batch.validate(full=True)
+
+        self.assertEqual([pa.string(), pa.decimal128(5, 2), pa.list_(pa.decimal128(7, 3))],
+                         [field.type for field in batch.schema])
+        self.assertEqual([str(2 ** 70), u'-1'], batch.column(0).to_pylist())
+        self.assertEqual([Decimal('-123.45'), Decimal('7')], batch.column(1).to_pylist())
+        self.assertEqual([Decimal('1000'), Decimal('0.001')], batch.column(2)[0].as_py())
+
+    @arrowtest
+    def test_serialized_types(self):
+        import pyarrow as pa
+
+        duration = DurationType.serialize(Duration(1, 2, 3), 4)
+        batch = parse([DurationType, ListType.apply_parameters([DurationType])],
+                      [[duration, ListType.apply_parameters([DurationType]).serialize([Duration(1, 2, 3)], 4)]])
+        self.assertEqual([pa.binary(), pa.list_(pa.binary())], [field.type for field in batch.schema])
+        self.assertEqual([duration], batch.column(0).to_pylist())
+        self.assertEqual([[duration]], batch.column(1).to_pylist())
+
+    @arrowtest
+    def test_decode_failure_raises(self):
+        # more digits than decimal128 holds
+        value = DecimalType.serialize(Decimal('1' * 39), 4)
+        self.assertRaises(ValueError, parse, [DecimalType], [[value]])
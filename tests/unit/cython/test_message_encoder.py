@@ -0,0 +1,87 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+import six
+
+from dse import ConsistencyLevel, ProtocolVersion
+from dse.cluster import ContinuousPagingOptions
+from dse.protocol import (QueryMessage, ExecuteMessage, BatchMessage, PrepareMessage,
+                          _ProtocolHandler, _UNSET_VALUE, TRACING_FLAG, USE_BETA_FLAG)
+from dse.query import BatchType
+
+try:
+    from dse.message_encoder import encode_message
+except ImportError:
+    encode_message = None  # noqa
+
+
+@unittest.skipIf(encode_message is None, 'dse.message_encoder extension is not built')
+class MessageEncoderTest(unittest.TestCase):
+    """
+    The Cython encoder must produce exactly the frames of _ProtocolHandler.
+    """
+
+    def assert_same_frame(self, msg, stream_id=3, frame_flags=0):
+        for version in ProtocolVersion.SUPPORTED_VERSIONS:
+            if msg.opcode != BatchMessage.opcode and msg.continuous_paging_options and \
+                    not ProtocolVersion.has_continuous_paging_support(version):
+                continue
+            expected = _ProtocolHandler.encode_message(msg, stream_id, version, None,
+                                                       bool(frame_flags & USE_BETA_FLAG))
+            actual = encode_message(msg, stream_id, version, frame_flags,
+                                    ProtocolVersion.uses_int_query_flags(version), _UNSET_VALUE)
+            self.assertEqual(expected, actual, "protocol version %d" % (version,))
+
+    def test_query_message(self):
+        self.assert_same_frame(QueryMessage("SELECT * FROM t", ConsistencyLevel.ONE))
+        self.assert_same_frame(QueryMessage(u"SELECT * FROM t WHERE k = '\u00e9'", ConsistencyLevel.QUORUM,
+                                            serial_consistency_level=ConsistencyLevel.LOCAL_SERIAL,
+                                            fetch_size=5000, paging_state=b'\x00\x01state',
+                                            timestamp=1234567890123))
+
+    def test_execute_message(self):
+        values = [b'\x00\x00\x00\x01', None, _UNSET_VALUE, b'', b'x' * 1000]
+        self.assert_same_frame(ExecuteMessage(b'\xde\xad\xbe\xef', values, ConsistencyLevel.LOCAL_ONE))
+        self.assert_same_frame(ExecuteMessage(b'\xde\xad\xbe\xef', values, ConsistencyLevel.LOCAL_ONE,
+                                              serial_consistency_level=ConsistencyLevel.SERIAL,
+                                              fetch_size=100, paging_state=b'abc', timestamp=1),
+                               stream_id=-1)
+        self.assert_same_frame(ExecuteMessage(b'id', [], ConsistencyLevel.ONE), stream_id=32767)
+
+    def test_execute_message_grows_buffer(self):
+        values = [six.int2byte(i % 256) * (i * 100) for i in range(64)]
+        self.assert_same_frame(ExecuteMessage(b'id', values, ConsistencyLevel.ONE))
+
+    def test_continuous_paging(self):
+        options = ContinuousPagingOptions(max_pages=4, max_pages_per_second=3,
+                                          page_unit=ContinuousPagingOptions.PagingUnit.BYTES)
+        self.assert_same_frame(QueryMessage("SELECT * FROM t", ConsistencyLevel.ONE, fetch_size=10,
+                                            continuous_paging_options=options))
+
+    def test_batch_message(self):
+        queries = [(False, "INSERT INTO t (k) VALUES (?)", [b'\x00\x00\x00\x01']),
+                   (True, b'\x01\x02', [None, _UNSET_VALUE, b'v']),
+                   (False, u"INSERT INTO t (k) VALUES (1)", [])]
+        self.assert_same_frame(BatchMessage(BatchType.UNLOGGED, queries, ConsistencyLevel.ONE))
+        self.assert_same_frame(BatchMessage(BatchType.LOGGED, queries, ConsistencyLevel.QUORUM,
+                                            serial_consistency_level=ConsistencyLevel.SERIAL,
+                                            timestamp=42))
+
+    def test_frame_flags(self):
+        msg = QueryMessage("SELECT * FROM t", ConsistencyLevel.ONE)
+        msg.tracing = True
+        self.assert_same_frame(msg, frame_flags=TRACING_FLAG | USE_BETA_FLAG)
+
+    def test_unsupported_message(self):
+        self.assertRaises(ValueError, encode_message, PrepareMessage("SELECT * FROM t"), 1, 4, 0, False, _UNSET_VALUE)
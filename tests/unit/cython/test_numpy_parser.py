@@ -0,0 +1,105 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+
+from tests.unit.cython.utils import numpytest
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+import datetime
+import io
+import uuid
+
+from dse.cqltypes import (BooleanType, ByteType, DateType, InetAddressType, Int32Type, SimpleDateType,
+                          TimeType, TimeUUIDType, UTF8Type, UUIDType)
+from dse.protocol import NumpyProtocolHandler, ResultMessage, RESULT_KIND_ROWS, write_int, write_value
+
+
+def column_metadata(*types):
+    return [('ks', 'tbl', 'col%d' % i, t) for i, t in enumerate(types)]
+
+
+def parse(types, rows, text_width=None):
+    f = io.BytesIO()
+    write_int(f, RESULT_KIND_ROWS)
+    write_int(f, ResultMessage._NO_METADATA_FLAG)
+    write_int(f, len(types))
+    write_int(f, len(rows))
+    for row in rows:
+        for value in row:
+            write_value(f, value)
+    f.seek(0)
+
+    message_type = NumpyProtocolHandler.message_types_by_opcode[ResultMessage.opcode]
+    parser = NumpyProtocolHandler.col_parser
+    parser.text_width = text_width
+    try:
+        msg = message_type.recv_body(f, 4, {}, column_metadata(*types))
+    finally:
+        parser.text_width = None
+    return [msg.parsed_rows['col%d' % i] for i in range(len(types))]
+
+
+class NumpyParserTest(unittest.TestCase):
+
+    @numpytest
+    def test_fixed_width_types(self):
+        import numpy as np
+
+        timestamp = datetime.datetime(2017, 3, 4, 5, 6, 7, 8000)
+        u1, u2 = uuid.uuid4(), uuid.uuid1()
+        types = [BooleanType, ByteType, DateType, SimpleDateType, TimeType, UUIDType, TimeUUIDType]
+        values = [BooleanType.serialize(True, 4), ByteType.serialize(-3, 4), DateType.serialize(timestamp, 4),
+                  SimpleDateType.serialize(datetime.date(1969, 7, 20), 4), TimeType.serialize(3723000000004, 4),
+                  u1.bytes, u2.bytes]
+        arrays = parse(types, [values, [None] * len(types), [b''] * len(types)])
+
+        self.assertEqual(['bool', 'int8', 'datetime64[ms]', 'datetime64[D]', 'timedelta64[ns]', '|V16', '|V16'],
+                         [arr.dtype.str if arr.dtype.kind == 'V' else str(arr.dtype) for arr in arrays])
+        for arr in arrays:
+            self.assertEqual([False, True, True], list(arr.mask))
+
+        self.assertEqual([True, -3], [arrays[0][0], arrays[1][0]])
+        self.assertEqual(np.datetime64(timestamp, 'ms'), arrays[2][0])
+        self.assertEqual(np.datetime64('1969-07-20'), arrays[3][0])
+        self.assertEqual(np.timedelta64(3723000000004, 'ns'), arrays[4][0])
+        self.assertEqual([u1, u2], [uuid.UUID(bytes=arrays[i].data[0].tobytes()) for i in (5, 6)])
+
+    @numpytest
+    def test_inet(self):
+        arr = parse([InetAddressType], [[InetAddressType.serialize('127.0.0.1', 4)],
+                                        [InetAddressType.serialize('2001:db8::1', 4)], [None]])[0]
+        self.assertEqual([b'\x00' * 10 + b'\xff\xff\x7f\x00\x00\x01',
+                          InetAddressType.serialize('2001:db8::1', 4)],
+                         [v.tobytes() for v in arr.data[:2]])
+        self.assertEqual([False, False, True], list(arr.mask))
+
+    @numpytest
+    def test_text(self):
+        values = [u'\u00e9t\u00e9', u'', u'abc']
+        rows = [[UTF8Type.serialize(v, 4), None] for v in values] + [[None, None]]
+        arr = parse([UTF8Type, Int32Type], rows)[0]
+        self.assertEqual('O', arr.dtype.kind)
+        self.assertEqual(values + [None], list(arr))
+
+    @numpytest
+    def test_text_width(self):
+        values = [u'\u00e9t\u00e9', u'', u'abc']
+        rows = [[UTF8Type.serialize(v, 4)] for v in values] + [[None]]
+        # the width does not depend on the values of the page
+        for text_width in (3, 10):
+            arr = parse([UTF8Type], rows, text_width=text_width)[0]
+            self.assertEqual('U', arr.dtype.kind)
+            self.assertEqual(4 * text_width, arr.dtype.itemsize)
+            self.assertEqual(values, list(arr.data[:3]))
+            self.assertEqual([False, False, False, True], list(arr.mask))
+
+        self.assertRaises(ValueError, parse, [UTF8Type], rows, text_width=2)
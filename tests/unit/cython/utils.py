@@ -7,7 +7,7 @@
 #
 # http://www.datastax.com/terms/datastax-dse-driver-license-terms
 
-from dse.cython_deps import HAVE_CYTHON, HAVE_NUMPY
+from dse.cython_deps import HAVE_CYTHON, HAVE_NUMPY, HAVE_ARROW
 try:
     from tests import VERIFY_CYTHON
 except ImportError:
@@ -36,3 +36,4 @@ def cyimport(import_path):
 cythontest = unittest.skipUnless((HAVE_CYTHON or VERIFY_CYTHON) or VERIFY_CYTHON, 'Cython is not available')
 notcython = unittest.skipIf(HAVE_CYTHON, 'Cython not supported')
 numpytest = unittest.skipUnless((HAVE_CYTHON and HAVE_NUMPY) or VERIFY_CYTHON, 'NumPy is not available')
+arrowtest = unittest.skipUnless((HAVE_CYTHON and HAVE_ARROW) or VERIFY_CYTHON, 'pyarrow is not available')
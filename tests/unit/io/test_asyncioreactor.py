@@ -0,0 +1,197 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest # noqa
+
+import errno
+from mock import patch, Mock
+import six
+from six import BytesIO
+from socket import error as socket_error
+import time
+
+from dse.connection import HEADER_DIRECTION_TO_CLIENT, ConnectionException
+from dse.protocol import (write_stringmultimap, write_int, write_string,
+                          SupportedMessage, ReadyMessage, ServerError)
+from dse.marshal import uint8_pack, uint32_pack, uint16_pack
+from tests import is_monkey_patched
+from tests.unit.io.utils import submit_and_wait_for_completion, TimerCallback
+
+try:
+    from dse.io.asyncioreactor import AsyncioConnection
+except (ImportError, SyntaxError):
+    AsyncioConnection = None  # noqa
+
+
+@patch('socket.socket')
+@patch('dse.io.asyncioreactor.AsyncioLoop.maybe_start')
+class AsyncioConnectionTest(unittest.TestCase):
+
+    def setUp(self):
+        if is_monkey_patched():
+            raise unittest.SkipTest("Can't test asyncio with monkey patching")
+        if AsyncioConnection is None:
+            raise unittest.SkipTest("asyncio requires Python 3.5+")
+        AsyncioConnection.initialize_reactor()
+
+    def make_connection(self):
+        c = AsyncioConnection('1.2.3.4', cql_version='3.0.1')
+        c._socket = Mock()
+        c._socket.send.side_effect = lambda x: len(x)
+        c._socket.sendmsg.side_effect = lambda bufs: sum(len(b) for b in bufs)
+        c._fileno = 100
+        return c
+
+    def make_header_prefix(self, message_class, version=3, stream_id=0):
+        header = list(map(uint8_pack, [
+            0xff & (HEADER_DIRECTION_TO_CLIENT | version),
+            stream_id,
+            message_class.opcode  # opcode
+        ]))
+        header.insert(1, uint16_pack(0))  # flags (compression)
+        return six.binary_type().join(header)
+
+    def make_options_body(self):
+        options_buf = BytesIO()
+        write_stringmultimap(options_buf, {
+            'CQL_VERSION': ['3.0.1'],
+            'COMPRESSION': []
+        })
+        return options_buf.getvalue()
+
+    def make_error_body(self, code, msg):
+        buf = BytesIO()
+        write_int(buf, code)
+        write_string(buf, msg)
+        return buf.getvalue()
+
+    def make_msg(self, header, body=six.binary_type()):
+        return header + uint32_pack(len(body)) + body
+
+    def test_successful_connection(self, *args):
+        c = self.make_connection()
+
+        # let it write the OptionsMessage
+        c.handle_write()
+
+        # read in a SupportedMessage response
+        header = self.make_header_prefix(SupportedMessage)
+        options = self.make_options_body()
+        c._socket.recv.return_value = self.make_msg(header, options)
+        c.handle_read()
+
+        # let it write out a StartupMessage
+        c.handle_write()
+
+        header = self.make_header_prefix(ReadyMessage, stream_id=1)
+        c._socket.recv.return_value = self.make_msg(header)
+        c.handle_read()
+
+        self.assertTrue(c.connected_event.is_set())
+        self.assertFalse(c.is_defunct)
+        return c
+
+    def test_error_message_on_startup(self, *args):
+        c = self.make_connection()
+        c.handle_write()
+
+        header = self.make_header_prefix(SupportedMessage)
+        c._socket.recv.return_value = self.make_msg(header, self.make_options_body())
+        c.handle_read()
+        c.handle_write()
+
+        header = self.make_header_prefix(ServerError, stream_id=1)
+        body = self.make_error_body(ServerError.error_code, ServerError.summary)
+        c._socket.recv.return_value = self.make_msg(header, body)
+        c.handle_read()
+
+        self.assertTrue(c.is_defunct)
+        self.assertIsInstance(c.last_error, ConnectionException)
+        self.assertTrue(c.connected_event.is_set())
+
+    def test_socket_error_on_write(self, *args):
+        c = self.make_connection()
+        c._socket.send.side_effect = socket_error(errno.EIO, "bad stuff!")
+        c.handle_write()
+
+        self.assertTrue(c.is_defunct)
+        self.assertIsInstance(c.last_error, socket_error)
+
+    def test_blocking_on_write(self, *args):
+        c = self.make_connection()
+        c._socket.send.side_effect = socket_error(errno.EAGAIN, "socket busy")
+        c.handle_write()
+
+        self.assertFalse(c.is_defunct)
+        self.assertTrue(c.deque)
+
+        c._socket.send.side_effect = lambda x: len(x)
+        c.handle_write()
+        self.assertFalse(c.deque)
+        self.assertFalse(c._writer_active)
+
+    def test_push_registers_writer_once(self, *args):
+        c = self.make_connection()
+        c.handle_write()
+        self.assertFalse(c._writer_active)
+
+        with patch.object(c._asyncioloop, 'call_soon') as call_soon:
+            c.push(six.b('a'))
+            c.push(six.b('b'))
+            call_soon.assert_called_once_with(c._start_writing)
+
+        c.handle_write()
+        c._socket.sendmsg.assert_called_once_with([six.b('a'), six.b('b')])
+
+    def test_closed_by_server(self, *args):
+        c = self.make_connection()
+        c._socket.recv.return_value = six.binary_type()
+        c.handle_read()
+
+        self.assertTrue(c.is_closed)
+        self.assertIsInstance(c.last_error, ConnectionException)
+
+
+class AsyncioTimerTest(unittest.TestCase):
+
+    def setUp(self):
+        if is_monkey_patched():
+            raise unittest.SkipTest("Can't test asyncio with monkey patching")
+        if AsyncioConnection is None:
+            raise unittest.SkipTest("asyncio requires Python 3.5+")
+        AsyncioConnection.initialize_reactor()
+        AsyncioConnection._asyncioloop.maybe_start()
+
+    def test_multi_timer_validation(self):
+        """
+        Verify that timer timeouts are honored appropriately
+        """
+        # Tests timers submitted in order at various timeouts
+        submit_and_wait_for_completion(self, AsyncioConnection, 0, 100, 1, 100)
+        # Tests timers submitted in reverse order at various timeouts
+        submit_and_wait_for_completion(self, AsyncioConnection, 100, 0, -1, 100)
+        # Tests timers submitted in varying order at various timeouts
+        submit_and_wait_for_completion(self, AsyncioConnection, 0, 100, 1, 100, True)
+
+    def test_timer_cancellation(self):
+        """
+        Verify that timer cancellation is honored
+        """
+        timeout = .1
+        callback = TimerCallback(timeout)
+        timer = AsyncioConnection.create_timer(timeout, callback.invoke)
+        timer.cancel()
+        # Release context allow for timer thread to run.
+        time.sleep(.2)
+        timer_manager = AsyncioConnection._asyncioloop._timers
+        # Assert that the cancellation was honored
+        self.assertEqual(0, len(timer_manager))
+        self.assertFalse(callback.was_invoked())
@@ -18,7 +18,6 @@ import errno
 import math
 import time
 from mock import patch, Mock
-import os
 from six import BytesIO
 import socket
 from socket import error as socket_error
@@ -62,6 +61,7 @@ class AsyncoreConnectionTest(unittest.TestCase):
         c = AsyncoreConnection('1.2.3.4', cql_version='3.0.1')
         c.socket = Mock()
         c.socket.send.side_effect = lambda x: len(x)
+        c.socket.sendmsg.side_effect = lambda bufs: sum(len(b) for b in bufs)
         return c
 
     def make_header_prefix(self, message_class, version=3, stream_id=0):
@@ -136,13 +136,11 @@ class AsyncoreConnectionTest(unittest.TestCase):
         c.handle_read()
         self.assertEqual(c._current_frame.end_pos, 20000 + len(header))
         # the EAGAIN prevents it from reading the last 100 bytes
-        c._iobuf.seek(0, os.SEEK_END)
         pos = c._iobuf.tell()
         self.assertEqual(pos, 4096 + 4096)
 
         # now tell it to read the last 100 bytes
         c.handle_read()
-        c._iobuf.seek(0, os.SEEK_END)
         pos = c._iobuf.tell()
         self.assertEqual(pos, 4096 + 4096 + 100)
 
@@ -222,7 +220,9 @@ class AsyncoreConnectionTest(unittest.TestCase):
         write_size = 4
         c.socket.send.side_effect = None
         c.socket.send.return_value = write_size
-        c.handle_write()
+        # each wakeup makes a single send; the rest of the message stays queued
+        while c.deque:
+            c.handle_write()
 
         msg_size = 9  # v3+ frame header
         expected_writes = int(math.ceil(float(msg_size) / write_size))
@@ -232,6 +232,20 @@ class AsyncoreConnectionTest(unittest.TestCase):
         self.assertEqual(expected_writes, c.socket.send.call_count)
         self.assertEqual(last_write_size, len(c.socket.send.call_args[0][0]))
 
+    def test_coalesced_write(self, *args):
+        c = self.make_connection()
+        c.handle_write()  # flush the OptionsMessage
+        c.socket.send.reset_mock()
+
+        for msg in (six.b('a') * 10, six.b('b') * 20, six.b('c') * 30):
+            c.push(msg)
+        c.handle_write()
+
+        c.socket.sendmsg.assert_called_once_with([six.b('a') * 10, six.b('b') * 20, six.b('c') * 30])
+        self.assertFalse(c.socket.send.called)
+        self.assertFalse(c.deque)
+        self.assertFalse(c.writable())
+
     def test_socket_error_on_read(self, *args):
         c = self.make_connection()
 
@@ -326,6 +340,5 @@ class AsyncoreConnectionTest(unittest.TestCase):
         time.sleep(.2)
         timer_manager = connection._loop._timers
         # Assert that the cancellation was honored
-        self.assertFalse(timer_manager._queue)
-        self.assertFalse(timer_manager._new_timers)
+        self.assertEqual(0, len(timer_manager))
         self.assertFalse(callback.was_invoked())
@@ -40,3 +40,10 @@ class EventletTimerTest(unittest.TestCase, TimerConnectionTests):
 
     # There is no unpatching because there is not a clear way
     # of doing it reliably
+
+    def test_initialize_reactor_keeps_timers(self):
+        timers = EventletConnection._timers
+        timeout_watcher = EventletConnection._timeout_watcher
+        EventletConnection.initialize_reactor()
+        self.assertIs(timers, EventletConnection._timers)
+        self.assertIs(timeout_watcher, EventletConnection._timeout_watcher)
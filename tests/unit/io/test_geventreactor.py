@@ -37,3 +37,10 @@ class GeventTimerTest(unittest.TestCase, TimerConnectionTests):
 
     # There is no unpatching because there is not a clear way
     # of doing it reliably
+
+    def test_initialize_reactor_keeps_timers(self):
+        timers = GeventConnection._timers
+        timeout_watcher = GeventConnection._timeout_watcher
+        GeventConnection.initialize_reactor()
+        self.assertIs(timers, GeventConnection._timers)
+        self.assertIs(timeout_watcher, GeventConnection._timeout_watcher)
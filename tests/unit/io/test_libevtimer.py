@@ -71,7 +71,6 @@ class LibevTimerTest(unittest.TestCase):
         time.sleep(.2)
         timer_manager = connection._libevloop._timers
         # Assert that the cancellation was honored
-        self.assertFalse(timer_manager._queue)
-        self.assertFalse(timer_manager._new_timers)
+        self.assertEqual(0, len(timer_manager))
         self.assertFalse(callback.was_invoked())
 
@@ -66,8 +66,7 @@ class TestTwistedTimer(unittest.TestCase):
         time.sleep(.2)
         timer_manager = connection._loop._timers
         # Assert that the cancellation was honored
-        self.assertFalse(timer_manager._queue)
-        self.assertFalse(timer_manager._new_timers)
+        self.assertEqual(0, len(timer_manager))
         self.assertFalse(callback.was_invoked())
 
 
@@ -126,6 +126,5 @@ class TimerConnectionTests(object):
         time.sleep(.2)
         timer_manager = self.connection_class._timers
         # Assert that the cancellation was honored
-        self.assertFalse(timer_manager._queue)
-        self.assertFalse(timer_manager._new_timers)
+        self.assertEqual(0, len(timer_manager))
         self.assertFalse(callback.was_invoked())
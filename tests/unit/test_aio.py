@@ -0,0 +1,137 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest # noqa
+
+from mock import Mock
+from threading import Thread
+
+try:
+    import asyncio
+    from dse import aio
+except (ImportError, SyntaxError):
+    aio = None  # noqa
+
+from dse import ConsistencyLevel, OperationTimedOut
+from dse.cluster import Session, ResponseFuture, ResultSet
+from dse.connection import Connection, ContinuousPagingSession
+from dse.protocol import QueryMessage, ResultMessage, ServerError, ErrorMessage
+from dse.query import SimpleStatement
+
+
+class AsyncioTestBase(unittest.TestCase):
+
+    def setUp(self):
+        if aio is None:
+            raise unittest.SkipTest("asyncio support requires Python 3.5+")
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def drain(self, async_iterator):
+        rows = []
+        while True:
+            try:
+                rows.append(self.loop.run_until_complete(async_iterator.__anext__()))
+            except StopAsyncIteration:
+                return rows
+
+
+class ResponseFutureAwaitTest(AsyncioTestBase):
+
+    def make_response_future(self):
+        session = Mock(spec=Session)
+        session.cluster._default_row_factory = lambda col_names, rows: rows
+        session.cluster._default_load_balancing_policy.make_query_plan.return_value = ['ip1', 'ip2']
+        query = SimpleStatement("SELECT * FROM foo")
+        message = QueryMessage(query=query, consistency_level=ConsistencyLevel.ONE)
+        rf = ResponseFuture(session, message, query, 1)
+        rf.send_request = Mock()
+        return rf
+
+    def test_await_result(self):
+        rf = self.make_response_future()
+        rows = [1, 2, 3]
+        # the result arrives on another thread, as it would from the event loop
+        self.loop.call_soon(lambda: Thread(target=rf._set_final_result, args=(rows,)).start())
+
+        result = self.loop.run_until_complete(rf)
+        self.assertIsInstance(result, ResultSet)
+        self.assertEqual(rows, list(result))
+        self.assertFalse(rf._callbacks)
+        self.assertFalse(rf._errbacks)
+
+    def test_await_exception(self):
+        rf = self.make_response_future()
+        exc = OperationTimedOut()
+        self.loop.call_soon(rf._set_final_exception, exc)
+
+        self.assertRaises(OperationTimedOut, self.loop.run_until_complete, rf)
+        self.assertFalse(rf._callbacks)
+        self.assertFalse(rf._errbacks)
+
+    def test_await_completed(self):
+        rf = self.make_response_future()
+        rf._set_final_result([1])
+
+        self.assertEqual([1], list(self.loop.run_until_complete(rf)))
+        self.assertFalse(rf._callbacks)
+        self.assertFalse(rf._errbacks)
+
+    def test_async_iteration_fetches_pages(self):
+        rf = self.make_response_future()
+        pages = [[4, 5, 6], [7]]
+
+        def deliver_page():
+            rows = pages.pop(0)
+            rf._paging_state = b'state' if pages else None
+            self.loop.call_soon(rf._set_final_result, rows)
+
+        rf.send_request.side_effect = deliver_page
+        rf._paging_state = b'state'
+        rf._set_final_result([1, 2, 3])
+
+        result = rf.result()
+        self.assertEqual(list(range(1, 8)), self.drain(result.__aiter__()))
+        self.assertEqual(2, rf.send_request.call_count)
+        self.assertFalse(result.current_rows)
+
+
+class ContinuousPagingAsyncTest(AsyncioTestBase):
+
+    def make_page(self, rows, last=False):
+        return Mock(spec=ResultMessage, column_names=['a'], parsed_rows=rows,
+                    continuous_paging_last=last)
+
+    def test_async_iteration(self):
+        connection = Mock(spec=Connection)
+        paging_session = ContinuousPagingSession(1, None, lambda names, rows: rows, connection)
+        paging_session.on_page(self.make_page([1, 2]))
+
+        self.loop.call_soon(paging_session.on_page, self.make_page([3]))
+        self.loop.call_soon(paging_session.on_page, self.make_page([4, 5], last=True))
+
+        self.assertEqual([1, 2, 3, 4, 5], self.drain(paging_session.__aiter__()))
+        connection.remove_continuous_paging_session.assert_called_once_with(1)
+
+    def test_async_iteration_error(self):
+        connection = Mock(spec=Connection)
+        paging_session = ContinuousPagingSession(1, None, lambda names, rows: rows, connection)
+        iterator = paging_session.__aiter__()
+        error = Mock(spec=ErrorMessage)
+        error.to_exception.return_value = ServerError(None, 'boom', None)
+
+        self.loop.call_soon(paging_session.on_error, error)
+        self.assertRaises(ServerError, self.loop.run_until_complete, iterator.__anext__())
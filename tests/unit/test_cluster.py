@@ -11,15 +11,19 @@ try:
 except ImportError:
     import unittest  # noqa
 
-from mock import patch
+from concurrent.futures import ThreadPoolExecutor
+from mock import Mock, patch
+from threading import Event
+import time
 
 from dse import ConsistencyLevel, DriverException, Timeout, Unavailable, RequestExecutionException, ReadTimeout, WriteTimeout, CoordinationFailure, ReadFailure, WriteFailure, FunctionFailure, AlreadyExists,\
     InvalidRequest, Unauthorized, AuthenticationFailed, OperationTimedOut, UnsupportedOperation, RequestValidationException, ConfigurationException, ProtocolVersion
 from dse.cluster import _Scheduler, Session, Cluster, _NOT_SET, default_lbp_factory, \
-    ExecutionProfile, EXEC_PROFILE_DEFAULT
+    ExecutionProfile, EXEC_PROFILE_DEFAULT, EXEC_PROFILE_GRAPH_DEFAULT
 from dse.hosts import Host
 from dse.policies import HostDistance, RetryPolicy, RoundRobinPolicy, DowngradingConsistencyRetryPolicy, SimpleConvictionPolicy
 from dse.query import SimpleStatement, named_tuple_factory, tuple_factory
+from dse.request_metrics import RequestMetrics
 from tests.unit.utils import mock_session_pools
 
 try:
@@ -106,6 +110,66 @@ class SchedulerTest(unittest.TestCase):
         sched.schedule(0, lambda: None)
         sched.schedule(0, lambda: None)  # pre-473: "TypeError: unorderable types: function() < function()"t
 
+    def test_runs_tasks_in_deadline_order(self):
+        executor = ThreadPoolExecutor(1)
+        sched = _Scheduler(executor)
+        try:
+            ran = []
+            done = Event()
+
+            def run(name):
+                ran.append(name)
+                if name == 'late':
+                    done.set()
+
+            sched.schedule(0.2, run, 'late')
+            sched.schedule(0.05, run, 'early')
+            self.assertTrue(done.wait(2))
+            self.assertEqual(['early', 'late'], ran)
+            self.assertFalse(sched._queue)
+            self.assertFalse(sched._scheduled_tasks)
+        finally:
+            sched.shutdown()
+            executor.shutdown()
+
+    def test_earlier_task_wakes_scheduler(self):
+        executor = ThreadPoolExecutor(1)
+        sched = _Scheduler(executor)
+        try:
+            sched.schedule(60, lambda: None)
+            time.sleep(0.05)  # let the thread wait for the first deadline
+            start = time.time()
+            done = Event()
+            sched.schedule(0.01, done.set)
+            self.assertTrue(done.wait(2))
+            # not quantized to a polling interval
+            self.assertLess(time.time() - start, 0.09)
+        finally:
+            sched.shutdown()
+            executor.shutdown()
+
+    def test_shutdown_drops_pending_tasks(self):
+        executor = Mock()
+        sched = _Scheduler(executor)
+        sched.schedule(60, lambda: None)
+        sched.shutdown()
+        self.assertFalse(sched.is_alive())
+        self.assertFalse(executor.submit.called)
+
+        sched.schedule(0, lambda: None)
+        self.assertEqual(1, len(sched._queue))
+
+    def test_schedule_unique(self):
+        sched = _Scheduler(Mock())
+        try:
+            fn = Mock()
+            sched.schedule_unique(60, fn, 1, a=2)
+            sched.schedule_unique(60, fn, 1, a=2)
+            sched.schedule_unique(60, fn, 2)
+            self.assertEqual(2, len(sched._queue))
+        finally:
+            sched.shutdown()
+
 
 class SessionTest(unittest.TestCase):
     def setUp(self):
@@ -267,6 +331,20 @@ class ExecutionProfileTest(unittest.TestCase):
         # cannot clone nonexistent profile
         self.assertRaises(ValueError, session.execution_profile_clone_update, 'DOES NOT EXIST', **profile_attrs)
 
+    @mock_session_pools
+    def test_request_metrics_profile_name(self):
+        profile = ExecutionProfile(RoundRobinPolicy(), *[object() for _ in range(3)])
+        cluster = Cluster(execution_profiles={'by-name': profile})
+        cluster.request_metrics = RequestMetrics()
+        session = Session(cluster, hosts=[Host("127.0.0.1", SimpleConvictionPolicy)])
+
+        # unregistered instances, such as clones, share a single name
+        profiles = [EXEC_PROFILE_DEFAULT, 'by-name', profile, session.execution_profile_clone_update('by-name'),
+                    ExecutionProfile(RoundRobinPolicy())]
+        self.assertEqual(['default', 'by-name', 'by-name', 'custom', 'custom'],
+                         [session.execute_async("query", execution_profile=p)._profile_name for p in profiles])
+        self.assertEqual('graph', cluster.profile_manager.name(EXEC_PROFILE_GRAPH_DEFAULT))
+
     def test_no_profiles_same_name(self):
         # can override default in init
         cluster = Cluster(execution_profiles={EXEC_PROFILE_DEFAULT: ExecutionProfile(), 'one': ExecutionProfile()})
@@ -13,18 +13,26 @@ try:
 except ImportError:
     import unittest  # noqa
 
-from itertools import cycle
+from collections import deque
+from copy import copy
+from itertools import count, cycle
 from mock import Mock
+import random
 import time
 import threading
 from six.moves.queue import PriorityQueue
 import sys
 import platform
 
-from dse.cluster import Cluster, Session
-from dse.concurrent import execute_concurrent, execute_concurrent_with_args
+from dse import ProtocolVersion
+from dse.cluster import Cluster, ContinuousPagingOptions, Session, ExecutionProfile, ResultSet
+from dse.concurrent import (execute_concurrent, execute_concurrent_with_args, execute_bulk_writes,
+                            execute_bulk_writes_with_args, scan_table)
 from dse.hosts import Host
-from dse.policies import SimpleConvictionPolicy
+from dse.metadata import (Metadata, KeyspaceMetadata, TableMetadata, ColumnMetadata, Murmur3Token,
+                          MIN_LONG, MAX_LONG)
+from dse.policies import SimpleConvictionPolicy, HostDistance
+from dse.query import BatchStatement, BatchType, SimpleStatement
 from tests.unit.utils import mock_session_pools
 
 
@@ -114,6 +122,58 @@ class TimedCallableInvoker(threading.Thread):
             self._stopper.wait(.001)
         return
 
+class ManualResponseFuture(object):
+    """
+    A ResponseFuture completed by the test.
+    """
+
+    _col_names = None
+    _col_types = None
+    has_more_pages = False
+
+    def __init__(self, idx):
+        self.idx = idx
+
+    def add_callbacks(self, callback, errback,
+                      callback_args=(), callback_kwargs=None,
+                      errback_args=(), errback_kwargs=None):
+        self._callback = (callback, callback_args)
+        self._errback = (errback, errback_args)
+
+    def clear_callbacks(self):
+        return
+
+    def succeed(self):
+        fn, args = self._callback
+        fn([self.idx], *args)
+
+    def fail(self, exc):
+        fn, args = self._errback
+        fn(exc, *args)
+
+
+class PagedResponseFuture(ManualResponseFuture):
+    """
+    A ResponseFuture whose pages are delivered by the test.
+    """
+
+    def __init__(self, idx, num_pages):
+        super(PagedResponseFuture, self).__init__(idx)
+        self.pages = [[(idx, page)] for page in range(num_pages)]
+        self.fetches = 0
+
+    @property
+    def has_more_pages(self):
+        return bool(self.pages)
+
+    def start_fetching_next_page(self):
+        self.fetches += 1
+
+    def succeed(self):
+        fn, args = self._callback
+        fn(self.pages.pop(0), *args)
+
+
 class ConcurrencyTest((unittest.TestCase)):
 
     def test_results_ordering_forward(self):
@@ -253,3 +313,502 @@ class ConcurrencyTest((unittest.TestCase)):
         for r in results:
             self.assertFalse(r[0])
             self.assertIsInstance(r[1], TypeError)
+
+
+class UnorderedConcurrencyTest(unittest.TestCase):
+
+    def make_session(self):
+        session = Mock()
+        self.futures = []
+
+        def execute_async(statement, params, timeout=None):
+            future = ManualResponseFuture(params[0])
+            self.futures.append(future)
+            return future
+
+        session.execute_async.side_effect = execute_async
+        return session
+
+    def test_results_as_completed(self):
+        session = self.make_session()
+        results = execute_concurrent_with_args(session, "INSERT", [(i,) for i in range(4)], concurrency=4,
+                                               ordered=False)
+        self.assertEqual(4, len(self.futures))
+
+        for future in reversed(self.futures):
+            future.succeed()
+        yielded = [(idx, success, list(result)) for idx, (success, result) in results]
+        self.assertEqual([(i, True, [i]) for i in (3, 2, 1, 0)], yielded)
+
+    def test_slow_statement_does_not_block(self):
+        session = self.make_session()
+        results = execute_concurrent_with_args(session, "INSERT", ((i,) for i in count()), concurrency=2,
+                                               ordered=False)
+        slow = self.futures[0]
+        for n in range(10):
+            self.futures[-1].succeed()
+            idx, (success, result) = next(results)
+            self.assertEqual(n + 1, idx)
+        slow.succeed()
+        self.assertEqual(0, next(results)[0])
+
+    def test_backpressure(self):
+        session = self.make_session()
+        results = execute_concurrent_with_args(session, "INSERT", ((i,) for i in count()), concurrency=2,
+                                               ordered=False, buffer_size=3)
+        self.assertEqual(2, len(self.futures))
+
+        # nothing is consumed: no statement is started once buffer_size
+        # results are buffered, and those in flight then complete
+        completed = 0
+        while completed < len(self.futures):
+            self.futures[completed].succeed()
+            completed += 1
+        self.assertEqual(4, len(self.futures))
+
+        # consuming makes room for more
+        self.assertEqual(0, next(results)[0])
+        self.assertEqual(4, len(self.futures))
+        self.assertEqual(1, next(results)[0])
+        self.assertEqual(6, len(self.futures))
+
+    def test_fail_fast(self):
+        session = self.make_session()
+        results = execute_concurrent_with_args(session, "INSERT", ((i,) for i in count()), concurrency=2,
+                                               ordered=False)
+        self.futures[1].fail(ValueError('boom'))
+        self.futures[0].succeed()
+        self.assertRaises(ValueError, next, results)
+        # nothing was started after the failure
+        self.assertEqual(2, len(self.futures))
+
+    def test_errors_collected(self):
+        session = self.make_session()
+        results = execute_concurrent_with_args(session, "INSERT", [(i,) for i in range(3)], concurrency=3,
+                                               ordered=False, raise_on_first_error=False)
+        self.futures[1].fail(ValueError('boom'))
+        self.futures[0].succeed()
+        self.futures[2].succeed()
+        yielded = dict(results)
+        self.assertEqual([0, 1, 2], sorted(yielded))
+        self.assertFalse(yielded[1].success)
+        self.assertIsInstance(yielded[1].result_or_exc, ValueError)
+
+    def test_no_statements(self):
+        self.assertEqual([], list(execute_concurrent(self.make_session(), [], ordered=False)))
+        self.assertRaises(ValueError, execute_concurrent, self.make_session(), [], ordered=False, buffer_size=0)
+
+
+class FetchAllPagesTest(unittest.TestCase):
+
+    def make_session(self, num_pages):
+        session = Mock()
+        self.futures = []
+
+        def execute_async(statement, params, timeout=None):
+            future = PagedResponseFuture(params[0], num_pages)
+            self.futures.append(future)
+            return future
+
+        session.execute_async.side_effect = execute_async
+        return session
+
+    def deliver_all(self):
+        while any(f.pages for f in self.futures):
+            for future in list(self.futures):
+                if future.pages:
+                    future.succeed()
+
+    def test_pages_fetched_within_concurrency(self):
+        session = self.make_session(3)
+        results = execute_concurrent_with_args(session, "SELECT", [(i,) for i in range(2)], concurrency=1,
+                                               results_generator=True, fetch_all_pages=True)
+        first = self.futures[0]
+        first.succeed()
+        first.succeed()
+        # the first statement holds the only slot until its last page
+        self.assertEqual(2, first.fetches)
+        self.assertEqual(1, len(self.futures))
+        first.succeed()
+        self.assertEqual(2, len(self.futures))
+
+        self.deliver_all()
+        results = list(results)
+        self.assertEqual([(i, page) for i in range(2) for page in range(3)],
+                         [row for success, result in results for row in result])
+        self.assertFalse(any(result.has_more_pages for success, result in results))
+
+    def test_unordered(self):
+        session = self.make_session(2)
+        results = execute_concurrent_with_args(session, "SELECT", [(i,) for i in range(3)], concurrency=3,
+                                               ordered=False, fetch_all_pages=True)
+        self.deliver_all()
+        self.assertEqual(dict((i, [(i, 0), (i, 1)]) for i in range(3)),
+                         dict((idx, list(result.result_or_exc)) for idx, result in results))
+
+    def test_error_on_later_page(self):
+        session = self.make_session(2)
+        results = execute_concurrent_with_args(session, "SELECT", [(0,)], raise_on_first_error=False,
+                                               results_generator=True, fetch_all_pages=True)
+        self.futures[0].succeed()
+        self.futures[0].fail(ValueError('boom'))
+        self.assertEqual([(False, ValueError)], [(r.success, type(r.result_or_exc)) for r in results])
+
+
+class ImmediateResponseFuture(object):
+    """
+    A ResponseFuture that completes as soon as callbacks are added.
+    """
+
+    def __init__(self, exc=None):
+        self.exc = exc
+
+    def add_callbacks(self, callback, errback,
+                      callback_args=(), callback_kwargs=None,
+                      errback_args=(), errback_kwargs=None):
+        if self.exc is None:
+            callback([], *callback_args)
+        else:
+            errback(self.exc, *errback_args)
+
+
+class BulkWritesTest(unittest.TestCase):
+
+    # partition key -> replicas
+    replicas = {b'a': ['h1', 'h2'], b'b': ['h2', 'h1'], b'c': ['h1', 'h2'], b'd': ['h3', 'h1']}
+
+    def make_session(self, future_factory=lambda statement: ImmediateResponseFuture()):
+        session = Mock()
+        self.sent = []
+
+        def execute_async(statement, params, timeout=None):
+            self.sent.append(statement)
+            return future_factory(statement)
+
+        session.execute_async.side_effect = execute_async
+        session.cluster.metadata.get_replicas.side_effect = \
+            lambda keyspace, key, statement=None: list(self.replicas[key])
+        return session
+
+    def statements(self, keys):
+        return [(SimpleStatement("INSERT %d" % i, routing_key=key, keyspace='ks'), None)
+                for i, key in enumerate(keys.split())]
+
+    def sent_groups(self):
+        return [sorted(q for _, q, _ in batch._statements_and_parameters) for batch in self.sent]
+
+    def test_grouped_by_partition(self):
+        session = self.make_session()
+        self.assertEqual([], execute_bulk_writes(session, self.statements(b'a b a c a b'), max_batch_size=2))
+        for batch in self.sent:
+            self.assertIsInstance(batch, BatchStatement)
+            self.assertEqual(BatchType.UNLOGGED, batch.batch_type)
+        self.assertEqual([['INSERT 0', 'INSERT 2'], ['INSERT 1', 'INSERT 5'], ['INSERT 3'], ['INSERT 4']],
+                         sorted(self.sent_groups()))
+
+    def test_grouped_by_replicas(self):
+        session = self.make_session()
+        execute_bulk_writes(session, self.statements(b'a b c d'), group_by='replicas')
+        # a, b and c share replicas, whatever their order
+        self.assertEqual([['INSERT 0', 'INSERT 1', 'INSERT 2'], ['INSERT 3']], sorted(self.sent_groups()))
+
+    def test_grouped_by_partition_without_replicas(self):
+        session = self.make_session()
+        session.cluster.metadata.get_replicas.side_effect = lambda keyspace, key, statement=None: []
+        execute_bulk_writes(session, self.statements(b'a b a c d'), group_by='replicas')
+        self.assertEqual([['INSERT 0', 'INSERT 2'], ['INSERT 1'], ['INSERT 3'], ['INSERT 4']],
+                         sorted(self.sent_groups()))
+
+    def test_batch_bytes_limit(self):
+        session = self.make_session()
+        execute_bulk_writes(session, self.statements(b'a a a'), max_batch_bytes=40)
+        self.assertEqual([['INSERT 0', 'INSERT 1'], ['INSERT 2']], sorted(self.sent_groups()))
+
+    def test_open_batches_bounded(self):
+        session = self.make_session()
+        execute_bulk_writes(session, self.statements(b'a b a b'), max_open_batches=1)
+        self.assertEqual(4, len(self.sent))
+
+    def test_unrouted_statements_sent_alone(self):
+        session = self.make_session()
+        statement = SimpleStatement("INSERT")
+        execute_bulk_writes_with_args(session, statement, [(1,), (2,)])
+        self.assertEqual([statement, statement], self.sent)
+        self.assertFalse(session.cluster.metadata.get_replicas.called)
+
+    def test_errors(self):
+        session = self.make_session(lambda statement: ImmediateResponseFuture(ValueError('boom')))
+        failures = execute_bulk_writes(session, self.statements(b'a b'), raise_on_first_error=False)
+        self.assertEqual(sorted(self.sent, key=id), sorted((s for s, _ in failures), key=id))
+        self.assertTrue(all(isinstance(exc, ValueError) for _, exc in failures))
+
+        self.assertRaises(ValueError, execute_bulk_writes, session, self.statements(b'a b'))
+        # nothing is sent after the failure
+        self.assertEqual(3, len(self.sent))
+
+    def test_per_host_limit(self):
+        futures = []
+
+        def future_factory(statement):
+            future = ManualResponseFuture(len(futures))
+            futures.append(future)
+            return future
+
+        session = self.make_session(future_factory)
+        result = []
+        writer = threading.Thread(target=lambda: result.append(execute_bulk_writes(
+            session, self.statements(b'a c d'), max_open_batches=1, max_in_flight_per_host=1)))
+        writer.start()
+
+        def wait_for(n):
+            deadline = time.time() + 5
+            while len(futures) < n and time.time() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.05)
+            self.assertEqual(n, len(futures))
+
+        # the batch for c routes to h1 like the one for a, and waits for it
+        wait_for(1)
+        futures[0].succeed()
+        wait_for(3)
+        futures[1].succeed()
+        futures[2].succeed()
+        writer.join(5)
+        self.assertEqual([[]], result)
+        self.assertEqual(['INSERT 0', 'INSERT 1', 'INSERT 2'],
+                         [batch._statements_and_parameters[0][1] for batch in self.sent])
+
+    def test_invalid_arguments(self):
+        session = self.make_session()
+        self.assertRaises(ValueError, execute_bulk_writes, session, [], group_by='table')
+        self.assertRaises(ValueError, execute_bulk_writes, session, [], max_batch_size=0)
+        self.assertRaises(ValueError, execute_bulk_writes, session, [], max_in_flight_per_host=0)
+
+
+class ScanResponseFuture(object):
+    """
+    A ResponseFuture for a token range, which delivers its pages as soon as
+    callbacks are added or the next page is requested.
+    """
+
+    _col_names = None
+    _col_types = None
+    has_more_pages = False
+
+    def __init__(self, pages, exc=None, paging_session=None, on_done=None):
+        self._pages = deque(pages)
+        self._exc = exc
+        self._continuous_paging_session = paging_session
+        self._on_done = on_done
+
+    def add_callbacks(self, callback, errback, callback_args=(), errback_args=()):
+        self._callback = lambda result: callback(result, *callback_args)
+        self._errback = lambda exc: errback(exc, *errback_args)
+        self.start_fetching_next_page()
+
+    def start_fetching_next_page(self):
+        if self._exc is not None:
+            self._errback(self._exc)
+            return
+        if self._continuous_paging_session is not None:
+            self._callback(None)
+            return
+        page = self._pages.popleft()
+        self.has_more_pages = bool(self._pages)
+        if not self.has_more_pages and self._on_done:
+            self._on_done()
+        self._callback(page)
+
+    def clear_callbacks(self):
+        pass
+
+    def result(self):
+        rows = [row for page in self._pages for row in page]
+        self._pages.clear()
+        return ResultSet(self, rows)
+
+
+class ScanPagingSession(object):
+
+    cancelled = False
+
+    def __init__(self, pages):
+        self.pages = deque(pages)
+
+    @staticmethod
+    def row_factory(names, rows):
+        return rows
+
+    def next_page(self, callback):
+        callback((['id'], self.pages.popleft(), None) if self.pages else None)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class ScanTableTest(unittest.TestCase):
+
+    def setUp(self):
+        rand = random.Random(0)
+        self.hosts = []
+        token_map = {}
+        for i in range(4):
+            host = Host('10.0.0.%d' % i, SimpleConvictionPolicy)
+            host.set_location_info('dc1' if i < 3 else 'dc2', 'rack1')
+            host.set_up()
+            self.hosts.append(host)
+            token_map[host] = [str(rand.randint(MIN_LONG, MAX_LONG)) for _ in range(4)]
+
+        self.metadata = Metadata()
+        keyspace = KeyspaceMetadata('ks', True, 'SimpleStrategy', {'replication_factor': '2'})
+        table = TableMetadata('ks', 'tbl')
+        table.partition_key = [ColumnMetadata(table, 'id', 'int')]
+        keyspace.tables['tbl'] = table
+        self.metadata.keyspaces['ks'] = keyspace
+        self.metadata.rebuild_token_map('Murmur3Partitioner', token_map)
+
+        policy = Mock()
+        policy.distance.side_effect = lambda host: \
+            HostDistance.LOCAL if host.datacenter == 'dc1' else HostDistance.REMOTE
+        self.profile = ExecutionProfile(load_balancing_policy=policy)
+
+    def make_session(self, protocol_version=4, future_factory=None):
+        future_factory = future_factory or (lambda start, end, profile: ScanResponseFuture([[(end, 0)], [(end, 1)]]))
+        session = Mock()
+        session.cluster.metadata = self.metadata
+        session.cluster.protocol_version = protocol_version
+        self.sent = []
+
+        def clone(ep, **kwargs):
+            profile = copy(ep if isinstance(ep, ExecutionProfile) else self.profile)
+            for attr, value in kwargs.items():
+                setattr(profile, attr, value)
+            return profile
+
+        def execute(statement, host, profile):
+            self.sent.append((statement, host, profile))
+            return future_factory(statement[0], statement[1], profile)
+
+        session.execution_profile_clone_update.side_effect = clone
+        session.prepare.return_value.bind.side_effect = lambda values: values
+        session.execute_async.side_effect = lambda statement, execution_profile: \
+            execute(statement, None, execution_profile)
+        session._execute_on_host.side_effect = execute
+        return session
+
+    def test_ranges(self):
+        session = self.make_session()
+        ranges = scan_table(session, 'ks', 'tbl', ['id', 'value'], split=2, per_range=True)
+        session.prepare.assert_called_once_with(
+            'SELECT id, value FROM ks.tbl WHERE token(id) > ? AND token(id) <= ?')
+
+        # the whole ring, in order, each ring range split in two
+        self.assertEqual(2 * (len(self.metadata.token_map.ring) + 1), len(ranges))
+        self.assertEqual(MIN_LONG, ranges[0][0])
+        self.assertEqual(MAX_LONG, ranges[-1][1])
+        for (_, end, _), (start, _, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+
+        self.assertEqual([(ranges[0][1], 0), (ranges[0][1], 1)], list(ranges[0][2]))
+        self.assertEqual(1, len(self.sent))
+
+        for _, _, rows in ranges[1:]:
+            list(rows)
+        replica_map = self.metadata.token_map.tokens_to_hosts_by_ks['ks']
+        ring_values = set(t.value for t in self.metadata.token_map.ring)
+        for (start, end), (_, host, _) in zip([r[:2] for r in ranges], self.sent):
+            if end in ring_values:
+                self.assertIn(host, replica_map[Murmur3Token(end)])
+        # local replicas are preferred, and ranges spread evenly among them
+        counts = dict((host, 0) for host in self.hosts[:3])
+        for _, host, _ in self.sent:
+            counts[host] += 1
+        self.assertLessEqual(max(counts.values()) - min(counts.values()), len(ranges) // 3)
+
+    def test_merged_rows_within_concurrency(self):
+        in_flight = [0]
+        max_in_flight = [0]
+
+        def done():
+            in_flight[0] -= 1
+
+        def future_factory(start, end, profile):
+            in_flight[0] += 1
+            max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+            return ScanResponseFuture([[(end, 0)], [(end, 1)]], on_done=done)
+
+        session = self.make_session(future_factory=future_factory)
+        rows = list(scan_table(session, 'ks', 'tbl', concurrency=3))
+        ends = [statement[1] for statement, _, _ in self.sent]
+        self.assertEqual(sorted((end, page) for end in ends for page in range(2)), sorted(rows))
+        self.assertEqual(MAX_LONG, max(ends))
+        self.assertEqual(3, max_in_flight[0])
+
+    def test_error(self):
+        def future_factory(start, end, profile):
+            exc = ValueError('boom') if start != MIN_LONG else None
+            return ScanResponseFuture([[(end, 0)]], exc=exc)
+
+        session = self.make_session(future_factory=future_factory)
+        self.assertRaises(ValueError, list, scan_table(session, 'ks', 'tbl'))
+
+    def test_continuous_paging(self):
+        self.hosts[0].dse_version = '5.1.3'
+        self.hosts[1].dse_version = '5.0.9'
+        paging_sessions = []
+
+        def future_factory(start, end, profile):
+            if profile.continuous_paging_options is None:
+                return ScanResponseFuture([[(end, 0)], [(end, 1)]])
+            paging_session = ScanPagingSession([[(end, 0)], [(end, 1)]])
+            paging_sessions.append(paging_session)
+            return ScanResponseFuture([], paging_session=paging_session)
+
+        session = self.make_session(ProtocolVersion.DSE_V1, future_factory)
+        rows = list(scan_table(session, 'ks', 'tbl'))
+        self.assertEqual(2 * len(self.sent), len(rows))
+        for _, host, profile in self.sent:
+            self.assertEqual(host is self.hosts[0], profile.continuous_paging_options is not None)
+        self.assertTrue(paging_sessions)
+        self.assertFalse(any(s.cancelled for s in paging_sessions))
+
+        # abandoning the scan cancels the ranges being read
+        del paging_sessions[:]
+        results = scan_table(session, 'ks', 'tbl', concurrency=100)
+        next(results)
+        results.close()
+        self.assertTrue(paging_sessions)
+        self.assertTrue(all(s.cancelled for s in paging_sessions))
+
+        # with continuous paging turned off
+        del self.sent[:]
+        list(scan_table(session, 'ks', 'tbl', continuous_paging=False))
+        self.assertTrue(all(profile.continuous_paging_options is None for _, _, profile in self.sent))
+
+    def test_continuous_paging_options(self):
+        self.hosts[0].dse_version = '5.1.3'
+
+        def future_factory(start, end, profile):
+            paging_session = ScanPagingSession([[(end, 0)]]) if profile.continuous_paging_options else None
+            return ScanResponseFuture([[(end, 0)]], paging_session=paging_session)
+
+        session = self.make_session(ProtocolVersion.DSE_V1, future_factory)
+        list(scan_table(session, 'ks', 'tbl'))
+        options = [profile.continuous_paging_options for _, host, profile in self.sent if host is self.hosts[0]]
+        self.assertTrue(options)
+        # pages waiting to be consumed are bounded by default
+        self.assertTrue(all(o.max_queue_size == 4 for o in options))
+
+        # the options of the profile are used as they are
+        del self.sent[:]
+        self.profile.continuous_paging_options = ContinuousPagingOptions(max_pages=10, max_queue_size=0)
+        list(scan_table(session, 'ks', 'tbl'))
+        options = [profile.continuous_paging_options for _, host, profile in self.sent if host is self.hosts[0]]
+        self.assertTrue(options)
+        self.assertTrue(all(o is self.profile.continuous_paging_options for o in options))
+
+    def test_invalid_arguments(self):
+        session = self.make_session()
+        self.assertRaises(ValueError, scan_table, session, 'ks', 'missing')
+        self.assertRaises(ValueError, scan_table, session, 'ks', 'tbl', concurrency=0)
+        self.assertRaises(ValueError, scan_table, session, 'ks', 'tbl', split=0)
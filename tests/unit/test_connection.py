@@ -11,20 +11,23 @@ try:
 except ImportError:
     import unittest  # noqa
 
+from collections import deque
+import errno
 from mock import Mock, ANY, call, patch
 import six
 from six import BytesIO
+import socket
 import time
 from threading import Lock
 
 from dse import OperationTimedOut
 from dse.cluster import Cluster
-from dse.connection import (Connection, HEADER_DIRECTION_TO_CLIENT, ProtocolError,
-                                  locally_supported_compressions, ConnectionHeartbeat, _Frame, Timer, TimerManager,
+from dse.connection import (Connection, ContinuousPagingSession, HEADER_DIRECTION_TO_CLIENT, ProtocolError,
+                                  locally_supported_compressions, ConnectionHeartbeat, _Frame, _FrameBuffer, Timer, TimerManager,
                                   ConnectionException)
 from dse.marshal import uint8_pack, uint32_pack, int32_pack
 from dse.protocol import (write_stringmultimap, write_int, write_string,
-                                SupportedMessage, ProtocolHandler)
+                                SupportedMessage, ProtocolHandler, ResultMessage, CancelMessage)
 
 
 class ConnectionTest(unittest.TestCase):
@@ -71,7 +74,7 @@ class ConnectionTest(unittest.TestCase):
         header = self.make_header_prefix(SupportedMessage, version=0x7f)
         options = self.make_options_body()
         message = self.make_msg(header, options)
-        c._iobuf = BytesIO()
+        c._iobuf = _FrameBuffer()
         c._iobuf.write(message)
         c.process_io_buffer()
 
@@ -88,7 +91,7 @@ class ConnectionTest(unittest.TestCase):
         # read in a SupportedMessage response
         header = self.make_header_prefix(SupportedMessage)
         message = header + int32_pack(-13)
-        c._iobuf = BytesIO()
+        c._iobuf = _FrameBuffer()
         c._iobuf.write(message)
         c.process_io_buffer()
 
@@ -250,6 +253,182 @@ class ConnectionTest(unittest.TestCase):
         cluster = Cluster(connection_class='test')
         self.assertEqual('test', cluster.connection_class)
 
+    def test_pipelined_frames(self):
+        c = self.make_connection()
+        c.process_msg = Mock()
+
+        bodies = [six.b('frame%d' % i) * (i + 1) for i in range(5)]
+        data = six.binary_type().join(
+            self.make_msg(self.make_header_prefix(SupportedMessage, stream_id=i), body)
+            for i, body in enumerate(bodies))
+
+        # feed the frames in chunks that straddle frame boundaries
+        for i in range(0, len(data), 7):
+            c._iobuf.write(data[i:i + 7])
+            c.process_io_buffer()
+
+        self.assertEqual(len(bodies), c.process_msg.call_count)
+        for i, (args, kwargs) in enumerate(c.process_msg.call_args_list):
+            frame, body = args
+            self.assertEqual(i, frame.stream)
+            self.assertEqual(bodies[i], body.tobytes())
+        self.assertEqual(0, len(c._iobuf))
+        self.assertIsNone(c._current_frame)
+
+
+    def test_send_coalesced(self):
+        c = self.make_connection()
+        c.out_batch_size = 8
+        queue = deque([six.b('aaa'), six.b('bbb'), six.b('ccc'), six.b('ddd')])
+        sendmsg = Mock(return_value=5)
+
+        # the batch stops once the byte budget is reached; the partially sent
+        # chunk and the rest of the batch go back to the front of the queue
+        self.assertEqual(5, c._send_coalesced(queue, Lock(), c._socket.send, sendmsg))
+        sendmsg.assert_called_once_with([six.b('aaa'), six.b('bbb'), six.b('ccc')])
+        self.assertEqual([six.b('b'), six.b('ccc'), six.b('ddd')], list(queue))
+
+        # without vectored sends the batch is joined into one send
+        send = Mock(side_effect=lambda data: len(data))
+        self.assertEqual(7, c._send_coalesced(queue, Lock(), send))
+        send.assert_called_once_with(six.b('bcccddd'))
+        self.assertFalse(queue)
+        self.assertIsNone(c._send_coalesced(queue, Lock(), send))
+
+    def test_send_coalesced_error_requeues(self):
+        c = self.make_connection()
+        queue = deque([six.b('aaa'), six.b('bbb')])
+        sendmsg = Mock(side_effect=socket.error(errno.EAGAIN, 'busy'))
+        self.assertRaises(socket.error, c._send_coalesced, queue, Lock(), c._socket.send, sendmsg)
+        self.assertEqual([six.b('aaa'), six.b('bbb')], list(queue))
+
+
+class FrameBufferTest(unittest.TestCase):
+
+    def test_views_survive_compaction(self):
+        buf = _FrameBuffer()
+        buf.write(six.b('abcdef'))
+        view = buf.view(1, 4)
+        buf.consume(4)
+        buf.compact()
+        buf.write(six.b('ghi'))
+
+        self.assertEqual(six.b('bcd'), view.tobytes())
+        self.assertEqual(six.b('efghi'), buf.getvalue())
+        self.assertEqual(5, len(buf))
+        self.assertEqual(ord('e'), buf.peek_byte())
+
+
+class ReadPauseTest(unittest.TestCase):
+
+    def test_pauses_nest(self):
+        c = Connection('1.2.3.4')
+        self.assertFalse(c.pause_reading())
+
+        c.supports_read_pause = True
+        c._reading_pause_changed = Mock()
+        self.assertTrue(c.pause_reading())
+        self.assertTrue(c.pause_reading())
+        self.assertTrue(c._reading_paused)
+        c.resume_reading()
+        self.assertTrue(c._reading_paused)
+        c.resume_reading()
+        self.assertFalse(c._reading_paused)
+        # unmatched resumes are ignored
+        c.resume_reading()
+        self.assertFalse(c._reading_paused)
+        self.assertEqual(2, c._reading_pause_changed.call_count)
+
+
+class ContinuousPagingSessionTest(unittest.TestCase):
+
+    def make_session(self, max_queue_size=2, page_timeout=None, metrics=None):
+        connection = Mock(spec=Connection, host='1.2.3.4')
+        connection.pause_reading.return_value = True
+        return ContinuousPagingSession(1, None, lambda names, rows: rows, connection, max_queue_size,
+                                       page_timeout, metrics)
+
+    def make_page(self, rows, last=False):
+        return Mock(spec=ResultMessage, column_names=['a'], parsed_rows=rows, continuous_paging_last=last)
+
+    def test_pauses_reading_when_full(self):
+        metrics = Mock()
+        session = self.make_session(metrics=metrics)
+        connection = session.connection
+        results = session.results()
+
+        session.on_page(self.make_page([1]))
+        self.assertFalse(connection.pause_reading.called)
+        session.on_page(self.make_page([2]))
+        connection.pause_reading.assert_called_once_with()
+        self.assertEqual(2, session.queue_depth)
+
+        self.assertEqual(1, next(results))
+        connection.resume_reading.assert_called_once_with()
+        self.assertEqual(1, session.stalls)
+        self.assertEqual(1, metrics.on_continuous_paging_stall.call_count)
+
+        session.on_page(self.make_page([3]))
+        session.on_page(self.make_page([4], last=True))
+        # the last page doesn't pause, as nothing more will be read
+        self.assertEqual(2, connection.pause_reading.call_count)
+        self.assertEqual(2, connection.resume_reading.call_count)
+        self.assertEqual([2, 3, 4], list(results))
+        self.assertEqual(3, session.max_queue_depth)
+
+    def test_error_resumes_reading(self):
+        session = self.make_session(max_queue_size=1)
+        session.on_page(self.make_page([1]))
+        error = Mock()
+        error.to_exception.return_value = ValueError()
+        session.on_error(error)
+        session.connection.resume_reading.assert_called_once_with()
+
+    def test_unlimited_without_reactor_support(self):
+        session = self.make_session(max_queue_size=1)
+        session.connection.pause_reading.return_value = False
+        for i in range(3):
+            session.on_page(self.make_page([i]))
+        session.connection.pause_reading.assert_called_once_with()
+        self.assertEqual(0, session.stalls)
+
+    def test_results_timeout(self):
+        session = self.make_session(page_timeout=0.01)
+        results = session.results()
+        session.on_page(self.make_page([1]))
+        self.assertEqual(1, next(results))
+        self.assertRaises(OperationTimedOut, next, results)
+
+        message = session.connection.send_msg.call_args[0][0]
+        self.assertIsInstance(message, CancelMessage)
+        self.assertEqual(1, message.op_id)
+
+    def test_next_page_timeout(self):
+        session = self.make_session(page_timeout=5)
+        callback = Mock()
+        session.next_page(callback)
+        timeout, on_timeout = session.connection.create_timer.call_args[0]
+        self.assertEqual(5, timeout)
+
+        on_timeout()
+        self.assertIsInstance(callback.call_args[0][0][2], OperationTimedOut)
+        self.assertTrue(session.connection.send_msg.called)
+
+        # a page arriving in time cancels the timer
+        session = self.make_session(page_timeout=5)
+        session.next_page(callback)
+        session.on_page(self.make_page([1]))
+        session.connection.create_timer.return_value.cancel.assert_called_once_with()
+        callback.assert_called_with((['a'], [1], None))
+
+    def test_abandoned_results_cancel(self):
+        session = self.make_session()
+        results = session.results()
+        session.on_page(self.make_page([1, 2]))
+        self.assertEqual(1, next(results))
+        results.close()
+        self.assertTrue(session.connection.send_msg.called)
+
 
 @patch('dse.connection.ConnectionHeartbeat._raise_if_stopped')
 class ConnectionHeartbeatTest(unittest.TestCase):
@@ -311,6 +490,28 @@ class ConnectionHeartbeatTest(unittest.TestCase):
         idle_connection.send_msg.assert_has_calls([call(ANY, request_id, ANY)] * get_holders.call_count)
         self.assertEqual(non_idle_connection.send_msg.call_count, 0)
 
+    def test_paused_connection_not_probed(self, *args):
+        connection = Connection('1.2.3.4')
+        connection.supports_read_pause = True
+        connection._reading_pause_changed = Mock()
+        connection.send_msg = Mock()
+        connection.defunct = Mock()
+        connection.pause_reading()
+
+        get_holders = self.make_get_holders(1)
+        holder = get_holders.return_value[0]
+        holder.get_connections.return_value.append(connection)
+
+        self.run_heartbeat(get_holders, count=3)
+
+        self.assertEqual(connection.send_msg.call_count, 0)
+        self.assertEqual(connection.defunct.call_count, 0)
+        self.assertFalse(holder.return_connection.called)
+        self.assertEqual(0, connection.in_flight)
+
+        connection.resume_reading()
+        self.assertTrue(connection.is_idle)
+
     def test_closed_defunct(self, *args):
         get_holders = self.make_get_holders(1)
         closed_connection = Mock(spec=Connection, in_flight=0, is_idle=False, is_defunct=False, is_closed=True)
@@ -422,3 +623,114 @@ class TimerTest(unittest.TestCase):
         tm.add_timer(t2)
         # Prior to #466: "TypeError: unorderable types: Timer() < Timer()"
         tm.service_timeouts()
+
+
+class FakeClock(object):
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TimerManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.tm = TimerManager(resolution=0.01, slots=16, clock=self.clock)
+        self.fired = []
+
+    def add_timer(self, delay, name):
+        timer = Timer(delay, lambda: self.fired.append(name))
+        timer.end = self.clock.now + delay
+        self.tm.add_timer(timer)
+        return timer
+
+    def advance(self, seconds):
+        self.clock.now += seconds
+        return self.tm.service_timeouts()
+
+    def test_empty_manager_is_true(self):
+        # reactors test the manager they share before creating one
+        self.assertEqual(0, len(self.tm))
+        self.assertTrue(self.tm)
+
+    def test_fires_at_deadline_in_order(self):
+        start = self.clock.now
+        self.add_timer(0.035, 'b')
+        self.add_timer(0.012, 'a')
+        self.add_timer(0.035, 'c')
+        self.assertAlmostEqual(start + 0.012, self.tm.next_timeout)
+
+        self.assertAlmostEqual(start + 0.012, self.advance(0.01))
+        self.assertEqual([], self.fired)
+        self.assertAlmostEqual(start + 0.035, self.advance(0.002))
+        self.assertEqual(['a'], self.fired)
+        self.assertIsNone(self.advance(0.03))
+        self.assertEqual(['a', 'b', 'c'], sorted(self.fired))
+        self.assertEqual(0, len(self.tm))
+
+    def test_cancel_removes_timer(self):
+        timers = [self.add_timer(1, i) for i in range(100)]
+        self.assertEqual(100, len(self.tm))
+        for timer in timers:
+            timer.cancel()
+        self.assertEqual(0, len(self.tm))
+        self.assertFalse(any(self.tm._buckets))
+
+        # cancelling twice, or after expiring, does nothing
+        timers[0].cancel()
+        timer = self.add_timer(0.01, 'a')
+        self.advance(0.01)
+        timer.cancel()
+        self.assertEqual(['a'], self.fired)
+        self.assertEqual(0, len(self.tm))
+
+    def test_timers_beyond_one_revolution(self):
+        # the wheel covers 0.16s
+        start = self.clock.now
+        self.add_timer(0.5, 'late')
+        self.add_timer(0.05, 'early')
+        self.advance(0.06)
+        self.assertEqual(['early'], self.fired)
+
+        # wakes up at most once per revolution until the deadline is reached
+        wakeups = 0
+        next_end = self.tm.next_timeout
+        while self.fired == ['early']:
+            self.assertLessEqual(next_end, start + 0.5 + 1e-9)
+            self.assertLessEqual(next_end - self.clock.now, 0.16 + 0.01)
+            next_end = self.advance(next_end - self.clock.now)
+            wakeups += 1
+        self.assertEqual(['early', 'late'], self.fired)
+        self.assertLessEqual(wakeups, 4)
+
+    def test_long_idle_period(self):
+        for i in range(20):
+            self.add_timer(0.01 * i, i)
+        self.advance(10)
+        self.assertEqual(list(range(20)), self.fired)
+        self.assertEqual(0, len(self.tm))
+
+    def test_timer_already_due(self):
+        self.advance(0.05)
+        self.add_timer(-0.03, 'past')
+        self.advance(0)
+        self.assertEqual(['past'], self.fired)
+
+    def test_cancelled_before_added(self):
+        timer = Timer(0, lambda: self.fired.append('a'))
+        timer.cancel()
+        self.tm.add_timer(timer)
+        self.assertEqual(0, len(self.tm))
+
+    def test_callback_error_does_not_stop_others(self):
+        timer = Timer(0, Mock(side_effect=Exception))
+        timer.end = self.clock.now
+        self.tm.add_timer(timer)
+        self.add_timer(0, 'a')
+        with patch('dse.connection.log') as log:
+            self.advance(0)
+        self.assertEqual(['a'], self.fired)
+        self.assertTrue(log.exception.called)
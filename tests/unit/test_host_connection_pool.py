@@ -0,0 +1,424 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest # noqa
+
+from collections import deque
+from mock import ANY, Mock, NonCallableMagicMock
+from threading import Thread, Event, Lock
+
+from dse.cluster import Cluster, Session
+from dse.connection import Connection, ConnectionException
+from dse.hosts import HostConnection, NoConnectionsAvailable
+from dse.policies import HostDistance
+
+
+class HostConnectionPoolTests(unittest.TestCase):
+
+    def make_session(self, core=1, max_conns=1, min_requests=0, max_requests=100):
+        session = NonCallableMagicMock(spec=Session, keyspace='foobarkeyspace')
+        cluster = session.cluster
+        cluster.get_core_connections_per_host.return_value = core
+        cluster.get_max_connections_per_host.return_value = max_conns
+        cluster.get_min_requests_per_connection.return_value = min_requests
+        cluster.get_max_requests_per_connection.return_value = max_requests
+        cluster.signal_connection_failure.return_value = False
+        return session
+
+    def make_connection(self):
+        conn = NonCallableMagicMock(spec=Connection, in_flight=0, is_defunct=False, is_closed=False,
+                                    max_request_id=100, signaled_error=False)
+        conn.lock = Lock()
+        return conn
+
+    def test_borrow_and_return(self):
+        host = Mock(spec=['address'], address='ip1')
+        session = self.make_session()
+        conn = self.make_connection()
+        session.cluster.connection_factory.return_value = conn
+
+        pool = HostConnection(host, HostDistance.LOCAL, session)
+        session.cluster.connection_factory.assert_called_once_with(host.address)
+
+        c, request_id = pool.borrow_connection(timeout=0.01)
+        self.assertIs(c, conn)
+        self.assertEqual(1, conn.in_flight)
+        conn.set_keyspace_blocking.assert_called_once_with('foobarkeyspace')
+
+        pool.return_connection(conn)
+        self.assertEqual(0, conn.in_flight)
+        self.assertNotIn(conn, pool._trash)
+
+    def test_opens_core_connections(self):
+        host = Mock(spec=['address'], address='ip1')
+        session = self.make_session(core=3, max_conns=3)
+        conns = [self.make_connection() for _ in range(3)]
+        session.cluster.connection_factory.side_effect = conns
+
+        pool = HostConnection(host, HostDistance.LOCAL, session)
+        self.assertEqual(3, session.cluster.connection_factory.call_count)
+        self.assertEqual(3, pool.open_count)
+        self.assertEqual([0, 0, 0], pool.get_state()['in_flights'])
+
+    def test_borrows_least_busy(self):
+        host = Mock(spec=['address'], address='ip1')
+        session = self.make_session(core=2, max_conns=2)
+        busy, idle = self.make_connection(), self.make_connection()
+        busy.in_flight = 10
+        session.cluster.connection_factory.side_effect = [busy, idle]
+
+        pool = HostConnection(host, HostDistance.LOCAL, session)
+        c, _ = pool.borrow_connection(timeout=0.01)
+        self.assertIs(c, idle)
+        self.assertEqual(1, idle.in_flight)
+        self.assertEqual(10, busy.in_flight)
+
+    def test_failed_wait_for_connection(self):
+        host = Mock(spec=['address'], address='ip1')
+        session = self.make_session()
+        conn = self.make_connection()
+        session.cluster.connection_factory.return_value = conn
+
+        pool = HostConnection(host, HostDistance.LOCAL, session)
+
+        conn.in_flight = conn.max_request_id + 1
+        self.assertRaises(NoConnectionsAvailable, pool.borrow_connection, 0)
+
+    def test_successful_wait_for_connection(self):
+        host = Mock(spec=['address'], address='ip1')
+        session = self.make_session()
+        conn = self.make_connection()
+        session.cluster.connection_factory.return_value = conn
+
+        pool = HostConnection(host, HostDistance.LOCAL, session)
+        conn.in_flight = conn.max_request_id + 1
+
+        started = Event()
+
+        def get_second_conn():
+            started.set()
+            c, request_id = pool.borrow_connection(1.0)
+            self.assertIs(conn, c)
+            pool.return_connection(c)
+
+        t = Thread(target=get_second_conn)
+        t.start()
+        started.wait()
+
+        pool.return_connection(conn)
+        t.join()
+        self.assertEqual(conn.max_request_id, conn.in_flight)
+
+    def test_spawn_when_at_max_requests(self):
+        host = Mock(spec=['address'], address='ip1')
+        session = self.make_session(core=1, max_conns=2, max_requests=10)
+        conn = self.make_connection()
+        session.cluster.connection_factory.return_value = conn
+
+        pool = HostConnection(host, HostDistance.LOCAL, session)
+        conn.in_flight = 9
+        pool.borrow_connection(timeout=0.01)
+        session.submit.assert_called_once_with(pool._create_new_connection)
+
+        # the pending creation counts toward the max
+        pool.borrow_connection(timeout=0.01)
+        self.assertEqual(1, session.submit.call_count)
+
+        new_conn = self.make_connection()
+        session.cluster.connection_factory.return_value = new_conn
+        pool._create_new_connection()
+        self.assertEqual(2, pool.open_count)
+
+        c, _ = pool.borrow_connection(timeout=0.01)
+        self.assertIs(c, new_conn)
+
+    def test_no_spawn_at_max_connections(self):
+        host = Mock(spec=['address'], address='ip1')
+        session = self.make_session(core=1, max_conns=1, max_requests=10)
+        conn = self.make_connection()
+        session.cluster.connection_factory.return_value = conn
+
+        pool = HostConnection(host, HostDistance.LOCAL, session)
+        conn.in_flight = 50
+        pool.borrow_connection(timeout=0.01)
+        self.assertFalse(session.submit.called)
+
+    def test_trash_idle_connection_above_core(self):
+        host = Mock(spec=['address'], address='ip1')
+        session = self.make_session(core=1, max_conns=2, min_requests=2)
+        conns = [self.make_connection(), self.make_connection()]
+        session.cluster.connection_factory.side_effect = conns
+
+        pool = HostConnection(host, HostDistance.LOCAL, session)
+        pool._add_conn_if_under_max()
+        self.assertEqual(2, pool.open_count)
+
+        # trashing is held off right after growing the pool
+        c, _ = pool.borrow_connection(timeout=0.01)
+        pool.return_connection(c)
+        self.assertEqual(2, pool.open_count)
+
+        pool._next_trash_allowed_at = 0
+        c, _ = pool.borrow_connection(timeout=0.01)
+        pool.return_connection(c)
+        self.assertEqual(1, pool.open_count)
+        c.close.assert_called_once_with()
+        self.assertEqual(0, pool.get_state()['trashed'])
+
+    def test_trashed_connection_closed_after_last_return(self):
+        host = Mock(spec=['address'], address='ip1')
+        session = self.make_session(core=1, max_conns=2, min_requests=5)
+        conns = [self.make_connection(), self.make_connection()]
+        session.cluster.connection_factory.side_effect = conns
+
+        pool = HostConnection(host, HostDistance.LOCAL, session)
+        pool._add_conn_if_under_max()
+        pool._next_trash_allowed_at = 0
+
+        busy = conns[1]
+        busy.in_flight = 2
+        pool.return_connection(busy)
+        self.assertIn(busy, pool._trash)
+        self.assertFalse(busy.close.called)
+        self.assertEqual([0], pool.get_state()['in_flights'])
+
+        pool.return_connection(busy)
+        self.assertNotIn(busy, pool._trash)
+        busy.close.assert_called_once_with()
+
+    def test_no_trash_at_core_connections(self):
+        host = Mock(spec=['address'], address='ip1')
+        session = self.make_session(core=2, max_conns=2, min_requests=5)
+        conns = [self.make_connection(), self.make_connection()]
+        session.cluster.connection_factory.side_effect = conns
+
+        pool = HostConnection(host, HostDistance.LOCAL, session)
+        pool._next_trash_allowed_at = 0
+        c, _ = pool.borrow_connection(timeout=0.01)
+        pool.return_connection(c)
+        self.assertEqual(2, pool.open_count)
+        self.assertFalse(pool._trash)
+
+    def test_return_defunct_connection(self):
+        host = Mock(spec=['address'], address='ip1')
+        session = self.make_session()
+        conn = self.make_connection()
+        session.cluster.connection_factory.return_value = conn
+
+        pool = HostConnection(host, HostDistance.LOCAL, session)
+        pool.borrow_connection(timeout=0.01)
+        conn.is_defunct = True
+        session.cluster.signal_connection_failure.return_value = False
+        pool.return_connection(conn)
+
+        # the connection should be replaced
+        self.assertFalse(pool.is_shutdown)
+        self.assertEqual(0, pool.open_count)
+        session.submit.assert_called_once_with(pool._replace, conn)
+
+        session.cluster.connection_factory.return_value = self.make_connection()
+        pool._replace(conn)
+        self.assertEqual(1, pool.open_count)
+
+    def test_return_defunct_connection_on_down_host(self):
+        host = Mock(spec=['address'], address='ip1')
+        session = self.make_session()
+        conn = self.make_connection()
+        session.cluster.connection_factory.return_value = conn
+
+        pool = HostConnection(host, HostDistance.LOCAL, session)
+        pool.borrow_connection(timeout=0.01)
+        conn.is_defunct = True
+        session.cluster.signal_connection_failure.return_value = True
+        pool.return_connection(conn)
+
+        # the pool should be shut down
+        self.assertTrue(session.cluster.signal_connection_failure.called)
+        self.assertTrue(conn.close.called)
+        self.assertFalse(session.submit.called)
+        self.assertTrue(pool.is_shutdown)
+
+    def test_ensure_core_connections(self):
+        host = Mock(spec=['address'], address='ip1')
+        session = self.make_session(core=1, max_conns=3)
+        session.cluster.connection_factory.side_effect = lambda *a, **kw: self.make_connection()
+
+        pool = HostConnection(host, HostDistance.LOCAL, session)
+        session.cluster.get_core_connections_per_host.return_value = 3
+        session.submit.side_effect = lambda fn, *args, **kwargs: fn(*args, **kwargs)
+        pool.ensure_core_connections()
+        self.assertEqual(3, pool.open_count)
+
+    def test_shutdown_closes_all(self):
+        host = Mock(spec=['address'], address='ip1')
+        session = self.make_session(core=2, max_conns=2)
+        conns = [self.make_connection(), self.make_connection()]
+        session.cluster.connection_factory.side_effect = conns
+
+        pool = HostConnection(host, HostDistance.LOCAL, session)
+        pool.shutdown()
+        for c in conns:
+            c.close.assert_called_once_with()
+        self.assertTrue(pool.get_state()['shutdown'])
+        self.assertEqual(0, pool.open_count)
+
+    def make_busy_pool(self, max_pending=2, timeout=None):
+        host = Mock(spec=['address'], address='ip1')
+        session = self.make_session()
+        session.cluster.max_pending_requests_per_host = max_pending
+        session.cluster.pending_request_timeout = timeout
+        session.cluster.metrics = None
+        conn = self.make_connection()
+        session.cluster.connection_factory.return_value = conn
+        pool = HostConnection(host, HostDistance.LOCAL, session)
+        conn.in_flight = conn.max_request_id + 1
+        return pool, conn
+
+    def test_parks_until_connection_returned(self):
+        pool, conn = self.make_busy_pool()
+        conn.get_request_id.return_value = 7
+        callback = Mock(return_value=True)
+
+        self.assertIsNone(pool.borrow_connection_or_park(callback))
+        self.assertEqual(1, pool.get_state()['pending'])
+        self.assertFalse(callback.called)
+
+        pool.return_connection(conn)
+        callback.assert_called_once_with(conn, 7, None)
+        self.assertEqual(0, pool.get_state()['pending'])
+        self.assertEqual(conn.max_request_id + 1, conn.in_flight)
+
+    def test_borrows_without_parking_when_available(self):
+        pool, conn = self.make_busy_pool()
+        conn.in_flight = 0
+        callback = Mock()
+        c, _ = pool.borrow_connection_or_park(callback)
+        self.assertIs(conn, c)
+        self.assertFalse(callback.called)
+
+    def test_parked_requests_go_first(self):
+        pool, conn = self.make_busy_pool()
+        order = []
+
+        def callback(name):
+            return Mock(side_effect=lambda *args: order.append(name))
+
+        pool.borrow_connection_or_park(callback('first'))
+        pool.borrow_connection_or_park(callback('second'))
+
+        pool.return_connection(conn)
+        self.assertEqual(['first'], order)
+
+        # a new request does not jump ahead of the parked one
+        conn.in_flight = 0
+        self.assertIsNone(pool.borrow_connection_or_park(callback('third')))
+        self.assertEqual(['first', 'second', 'third'], order)
+
+    def test_unused_request_id_is_released(self):
+        pool, conn = self.make_busy_pool()
+        conn.get_request_id.return_value = 7
+        pool.borrow_connection_or_park(Mock(return_value=False))
+
+        pool.return_connection(conn)
+        conn.request_ids.append.assert_called_once_with(7)
+        self.assertEqual(conn.max_request_id, conn.in_flight)
+
+    def test_request_id_released_when_callback_fails(self):
+        pool, conn = self.make_busy_pool()
+        conn.request_ids = deque([7])
+        conn.get_request_id.side_effect = conn.request_ids.popleft
+        pool.borrow_connection_or_park(Mock(side_effect=Exception))
+        second = Mock(return_value=True)
+        pool.borrow_connection_or_park(second)
+
+        pool.return_connection(conn)
+        # the ID borrowed for the failed callback went to the next request
+        second.assert_called_once_with(conn, 7, None)
+        self.assertEqual(conn.max_request_id + 1, conn.in_flight)
+
+        pool.borrow_connection_or_park(Mock(side_effect=Exception))
+        conn.request_ids.append(8)
+        pool.return_connection(conn)
+        self.assertEqual(deque([8]), conn.request_ids)
+        self.assertEqual(conn.max_request_id, conn.in_flight)
+
+    def test_fails_fast_when_queue_full(self):
+        pool, conn = self.make_busy_pool(max_pending=1)
+        pool.borrow_connection_or_park(Mock())
+        self.assertRaises(NoConnectionsAvailable, pool.borrow_connection_or_park, Mock())
+
+        pool, conn = self.make_busy_pool(max_pending=0)
+        self.assertRaises(NoConnectionsAvailable, pool.borrow_connection_or_park, Mock())
+
+    def test_pending_timeout(self):
+        pool, conn = self.make_busy_pool(timeout=2.0)
+        create_timer = pool._session.cluster.connection_class.create_timer
+        callback = Mock(return_value=True)
+        pool.borrow_connection_or_park(callback)
+        self.assertEqual(2.0, create_timer.call_args[0][0])
+
+        # the timer expires
+        create_timer.call_args[0][1]()
+        callback.assert_called_once_with(None, None, ANY)
+        self.assertIsInstance(callback.call_args[0][2], NoConnectionsAvailable)
+        self.assertEqual(0, pool.get_state()['pending'])
+
+        # the expired request is skipped
+        pool.return_connection(conn)
+        self.assertEqual(1, callback.call_count)
+        self.assertEqual(conn.max_request_id, conn.in_flight)
+
+    def test_timer_cancelled_when_dispatched(self):
+        pool, conn = self.make_busy_pool(timeout=2.0)
+        pool.borrow_connection_or_park(Mock(return_value=True))
+        timer = pool._session.cluster.connection_class.create_timer.return_value
+        pool.return_connection(conn)
+        timer.cancel.assert_called_once_with()
+
+    def test_records_wait_time(self):
+        pool, conn = self.make_busy_pool()
+        metrics = pool._session.cluster.metrics = Mock()
+        pool.borrow_connection_or_park(Mock(return_value=True))
+        pool.return_connection(conn)
+        self.assertEqual(1, metrics.on_pending_request.call_count)
+
+    def test_shutdown_fails_pending(self):
+        pool, conn = self.make_busy_pool()
+        callback = Mock()
+        pool.borrow_connection_or_park(callback)
+        pool.shutdown()
+        callback.assert_called_once_with(None, None, ANY)
+        self.assertIsInstance(callback.call_args[0][2], ConnectionException)
+        self.assertEqual(0, pool.get_state()['pending'])
+
+
+class ClusterPoolSettingsTest(unittest.TestCase):
+
+    def test_pool_settings_per_instance(self):
+        a = Cluster()
+        b = Cluster()
+        a.set_max_connections_per_host(HostDistance.LOCAL, 4)
+        a.set_core_connections_per_host(HostDistance.LOCAL, 2)
+        self.assertEqual(2, a.get_core_connections_per_host(HostDistance.LOCAL))
+        self.assertEqual(4, a.get_max_connections_per_host(HostDistance.LOCAL))
+        self.assertEqual(1, b.get_core_connections_per_host(HostDistance.LOCAL))
+        self.assertEqual(1, b.get_max_connections_per_host(HostDistance.LOCAL))
+
+    def test_pool_settings_validation(self):
+        cluster = Cluster()
+        self.assertRaises(ValueError, cluster.set_core_connections_per_host, HostDistance.LOCAL, 2)
+        self.assertRaises(ValueError, cluster.set_core_connections_per_host, HostDistance.LOCAL, 0)
+        self.assertRaises(ValueError, cluster.set_max_connections_per_host, HostDistance.LOCAL, 0)
+        self.assertRaises(ValueError, cluster.set_max_requests_per_connection, HostDistance.LOCAL,
+                          cluster.get_min_requests_per_connection(HostDistance.LOCAL))
+        self.assertRaises(ValueError, cluster.set_min_requests_per_connection, HostDistance.LOCAL,
+                          cluster.get_max_requests_per_connection(HostDistance.LOCAL))
@@ -13,7 +13,7 @@ except ImportError:
     import unittest  # noqa
 
 from binascii import unhexlify
-from mock import Mock
+from mock import Mock, patch
 import os
 import six
 import timeit
@@ -30,6 +30,7 @@ from dse.metadata import (Murmur3Token, MD5Token,
                                 IndexMetadata, Function, Aggregate,
                                 Metadata)
 from dse.policies import SimpleConvictionPolicy
+from dse.query import SimpleStatement
 from dse.hosts import Host
 
 
@@ -376,6 +377,170 @@ class BytesTokensTest(unittest.TestCase):
         self.assertFalse(t0 < t1)
 
 
+class TokenMapTest(unittest.TestCase):
+
+    def make_metadata(self):
+        metadata = Metadata()
+        metadata.keyspaces['ks'] = KeyspaceMetadata('ks', True, 'SimpleStrategy', dict(replication_factor=2))
+        hosts = [Host('192.168.1.%d' % i, SimpleConvictionPolicy) for i in range(3)]
+        token_map = dict((host, [str(i * 1000 + j * 100 - 2000) for j in range(4)]) for i, host in enumerate(hosts))
+        metadata.rebuild_token_map('Murmur3Partitioner', token_map)
+        return metadata
+
+    def test_get_replicas(self):
+        metadata = self.make_metadata()
+        token_map = metadata.token_map
+        ring = token_map.ring
+        replica_map = token_map.replica_map_for_keyspace(metadata.keyspaces['ks'])
+
+        values = [t.value for t in ring]
+        probes = values + [v - 1 for v in values] + [v + 1 for v in values] + [dse.metadata.MIN_LONG, dse.metadata.MAX_LONG]
+        for value in probes:
+            # the range (ring[i-1], ring[i]] is replicated like ring[i]; past the end wraps to ring[0]
+            owner = next((t for t in ring if t.value > value), ring[0])
+            self.assertEqual(replica_map[owner], token_map.get_replicas('ks', Murmur3Token(value)))
+
+        self.assertEqual([], token_map.get_replicas('unknown_ks', ring[0]))
+
+        token_map.remove_keyspace('ks')
+        self.assertNotIn('ks', token_map.tokens_to_hosts_by_ks)
+        self.assertEqual(replica_map[ring[1]], token_map.get_replicas('ks', ring[0]))
+
+    def test_routing_token_cached_on_statement(self):
+        metadata = self.make_metadata()
+        statement = SimpleStatement('SELECT * FROM ks.t WHERE k=1', routing_key=b'key1')
+        expected = metadata.get_replicas('ks', b'key1')
+
+        with patch.object(Murmur3Token, 'from_key', wraps=Murmur3Token.from_key) as from_key:
+            self.assertEqual(expected, metadata.get_replicas('ks', statement.routing_key, statement=statement))
+            self.assertEqual(expected, metadata.get_replicas('ks', statement.routing_key, statement=statement))
+            self.assertEqual(1, from_key.call_count)
+
+            # a new routing key is hashed again
+            statement.routing_key = b'key2'
+            self.assertEqual(metadata.get_replicas('ks', b'key2'),
+                             metadata.get_replicas('ks', statement.routing_key, statement=statement))
+            self.assertEqual(3, from_key.call_count)
+
+    def make_nts_metadata(self, token_map):
+        metadata = Metadata()
+        for name in ('ks1', 'ks2'):
+            metadata.keyspaces[name] = KeyspaceMetadata(name, True, 'NetworkTopologyStrategy',
+                                                        {'dc1': '2', 'dc2': '1'})
+        metadata.keyspaces['ks3'] = KeyspaceMetadata('ks3', True, 'SimpleStrategy', {'replication_factor': '2'})
+        metadata.rebuild_token_map('Murmur3Partitioner', token_map)
+        return metadata
+
+    def make_nts_hosts(self, num_hosts):
+        hosts = []
+        for i in range(num_hosts):
+            host = Host('10.0.0.%d' % i, SimpleConvictionPolicy)
+            host.set_location_info('dc%d' % (i % 2 + 1), 'rack%d' % (i % 3))
+            hosts.append(host)
+        return hosts
+
+    def assert_full_rebuild(self, metadata):
+        token_map = metadata.token_map
+        for name, keyspace in metadata.keyspaces.items():
+            strategy = keyspace.replication_strategy
+            expected = strategy.make_token_replica_map(token_map.token_to_host_owner, token_map.ring)
+            self.assertEqual(expected, token_map.replica_map_for_keyspace(keyspace))
+            for token in token_map.ring:
+                self.assertEqual(expected[token], token_map.get_replicas(name, Murmur3Token(token.value - 1)))
+
+    def test_replica_maps_shared_between_keyspaces(self):
+        hosts = self.make_nts_hosts(6)
+        metadata = self.make_nts_metadata(dict((host, [str(i * 100 + j * 10) for j in range(4)])
+                                               for i, host in enumerate(hosts)))
+        token_map = metadata.token_map
+        self.assert_full_rebuild(metadata)
+        self.assertIs(token_map.tokens_to_hosts_by_ks['ks1'], token_map.tokens_to_hosts_by_ks['ks2'])
+        self.assertIsNot(token_map.tokens_to_hosts_by_ks['ks1'], token_map.tokens_to_hosts_by_ks['ks3'])
+        self.assertEqual(2, len(token_map._replica_maps))
+
+        token_map.remove_keyspace('ks1')
+        self.assertEqual(2, len(token_map._replica_maps))
+        token_map.remove_keyspace('ks2')
+        self.assertEqual(1, len(token_map._replica_maps))
+
+    def test_replica_map_signature(self):
+        hosts = self.make_nts_hosts(4)
+        metadata = self.make_nts_metadata(dict((host, [str(i * 100)]) for i, host in enumerate(hosts)))
+        # a data center without replicas does not make a different map
+        metadata.keyspaces['ks2'] = KeyspaceMetadata('ks2', True, 'NetworkTopologyStrategy',
+                                                     {'dc2': '1', 'dc1': '2', 'dc3': '0'})
+        metadata.keyspaces['ks4'] = KeyspaceMetadata('ks4', True, 'OldNetworkTopologyStrategy', {'dc1': '2'})
+        metadata.keyspaces['ks5'] = KeyspaceMetadata('ks5', True, 'LocalStrategy', {})
+        token_map = metadata.token_map
+        for name in metadata.keyspaces:
+            token_map.get_replicas(name, token_map.ring[0])
+
+        by_ks = token_map.tokens_to_hosts_by_ks
+        self.assertIs(by_ks['ks1'], by_ks['ks2'])
+        self.assertEqual(4, len(token_map._replica_maps))
+        self.assertEqual({}, by_ks['ks4'])
+        self.assertEqual([], token_map.get_replicas('ks4', token_map.ring[0]))
+        self.assertEqual([], token_map.get_replicas('ks5', token_map.ring[0]))
+
+    def test_replica_map_is_read_only(self):
+        hosts = self.make_nts_hosts(4)
+        metadata = self.make_nts_metadata(dict((host, [str(i * 100)]) for i, host in enumerate(hosts)))
+        token_map = metadata.token_map
+        token = token_map.ring[0]
+        replicas = token_map.get_replicas('ks1', Murmur3Token(token.value - 1))
+
+        replica_map = token_map.tokens_to_hosts_by_ks['ks1']
+        self.assertEqual(replicas, replica_map[token])
+        self.assertEqual(token_map.ring, list(replica_map))
+        self.assertRaises(KeyError, replica_map.__getitem__, Murmur3Token(token.value + 1))
+        with self.assertRaises(TypeError):
+            replica_map[token] = []
+
+        # callers get their own list
+        replicas.append(hosts[0])
+        self.assertNotEqual(replicas, replica_map[token])
+
+    def test_incremental_rebuild(self):
+        hosts = self.make_nts_hosts(8)
+        tokens = dict((host, [str(i * 100 + j * 1000) for j in range(4)]) for i, host in enumerate(hosts))
+        metadata = self.make_nts_metadata(dict((host, tokens[host]) for host in hosts[:6]))
+        self.assert_full_rebuild(metadata)
+
+        # add two hosts; replicas of ranges far from the new tokens are
+        # carried over rather than walked again
+        walked = []
+        replica_walker = NetworkTopologyStrategy._replica_walker
+
+        def counting_replica_walker(strategy, owners):
+            walk, params = replica_walker(strategy, owners)
+
+            def counting_walk(i):
+                walked.append(i)
+                return walk(i)
+            return counting_walk, params
+
+        with patch.object(NetworkTopologyStrategy, '_replica_walker', counting_replica_walker):
+            metadata.rebuild_token_map('Murmur3Partitioner', tokens)
+        self.assertTrue(0 < len(walked) < len(metadata.token_map.ring))
+        self.assert_full_rebuild(metadata)
+
+        # move a host to another rack
+        hosts[1].set_location_info('dc2', 'rack9')
+        metadata.rebuild_token_map('Murmur3Partitioner', tokens)
+        self.assert_full_rebuild(metadata)
+
+        # move a host's tokens and remove another one
+        tokens[hosts[2]] = [str(int(t) + 50) for t in tokens[hosts[2]]]
+        del tokens[hosts[4]]
+        metadata.rebuild_token_map('Murmur3Partitioner', tokens)
+        self.assert_full_rebuild(metadata)
+
+        # a new replication strategy is built from scratch
+        metadata.keyspaces['ks2'] = KeyspaceMetadata('ks2', True, 'NetworkTopologyStrategy', {'dc1': '3'})
+        metadata.rebuild_token_map('Murmur3Partitioner', tokens)
+        self.assert_full_rebuild(metadata)
+
+
 class KeyspaceMetadataTest(unittest.TestCase):
 
     def test_export_as_string_user_types(self):
@@ -13,6 +13,7 @@ except ImportError:
     import unittest  # noqa
 
 from itertools import islice, cycle
+from math import log
 from mock import Mock, patch, call
 from random import randint
 import six
@@ -30,7 +31,8 @@ from dse.policies import (RoundRobinPolicy, WhiteListRoundRobinPolicy, DCAwareRo
                                 RetryPolicy, WriteType,
                                 DowngradingConsistencyRetryPolicy, ConstantReconnectionPolicy,
                                 LoadBalancingPolicy, ConvictionPolicy, ReconnectionPolicy, FallthroughRetryPolicy,
-                                IdentityTranslator, EC2MultiRegionTranslator, HostFilterPolicy)
+                                IdentityTranslator, EC2MultiRegionTranslator, HostFilterPolicy,
+                                LatencyAwarePolicy, AIMDConcurrencyLimiter)
 from dse.hosts import Host
 from dse.query import Statement
 
@@ -527,7 +529,7 @@ class TokenAwarePolicyTest(unittest.TestCase):
         for host in hosts:
             host.set_up()
 
-        def get_replicas(keyspace, packed_key):
+        def get_replicas(keyspace, packed_key, statement=None):
             index = struct.unpack('>i', packed_key)[0]
             return list(islice(cycle(hosts), index, index + 2))
 
@@ -562,7 +564,7 @@ class TokenAwarePolicyTest(unittest.TestCase):
         for h in hosts[2:]:
             h.set_location_info("dc2", "rack1")
 
-        def get_replicas(keyspace, packed_key):
+        def get_replicas(keyspace, packed_key, statement=None):
             index = struct.unpack('>i', packed_key)[0]
             # return one node from each DC
             if index % 2 == 0:
@@ -708,7 +710,7 @@ class TokenAwarePolicyTest(unittest.TestCase):
         query = Statement(routing_key=routing_key)
         qplan = list(policy.make_query_plan(keyspace, query))
         self.assertEqual(replicas + hosts[:2], qplan)
-        cluster.metadata.get_replicas.assert_called_with(keyspace, routing_key)
+        cluster.metadata.get_replicas.assert_called_with(keyspace, routing_key, statement=query)
 
         # statement keyspace, no working
         cluster.metadata.get_replicas.reset_mock()
@@ -718,7 +720,7 @@ class TokenAwarePolicyTest(unittest.TestCase):
         query = Statement(routing_key=routing_key, keyspace=statement_keyspace)
         qplan = list(policy.make_query_plan(working_keyspace, query))
         self.assertEqual(replicas + hosts[:2], qplan)
-        cluster.metadata.get_replicas.assert_called_with(statement_keyspace, routing_key)
+        cluster.metadata.get_replicas.assert_called_with(statement_keyspace, routing_key, statement=query)
 
         # both keyspaces set, statement keyspace used for routing
         cluster.metadata.get_replicas.reset_mock()
@@ -728,7 +730,7 @@ class TokenAwarePolicyTest(unittest.TestCase):
         query = Statement(routing_key=routing_key, keyspace=statement_keyspace)
         qplan = list(policy.make_query_plan(working_keyspace, query))
         self.assertEqual(replicas + hosts[:2], qplan)
-        cluster.metadata.get_replicas.assert_called_with(statement_keyspace, routing_key)
+        cluster.metadata.get_replicas.assert_called_with(statement_keyspace, routing_key, statement=query)
 
     def test_shuffles_if_given_keyspace_and_routing_key(self):
         """
@@ -1439,7 +1441,7 @@ class HostFilterPolicyQueryPlanTest(unittest.TestCase):
         for host in hosts:
             host.set_up()
 
-        def get_replicas(keyspace, packed_key):
+        def get_replicas(keyspace, packed_key, statement=None):
             return hosts[:2]
 
         cluster.metadata.get_replicas.side_effect = get_replicas
@@ -1487,3 +1489,165 @@ class HostFilterPolicyQueryPlanTest(unittest.TestCase):
         self.assertEqual(set(query_plan), {Host("127.0.0.1", SimpleConvictionPolicy),
                                            Host("127.0.0.4", SimpleConvictionPolicy)})
 
+
+class LatencyAwarePolicyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.hosts = [Host("127.0.0.{}".format(i), SimpleConvictionPolicy) for i in range(1, 5)]
+        for host in self.hosts:
+            host.set_up()
+        self.now = 1000.0
+        patcher = patch('dse.policies.time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_policy(self, **kwargs):
+        child_policy = Mock(spec=LoadBalancingPolicy)
+        child_policy.make_query_plan.side_effect = lambda *args: iter(self.hosts)
+        policy = LatencyAwarePolicy(child_policy, **kwargs)
+        cluster = Mock(spec=Cluster)
+        policy.populate(cluster, self.hosts)
+        cluster.register_latency_tracker.assert_called_once_with(policy)
+        return policy
+
+    def measure(self, policy, latencies, count):
+        for _ in range(count):
+            self.now += 0.01
+            for host, latency in zip(self.hosts, latencies):
+                policy.update(host, latency)
+
+    def test_decaying_average(self):
+        policy = self.make_policy()
+        host = self.hosts[0]
+        policy.update(host, 1.0)
+        self.assertEqual((1000.0, 1.0, 1), policy._latencies[host])
+
+        # a measurement `scale` seconds later weighs 1 - log(2)
+        self.now += 0.1
+        policy.update(host, 2.0)
+        timestamp, average, count = policy._latencies[host]
+        self.assertAlmostEqual(2.0 - log(2), average)
+        self.assertEqual(2, count)
+
+        # much later measurements replace most of the average
+        self.now += 1000
+        policy.update(host, 10.0)
+        self.assertGreater(policy._latencies[host][1], 9.9)
+
+    def test_slow_hosts_moved_to_end(self):
+        policy = self.make_policy(min_measure=10)
+        self.assertEqual(self.hosts, list(policy.make_query_plan()))
+
+        # not enough measurements yet
+        self.measure(policy, [0.01, 0.1, 0.015, 0.01], 5)
+        self.assertEqual(self.hosts, list(policy.make_query_plan()))
+
+        self.measure(policy, [0.01, 0.1, 0.015, 0.01], 5)
+        self.now += 1
+        self.assertEqual([self.hosts[0], self.hosts[2], self.hosts[3], self.hosts[1]],
+                         list(policy.make_query_plan()))
+
+        # a slow host without measurements for retry_period is tried again
+        self.now += policy.retry_period
+        for host in self.hosts[0], self.hosts[2], self.hosts[3]:
+            policy.update(host, 0.01)
+        self.assertEqual(self.hosts, list(policy.make_query_plan()))
+
+    def test_on_remove(self):
+        policy = self.make_policy(min_measure=1)
+        self.measure(policy, [0.01, 0.1, 0.01, 0.01], 1)
+        policy.on_remove(self.hosts[1])
+        policy._child_policy.on_remove.assert_called_once_with(self.hosts[1])
+        self.assertNotIn(self.hosts[1], policy._latencies)
+
+    def test_wrap_token_aware(self):
+        cluster = Mock(spec=Cluster)
+        cluster.metadata.get_replicas.side_effect = lambda keyspace, key, statement=None: self.hosts[:2]
+        policy = LatencyAwarePolicy(TokenAwarePolicy(RoundRobinPolicy()), min_measure=1)
+        policy.populate(cluster, self.hosts)
+
+        self.measure(policy, [0.5, 0.01, 0.01, 0.01], 1)
+        self.now += 1
+        query = Statement(routing_key=b'key', keyspace='ks')
+        # the fast replica goes first, the slow one last
+        plan = list(policy.make_query_plan('ks', query))
+        self.assertEqual([self.hosts[1], self.hosts[0]], [plan[0], plan[-1]])
+        self.assertEqual(set(self.hosts[2:]), set(plan[1:-1]))
+
+    def test_invalid_options(self):
+        self.assertRaises(ValueError, LatencyAwarePolicy, RoundRobinPolicy(), exclusion_threshold=0.5)
+        self.assertRaises(ValueError, LatencyAwarePolicy, RoundRobinPolicy(), scale=0)
+        self.assertRaises(ValueError, LatencyAwarePolicy, RoundRobinPolicy(), retry_period=-1)
+
+
+class AIMDConcurrencyLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.host = Host('127.0.0.1', SimpleConvictionPolicy)
+
+    def fill(self, limiter):
+        while limiter.try_acquire(self.host):
+            pass
+
+    def test_limit(self):
+        limiter = AIMDConcurrencyLimiter(initial_limit=10)
+        self.fill(limiter)
+        self.assertEqual(10, limiter.get_in_flight(self.host))
+        self.assertFalse(limiter.try_acquire(self.host))
+
+        # other hosts have their own limit
+        other = Host('127.0.0.2', SimpleConvictionPolicy)
+        self.assertTrue(limiter.try_acquire(other))
+
+        limiter.release(self.host, None, False)
+        self.assertEqual(9, limiter.get_in_flight(self.host))
+        self.assertTrue(limiter.try_acquire(self.host))
+
+    def test_additive_increase(self):
+        limiter = AIMDConcurrencyLimiter(initial_limit=10, max_limit=11)
+        # about one limit's worth of responses to grow by one
+        for _ in range(11):
+            self.fill(limiter)
+            limiter.release(self.host, 0.001, False)
+        self.assertEqual(11, limiter.get_limit(self.host))
+
+        # capped to max_limit
+        for _ in range(20):
+            self.fill(limiter)
+            limiter.release(self.host, 0.001, False)
+        self.assertEqual(11, limiter.get_limit(self.host))
+
+    def test_no_increase_when_underused(self):
+        limiter = AIMDConcurrencyLimiter(initial_limit=10)
+        for _ in range(100):
+            limiter.try_acquire(self.host)
+            limiter.release(self.host, 0.001, False)
+        self.assertEqual(10, limiter.get_limit(self.host))
+        self.assertEqual(0, limiter.get_in_flight(self.host))
+
+    def test_multiplicative_decrease(self):
+        limiter = AIMDConcurrencyLimiter(initial_limit=100, min_limit=80, backoff_ratio=0.5, max_latency=0.1)
+        limiter.try_acquire(self.host)
+        limiter.release(self.host, 0.001, True)
+        self.assertEqual(80, limiter.get_limit(self.host))
+
+        limiter = AIMDConcurrencyLimiter(initial_limit=100, backoff_ratio=0.5, max_latency=0.1)
+        limiter.try_acquire(self.host)
+        limiter.release(self.host, 0.2, False)
+        self.assertEqual(50, limiter.get_limit(self.host))
+
+        limiter.on_timeout(self.host)
+        self.assertEqual(25, limiter.get_limit(self.host))
+        # the timed out request still holds its slot
+        self.assertEqual(0, limiter.get_in_flight(self.host))
+
+    def test_release_without_latency(self):
+        limiter = AIMDConcurrencyLimiter(initial_limit=10)
+        self.fill(limiter)
+        limiter.release(self.host, None, False)
+        self.assertEqual(10, limiter.get_limit(self.host))
+
+    def test_invalid_options(self):
+        self.assertRaises(ValueError, AIMDConcurrencyLimiter, backoff_ratio=1)
+        self.assertRaises(ValueError, AIMDConcurrencyLimiter, initial_limit=4, min_limit=8)
+        self.assertRaises(ValueError, AIMDConcurrencyLimiter, initial_limit=10, max_limit=5)
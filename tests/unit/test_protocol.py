@@ -3,6 +3,10 @@ try:
 except ImportError:
     import unittest # noqa
 
+import os
+import subprocess
+import sys
+
 from mock import Mock
 
 from dse import ProtocolVersion
@@ -10,6 +14,7 @@ from dse.protocol import (PrepareMessage, QueryMessage, ExecuteMessage, Unsuppor
     _PAGING_OPTIONS_FLAG, _WITH_SERIAL_CONSISTENCY_FLAG, _PAGE_SIZE_FLAG, _WITH_PAGING_STATE_FLAG)
 from dse.marshal import uint32_unpack
 from dse.cluster import ContinuousPagingOptions
+from dse.cython_deps import HAVE_ARROW
 
 
 class MessageTest(unittest.TestCase):
@@ -128,4 +133,14 @@ class MessageTest(unittest.TestCase):
                 # self.assertEqual(uint32_unpack(io.write.mock_calls[2][1][0]) & _WITH_SERIAL_CONSISTENCY_FLAG, 1)
             else:
                 self.assertEqual(len(io.write.mock_calls), 2)
-            io.reset_mock()
\ No newline at end of file
+            io.reset_mock()
+
+
+class ArrowImportTest(unittest.TestCase):
+
+    @unittest.skipUnless(HAVE_ARROW, 'pyarrow is not available')
+    def test_pyarrow_not_imported_with_driver(self):
+        # pyarrow is slow to import, so only Arrow results import it
+        code = "import sys, dse.protocol, dse.cluster; sys.exit('pyarrow' in sys.modules)"
+        self.assertEqual(0, subprocess.call([sys.executable, '-c', code], cwd=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), '..', '..')))
@@ -0,0 +1,153 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest # noqa
+
+from threading import Thread
+
+from mock import Mock
+
+from dse import OperationTimedOut
+from dse.hosts import Host
+from dse.policies import SimpleConvictionPolicy
+from dse.request_metrics import RequestMetrics, _bucket_index, _bucket_value, _FLUSH_SIZE
+
+
+class RequestMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.host = Host('127.0.0.1', SimpleConvictionPolicy)
+        self.host.set_location_info('dc1', 'rack1')
+        self.statement = Mock(query_id=b'\x01\xab')
+
+    def test_bucket_precision(self):
+        for latency in (1e-6, 0.00123, 0.25, 0.5, 1, 3.7, 60):
+            self.assertAlmostEqual(latency, _bucket_value(_bucket_index(latency)), delta=latency * 0.01)
+        # buckets are ordered by latency
+        indexes = [_bucket_index(latency / 1000.0) for latency in range(1, 5000)]
+        self.assertEqual(sorted(indexes), indexes)
+
+    def test_percentiles(self):
+        metrics = RequestMetrics()
+        for i in range(1, 1001):
+            metrics.record(self.host, 'default', None, i / 1000.0)
+
+        histogram = metrics.histograms()[('127.0.0.1', 'default', None)]
+        self.assertEqual(1000, histogram.count)
+        self.assertAlmostEqual(500.5, histogram.total)
+        self.assertAlmostEqual(0.5005, histogram.mean)
+        self.assertAlmostEqual(0.001, histogram.min, delta=0.00001)
+        self.assertAlmostEqual(1, histogram.max, delta=0.01)
+        for percentile in (50, 90, 99, 99.9):
+            self.assertAlmostEqual(percentile / 100.0, histogram.percentile(percentile), delta=percentile / 100.0 * 0.01)
+
+    def test_breakdown(self):
+        metrics = RequestMetrics()
+        other_host = Host('127.0.0.2', SimpleConvictionPolicy)
+        metrics.record(self.host, 'default', None, 0.01)
+        metrics.record(self.host, 'default', self.statement, 0.01)
+        metrics.record(self.host, 'analytics', self.statement, 0.01, OperationTimedOut())
+        metrics.record(other_host, 'analytics', self.statement, 0.01)
+        self.assertEqual(4, len(metrics.histograms()))
+
+        metrics = RequestMetrics(by_host=False, by_statement=False)
+        metrics.record(self.host, 'default', None, 0.01)
+        metrics.record(self.host, 'default', self.statement, 0.01)
+        metrics.record(self.host, 'analytics', self.statement, 0.01, OperationTimedOut())
+        metrics.record(other_host, 'analytics', self.statement, 0.01)
+        histograms = metrics.histograms()
+        self.assertEqual(2, histograms[(None, 'default', None)].count)
+        self.assertEqual({'OperationTimedOut': 1}, histograms[(None, 'analytics', None)].errors)
+
+    def test_threads_merged(self):
+        metrics = RequestMetrics()
+
+        def record():
+            for _ in range(100):
+                metrics.record(self.host, 'default', None, 0.01)
+
+        threads = [Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        record()
+
+        self.assertEqual(500, metrics.histograms()[('127.0.0.1', 'default', None)].count)
+        # the series of exited threads are merged together
+        self.assertEqual(1, len(metrics._thread_series))
+        thread = Thread(target=record)
+        thread.start()
+        thread.join()
+        histogram = metrics.histograms()[('127.0.0.1', 'default', None)]
+        self.assertEqual(600, histogram.count)
+        self.assertAlmostEqual(6, histogram.total)
+
+    def test_counted_in_bulk(self):
+        metrics = RequestMetrics()
+        for i in range(_FLUSH_SIZE + 10):
+            metrics.record(self.host, 'default', None, 0.01 if i % 2 else 0.02)
+            if i in (0, _FLUSH_SIZE - 1, _FLUSH_SIZE):
+                histogram = metrics.histograms()[('127.0.0.1', 'default', None)]
+                self.assertEqual(i + 1, histogram.count)
+
+        histogram = metrics.histograms()[('127.0.0.1', 'default', None)]
+        self.assertEqual(_FLUSH_SIZE + 10, histogram.count)
+        self.assertAlmostEqual((_FLUSH_SIZE + 10) * 0.015, histogram.total)
+        self.assertAlmostEqual(0.01, histogram.percentile(50), delta=0.0001)
+        self.assertAlmostEqual(0.02, histogram.percentile(51), delta=0.0002)
+
+    def test_non_positive_latency(self):
+        metrics = RequestMetrics()
+        metrics.record(self.host, 'default', None, 0)
+        metrics.record(self.host, 'default', None, -0.001)
+        self.assertEqual(2, metrics.histograms()[('127.0.0.1', 'default', None)].count)
+
+    def test_snapshot(self):
+        metrics = RequestMetrics()
+        metrics.record(self.host, 'default', self.statement, 0.01, OperationTimedOut())
+        metrics.record(None, 'analytics', None, 0.02)
+
+        snapshot = sorted(metrics.snapshot(percentiles=(50,)), key=lambda entry: entry['profile'])
+        self.assertEqual(2, len(snapshot))
+        entry = snapshot[1]
+        self.assertEqual(('127.0.0.1', 'dc1', 'default', '01ab', 1, {'OperationTimedOut': 1}),
+                         (entry['host'], entry['datacenter'], entry['profile'], entry['statement_id'],
+                          entry['count'], entry['errors']))
+        self.assertAlmostEqual(0.01, entry['percentiles'][50], delta=0.0001)
+        entry = snapshot[0]
+        self.assertEqual((None, None, 'analytics', None), (entry['host'], entry['datacenter'], entry['profile'],
+                                                           entry['statement_id']))
+
+    def test_prometheus(self):
+        metrics = RequestMetrics(by_statement=False)
+        metrics.record(self.host, 'default', None, 0.5, OperationTimedOut())
+        metrics.record(self.host, 'default', None, 0.5)
+
+        lines = metrics.to_prometheus(percentiles=(50, 99.9)).splitlines()
+        labels = 'host="127.0.0.1",datacenter="dc1",profile="default"'
+        self.assertEqual([
+            '# HELP dse_driver_request_latency_seconds Latency of requests.',
+            '# TYPE dse_driver_request_latency_seconds summary',
+            'dse_driver_request_latency_seconds{%s,quantile="0.5"} %r' % (labels, _bucket_value(_bucket_index(0.5))),
+            'dse_driver_request_latency_seconds{%s,quantile="0.999"} %r' % (labels, _bucket_value(_bucket_index(0.5))),
+            'dse_driver_request_latency_seconds_sum{%s} 1.0' % labels,
+            'dse_driver_request_latency_seconds_count{%s} 2' % labels,
+            '# HELP dse_driver_request_errors_total Failed requests by error.',
+            '# TYPE dse_driver_request_errors_total counter',
+            'dse_driver_request_errors_total{%s,error="OperationTimedOut"} 1' % labels,
+        ], lines)
+
+    def test_empty(self):
+        metrics = RequestMetrics()
+        self.assertEqual([], metrics.snapshot())
+        self.assertEqual(4, len(metrics.to_prometheus().splitlines()))
@@ -12,9 +12,9 @@ try:
 except ImportError:
     import unittest # noqa
 
-from mock import Mock, MagicMock, ANY
+from mock import Mock, MagicMock, ANY, patch
 
-from dse import ConsistencyLevel, Unavailable, SchemaTargetType, SchemaChangeType
+from dse import ConsistencyLevel, Unavailable, SchemaTargetType, SchemaChangeType, OperationTimedOut
 from dse.cluster import Session, ResponseFuture, NoHostAvailable
 from dse.connection import Connection, ConnectionException
 from dse.protocol import (ReadTimeoutErrorMessage, WriteTimeoutErrorMessage,
@@ -24,8 +24,10 @@ from dse.protocol import (ReadTimeoutErrorMessage, WriteTimeoutErrorMessage,
                                 RESULT_KIND_ROWS, RESULT_KIND_SET_KEYSPACE,
                                 RESULT_KIND_SCHEMA_CHANGE, RESULT_KIND_PREPARED,
                                 ProtocolHandler)
-from dse.policies import RetryPolicy
-from dse.hosts import NoConnectionsAvailable
+from dse.policies import (RetryPolicy, AIMDConcurrencyLimiter, LatencyAwarePolicy, LoadBalancingPolicy,
+                          SimpleConvictionPolicy)
+from dse.request_metrics import RequestMetrics
+from dse.hosts import Host, NoConnectionsAvailable
 from dse.query import SimpleStatement
 
 
@@ -57,13 +59,13 @@ class ResponseFutureTests(unittest.TestCase):
         pool.is_shutdown = False
 
         connection = Mock(spec=Connection)
-        pool.borrow_connection.return_value = (connection, 1)
+        pool.borrow_connection_or_park.return_value = (connection, 1)
 
         rf = self.make_response_future(session)
         rf.send_request()
 
         rf.session._pools.get.assert_called_once_with('ip1')
-        pool.borrow_connection.assert_called_once_with(timeout=ANY)
+        pool.borrow_connection_or_park.assert_called_once_with(ANY)
 
         connection.send_msg.assert_called_once_with(rf.message, 1, cb=ANY, encoder=ProtocolHandler.encode_message, decoder=ProtocolHandler.decode_message, result_metadata=[])
 
@@ -72,11 +74,74 @@ class ResponseFutureTests(unittest.TestCase):
         result = rf.result()[0]
         self.assertEqual(result, expected_result)
 
+    def test_latency_reported(self):
+        session = self.make_session()
+        pool = session._pools.get.return_value
+        pool.borrow_connection_or_park.return_value = (Mock(spec=Connection), 1)
+        tracker = Mock()
+
+        query = SimpleStatement("SELECT * FROM foo")
+        message = QueryMessage(query=query, consistency_level=ConsistencyLevel.ONE)
+        rf = ResponseFuture(session, message, query, 1, latency_trackers=(tracker,))
+        rf.send_request()
+
+        rf._set_result('ip1', None, pool, self.make_mock_response([], []))
+        tracker.update.assert_called_once_with('ip1', ANY)
+        self.assertGreaterEqual(tracker.update.call_args[0][1], 0)
+
+    def test_timeouts_reported(self):
+        hosts = [Host('127.0.0.1', SimpleConvictionPolicy), Host('127.0.0.2', SimpleConvictionPolicy)]
+        for host in hosts:
+            host.set_up()
+        child_policy = Mock(spec=LoadBalancingPolicy)
+        child_policy.make_query_plan.side_effect = lambda *args: iter(hosts)
+        policy = LatencyAwarePolicy(child_policy, min_measure=3)
+        policy.populate(Mock(), hosts)
+
+        session = self.make_session()
+        pool = session._pools.get.return_value
+        pool.borrow_connection_or_park.return_value = (Mock(spec=Connection), 1)
+        query = SimpleStatement("SELECT * FROM foo")
+        message = QueryMessage(query=query, consistency_level=ConsistencyLevel.ONE)
+        now = [1000.0]
+
+        with patch('time.time', side_effect=lambda: now[0]):
+            # the first host never answers
+            for _ in range(3):
+                slow = ResponseFuture(session, message, query, 1, latency_trackers=(policy,))
+                slow._query(hosts[0])
+                fast = ResponseFuture(session, message, query, 1, latency_trackers=(policy,))
+                fast._query(hosts[1])
+                now[0] += 0.01
+                fast._set_result(hosts[1], None, pool, self.make_mock_response([], []))
+                now[0] += 1
+                slow._on_timeout()
+                self.assertRaises(OperationTimedOut, slow.result)
+
+            now[0] += 1
+            self.assertEqual([hosts[1], hosts[0]], list(policy.make_query_plan()))
+
+    def test_overloaded_latency_reported(self):
+        session = self.make_session()
+        pool = session._pools.get.return_value
+        pool.borrow_connection_or_park.return_value = (Mock(spec=Connection), 1)
+        tracker = Mock()
+
+        query = SimpleStatement("SELECT * FROM foo")
+        message = QueryMessage(query=query, consistency_level=ConsistencyLevel.ONE)
+        rf = ResponseFuture(session, message, query, 5, latency_trackers=(tracker,))
+        rf.send_request()
+
+        # counted as taking the whole timeout
+        rf._set_result('ip1', None, pool, Mock(spec=OverloadedErrorMessage))
+        tracker.update.assert_called_once_with('ip1', ANY)
+        self.assertGreaterEqual(tracker.update.call_args[0][1], 5)
+
     def test_unknown_result_class(self):
         session = self.make_session()
         pool = session._pools.get.return_value
         connection = Mock(spec=Connection)
-        pool.borrow_connection.return_value = (connection, 1)
+        pool.borrow_connection_or_park.return_value = (connection, 1)
 
         rf = self.make_response_future(session)
         rf.send_request()
@@ -182,7 +247,7 @@ class ResponseFutureTests(unittest.TestCase):
         message = QueryMessage(query=query, consistency_level=ConsistencyLevel.QUORUM)
 
         connection = Mock(spec=Connection)
-        pool.borrow_connection.return_value = (connection, 1)
+        pool.borrow_connection_or_park.return_value = (connection, 1)
 
         retry_policy = Mock()
         retry_policy.on_unavailable.return_value = (RetryPolicy.RETRY, ConsistencyLevel.ONE)
@@ -191,7 +256,7 @@ class ResponseFutureTests(unittest.TestCase):
         rf.send_request()
 
         rf.session._pools.get.assert_called_once_with('ip1')
-        pool.borrow_connection.assert_called_once_with(timeout=ANY)
+        pool.borrow_connection_or_park.assert_called_once_with(ANY)
         connection.send_msg.assert_called_once_with(rf.message, 1, cb=ANY, encoder=ProtocolHandler.encode_message, decoder=ProtocolHandler.decode_message, result_metadata=[])
 
         result = Mock(spec=UnavailableErrorMessage, info={})
@@ -202,7 +267,7 @@ class ResponseFutureTests(unittest.TestCase):
         self.assertEqual(1, rf._query_retries)
 
         connection = Mock(spec=Connection)
-        pool.borrow_connection.return_value = (connection, 2)
+        pool.borrow_connection_or_park.return_value = (connection, 2)
 
         # simulate the executor running this
         rf._retry_task(True, host)
@@ -210,7 +275,7 @@ class ResponseFutureTests(unittest.TestCase):
         # it should try again with the same host since this was
         # an UnavailableException
         rf.session._pools.get.assert_called_with(host)
-        pool.borrow_connection.assert_called_with(timeout=ANY)
+        pool.borrow_connection_or_park.assert_called_with(ANY)
         connection.send_msg.assert_called_with(rf.message, 2, cb=ANY, encoder=ProtocolHandler.encode_message, decoder=ProtocolHandler.decode_message, result_metadata=[])
 
     def test_retry_with_different_host(self):
@@ -218,14 +283,14 @@ class ResponseFutureTests(unittest.TestCase):
         pool = session._pools.get.return_value
 
         connection = Mock(spec=Connection)
-        pool.borrow_connection.return_value = (connection, 1)
+        pool.borrow_connection_or_park.return_value = (connection, 1)
 
         rf = self.make_response_future(session)
         rf.message.consistency_level = ConsistencyLevel.QUORUM
         rf.send_request()
 
         rf.session._pools.get.assert_called_once_with('ip1')
-        pool.borrow_connection.assert_called_once_with(timeout=ANY)
+        pool.borrow_connection_or_park.assert_called_once_with(ANY)
         connection.send_msg.assert_called_once_with(rf.message, 1, cb=ANY, encoder=ProtocolHandler.encode_message, decoder=ProtocolHandler.decode_message, result_metadata=[])
         self.assertEqual(ConsistencyLevel.QUORUM, rf.message.consistency_level)
 
@@ -238,13 +303,13 @@ class ResponseFutureTests(unittest.TestCase):
         self.assertEqual(0, rf._query_retries)
 
         connection = Mock(spec=Connection)
-        pool.borrow_connection.return_value = (connection, 2)
+        pool.borrow_connection_or_park.return_value = (connection, 2)
         # simulate the executor running this
         rf._retry_task(False, host)
 
         # it should try with a different host
         rf.session._pools.get.assert_called_with('ip2')
-        pool.borrow_connection.assert_called_with(timeout=ANY)
+        pool.borrow_connection_or_park.assert_called_with(ANY)
         connection.send_msg.assert_called_with(rf.message, 2, cb=ANY, encoder=ProtocolHandler.encode_message, decoder=ProtocolHandler.decode_message, result_metadata=[])
 
         # the consistency level should be the same
@@ -254,7 +319,7 @@ class ResponseFutureTests(unittest.TestCase):
         session = self.make_session()
         pool = session._pools.get.return_value
         connection = Mock(spec=Connection)
-        pool.borrow_connection.return_value = (connection, 1)
+        pool.borrow_connection_or_park.return_value = (connection, 1)
 
         rf = self.make_response_future(session)
         rf.send_request()
@@ -308,15 +373,15 @@ class ResponseFutureTests(unittest.TestCase):
         session = self.make_basic_session()
         session.cluster._default_load_balancing_policy.make_query_plan.return_value = ['ip1', 'ip2']
 
-        # the first pool will raise an exception on borrow_connection()
+        # the first pool will raise an exception on borrow_connection_or_park()
         exc = NoConnectionsAvailable()
         first_pool = Mock(is_shutdown=False)
-        first_pool.borrow_connection.side_effect = exc
+        first_pool.borrow_connection_or_park.side_effect = exc
 
         # the second pool will return a connection
         second_pool = Mock(is_shutdown=False)
         connection = Mock(spec=Connection)
-        second_pool.borrow_connection.return_value = (connection, 1)
+        second_pool.borrow_connection_or_park.return_value = (connection, 1)
 
         session._pools.get.side_effect = [first_pool, second_pool]
 
@@ -330,6 +395,118 @@ class ResponseFutureTests(unittest.TestCase):
         # make sure the exception is recorded correctly
         self.assertEqual(rf._errors, {'ip1': exc})
 
+    def test_parked_until_connection_available(self):
+        session = self.make_session()
+        pool = session._pools.get.return_value
+        pool.borrow_connection_or_park.return_value = None
+
+        rf = self.make_response_future(session)
+        rf.send_request()
+        # waits on the first host instead of moving on
+        session._pools.get.assert_called_once_with('ip1')
+        on_available = pool.borrow_connection_or_park.call_args[0][0]
+
+        connection = Mock(spec=Connection)
+        self.assertTrue(on_available(connection, 3, None))
+        connection.send_msg.assert_called_once_with(rf.message, 3, cb=ANY, encoder=ProtocolHandler.encode_message,
+                                                    decoder=ProtocolHandler.decode_message, result_metadata=[])
+
+        expected_result = (object(), object())
+        rf._set_result('ip1', None, None, self.make_mock_response(expected_result[0], expected_result[1]))
+        self.assertEqual(rf.result()[0], expected_result)
+
+    def test_parked_request_moves_to_next_host(self):
+        session = self.make_basic_session()
+        session.cluster._default_load_balancing_policy.make_query_plan.return_value = ['ip1', 'ip2']
+        first_pool = Mock(is_shutdown=False)
+        first_pool.borrow_connection_or_park.return_value = None
+        second_pool = Mock(is_shutdown=False)
+        connection = Mock(spec=Connection)
+        second_pool.borrow_connection_or_park.return_value = (connection, 1)
+        session._pools.get.side_effect = [first_pool, second_pool]
+
+        rf = self.make_response_future(session)
+        rf.send_request()
+        self.assertFalse(second_pool.borrow_connection_or_park.called)
+
+        exc = NoConnectionsAvailable()
+        on_available = first_pool.borrow_connection_or_park.call_args[0][0]
+        self.assertFalse(on_available(None, None, exc))
+        self.assertEqual(rf._errors, {'ip1': exc})
+        self.assertTrue(connection.send_msg.called)
+
+    def test_parked_request_completed_while_waiting(self):
+        session = self.make_session()
+        pool = session._pools.get.return_value
+        pool.borrow_connection_or_park.return_value = None
+
+        rf = self.make_response_future(session)
+        rf.send_request()
+        rf._set_final_exception(OperationTimedOut())
+        self.assertRaises(OperationTimedOut, rf.result)
+
+        connection = Mock(spec=Connection)
+        on_available = pool.borrow_connection_or_park.call_args[0][0]
+        self.assertFalse(on_available(connection, 3, None))
+        self.assertFalse(connection.send_msg.called)
+
+    def test_concurrency_limited_host_skipped(self):
+        session = self.make_session()
+        pool = session._pools.get.return_value
+        connection = Mock(spec=Connection)
+        pool.borrow_connection_or_park.return_value = (connection, 1)
+        limiter = AIMDConcurrencyLimiter(initial_limit=8, min_limit=1)
+        for _ in range(8):
+            limiter.try_acquire('ip1')
+
+        query = SimpleStatement("SELECT * FROM foo")
+        message = QueryMessage(query=query, consistency_level=ConsistencyLevel.ONE)
+        rf = ResponseFuture(session, message, query, 1, concurrency_limiter=limiter)
+        rf.send_request()
+        self.assertIsInstance(rf._errors['ip1'], NoConnectionsAvailable)
+        session._pools.get.assert_called_with('ip2')
+        self.assertEqual(1, limiter.get_in_flight('ip2'))
+
+        # the slot is given back with the response
+        cb = connection.send_msg.call_args[1]['cb']
+        cb(OverloadedErrorMessage(None, None, None))
+        self.assertEqual(0, limiter.get_in_flight('ip2'))
+        self.assertEqual(7, limiter.get_limit('ip2'))
+
+    def test_concurrency_limit_released_on_error(self):
+        session = self.make_session()
+        pool = session._pools.get.return_value
+        pool.borrow_connection_or_park.side_effect = NoConnectionsAvailable()
+        limiter = AIMDConcurrencyLimiter()
+
+        query = SimpleStatement("SELECT * FROM foo")
+        message = QueryMessage(query=query, consistency_level=ConsistencyLevel.ONE)
+        rf = ResponseFuture(session, message, query, 1, concurrency_limiter=limiter)
+        rf.send_request()
+        self.assertRaises(NoHostAvailable, rf.result)
+        self.assertEqual(0, limiter.get_in_flight('ip1'))
+        self.assertEqual(0, limiter.get_in_flight('ip2'))
+
+    def test_request_metrics(self):
+        session = self.make_session()
+        pool = session._pools.get.return_value
+        pool.borrow_connection_or_park.return_value = (Mock(spec=Connection), 1)
+        metrics = RequestMetrics(by_host=False)
+
+        query = SimpleStatement("SELECT * FROM foo")
+        message = QueryMessage(query=query, consistency_level=ConsistencyLevel.ONE)
+        rf = ResponseFuture(session, message, query, 1, request_metrics=metrics, profile_name='analytics')
+        rf.send_request()
+        rf._set_result('ip1', None, None, self.make_mock_response([], []))
+
+        rf = ResponseFuture(session, message, query, 1, request_metrics=metrics, profile_name='analytics')
+        rf.send_request()
+        rf._set_final_exception(OperationTimedOut())
+
+        histogram = metrics.histograms()[(None, 'analytics', None)]
+        self.assertEqual(2, histogram.count)
+        self.assertEqual({'OperationTimedOut': 1}, histogram.errors)
+
     def test_callback(self):
         session = self.make_session()
         rf = self.make_response_future(session)
@@ -355,7 +532,7 @@ class ResponseFutureTests(unittest.TestCase):
         session = self.make_session()
         pool = session._pools.get.return_value
         connection = Mock(spec=Connection)
-        pool.borrow_connection.return_value = (connection, 1)
+        pool.borrow_connection_or_park.return_value = (connection, 1)
 
         query = SimpleStatement("INSERT INFO foo (a, b) VALUES (1, 2)")
         query.retry_policy = Mock()
@@ -402,7 +579,7 @@ class ResponseFutureTests(unittest.TestCase):
         session = self.make_session()
         pool = session._pools.get.return_value
         connection = Mock(spec=Connection)
-        pool.borrow_connection.return_value = (connection, 1)
+        pool.borrow_connection_or_park.return_value = (connection, 1)
 
         query = SimpleStatement("INSERT INFO foo (a, b) VALUES (1, 2)")
         message = QueryMessage(query=query, consistency_level=ConsistencyLevel.ONE)
@@ -471,7 +648,7 @@ class ResponseFutureTests(unittest.TestCase):
         session = self.make_session()
         pool = session._pools.get.return_value
         connection = Mock(spec=Connection)
-        pool.borrow_connection.return_value = (connection, 1)
+        pool.borrow_connection_or_park.return_value = (connection, 1)
 
         rf = self.make_response_future(session)
         rf.send_request()
@@ -495,7 +672,7 @@ class ResponseFutureTests(unittest.TestCase):
         session = self.make_session()
         pool = session._pools.get.return_value
         connection = Mock(spec=Connection)
-        pool.borrow_connection.return_value = (connection, 1)
+        pool.borrow_connection_or_park.return_value = (connection, 1)
 
         rf = self.make_response_future(session)
         rf.send_request()
@@ -13,9 +13,56 @@ try:
 except ImportError:
     import unittest # noqa
 
-from mock import Mock, PropertyMock
+from mock import ANY, Mock, PropertyMock, patch
+import threading
 
+from dse import DriverException
 from dse.cluster import ResultSet
+from dse.cython_deps import HAVE_ARROW
+
+
+class PagedResponseFuture(object):
+    """
+    A ResponseFuture over `pages`, whose pages after the first are delivered
+    by the test.
+    """
+
+    _continuous_paging_session = None
+    _col_names = None
+    _col_types = None
+    _page_size_bytes = 100
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested = 1
+        self.in_flight = False
+        self._next_page = 1
+        self._paging_state = b'1' if len(pages) > 1 else None
+        self._callback = self._errback = None
+
+    @property
+    def has_more_pages(self):
+        return self._paging_state is not None
+
+    def start_fetching_next_page(self):
+        assert not self.in_flight, "a page is already being fetched"
+        self.in_flight = True
+        self.requested += 1
+
+    def add_callbacks(self, callback, errback):
+        self._callback = callback
+        self._errback = errback
+
+    def deliver(self):
+        rows = self.pages[self._next_page]
+        self._next_page += 1
+        self._paging_state = str(self._next_page).encode() if self._next_page < len(self.pages) else None
+        self.in_flight = False
+        self._callback(rows)
+
+    def fail(self, exc):
+        self.in_flight = False
+        self._errback(exc)
 
 
 class ResultSetTests(unittest.TestCase):
@@ -182,3 +229,117 @@ class ResultSetTests(unittest.TestCase):
         for applied in (True, False):
             rs = ResultSet(Mock(row_factory=row_factory), [{'[applied]': applied}])
             self.assertEqual(rs.was_applied, applied)
+
+    @unittest.skipUnless(HAVE_ARROW, 'pyarrow is not available')
+    def test_to_arrow(self):
+        import pyarrow
+
+        pages = [pyarrow.RecordBatch.from_arrays([pyarrow.array(values, pyarrow.int32())], ['a'])
+                 for values in ([1, 2], [3], [])]
+        response_future = Mock(has_more_pages=True, _continuous_paging_session=None)
+        response_future.result.side_effect = [ResultSet(Mock(), page) for page in pages[1:]]
+        rs = ResultSet(response_future, pages[0])
+        type(response_future).has_more_pages = PropertyMock(side_effect=(True, True, True, True, False))
+
+        table = rs.to_arrow()
+        self.assertEqual({'a': [1, 2, 3]}, table.to_pydict())
+        self.assertEqual(pyarrow.int32(), table.schema.field('a').type)
+        # pages are kept
+        self.assertEqual({'a': [1, 2, 3]}, rs.to_arrow().to_pydict())
+
+        # null typed columns of pages without values are promoted
+        null_page = pyarrow.RecordBatch.from_arrays([pyarrow.array([None])], ['a'])
+        rs = ResultSet(Mock(has_more_pages=False), null_page)
+        rs._current_rows.insert(0, pages[0])
+        self.assertEqual({'a': [1, 2, None]}, rs.to_arrow().to_pydict())
+
+    @unittest.skipUnless(HAVE_ARROW, 'pyarrow is not available')
+    def test_to_arrow_promote_options(self):
+        import pyarrow
+
+        pages = [pyarrow.RecordBatch.from_arrays([pyarrow.array(values)], ['a']) for values in ([1], [None])]
+        rs = ResultSet(Mock(has_more_pages=False), pages[0])
+        rs._current_rows.append(pages[1])
+        for version, kwargs in (('13.0.0', {'promote': True}), ('14.0.1', {'promote_options': 'default'})):
+            with patch.object(pyarrow, '__version__', version), patch.object(pyarrow, 'concat_tables') as concat:
+                self.assertIs(concat.return_value, rs.to_arrow())
+                concat.assert_called_once_with(ANY, **kwargs)
+
+    def test_to_arrow_requires_batches(self):
+        self.assertRaises(DriverException, ResultSet(Mock(has_more_pages=False), [(1,)]).to_arrow)
+
+    def test_prefetch(self):
+        pages = [[0, 1], [2, 3], [4, 5], [6]]
+        future = PagedResponseFuture(pages)
+        rs = ResultSet(future, pages[0]).prefetch(pages=2)
+        # the next page is requested right away, and the following one as soon as it arrives
+        self.assertEqual(2, future.requested)
+        future.deliver()
+        self.assertEqual(3, future.requested)
+        future.deliver()
+        # two pages are waiting
+        self.assertEqual(3, future.requested)
+        self.assertEqual(b'1', rs.paging_state)
+
+        rows = iter(rs)
+        self.assertEqual([0, 1, 2], [next(rows) for _ in range(3)])
+        self.assertEqual(b'2', rs.paging_state)
+        self.assertEqual(4, future.requested)
+        future.deliver()
+        self.assertEqual([3, 4, 5, 6], [next(rows) for _ in range(4)])
+        self.assertRaises(StopIteration, next, rows)
+        self.assertFalse(rs.has_more_pages)
+        self.assertIsNone(rs.paging_state)
+
+    def test_prefetch_memory_cap(self):
+        pages = [[0, 1]] * 6
+        future = PagedResponseFuture(pages)
+        rs = ResultSet(future, pages[0]).prefetch(pages=10, max_rows=3)
+        future.deliver()
+        future.deliver()
+        # 4 rows are waiting
+        self.assertEqual(3, future.requested)
+        rs.fetch_next_page()
+        self.assertEqual(4, future.requested)
+
+        future = PagedResponseFuture(pages)
+        ResultSet(future, pages[0]).prefetch(pages=10, max_bytes=150)
+        future.deliver()
+        self.assertEqual(3, future.requested)
+        future.deliver()
+        self.assertEqual(3, future.requested)
+
+    def test_prefetch_error(self):
+        pages = [[0], [1], [2]]
+        future = PagedResponseFuture(pages)
+        rs = ResultSet(future, pages[0]).prefetch(pages=2)
+        future.deliver()
+        future.fail(ValueError('boom'))
+
+        rows = iter(rs)
+        self.assertEqual([0, 1], [next(rows) for _ in range(2)])
+        self.assertRaises(ValueError, next, rows)
+        self.assertTrue(rs.has_more_pages)
+
+        # the page is fetched again
+        timer = threading.Timer(0.05, future.deliver)
+        timer.start()
+        self.assertEqual(2, next(rows))
+        timer.join()
+        self.assertEqual(4, future.requested)
+
+    def test_prefetch_waits_for_pages(self):
+        pages = [[0], [1]]
+        future = PagedResponseFuture(pages)
+        rs = ResultSet(future, pages[0]).prefetch()
+        timer = threading.Timer(0.05, future.deliver)
+        timer.start()
+        self.assertEqual([0, 1], list(rs))
+        timer.join()
+
+    def test_prefetch_single_page(self):
+        future = PagedResponseFuture([[0]])
+        rs = ResultSet(future, [0]).prefetch()
+        self.assertEqual(1, future.requested)
+        self.assertEqual([0], list(rs))
+        self.assertRaises(ValueError, ResultSet(future, [0]).prefetch, pages=0)
@@ -0,0 +1,107 @@
+# Copyright 2016-2017 DataStax, Inc.
+#
+# Licensed under the DataStax DSE Driver License;
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at
+#
+# http://www.datastax.com/terms/datastax-dse-driver-license-terms
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest # noqa
+
+import io
+from mock import patch
+import uuid
+
+from dse import DriverException
+from dse.cqltypes import (AsciiType, BooleanType, ByteType, BytesType, CounterColumnType,
+                          DateType, DoubleType, FloatType, Int32Type, LongType, ShortType,
+                          TimeUUIDType, UTF8Type, UUIDType, VarcharType, lookup_casstype)
+from dse.protocol import ResultMessage, RESULT_KIND_ROWS, write_int, write_value
+from dse.query import named_tuple_factory, tuple_factory, dict_factory
+from dse.row_decoder import RowDecoder, get_row_decoder, _row_decoders
+
+
+def column_metadata(*types):
+    return [('ks', 'tbl', 'col%d' % i, t) for i, t in enumerate(types)]
+
+
+def rows_body(rows, colcount):
+    f = io.BytesIO()
+    write_int(f, RESULT_KIND_ROWS)
+    write_int(f, ResultMessage._NO_METADATA_FLAG)
+    write_int(f, colcount)
+    write_int(f, len(rows))
+    for row in rows:
+        for value in row:
+            write_value(f, value)
+    return f.getvalue()
+
+
+class RowDecoderTest(unittest.TestCase):
+
+    def assert_decodes_like_from_binary(self, types, rows, protocol_version=4):
+        metadata = column_metadata(*types)
+        msg = ResultMessage.recv_body(io.BytesIO(rows_body(rows, len(types))), protocol_version, {}, metadata)
+        expected = [tuple(t.from_binary(v, protocol_version) for t, v in zip(types, row)) for row in rows]
+        self.assertEqual(expected, msg.parsed_rows)
+        self.assertEqual([c[2] for c in metadata], msg.column_names)
+        self.assertIsInstance(msg.row_decoder, RowDecoder)
+        return msg
+
+    def test_fast_types(self):
+        types = [Int32Type, LongType, CounterColumnType, ShortType, ByteType, FloatType, DoubleType,
+                 BooleanType, UTF8Type, VarcharType, AsciiType, BytesType, UUIDType, TimeUUIDType]
+        values = [Int32Type.serialize(-42, 4), LongType.serialize(2 ** 40, 4), LongType.serialize(7, 4),
+                  ShortType.serialize(-3, 4), ByteType.serialize(5, 4), FloatType.serialize(1.5, 4),
+                  DoubleType.serialize(-2.25, 4), BooleanType.serialize(True, 4),
+                  UTF8Type.serialize(u'\u00e9t\u00e9', 4), b'varchar', b'ascii', b'\x00\x01',
+                  uuid.uuid4().bytes, uuid.uuid1().bytes]
+        self.assert_decodes_like_from_binary(types, [values, [None] * len(types), [b''] * len(types)])
+
+    def test_generic_types(self):
+        list_type = lookup_casstype('ListType(Int32Type)')
+        types = [DateType, list_type]
+        values = [DateType.serialize(0, 4), list_type.serialize([1, 2, 3], 4)]
+        self.assert_decodes_like_from_binary(types, [values, [None, None]])
+        self.assert_decodes_like_from_binary(types, [values], protocol_version=3)
+
+    def test_empty_values(self):
+        msg = self.assert_decodes_like_from_binary([Int32Type, UUIDType], [[b'', b'']])
+        self.assertEqual([(None, None)], msg.parsed_rows)
+
+    def test_overridden_deserializer(self):
+        _row_decoders.clear()
+        with patch.object(Int32Type, 'deserialize', staticmethod(lambda byts, protocol_version: 'patched')):
+            self.assertEqual([('patched',)], self.assert_decodes_like_from_binary(
+                [Int32Type], [[Int32Type.serialize(1, 4)]]).parsed_rows)
+        _row_decoders.clear()
+
+    def test_decoding_error(self):
+        body = rows_body([[Int32Type.serialize(1, 4), b'\x00\x01']], 2)
+        with self.assertRaises(DriverException) as cm:
+            ResultMessage.recv_body(io.BytesIO(body), 4, {}, column_metadata(Int32Type, Int32Type))
+        self.assertIn('col1', str(cm.exception))
+
+    def test_decoder_cache(self):
+        metadata = column_metadata(Int32Type, UTF8Type)
+        decoder = get_row_decoder(metadata, 4)
+        self.assertIs(decoder, get_row_decoder(list(metadata), 4))
+        self.assertIsNot(decoder, get_row_decoder(metadata, 3))
+        self.assertIsNot(decoder, get_row_decoder(column_metadata(Int32Type, BytesType), 4))
+
+    def test_make_rows(self):
+        decoder = get_row_decoder([('ks', 'tbl', 'a', Int32Type), ('ks', 'tbl', 'b-c', Int32Type)], 4)
+        rows = [(1, 2), (3, 4)]
+
+        self.assertIs(rows, decoder.make_rows(tuple_factory, rows))
+        self.assertEqual([{'a': 1, 'b-c': 2}, {'a': 3, 'b-c': 4}], decoder.make_rows(dict_factory, rows))
+
+        named = decoder.make_rows(named_tuple_factory, rows)
+        self.assertEqual(named_tuple_factory(decoder.column_names, rows), named)
+        self.assertEqual((1, 2), (named[0].a, named[0].b_c))
+        # the row class is built once per decoder
+        self.assertIs(type(named[0]), type(decoder.make_rows(named_tuple_factory, rows[:1])[0]))